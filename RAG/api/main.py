@@ -1,12 +1,30 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import time
-from typing import Dict, Any
+import uuid
+from typing import Dict, Any, List, Optional
 
 from config.settings import settings
-from api.models.query_models import QueryRequest, QueryResponse, ErrorResponse, HealthResponse
-from api.services.rag_service import rag_service
+from api.models.query_models import QueryRequest, QueryResponse, ErrorResponse, HealthResponse, ReadinessResponse, SessionResponse, JobRequest, JobResponse, ResultResponse, TimeseriesResponse
+from api.services.rag_service import QUERY_MODES
+from api.services.metrics import metrics
+from api.services.admission import admission_controller, AdmissionRejected
+from api.services.session_store import session_store, SessionNotFound
+from api.services.job_queue import get_job_queue, JobWorkerPool, run_query_job
+from api.services.observation_manager import observation_store
+from api.services.service_pool import service_pool, DatabaseNotFound
+from api.services.hot_reload import HotReloader
+from api.services.timeseries import build_timeseries
+from api.services.telemetry_ingest import (
+    telemetry_ingest, ingest_authorized, IngestConflict, IngestError, IngestRejected, ReadingsParser, validate_readings,
+    MAX_REPORTED_ERRORS
+)
+from api.services.circuit_breaker import CircuitOpenError
+from api.services.request_profiler import Profile, SamplingProfiler, profile_store, profiling_authorized
+from api.utils.response_encoding import CompactJSONResponse, CompressionMiddleware, etag_matches, project
 
 # Criar aplicação FastAPI
 app = FastAPI(
@@ -15,7 +33,8 @@ app = FastAPI(
     description=settings.api_description,
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    default_response_class=CompactJSONResponse
 )
 
 # Configurar CORS
@@ -27,18 +46,94 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compressão das respostas (brotli ou gzip, negociada pelo Accept-Encoding)
+if settings.response_compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.response_compression_min_bytes,
+        level=settings.response_compression_level
+    )
+
+# Workers dos jobs assíncronos executados no processo da API (criados na inicialização se JOB_WORKERS > 0)
+job_workers: Optional[JobWorkerPool] = None
+
+# Recarga do banco e das consultas validadas quando os arquivos mudam
+hot_reloader = HotReloader(service_pool, settings.hot_reload_poll_seconds)
+
+def _refresh_partitions(database_path: str) -> None:
+    """Partições criadas pela ingestão passam a ser consideradas pela poda das consultas"""
+    for _, service in service_pool.loaded():
+        if service.database_path == database_path and service.partition_pruner is not None:
+            service.partition_pruner.refresh(database_path)
+
+def _refresh_data(database_path: str) -> None:
+    """Leituras ingeridas atualizam catálogo, amostra e esquema em background, sem recarga completa"""
+    for _, service in service_pool.loaded():
+        if service.database_path == database_path:
+            service.request_refresh()
+
+telemetry_ingest.on_partitions_created = _refresh_partitions
+telemetry_ingest.on_checkpoint = _refresh_data
+
 @app.on_event("startup")
 async def startup_event():
     """Evento executado na inicialização da aplicação"""
+    global job_workers
     try:
-        # Verificar se o serviço RAG está funcionando
-        health_status = rag_service.get_health_status()
-        if health_status["status"] != "healthy":
-            print(f"Aviso: Serviço RAG não está saudável: {health_status}")
+        # O agente é montado em background; /health responde imediatamente
+        # e /ready indica quando as consultas podem ser atendidas
+        if settings.warmup_on_startup:
+            service_pool.default.start_warmup()
+            print("🔥 Aquecimento do serviço RAG iniciado em background")
         else:
-            print("✅ Serviço RAG inicializado com sucesso")
+            print("ℹ️ Aquecimento desativado: o serviço RAG será inicializado na primeira consulta")
     except Exception as e:
         print(f"❌ Erro ao inicializar serviço RAG: {e}")
+    
+    if settings.job_workers > 0:
+        job_workers = JobWorkerPool(
+            get_job_queue(),
+            handler=run_query_job,
+            workers=settings.job_workers,
+            poll_interval=settings.job_poll_interval_seconds
+        )
+        job_workers.start()
+        print(f"🧵 {settings.job_workers} worker(s) de jobs assíncronos iniciados")
+    
+    if settings.hot_reload_enabled:
+        hot_reloader.start()
+        print(f"🔄 Recarga automática ativa (verificação a cada {settings.hot_reload_poll_seconds:g}s)")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Evento executado no encerramento da aplicação"""
+    if job_workers is not None:
+        job_workers.stop()
+    hot_reloader.stop()
+    telemetry_ingest.close()
+
+def get_client_id(http_request: Request) -> str:
+    """Identifica o cliente para o controle de admissão (API key ou IP de origem)"""
+    api_key = http_request.headers.get("x-api-key")
+    if api_key:
+        return f"key:{api_key}"
+    
+    # Atrás do nginx, o IP real do cliente vem no X-Forwarded-For
+    forwarded_for = http_request.headers.get("x-forwarded-for")
+    if forwarded_for:
+        return f"ip:{forwarded_for.split(',')[0].strip()}"
+    
+    return f"ip:{http_request.client.host if http_request.client else 'desconhecido'}"
+
+def require_profiling_admin(http_request: Request) -> None:
+    """Perfis expõem o código e as perguntas: só com o token de admin"""
+    if not profiling_authorized(http_request.headers.get("x-admin-token")):
+        raise HTTPException(status_code=403, detail="Profiling exige X-Admin-Token válido")
+
+def require_ingest_token(http_request: Request) -> None:
+    """A ingestão grava na Telemetria: só coletores com o token de ingestão"""
+    if not ingest_authorized(http_request.headers.get("x-ingest-token")):
+        raise HTTPException(status_code=403, detail="Ingestão exige X-Ingest-Token válido")
 
 @app.get("/", tags=["Root"])
 async def root():
@@ -47,18 +142,20 @@ async def root():
         "message": "Visagio RAG API",
         "version": settings.api_version,
         "docs": "/docs",
-        "health": "/health"
+        "health": "/health",
+        "ready": "/ready"
     }
 
 @app.get("/health", response_model=HealthResponse, tags=["Health"])
 async def health_check():
     """Verificar o status de saúde da API"""
     try:
-        health_status = rag_service.get_health_status()
+        health_status = service_pool.default.get_health_status()
         return HealthResponse(
             status=health_status["status"],
             database_connected=health_status["database_connected"],
-            gemini_configured=health_status["gemini_configured"]
+            gemini_configured=health_status["gemini_configured"],
+            llm_circuit=health_status.get("llm_circuit")
         )
     except Exception as e:
         return HealthResponse(
@@ -67,13 +164,28 @@ async def health_check():
             gemini_configured=False
         )
 
+@app.get("/ready", response_model=ReadinessResponse, tags=["Health"])
+async def readiness_check():
+    """Verificar se o agente RAG já está pronto para atender consultas"""
+    readiness = service_pool.default.get_readiness()
+    response = ReadinessResponse(**readiness)
+    
+    # 503 enquanto o aquecimento não termina, para que orquestradores aguardem
+    status_code = 200 if readiness["ready"] else 503
+    return JSONResponse(status_code=status_code, content=response.model_dump(mode="json"))
+
 @app.post("/query", response_model=QueryResponse, tags=["RAG"])
-async def execute_query(request: QueryRequest):
+async def execute_query(request: QueryRequest, http_request: Request, response: Response,
+                        client_id: str = Depends(get_client_id), fields: Optional[str] = None,
+                        profile: bool = False):
     """
     Executa uma consulta RAG usando linguagem natural
     
     - **query**: Pergunta ou consulta em linguagem natural
     - **similarity_threshold**: Threshold para similaridade de consultas (opcional)
+    - **fields** (query string): campos da resposta, separados por vírgula (ex: `sql_query,result`)
+    - **profile** (query string) ou header `X-Profile: true`: executa a consulta sob o profiler por
+      amostragem (exige `X-Admin-Token`); o perfil fica em GET /profiles/{X-Profile-Id}
     
     Retorna:
     - A consulta SQL gerada
@@ -87,20 +199,93 @@ async def execute_query(request: QueryRequest):
         print(f"🌐 DEBUG: Request completo: {request}")
         print(f"🔍 DEBUG: Query recebida: '{request.query}' (tipo: {type(request.query)})")
         
-        # Executar a consulta RAG
-        result = rag_service.query(request.query)
+        if not request.query.strip():
+            raise ValueError("A consulta não pode ser vazia")
+        
+        if request.mode and request.mode not in QUERY_MODES:
+            raise ValueError(f"Modo inválido: {request.mode} (use {', '.join(QUERY_MODES)})")
+        
+        # Validar a projeção antes de executar a consulta
+        project({}, fields, QueryResponse.model_fields)
+        
+        if request.session_id:
+            # Falhar cedo (404) se a sessão não existe ou expirou
+            session_store.get(request.session_id)
+        
+        # Profiling sob demanda: sem o pedido, nenhum profiler é criado
+        profiler = None
+        if profile or http_request.headers.get("x-profile", "").lower() in ("1", "true"):
+            require_profiling_admin(http_request)
+            profiler = SamplingProfiler(settings.profiling_sample_interval_ms / 1000)
+        
+        # Executar a consulta RAG fora do event loop, para que requisições
+        # concorrentes (e perguntas idênticas coalescidas) avancem em paralelo,
+        # respeitando o limite de execuções simultâneas do controle de admissão
+        query_args = (
+            service_pool.query, request.database, request.query,
+            request.similarity_threshold, request.session_id, request.mode, request.approximate
+        )
+        async with admission_controller.slot(client_id):
+            if profiler is None:
+                result = await run_in_threadpool(*query_args)
+            else:
+                profiler.start()
+                try:
+                    result = await run_in_threadpool(profiler.run, *query_args)
+                finally:
+                    profiled = Profile(
+                        uuid.uuid4().hex[:12], f"POST /query: {request.query[:80]}", profiler.stop(),
+                        profiler.interval, profiler.duration,
+                        {"query": request.query, "database": request.database, "mode": request.mode}
+                    )
+                    profile_store.put(profiled)
+                    response.headers["X-Profile-Id"] = profiled.request_id
+                    print(f"🔬 Perfil {profiled.request_id}: {profiled.samples} amostras em {profiled.duration:.2f}s")
         
         # Criar resposta estruturada
-        response = QueryResponse(
+        query_response = QueryResponse(
             query=result["query"],
             sql_query=result["sql_query"],
             result=result["result"],
             justification=result["justification"],
-            execution_time=result["execution_time"]
+            execution_time=result["execution_time"],
+            model=result.get("model"),
+            mode=result.get("mode"),
+            llm_calls=result.get("llm_calls"),
+            database=result.get("database"),
+            session_id=result.get("session_id"),
+            result_table=result.get("result_table"),
+            approximate=result.get("approximate", False),
+            approximation=result.get("approximation"),
+            degraded=result.get("degraded", False),
+            degraded_source=result.get("degraded_source")
         )
         
-        return response
+        if fields:
+            return CompactJSONResponse(
+                project(query_response.model_dump(mode="json"), fields, QueryResponse.model_fields),
+                headers=dict(response.headers)
+            )
+        return query_response
         
+    except HTTPException:
+        raise
+    except (SessionNotFound, DatabaseNotFound) as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except AdmissionRejected as e:
+        # Servidor saturado: recusar rapidamente para que o cliente tente depois
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except CircuitOpenError as e:
+        # LLM indisponível e nenhuma resposta degradada: falhar rápido
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except ValueError as e:
         # Erro de validação
         raise HTTPException(status_code=400, detail=str(e))
@@ -111,6 +296,205 @@ async def execute_query(request: QueryRequest):
         # Erro genérico
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
+def _job_response(job: Dict[str, Any]) -> JobResponse:
+    return JobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        attempts=job["attempts"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+        result=job["result"],
+        error=job["error"]
+    )
+
+@app.post("/jobs", response_model=JobResponse, status_code=202, tags=["Jobs"])
+async def create_job(request: JobRequest):
+    """
+    Enfileira uma consulta longa para execução em background
+    
+    Retorna imediatamente o ID do job; acompanhe o status em GET /jobs/{job_id}.
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="A consulta não pode ser vazia")
+    if request.mode and request.mode not in QUERY_MODES:
+        raise HTTPException(status_code=400, detail=f"Modo inválido: {request.mode} (use {', '.join(QUERY_MODES)})")
+    if request.database and request.database not in service_pool.databases():
+        raise HTTPException(status_code=404, detail=f"Banco não registrado: {request.database}")
+    # As sessões vivem na memória deste processo; o job pode rodar em outro (worker.py)
+    if request.session_id:
+        raise HTTPException(status_code=400, detail="Jobs não aceitam session_id: use POST /query para perguntas de uma sessão")
+    
+    job_queue = get_job_queue()
+    job_id = await run_in_threadpool(job_queue.enqueue, request.model_dump(exclude={"session_id"}))
+    return _job_response(await run_in_threadpool(job_queue.get, job_id))
+
+@app.get("/jobs/{job_id}", response_model=JobResponse, tags=["Jobs"])
+async def get_job(job_id: str):
+    """Retorna o status e, quando concluído, o resultado de um job"""
+    job = await run_in_threadpool(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job não encontrado: {job_id}")
+    return _job_response(job)
+
+@app.post("/sessions", response_model=SessionResponse, status_code=201, tags=["Sessions"])
+async def create_session():
+    """Cria uma sessão de conversa para perguntas de acompanhamento"""
+    return SessionResponse(**session_store.create().to_dict())
+
+@app.get("/sessions/{session_id}", response_model=SessionResponse, tags=["Sessions"])
+async def get_session(session_id: str):
+    """Retorna os turnos de uma sessão de conversa"""
+    try:
+        return SessionResponse(**session_store.get(session_id).to_dict())
+    except SessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+@app.delete("/sessions/{session_id}", status_code=204, tags=["Sessions"])
+async def delete_session(session_id: str):
+    """Encerra uma sessão de conversa, liberando suas tabelas"""
+    try:
+        session_store.delete(session_id)
+    except SessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+@app.get("/results/{result_id}", response_model=ResultResponse, tags=["RAG"])
+async def get_result(result_id: str, offset: int = 0, limit: int = 1000):
+    """Retorna (paginado) um resultado completo que o agente recebeu apenas resumido"""
+    result = observation_store.get(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Resultado não encontrado ou expirado: {result_id}")
+    
+    offset = max(0, offset)
+    return ResultResponse(
+        result_id=result_id,
+        sql=result["sql"],
+        columns=result["columns"],
+        rows=[list(row) for row in result["rows"][offset:offset + max(0, limit)]],
+        total_rows=len(result["rows"]),
+        offset=offset
+    )
+
+@app.get("/profiles", tags=["Profiling"], dependencies=[Depends(require_profiling_admin)])
+async def list_profiles():
+    """Perfis guardados, do mais recente ao mais antigo"""
+    return {"profiles": profile_store.list()}
+
+@app.get("/profiles/{request_id}", tags=["Profiling"], dependencies=[Depends(require_profiling_admin)])
+async def download_profile(request_id: str, format: str = "speedscope"):
+    """Baixa o perfil de uma consulta (speedscope JSON ou pilhas colapsadas)"""
+    profiled = profile_store.get(request_id)
+    if profiled is None:
+        raise HTTPException(status_code=404, detail=f"Perfil não encontrado ou expirado: {request_id}")
+    if format == "collapsed":
+        return PlainTextResponse(
+            profiled.to_collapsed(),
+            headers={"Content-Disposition": f'attachment; filename="{request_id}.collapsed.txt"'}
+        )
+    if format != "speedscope":
+        raise HTTPException(status_code=400, detail="Formato inválido: use speedscope ou collapsed")
+    return CompactJSONResponse(
+        profiled.to_speedscope(),
+        headers={"Content-Disposition": f'attachment; filename="{request_id}.speedscope.json"'}
+    )
+
+@app.get("/timeseries", response_model=TimeseriesResponse, tags=["Database"])
+async def get_timeseries(
+    categoria: str,
+    serie: str,
+    chassi: List[int] = Query(..., description="Chassi(s); repita o parâmetro para vários"),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    points: int = Query(500, ge=2, le=10000),
+    method: str = "lttb",
+    database: Optional[str] = None
+):
+    """Séries temporais de telemetria reduzidas para gráficos (sem passar pelo LLM)"""
+    try:
+        database_path = service_pool.database_path(database)
+        result = await run_in_threadpool(
+            build_timeseries, database_path, chassi, categoria, serie, start, end, points, method
+        )
+    except DatabaseNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    metrics.observe("rag_timeseries_duration_seconds", result["elapsed_ms"] / 1000, method=method)
+    return result
+
+@app.post("/telemetry", tags=["Database"], dependencies=[Depends(require_ingest_token)])
+async def ingest_telemetry(request: Request, database: Optional[str] = None):
+    """Recebe leituras de sensores (JSON, NDJSON ou CSV) e as grava na Telemetria
+    
+    O corpo é lido em partes: a cada INGEST_PARSE_ROWS leituras, o lote é validado e
+    enfileirado no escritor único do banco. A resposta só é enviada depois que todos os
+    lotes foram confirmados (COMMIT). Leituras inválidas são recusadas individualmente.
+    """
+    start_time = time.time()
+    received = rejected = 0
+    errors: List[Dict[str, Any]] = []
+    futures = []
+    
+    def _enqueue(records: List[Any]) -> None:
+        nonlocal received, rejected
+        batch, invalid, batch_errors = validate_readings(records, received)
+        received += len(records)
+        rejected += invalid
+        errors.extend(batch_errors[:MAX_REPORTED_ERRORS - len(errors)])
+        futures.append(writer.submit(batch))
+    
+    try:
+        writer = telemetry_ingest.writer(service_pool.database_path(database))
+        parser = ReadingsParser(request.headers.get("content-type"))
+        pending: List[Any] = []
+        async for chunk in request.stream():
+            pending.extend(parser.feed(chunk))
+            if len(pending) >= settings.ingest_parse_rows:
+                await run_in_threadpool(_enqueue, pending)
+                pending = []
+        pending.extend(parser.close())
+        if pending:
+            await run_in_threadpool(_enqueue, pending)
+        written = sum(await asyncio.gather(*(asyncio.wrap_future(future) for future in futures)))
+    except DatabaseNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IngestConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except IngestRejected as e:
+        # Lotes já enfileirados são gravados; reenviar tudo é seguro (upsert na chave)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gravar leituras: {str(e)}")
+    
+    metrics.observe("rag_ingest_request_seconds", time.time() - start_time)
+    return {
+        "database_path": writer.database_path,
+        "received": received,
+        "written": written,
+        "rejected": rejected,
+        "errors": errors,
+        "elapsed_ms": (time.time() - start_time) * 1000
+    }
+
+@app.get("/databases", tags=["Health"])
+async def get_databases():
+    """Bancos registrados, o estado das instâncias do serviço no pool e os escritores da Telemetria"""
+    return {
+        "default": settings.default_database,
+        "databases": service_pool.status(),
+        "ingest": telemetry_ingest.status()
+    }
+
+@app.get("/metrics", tags=["Health"])
+async def get_metrics(format: str = "json"):
+    """Retorna as métricas do processo (JSON ou formato texto do Prometheus com ?format=prometheus)"""
+    if format == "prometheus":
+        return PlainTextResponse(metrics.render_prometheus())
+    return metrics.snapshot()
+
 @app.get("/examples", tags=["Examples"])
 async def get_example_queries():
     """Retorna exemplos de consultas que podem ser feitas"""
@@ -140,61 +524,21 @@ async def get_example_queries():
     }
 
 @app.get("/database/schema", tags=["Database"])
-async def get_database_schema():
-    """Retorna informações sobre o esquema do banco de dados"""
+async def get_database_schema(request: Request, database: Optional[str] = None):
+    """Retorna o esquema do banco de dados, lido do próprio SQLite (com ETag para revalidação)"""
     try:
-        # Obter informações das tabelas
-        tables_info = {}
-        
-        # Informações sobre a tabela Chassis
-        tables_info["Chassis"] = {
-            "description": "Tabela relacionando dados de clientes e seus contratos de locação de veículos",
-            "columns": {
-                "Chassi": {"type": "INTEGER", "description": "ID do chassi"},
-                "Contrato": {"type": "INTEGER", "description": "ID do contrato"},
-                "Cliente": {"type": "INTEGER", "description": "ID do cliente"},
-                "Modelo": {"type": "INTEGER", "description": "ID do modelo"}
-            }
-        }
-        
-        # Informações sobre a tabela Telemetria
-        tables_info["Telemetria"] = {
-            "description": "Tabela contendo dados diários dos veículos obtidos por sensores",
-            "columns": {
-                "Chassi": {"type": "INTEGER", "description": "ID do chassi"},
-                "UnidadeMedida": {"type": "TEXT", "description": "Unidade de medida ('l' para litros ou 'hr' para horas)"},
-                "Categoria": {"type": "TEXT", "description": "Nome da categoria da informação sensoriada"},
-                "Data": {"type": "TIMESTAMP", "description": "Data e hora de captação do dado"},
-                "Serie": {"type": "TEXT", "description": "Nome da subcategoria do tipo de dado sensoriado"},
-                "Valor": {"type": "REAL", "description": "Valor capturado pelo sensor"}
-            }
-        }
-        
-        # Categorias e séries disponíveis
-        categories_info = {
-            "Uso do Motor": {
-                "description": "Tempo (em horas 'hr') em cada status de motor",
-                "series": ["Chave-Ligada", "Marcha Lenta", "Carga Baixa", "Carga Média", "Carga Alta"]
-            },
-            "Uso do Combustível do Motor": {
-                "description": "Consumo de combustível (em litros 'l') em cada status de motor",
-                "series": ["Chave-Ligada", "Marcha Lenta", "Carga Baixa", "Carga Média", "Carga Alta"]
-            },
-            "Uso da Configuração do Modo do Motor": {
-                "description": "Tempo (em horas 'hr') em cada configuração de motor",
-                "series": ["HP", "P", "E"]
-            }
-        }
-        
-        return {
-            "database_path": str(settings.database_path),
-            "tables": tables_info,
-            "categories": categories_info,
-            "note": "Este esquema representa dados de telemetria de uma empresa locadora de maquinário agrícola."
-        }
-        
+        with service_pool.lease(database) as service:
+            catalog = await run_in_threadpool(service.get_schema)
+    except DatabaseNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter esquema: {str(e)}")
+    
+    # O esquema só muda com o banco: o cliente revalida e recebe 304 enquanto a versão for a mesma
+    headers = {"ETag": catalog.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), catalog.etag):
+        return Response(status_code=304, headers=headers)
+    return CompactJSONResponse(catalog.to_response(service.database_path), headers=headers)
 
 @app.get("/test/response-structure", tags=["Testing"])
 async def test_response_structure():
@@ -202,7 +546,7 @@ async def test_response_structure():
     try:
         # Fazer uma consulta de teste
         test_query = "Qual a categoria de telemetria mais utilizada?"
-        result = rag_service.query(test_query)
+        result = service_pool.query(None, test_query)
         
         # Verificar duplicações
         analysis = {
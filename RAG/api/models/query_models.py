@@ -6,6 +6,10 @@ class QueryRequest(BaseModel):
     """Modelo para requisição de consulta"""
     query: str = Field(..., description="Pergunta ou consulta em linguagem natural")
     similarity_threshold: Optional[float] = Field(0.7, description="Threshold para similaridade de consultas")
+    session_id: Optional[str] = Field(None, description="Sessão de conversa (criada em POST /sessions) para perguntas de acompanhamento")
+    mode: Optional[str] = Field(None, description="Modo de execução: 'agent' (ReAct), 'plan' (plano com passos SQL em paralelo) ou 'fast' (consulta única); padrão em DEFAULT_QUERY_MODE")
+    database: Optional[str] = Field(None, description="Nome do banco registrado em DATABASES; padrão em DEFAULT_DATABASE")
+    approximate: bool = Field(False, description="Estimar agregações em uma amostra estratificada (resposta em milissegundos, com margem de erro); usa o modo 'fast'")
 
 class QueryResponse(BaseModel):
     """Modelo para resposta da consulta"""
@@ -14,6 +18,16 @@ class QueryResponse(BaseModel):
     result: Any = Field(..., description="Resultado da consulta (sem duplicações)")
     justification: str = Field(..., description="Justificativa da consulta gerada (processo de pensamento)")
     execution_time: float = Field(..., description="Tempo de execução em segundos")
+    model: Optional[str] = Field(None, description="Modelo da cascata que resolveu a pergunta")
+    mode: Optional[str] = Field(None, description="Modo de execução usado ('plan' e 'fast' podem recair em 'agent')")
+    llm_calls: Optional[int] = Field(None, description="Chamadas ao LLM feitas para responder")
+    database: Optional[str] = Field(None, description="Banco consultado")
+    session_id: Optional[str] = Field(None, description="Sessão de conversa da pergunta")
+    result_table: Optional[str] = Field(None, description="Tabela da sessão onde o resultado foi salvo")
+    approximate: bool = Field(False, description="Se o resultado é uma estimativa feita na amostra estratificada")
+    approximation: Optional[Dict[str, Any]] = Field(None, description="Nível de confiança, tamanho da amostra e intervalo de cada agregação por linha do resultado")
+    degraded: bool = Field(False, description="Se a resposta foi dada sem o LLM, com o circuito do LLM aberto")
+    degraded_source: Optional[str] = Field(None, description="Origem da resposta degradada ('answer_cache', 'similar_answer' ou 'validated_query')")
     timestamp: datetime = Field(default_factory=datetime.now, description="Timestamp da execução")
     
     class Config:
@@ -37,4 +51,67 @@ class HealthResponse(BaseModel):
     status: str = Field(..., description="Status da API")
     timestamp: datetime = Field(default_factory=datetime.now, description="Timestamp do check")
     database_connected: bool = Field(..., description="Status da conexão com o banco")
-    gemini_configured: bool = Field(..., description="Status da configuração do Gemini") 
\ No newline at end of file
+    gemini_configured: bool = Field(..., description="Status da configuração do Gemini")
+    llm_circuit: Optional[Dict[str, Any]] = Field(None, description="Estado do circuito do LLM ('closed', 'open', 'half_open' ou 'disabled')")
+
+class ReadinessResponse(BaseModel):
+    """Modelo para resposta de readiness check"""
+    ready: bool = Field(..., description="Se o agente RAG está pronto para atender consultas")
+    status: str = Field(..., description="Estado da inicialização ('warming_up', 'ready' ou 'failed')")
+    error: Optional[str] = Field(None, description="Erro da última tentativa de inicialização")
+    init_duration: Optional[float] = Field(None, description="Tempo de inicialização do agente em segundos")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Timestamp do check")
+
+class SessionResponse(BaseModel):
+    """Modelo para resposta de uma sessão de conversa"""
+    session_id: str = Field(..., description="ID da sessão")
+    created_at: float = Field(..., description="Criação da sessão (epoch em segundos)")
+    last_access: float = Field(..., description="Último uso da sessão (epoch em segundos)")
+    size_bytes: int = Field(0, description="Memória estimada ocupada pelas tabelas da sessão")
+    turns: List[Dict[str, Any]] = Field(default_factory=list, description="Perguntas, consultas e tabelas de resultado de cada turno")
+
+class JobRequest(BaseModel):
+    """Modelo para requisição de job assíncrono"""
+    query: str = Field(..., description="Pergunta ou consulta em linguagem natural")
+    similarity_threshold: Optional[float] = Field(0.7, description="Threshold para similaridade de consultas")
+    session_id: Optional[str] = Field(None, description="Não suportado: jobs podem rodar em outro processo, sem acesso às sessões (use POST /query)")
+    mode: Optional[str] = Field(None, description="Modo de execução: 'agent', 'plan' ou 'fast'")
+    database: Optional[str] = Field(None, description="Nome do banco registrado em DATABASES")
+    approximate: bool = Field(False, description="Estimar agregações na amostra estratificada")
+
+class JobResponse(BaseModel):
+    """Modelo para resposta de job assíncrono"""
+    job_id: str = Field(..., description="ID do job")
+    status: str = Field(..., description="Status do job ('queued', 'running', 'succeeded' ou 'failed')")
+    attempts: int = Field(0, description="Número de execuções iniciadas")
+    created_at: Optional[float] = Field(None, description="Criação do job (epoch em segundos)")
+    started_at: Optional[float] = Field(None, description="Início da última execução (epoch em segundos)")
+    finished_at: Optional[float] = Field(None, description="Término do job (epoch em segundos)")
+    result: Optional[Dict[str, Any]] = Field(None, description="Resultado da consulta (quando concluído)")
+    error: Optional[str] = Field(None, description="Erro da execução (quando falho)")
+
+class ResultResponse(BaseModel):
+    """Modelo para resposta de um resultado completo guardado no servidor"""
+    result_id: str = Field(..., description="ID do resultado")
+    sql: str = Field(..., description="Consulta que produziu o resultado")
+    columns: List[str] = Field(..., description="Nomes das colunas")
+    rows: List[List[Any]] = Field(..., description="Linhas da página solicitada")
+    total_rows: int = Field(..., description="Número total de linhas do resultado")
+    offset: int = Field(0, description="Posição da primeira linha retornada")
+
+class SeriesData(BaseModel):
+    """Série de um chassi em arrays colunares"""
+    chassi: int = Field(..., description="Chassi da série")
+    t: List[int] = Field(..., description="Instantes das medições (epoch em segundos, UTC)")
+    v: List[float] = Field(..., description="Valores das medições")
+
+class TimeseriesResponse(BaseModel):
+    """Modelo para resposta de séries temporais reduzidas para gráficos"""
+    categoria: str = Field(..., description="Categoria consultada")
+    serie: str = Field(..., description="Série consultada")
+    unidade: Optional[str] = Field(None, description="Unidade de medida dos valores")
+    method: str = Field(..., description="Método de redução de pontos usado")
+    points_in: int = Field(..., description="Pontos lidos do banco no intervalo")
+    points_out: int = Field(..., description="Pontos retornados após a redução")
+    series: List[SeriesData] = Field(..., description="Séries por chassi")
+    elapsed_ms: float = Field(..., description="Tempo de leitura e redução em milissegundos")
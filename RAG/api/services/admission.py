@@ -0,0 +1,157 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict
+
+from config.settings import settings
+from api.services.metrics import metrics
+
+class AdmissionRejected(Exception):
+    """Requisição recusada pelo controle de admissão (fila cheia ou espera excedida)"""
+
+    def __init__(self, message: str, retry_after: int, reason: str):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.reason = reason
+
+class AdmissionController:
+    """Fila de admissão limitada na frente das execuções do agente
+
+    - No máximo `max_concurrency` execuções simultâneas
+    - No máximo `max_queue` requisições aguardando (e `max_queue_per_client` por cliente)
+    - Cada requisição espera no máximo `max_wait_seconds` por uma vaga
+    - Vagas liberadas são distribuídas em round-robin entre os clientes com requisições
+      na fila, para que um cliente com rajadas não monopolize o serviço
+
+    Deve ser usado a partir de um único event loop (o da aplicação FastAPI).
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, max_wait_seconds: float,
+                 max_queue_per_client: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.max_queue_per_client = max_queue_per_client
+        self._active = 0
+        self._queued = 0
+        # Cliente -> fila de futures aguardando vaga (ordem de inserção = ordem do round-robin)
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def _retry_after(self) -> int:
+        """Estimativa (em segundos) de quando uma nova tentativa deve ter vaga"""
+        service_time = metrics.get_percentile("rag_query_duration_seconds", 0.5) or 5.0
+        return max(1, math.ceil(service_time * (self._queued + 1) / self.max_concurrency))
+
+    def _publish_metrics(self) -> None:
+        metrics.set_gauge("rag_admission_queue_depth", self._queued)
+        metrics.set_gauge("rag_admission_active", self._active)
+
+    def _reject(self, message: str, reason: str) -> AdmissionRejected:
+        metrics.inc("rag_admission_rejected_total", reason=reason)
+        return AdmissionRejected(message, retry_after=self._retry_after(), reason=reason)
+
+    async def acquire(self, client_id: str) -> float:
+        """Aguarda uma vaga para o cliente e retorna o tempo de espera em segundos"""
+        start_time = time.monotonic()
+
+        # Caminho rápido: há vaga e ninguém esperando
+        if self._active < self.max_concurrency and self._queued == 0:
+            self._active += 1
+            self._publish_metrics()
+            metrics.observe("rag_admission_wait_seconds", 0.0)
+            return 0.0
+
+        if self._queued >= self.max_queue:
+            raise self._reject("Servidor saturado: fila de consultas cheia", reason="queue_full")
+
+        client_queue = self._waiters.get(client_id)
+        if client_queue is not None and len(client_queue) >= self.max_queue_per_client:
+            raise self._reject("Limite de consultas na fila para este cliente atingido", reason="client_limit")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(client_id, deque()).append(future)
+        self._queued += 1
+        self._publish_metrics()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done():
+                # A vaga foi concedida no mesmo instante do timeout/cancelamento
+                if isinstance(e, asyncio.CancelledError):
+                    self.release()
+                    raise
+            else:
+                future.cancel()
+                self._remove_waiter(client_id, future)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                raise self._reject("Tempo máximo de espera por uma vaga excedido", reason="timeout")
+
+        wait_time = time.monotonic() - start_time
+        metrics.observe("rag_admission_wait_seconds", wait_time)
+        return wait_time
+
+    def _remove_waiter(self, client_id: str, future: asyncio.Future) -> None:
+        client_queue = self._waiters.get(client_id)
+        if client_queue is not None and future in client_queue:
+            client_queue.remove(future)
+            self._queued -= 1
+            if not client_queue:
+                del self._waiters[client_id]
+        self._publish_metrics()
+
+    def release(self) -> None:
+        """Libera uma vaga, entregando-a ao próximo cliente no round-robin"""
+        while self._waiters:
+            client_id, client_queue = self._waiters.popitem(last=False)
+            future = client_queue.popleft()
+            self._queued -= 1
+            if client_queue:
+                # O cliente volta para o fim da rotação
+                self._waiters[client_id] = client_queue
+            if not future.done():
+                # A vaga passa diretamente para o próximo da fila (_active inalterado)
+                future.set_result(None)
+                self._publish_metrics()
+                return
+
+        self._active -= 1
+        self._publish_metrics()
+
+    @asynccontextmanager
+    async def slot(self, client_id: str):
+        """Context manager que ocupa uma vaga durante a execução da consulta"""
+        await self.acquire(client_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_status(self) -> Dict[str, int]:
+        """Retorna o estado atual da fila de admissão"""
+        return {
+            "active": self._active,
+            "queued": self._queued,
+            "clients_waiting": len(self._waiters),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+# Instância global do controle de admissão
+admission_controller = AdmissionController(
+    max_concurrency=settings.admission_max_concurrency,
+    max_queue=settings.admission_max_queue,
+    max_wait_seconds=settings.admission_max_wait_seconds,
+    max_queue_per_client=settings.admission_max_queue_per_client,
+)
@@ -0,0 +1,403 @@
+import json
+import math
+import re
+import sqlite3
+import time
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from api.services.metrics import metrics
+from api.services.statistics_catalog import telemetry_fingerprint
+
+# Tabelas laterais da amostra, gravadas no próprio banco e ocultas do agente
+SAMPLE_TABLE = "AmostraTelemetria"
+SAMPLE_STRATA_TABLE = "AmostraEstratos"
+SAMPLE_META_TABLE = "AmostraMetadados"
+SAMPLE_TABLES = [SAMPLE_TABLE, SAMPLE_STRATA_TABLE, SAMPLE_META_TABLE]
+
+# Colunas que definem o estrato de cada linha da Telemetria
+STRATUM_COLUMNS = ("Chassi", "Categoria", "Serie")
+
+_QUERY = re.compile(
+    r"^\s*SELECT\s+(?P<select>.+?)\s+(?P<source>FROM\s+.+?)"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?"
+    r"(?:\s+GROUP\s+BY\s+(?P<group>.+?))?"
+    r"(?:\s+ORDER\s+BY\s+(?P<order>.+?))?"
+    r"(?:\s+LIMIT\s+(?P<limit>\d+))?\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_REFERENCE = re.compile(r"\b(?:FROM|JOIN)\s+Telemetria\b(?!\s*\.)", re.IGNORECASE)
+_ALIAS = re.compile(r"\s+(?:(AS)\s+)?([A-Za-z_]\w*)", re.IGNORECASE)
+_ITEM = re.compile(r"^(?P<expr>.+?)(?:\s+(?P<as>AS\s+)?(?P<alias>\"[^\"]+\"|\[[^\]]+\]|`[^`]+`|\w+))?$",
+                   re.IGNORECASE | re.DOTALL)
+_AGGREGATE = re.compile(
+    r"^(?:(ROUND)\s*\(\s*)?(SUM|TOTAL|COUNT|AVG)\s*\(\s*(.+?)\s*\)(?(1)\s*(?:,\s*(\d+)\s*)?\))$",
+    re.IGNORECASE | re.DOTALL,
+)
+_ANY_AGGREGATE = re.compile(r"\b(SUM|TOTAL|COUNT|AVG|MIN|MAX|GROUP_CONCAT)\s*\(", re.IGNORECASE)
+_ORDER_TERM = re.compile(r"^(?P<expr>.+?)(?:\s+(?P<direction>ASC|DESC))?$", re.IGNORECASE | re.DOTALL)
+
+# Construções que a estimativa por estrato não reproduz
+_UNSUPPORTED = re.compile(r"\b(DISTINCT|HAVING|UNION|EXCEPT|INTERSECT|OVER|WITH)\b", re.IGNORECASE)
+
+# Palavras que podem seguir "FROM Telemetria" sem serem um alias
+_KEYWORDS = {
+    "WHERE", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "NATURAL", "OUTER", "ON", "USING",
+    "GROUP", "ORDER", "LIMIT",
+}
+
+class ApproximateQueryError(ValueError):
+    """Consulta que não pode ser estimada pela amostra (é executada de forma exata)"""
+
+def _split(text: str) -> List[str]:
+    """Separa por vírgulas fora de parênteses e de strings"""
+    parts, depth, quote_char, current = [], 0, None, []
+    for char in text:
+        if quote_char:
+            quote_char = None if char == quote_char else quote_char
+        elif char in "'\"":
+            quote_char = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current).strip())
+    return [part for part in parts if part]
+
+def _balanced(text: str) -> bool:
+    depth = 0
+    for char in text:
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if depth < 0:
+            return False
+    return depth == 0
+
+def parse_aggregate_query(sql: str) -> Dict[str, Any]:
+    """Decompõe uma consulta de agregação sobre a Telemetria (SUM, TOTAL, COUNT e AVG por grupo)
+
+    Aceita um único SELECT com a Telemetria no FROM (junções com outras tabelas, como
+    Chassis, são mantidas), filtros no WHERE, GROUP BY, ORDER BY por coluna do
+    resultado e LIMIT. Qualquer outra forma levanta ApproximateQueryError.
+    """
+    match = _QUERY.match(sql)
+    if (
+        not match
+        or len(re.findall(r"\bSELECT\b", sql, re.IGNORECASE)) != 1
+        or _UNSUPPORTED.search(sql)
+        or len(_REFERENCE.findall(match.group("source"))) != 1
+    ):
+        raise ApproximateQueryError("Consulta fora do formato de agregação suportado")
+
+    source = match.group("source")
+    reference = _REFERENCE.search(source)
+    alias_match = _ALIAS.match(source, reference.end())
+    has_alias = bool(alias_match) and (
+        alias_match.group(1) is not None or alias_match.group(2).upper() not in _KEYWORDS
+    )
+    alias = alias_match.group(2) if has_alias else "Telemetria"
+    start = reference.end() - len("Telemetria")
+    source = source[:start] + SAMPLE_TABLE + ("" if has_alias else " AS Telemetria") + source[reference.end():]
+
+    items = []
+    for text in _split(match.group("select")):
+        item = _ITEM.match(text)
+        expr, name = item.group("expr").strip(), item.group("alias")
+        # Sem AS, só é alias o que segue uma expressão fechada (evita ler "a + b" como "a +" AS b)
+        if name and not item.group("as") and not re.search(r"[)\"\]`]$|^[\w.]+$", expr):
+            expr, name = text, None
+        # Sem alias, o SQLite nomeia uma coluna qualificada (c.Cliente) só pelo nome da coluna
+        name = name.strip("\"[]`") if name else re.sub(r"^\w+\.(\w+)$", r"\1", expr)
+
+        aggregate = _AGGREGATE.match(expr)
+        if aggregate and _balanced(aggregate.group(3)) and not _ANY_AGGREGATE.search(aggregate.group(3)):
+            function, argument = aggregate.group(2).upper(), aggregate.group(3)
+            digits = aggregate.group(4)
+            items.append({
+                "name": name, "expr": expr, "function": function,
+                "argument": None if argument == "*" else argument,
+                "round": (int(digits) if digits else 0) if aggregate.group(1) else None,
+            })
+        elif _ANY_AGGREGATE.search(expr):
+            raise ApproximateQueryError(f"Agregação não suportada: {expr}")
+        else:
+            items.append({"name": name, "expr": expr, "function": None})
+
+    if not any(item["function"] for item in items):
+        raise ApproximateQueryError("Consulta sem agregação")
+
+    # GROUP BY por posição ou por alias vira a expressão correspondente
+    groups = []
+    for group in _split(match.group("group") or ""):
+        if group.isdigit() and 0 < int(group) <= len(items):
+            group = items[int(group) - 1]["expr"]
+        else:
+            group = next((i["expr"] for i in items if not i["function"] and i["name"] == group), group)
+        if _ANY_AGGREGATE.search(group):
+            raise ApproximateQueryError("GROUP BY por agregação")
+        groups.append(group)
+
+    # ORDER BY apenas por colunas do resultado (aplicado às estimativas)
+    order = []
+    for term in _split(match.group("order") or ""):
+        parsed = _ORDER_TERM.match(term)
+        expr, descending = parsed.group("expr").strip(), (parsed.group("direction") or "").upper() == "DESC"
+        if expr.isdigit() and 0 < int(expr) <= len(items):
+            position = int(expr) - 1
+        else:
+            names = [i["name"].lower() for i in items]
+            exprs = [i["expr"].lower() for i in items]
+            if expr.lower() in names:
+                position = names.index(expr.lower())
+            elif expr.lower() in exprs:
+                position = exprs.index(expr.lower())
+            else:
+                raise ApproximateQueryError(f"ORDER BY não suportado: {expr}")
+        order.append((position, descending))
+
+    return {
+        "items": items,
+        "source": source,
+        "alias": alias,
+        "where": match.group("where"),
+        "groups": groups,
+        "order": order,
+        "limit": int(match.group("limit")) if match.group("limit") else None,
+    }
+
+def _moments(item: Dict[str, Any]) -> List[str]:
+    """Somas por estrato de que o estimador precisa: Σz, Σz² e número de valores não nulos"""
+    argument = item["argument"]
+    if item["function"] == "COUNT":
+        count = f"COUNT({argument or '*'})"
+        return [count, count, count]
+    return [f"TOTAL({argument})", f"TOTAL(({argument}) * ({argument}))", f"COUNT({argument})"]
+
+def _total(strata: List[Tuple[float, float, float, float]]) -> Tuple[float, float]:
+    """Estimativa do total e sua variância a partir de (N_h, n_h, Σz, Σz²) de cada estrato"""
+    estimate = variance = 0.0
+    for population, sample, first, second in strata:
+        estimate += population / sample * first
+        if 1 < sample < population:
+            spread = max(0.0, second - first * first / sample) / (sample - 1)
+            variance += population * population * (1 - sample / population) * spread / sample
+    return estimate, variance
+
+def _sort_key(value: Any) -> tuple:
+    # Ordem do SQLite: NULL, números e depois texto
+    if value is None:
+        return (0,)
+    return (1, 0, value) if isinstance(value, (int, float)) else (2, str(value))
+
+class StratifiedSample:
+    """Amostra estratificada da Telemetria para respostas aproximadas com margem de erro
+
+    Cada estrato (Chassi, Categoria, Serie) contribui com uma fração `rate` de suas
+    linhas, com pelo menos `min_rows` (ou o estrato inteiro, se menor), sorteadas
+    uniformemente. A amostra é calculada uma vez e persistida em tabelas laterais do
+    banco; como o catálogo de estatísticas, só é recalculada se a impressão digital
+    da Telemetria mudar. Consultas de agregação são reescritas para a amostra e os
+    totais, contagens e médias estimados com o estimador estratificado (médias como
+    razão de totais), com intervalo de confiança pela aproximação normal.
+    """
+
+    def __init__(self, database_path: str, rate: float, min_rows: int):
+        self.database_path = str(database_path)
+        self.rate = rate
+        self.min_rows = min_rows
+        self.metadata: Dict[str, Any] = {}
+        # (Chassi, Categoria, Serie) -> (linhas na Telemetria, linhas na amostra)
+        self.strata: Dict[tuple, Tuple[int, int]] = {}
+
+    def load_or_build(self) -> None:
+        """Carrega a amostra persistida ou a recalcula se a Telemetria (ou a fração) mudou"""
+        conn = sqlite3.connect(f"file:{quote(self.database_path)}?mode=ro", uri=True)
+        try:
+            fingerprint = self._fingerprint(conn)
+            if self._load(conn) and self.metadata.get("fingerprint") == fingerprint:
+                return
+        finally:
+            conn.close()
+
+        start_time = time.time()
+        self._build(fingerprint)
+        duration = time.time() - start_time
+        metrics.set_gauge("rag_approximate_sample_build_seconds", duration)
+        print(f"🎲 Amostra estratificada calculada em {duration:.2f}s "
+              f"({self.metadata['linhas_amostra']} de {self.metadata['linhas_telemetria']} linhas)")
+
+    def _fingerprint(self, conn: sqlite3.Connection) -> str:
+        return f"{telemetry_fingerprint(conn)}:{self.rate}:{self.min_rows}"
+
+    def _load(self, conn: sqlite3.Connection) -> bool:
+        try:
+            metadata = dict(conn.execute(f"SELECT Chave, Valor FROM {SAMPLE_META_TABLE}").fetchall())
+            rows = conn.execute(f"SELECT Chassi, Categoria, Serie, Linhas, Amostra FROM {SAMPLE_STRATA_TABLE}").fetchall()
+        except sqlite3.OperationalError:
+            return False
+
+        self.metadata = {key: json.loads(value) for key, value in metadata.items()}
+        self.strata = {row[:3]: (row[3], row[4]) for row in rows}
+        return True
+
+    def _build(self, fingerprint: str) -> None:
+        conn = sqlite3.connect(self.database_path, timeout=30)
+        try:
+            columns = [c[0] for c in conn.execute("SELECT * FROM Telemetria LIMIT 0").description]
+            key = ", ".join(STRATUM_COLUMNS)
+            counts = conn.execute(
+                f"SELECT {key}, COUNT(*) FROM Telemetria "
+                "WHERE Chassi IS NOT NULL AND Categoria IS NOT NULL AND Serie IS NOT NULL "
+                f"GROUP BY {key}"
+            ).fetchall()
+            strata = [
+                (*row[:3], row[3], min(row[3], max(self.min_rows, math.ceil(row[3] * self.rate))))
+                for row in counts
+            ]
+
+            with conn:
+                for table in SAMPLE_TABLES:
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(f"CREATE TABLE {SAMPLE_META_TABLE} (Chave TEXT PRIMARY KEY, Valor TEXT)")
+                conn.execute(
+                    f"CREATE TABLE {SAMPLE_STRATA_TABLE} (Chassi INTEGER, Categoria TEXT, Serie TEXT, "
+                    "Linhas INTEGER, Amostra INTEGER, PRIMARY KEY (Chassi, Categoria, Serie))"
+                )
+                conn.executemany(f"INSERT INTO {SAMPLE_STRATA_TABLE} VALUES (?, ?, ?, ?, ?)", strata)
+                # A amostra tem as mesmas colunas da Telemetria, então as consultas rodam sem mudanças
+                conn.execute(f"CREATE TABLE {SAMPLE_TABLE} AS SELECT * FROM Telemetria LIMIT 0")
+                selected = ", ".join(f"s.{column}" for column in columns)
+                conn.execute(
+                    f"INSERT INTO {SAMPLE_TABLE} ({', '.join(columns)}) SELECT {selected} FROM ("
+                    f"SELECT t.*, ROW_NUMBER() OVER (PARTITION BY {key} ORDER BY random()) AS Sorteio "
+                    f"FROM Telemetria t) s JOIN {SAMPLE_STRATA_TABLE} e USING ({key}) WHERE s.Sorteio <= e.Amostra"
+                )
+                conn.execute(f"CREATE INDEX idx_{SAMPLE_TABLE.lower()}_estrato ON {SAMPLE_TABLE} ({key})")
+
+                self.metadata = {
+                    "fingerprint": fingerprint,
+                    "built_at": time.time(),
+                    "fracao": self.rate,
+                    "linhas_telemetria": sum(row[3] for row in strata),
+                    "linhas_amostra": sum(row[4] for row in strata),
+                    "estratos": len(strata),
+                }
+                conn.executemany(
+                    f"INSERT INTO {SAMPLE_META_TABLE} VALUES (?, ?)",
+                    [(key, json.dumps(value)) for key, value in self.metadata.items()],
+                )
+        finally:
+            conn.close()
+        self.strata = {row[:3]: (row[3], row[4]) for row in strata}
+
+    def estimate(self, conn: sqlite3.Connection, sql: str, confidence: float) -> Dict[str, Any]:
+        """Executa a consulta de agregação na amostra e devolve estimativas com intervalo de confiança
+
+        Retorna colunas e linhas no formato do resultado exato (cada agregação seguida da
+        margem de erro) e, por linha, o intervalo [mínimo, máximo] de cada agregação.
+        """
+        if not self.strata:
+            raise ApproximateQueryError("Amostra estratificada indisponível")
+        query = parse_aggregate_query(sql)
+        items, alias = query["items"], query["alias"]
+        aggregates = [item for item in items if item["function"]]
+        plain = [item for item in items if not item["function"]]
+        stratum = [f"{alias}.{column}" for column in STRATUM_COLUMNS]
+
+        select = [item["expr"] for item in plain] + query["groups"] + stratum
+        select += [moment for item in aggregates for moment in _moments(item)]
+        stratum_sql = (
+            f"SELECT {', '.join(select)} {query['source']}"
+            + (f" WHERE {query['where']}" if query["where"] else "")
+            + f" GROUP BY {', '.join(query['groups'] + stratum)}"
+        )
+        rows = conn.execute(stratum_sql).fetchall()
+
+        # Estratos de cada grupo do resultado, com as somas de cada agregação
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        offset = len(plain) + len(query["groups"])
+        for row in rows:
+            key = row[len(plain):offset]
+            sizes = self.strata.get(tuple(row[offset:offset + 3]))
+            if sizes is None:
+                continue
+            group = groups.setdefault(key, {"plain": row[:len(plain)], "strata": []})
+            group["strata"].append((sizes, row[offset + 3:]))
+
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        result_rows, intervals = [], []
+        for group in groups.values():
+            values, bounds = {}, {}
+            for index, item in enumerate(aggregates):
+                moments = [(sizes[0], sizes[1], *sums[3 * index:3 * index + 3]) for sizes, sums in group["strata"]]
+                estimate, margin = self._estimate(item["function"], moments, z)
+                if estimate is not None and item["round"] is not None:
+                    estimate, margin = round(estimate, item["round"]), round(margin, item["round"])
+                values[item["name"]] = (estimate, margin)
+                bounds[item["name"]] = None if estimate is None else [estimate - margin, estimate + margin]
+
+            plain_values = iter(group["plain"])
+            row = [values[item["name"]][0] if item["function"] else next(plain_values) for item in items]
+            result_rows.append((row, values, bounds))
+
+        # ORDER BY e LIMIT sobre as estimativas (ordenações estáveis, da última chave para a primeira)
+        for position, descending in reversed(query["order"]):
+            result_rows.sort(key=lambda entry: _sort_key(entry[0][position]), reverse=descending)
+        if query["limit"] is not None:
+            result_rows = result_rows[:query["limit"]]
+
+        level = f"{confidence:.0%}"
+        columns = []
+        for item in items:
+            columns.append(item["name"])
+            if item["function"]:
+                columns.append(f"{item['name']} ± (IC {level})")
+        output = []
+        for row, values, bounds in result_rows:
+            line = []
+            for item, value in zip(items, row):
+                line.append(value)
+                if item["function"]:
+                    line.append(values[item["name"]][1])
+            output.append(tuple(line))
+            intervals.append(bounds)
+
+        return {
+            "columns": columns,
+            "rows": output,
+            "intervals": intervals,
+            "confidence": confidence,
+            "sample_rate": self.metadata.get("fracao"),
+            "sample_rows": self.metadata.get("linhas_amostra"),
+            "table_rows": self.metadata.get("linhas_telemetria"),
+        }
+
+    @staticmethod
+    def _estimate(function: str, strata: List[tuple], z: float) -> Tuple[Optional[float], float]:
+        """Estimativa e margem de erro de uma agregação a partir de (N_h, n_h, Σz, Σz², contagem)"""
+        counts = sum(stratum[4] for stratum in strata)
+        if function == "COUNT":
+            estimate, variance = _total([stratum[:4] for stratum in strata])
+            return int(round(estimate)), z * math.sqrt(variance)
+        if not counts:
+            # SUM e AVG de nenhum valor são NULL (TOTAL é 0.0)
+            return (0.0, 0.0) if function == "TOTAL" else (None, 0.0)
+
+        total, total_variance = _total([stratum[:4] for stratum in strata])
+        if function in ("SUM", "TOTAL"):
+            return total, z * math.sqrt(total_variance)
+
+        # Média como razão de totais; variância pela linearização (resíduos z - R·1)
+        population, _ = _total([(n, m, c, c) for n, m, _, _, c in strata])
+        ratio = total / population
+        residuals = [
+            (n, m, first - ratio * c, second - 2 * ratio * first + ratio * ratio * c)
+            for n, m, first, second, c in strata
+        ]
+        _, variance = _total(residuals)
+        return ratio, z * math.sqrt(variance) / population
@@ -0,0 +1,203 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from api.services.metrics import metrics
+
+# Valor do gauge rag_llm_breaker_state para cada estado
+STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+class CircuitOpenError(RuntimeError):
+    """Chamada ao LLM recusada sem tentativa: o circuito está aberto"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Circuito em volta das chamadas ao LLM, aberto por taxa de erro ou de lentidão
+
+    Cada chamada registra seu resultado em uma janela deslizante de `window` segundos.
+    Com pelo menos `min_calls` chamadas na janela, o circuito abre quando a fração de
+    erros passa de `error_rate` ou a de chamadas lentas (acima de `slow_call_seconds`)
+    passa de `slow_call_rate`. Chamadas em andamento há mais de `slow_call_seconds`
+    já contam como lentas, para que um provedor travado abra o circuito antes dos
+    timeouts. Aberto, ele recusa as chamadas (CircuitOpenError) por `open_seconds`;
+    depois deixa passar uma chamada de teste por vez (meio aberto): se ela for rápida e
+    bem-sucedida o circuito fecha, senão abre de novo. Uma chamada de teste em andamento há
+    mais de `slow_call_seconds` conta como falha, para que um teste travado não deixe o
+    circuito recusando tudo indefinidamente.
+    """
+
+    def __init__(self, name: str = "llm", window: float = 60.0, min_calls: int = 10,
+                 error_rate: float = 0.5, slow_call_seconds: float = 30.0,
+                 slow_call_rate: float = 0.8, open_seconds: float = 30.0, enabled: bool = True):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.enabled = enabled
+        self.state = "closed"
+        self.reason: Optional[str] = None
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+        # (instante do fim, falhou, lenta) das chamadas concluídas na janela
+        self._outcomes: Deque[Tuple[float, bool, bool]] = deque()
+        self._in_flight: Dict[int, float] = {}
+        self._tokens = itertools.count()
+        # Token da chamada de teste do estado meio aberto (só ela decide a transição)
+        self._probe_token: Optional[int] = None
+        self._publish()
+
+    def _publish(self) -> None:
+        metrics.set_gauge("rag_llm_breaker_state", STATE_VALUES[self.state], breaker=self.name)
+
+    def _transition(self, state: str, reason: Optional[str] = None) -> None:
+        """Muda de estado (com o lock adquirido)"""
+        if state == self.state:
+            return
+        self.state = state
+        self.reason = reason
+        if state == "open":
+            self.opened_at = time.monotonic()
+        elif state == "closed":
+            self._outcomes.clear()
+        self._probe_token = None
+        metrics.inc("rag_llm_breaker_transitions_total", breaker=self.name, state=state)
+        self._publish()
+        icon = {"open": "🔴", "half_open": "🟡", "closed": "🟢"}[state]
+        print(f"{icon} Circuito do {self.name}: {state}" + (f" ({reason})" if reason else ""))
+
+    def retry_after(self) -> int:
+        """Segundos até o circuito aberto aceitar uma chamada de teste"""
+        if self.opened_at is None:
+            return 1
+        return max(1, int(round(self.open_seconds - (time.monotonic() - self.opened_at))))
+
+    def is_open(self) -> bool:
+        """Se uma chamada agora seria recusada (aberto, ou meio aberto com um teste em andamento)"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            self._refresh()
+            return self.state == "open" or (self.state == "half_open" and self._probe_token is not None)
+
+    def before_call(self) -> int:
+        """Autoriza uma chamada e devolve o token para `after_call`, ou levanta CircuitOpenError"""
+        token = next(self._tokens)
+        if not self.enabled:
+            return token
+        with self._lock:
+            self._refresh()
+            if self.state == "open" or (self.state == "half_open" and self._probe_token is not None):
+                metrics.inc("rag_llm_breaker_rejected_total", breaker=self.name)
+                raise CircuitOpenError(
+                    f"Circuito do {self.name} aberto ({self.reason}): chamada recusada", self.retry_after()
+                )
+            if self.state == "half_open":
+                self._probe_token = token
+            self._in_flight[token] = time.monotonic()
+        return token
+
+    def after_call(self, token: int, error: Optional[BaseException] = None) -> None:
+        """Registra o resultado de uma chamada autorizada"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            started = self._in_flight.pop(token, None)
+            if started is None:
+                return  # Chamada de teste travada, já contada como falha
+            failed = error is not None
+            slow = now - started >= self.slow_call_seconds
+            if self.state == "half_open":
+                # Chamadas iniciadas antes da abertura terminando agora não são o teste
+                if token != self._probe_token:
+                    return
+                if failed or slow:
+                    self._transition("open", "chamada de teste " + ("falhou" if failed else "lenta"))
+                else:
+                    self._transition("closed")
+                return
+            self._outcomes.append((now, failed, slow))
+            self._evaluate(now)
+
+    def _refresh(self) -> None:
+        """Avança o estado pelo tempo: aberto vira meio aberto; chamadas travadas podem abrir"""
+        now = time.monotonic()
+        if self.state == "open" and now - self.opened_at >= self.open_seconds:
+            self._transition("half_open")
+        elif self.state == "half_open" and self._probe_token is not None:
+            started = self._in_flight.get(self._probe_token)
+            if started is not None and now - started >= self.slow_call_seconds:
+                # Já contada como falha: se um dia terminar, seu resultado é ignorado
+                del self._in_flight[self._probe_token]
+                self._transition("open", "chamada de teste travada")
+        elif self.state == "closed":
+            self._evaluate(now)
+
+    def _evaluate(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+        stuck = sum(1 for started in self._in_flight.values() if now - started >= self.slow_call_seconds)
+        calls = len(self._outcomes) + stuck
+        if calls < self.min_calls:
+            return
+        errors = sum(1 for _, failed, _ in self._outcomes if failed)
+        slow = sum(1 for _, failed, is_slow in self._outcomes if is_slow and not failed) + stuck
+        if errors / calls >= self.error_rate:
+            self._transition("open", f"{errors}/{calls} chamadas com erro")
+        elif slow / calls >= self.slow_call_rate:
+            self._transition("open", f"{slow}/{calls} chamadas acima de {self.slow_call_seconds:g}s")
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            if self.enabled:
+                self._refresh()
+            return {
+                "state": self.state if self.enabled else "disabled",
+                "reason": self.reason,
+                "retry_after": self.retry_after() if self.state == "open" else None,
+                "calls_in_window": len(self._outcomes),
+                "errors_in_window": sum(1 for _, failed, _ in self._outcomes if failed),
+                "in_flight": len(self._in_flight),
+            }
+
+class AnswerCache:
+    """Últimas respostas bem-sucedidas por pergunta normalizada (LRU), servidas no modo degradado"""
+
+    def __init__(self, max_answers: int):
+        self.max_answers = max_answers
+        self._lock = threading.Lock()
+        self._answers: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def put(self, question: str, answer: Dict[str, Any]) -> None:
+        if self.max_answers <= 0:
+            return
+        with self._lock:
+            self._answers[question] = answer
+            self._answers.move_to_end(question)
+            while len(self._answers) > self.max_answers:
+                self._answers.popitem(last=False)
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            return list(self._answers.items())
+
+# Instância global: o provedor é o mesmo para todos os bancos e modelos
+llm_breaker = CircuitBreaker(
+    name="llm",
+    window=settings.llm_breaker_window_seconds,
+    min_calls=settings.llm_breaker_min_calls,
+    error_rate=settings.llm_breaker_error_rate,
+    slow_call_seconds=settings.llm_breaker_slow_call_seconds,
+    slow_call_rate=settings.llm_breaker_slow_call_rate,
+    open_seconds=settings.llm_breaker_open_seconds,
+    enabled=settings.llm_breaker_enabled,
+)
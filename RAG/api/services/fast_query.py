@@ -0,0 +1,53 @@
+from typing import Dict, List
+
+from config.settings import settings
+from api.services.observation_manager import markdown_rows, observation_store
+from api.services.plan_executor import READ_ONLY_SQL, PlanError, extract_json
+
+class FastQueryError(ValueError):
+    """Resposta do modo rápido inutilizável (JSON malformado, SQL não permitido, pedido de agente)"""
+
+def build_fast_prompt(question: str, schema: str, shots: str = "") -> str:
+    """Prompt do modo rápido: uma única chamada devolve a consulta SQL que responde ao pedido"""
+    shots = f"\n{shots.strip()}\n" if shots and shots.strip() else ""
+    return f"""Você é um especialista em SQLite que atende analistas de uma locadora de maquinário agrícola.
+
+{schema}{shots}
+Escreva UMA consulta SQLite (somente SELECT) que responda exatamente ao pedido, com apenas as colunas
+necessárias e nomes descritivos. Responda APENAS com JSON:
+{{"sql": "SELECT ...", "justificativa": "<relação entre pedido e consulta, com as suposições feitas>"}}
+
+Pedidos que exigem várias consultas dependentes entre si ou análise de manutenção preventiva: {{"agente": "<motivo>"}}
+Pedidos sem relação com o banco ou que modifiquem dados: {{"erro": "<motivo>"}}
+
+Pedido: {question}
+"""
+
+def parse_fast_response(text: str) -> Dict[str, str]:
+    """Valida a resposta do LLM; retorna {"error"}, {"agent"} ou {"sql", "justification"}"""
+    try:
+        data = extract_json(text)
+    except PlanError as e:
+        raise FastQueryError(str(e))
+
+    if data.get("erro"):
+        return {"error": str(data["erro"])}
+    if data.get("agente"):
+        return {"agent": str(data["agente"])}
+
+    sql = str(data.get("sql", "")).strip().rstrip(";")
+    if not READ_ONLY_SQL.match(sql):
+        raise FastQueryError("A resposta não contém uma consulta SELECT")
+    return {"sql": sql, "justification": str(data.get("justificativa", "")).strip()}
+
+def format_answer(sql: str, columns: List[str], rows: List[tuple], justification: str) -> str:
+    """Resposta final montada localmente, no mesmo formato das respostas do agente"""
+    max_rows = settings.fast_max_answer_rows
+    lines = markdown_rows(columns, rows[:max_rows])
+    if len(rows) > max_rows:
+        # Resultado completo fica no servidor, como as observações grandes do agente
+        result_id = observation_store.put(sql, columns, rows)
+        where = f"resultado completo em GET /results/{result_id}" if result_id else "resultado completo grande demais para ser guardado"
+        lines.append(f"\n{len(rows)} linhas; as primeiras {max_rows} acima ({where})")
+    table = "\n".join(lines)
+    return f"### Consulta:\n```sql\n{sql}\n```\n\n### Resposta:\n{table}\n\n### Justificativa:\n{justification}"
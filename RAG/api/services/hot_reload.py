@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from api.services.metrics import metrics
+
+def snapshot_signature(paths: List[str]) -> Tuple:
+    """Identidade dos arquivos (inode, tamanho e mtime); muda quando um arquivo é trocado ou alterado"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            signature.append((path, None))
+    return tuple(signature)
+
+class HotReloader:
+    """Recarrega sem downtime o banco e as consultas validadas quando os arquivos mudam
+
+    Uma thread compara periodicamente a assinatura dos arquivos de cada serviço
+    carregado com a do momento em que ele foi inicializado. A mudança só é aplicada
+    depois de estável por uma verificação (arquivo ainda sendo copiado não é lido):
+    uma nova instância do serviço é construída e aquecida em background e então
+    trocada no pool; consultas em andamento terminam na instância anterior.
+    """
+
+    def __init__(self, pool: Any, poll_interval: float):
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Última assinatura vista por banco (estabilidade) e a que falhou ao recarregar
+        self._pending: Dict[str, Tuple] = {}
+        self._failed: Dict[str, Tuple] = {}
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="hot-reload", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"⚠️ Aviso: Erro ao verificar recarga: {e}")
+
+    def check(self) -> List[str]:
+        """Verifica os serviços carregados e recarrega os que mudaram; retorna os bancos recarregados"""
+        reloaded = []
+        for name, service in self.pool.loaded():
+            # Serviços ainda não inicializados vão ler os arquivos atuais de qualquer forma; os que
+            # estão atualizando os dados após a ingestão renovam a própria assinatura ao terminar
+            if not service.is_ready or service.snapshot is None or getattr(service, "refreshing", False):
+                self._pending.pop(name, None)
+                continue
+
+            current = snapshot_signature(service.snapshot_paths())
+            if current == service.snapshot or current == self._failed.get(name):
+                self._pending.pop(name, None)
+                continue
+            if self._pending.get(name) != current:
+                self._pending[name] = current
+                continue
+
+            self._pending.pop(name, None)
+            if self.reload(name, service):
+                reloaded.append(name)
+            else:
+                self._failed[name] = current
+        return reloaded
+
+    def reload(self, name: str, service: Any) -> bool:
+        """Constrói e aquece a nova instância do banco e a troca no pool"""
+        print(f"🔄 Recarregando o banco '{name}'...")
+        start_time = time.time()
+        try:
+            replacement = self.pool.factory(service.database_path, name)
+            replacement.ensure_initialized()
+        except Exception as e:
+            metrics.inc("rag_reload_failures_total", database=name)
+            print(f"❌ Erro ao recarregar o banco '{name}' (instância atual mantida): {e}")
+            return False
+
+        self.pool.swap(name, replacement)
+        self._failed.pop(name, None)
+        duration = time.time() - start_time
+        metrics.observe("rag_reload_duration_seconds", duration, database=name)
+        metrics.inc("rag_reload_swaps_total", database=name)
+        print(f"✅ Banco '{name}' recarregado em {duration:.2f}s")
+        return True
@@ -0,0 +1,264 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from config.settings import settings
+from api.services.metrics import metrics
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+class JobQueue:
+    """Fila persistente de jobs em um arquivo SQLite local
+
+    Os jobs sobrevivem a reinicializações e podem ser consumidos por vários
+    processos: cada worker reivindica um job com um lease (BEGIN IMMEDIATE garante
+    que dois workers não peguem o mesmo job) e o renova enquanto executa. Jobs cujo
+    lease expirou (worker morto) voltam a ser elegíveis, até `max_attempts`.
+    """
+
+    def __init__(self, database_path: str, lease_seconds: float, max_attempts: int, busy_timeout: float = 30.0):
+        self.database_path = str(database_path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.busy_timeout = busy_timeout
+
+        Path(self.database_path).parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    lease_expires_at REAL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Conexão em autocommit; quem abre fecha (`closing`): `with conn` só faria commit"""
+        conn = sqlite3.connect(self.database_path, timeout=self.busy_timeout, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, payload: Dict[str, Any]) -> str:
+        """Enfileira um job e retorna seu ID"""
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, payload, created_at) VALUES (?, 'queued', ?, ?)",
+                (job_id, json.dumps(payload), time.time()),
+            )
+        metrics.inc("rag_jobs_enqueued_total")
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Reivindica o job mais antigo disponível (na fila ou com lease expirado)"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+
+            # Jobs abandonados por workers mortos que já esgotaram as tentativas
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+                "WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?",
+                ("Job abandonado: número máximo de tentativas atingido", now, now, self.max_attempts),
+            )
+
+            row = conn.execute(
+                "SELECT id FROM jobs "
+                "WHERE status = 'queued' OR (status = 'running' AND lease_expires_at < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "lease_expires_at = ?, started_at = ? WHERE id = ?",
+                (worker_id, now + self.lease_seconds, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            # Se o próprio BEGIN IMMEDIATE falhou (banco ocupado), não há transação a desfazer
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        return self.get(row["id"])
+
+    def extend_lease(self, job_id: str, worker_id: str) -> None:
+        """Renova o lease de um job em execução"""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, job_id, worker_id),
+            )
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> None:
+        """Marca o job como concluído com sucesso"""
+        self._finish(job_id, worker_id, "succeeded", result=json.dumps(result, default=str))
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        """Marca o job como falho"""
+        self._finish(job_id, worker_id, "failed", error=error)
+
+    def _finish(self, job_id: str, worker_id: str, status: str, result: str = None, error: str = None) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires_at = NULL "
+                "WHERE id = ? AND worker = ?",
+                (status, result, error, time.time(), job_id, worker_id),
+            )
+        metrics.inc("rag_jobs_finished_total", status=status)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Retorna o job (status, payload, resultado e erro)"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def counts(self) -> Dict[str, int]:
+        """Número de jobs por status"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+class JobWorkerPool:
+    """Threads que consomem a fila de jobs executando uma função (ex: RAGService.query)"""
+
+    def __init__(self, queue: JobQueue, handler: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 workers: int, poll_interval: float):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self) -> None:
+        """Inicia as threads de worker"""
+        self._stop.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, args=(f"{self._worker_prefix}:{index}",),
+                name=f"job-worker-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Sinaliza a parada e aguarda as threads terminarem o job atual"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def run_forever(self) -> None:
+        """Executa os workers no processo atual até ser interrompido"""
+        self.start()
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def _run(self, worker_id: str) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(worker_id)
+            except Exception as e:
+                print(f"⚠️ Aviso: Erro ao reivindicar job: {e}")
+                job = None
+
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+
+            self._execute(job, worker_id)
+
+    def _execute(self, job: Dict[str, Any], worker_id: str) -> None:
+        print(f"🧵 Worker {worker_id} executando job {job['id']}")
+        start_time = time.time()
+
+        # Renovar o lease enquanto o job executa, para que outro worker não o pegue
+        done = threading.Event()
+
+        def _heartbeat():
+            while not done.wait(self.queue.lease_seconds / 3):
+                self.queue.extend_lease(job["id"], worker_id)
+
+        heartbeat = threading.Thread(target=_heartbeat, daemon=True)
+        heartbeat.start()
+        try:
+            result = self.handler(job["payload"])
+            self.queue.complete(job["id"], worker_id, result)
+        except Exception as e:
+            print(f"❌ Erro no job {job['id']}: {e}")
+            self.queue.fail(job["id"], worker_id, str(e))
+        finally:
+            done.set()
+            metrics.observe("rag_job_duration_seconds", time.time() - start_time)
+
+def run_query_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Handler padrão dos jobs: executa a consulta no serviço RAG
+
+    Jobs não têm sessão: as sessões ficam na memória do processo da API e o job pode
+    ser executado por outro processo (worker.py).
+    """
+    from api.services.service_pool import service_pool
+
+    return service_pool.query(
+        payload.get("database"),
+        payload["query"],
+        payload.get("similarity_threshold"),
+        None,
+        payload.get("mode"),
+        payload.get("approximate", False),
+    )
+
+# Instância global da fila de jobs, criada no primeiro uso: importar o módulo não cria o arquivo
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """Fila global de jobs (arquivo em JOBS_DATABASE_PATH)"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(
+                settings.jobs_database_path,
+                lease_seconds=settings.job_lease_seconds,
+                max_attempts=settings.job_max_attempts,
+            )
+        return _job_queue
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+
+
+class SQLiteCompletionCache(BaseCache):
+    """Cache persistente de completions individuais do LLM em um arquivo SQLite local
+
+    Cada chamada ao LLM dentro do loop ReAct (incluindo retentativas e recuperações
+    de erro de parsing) é indexada pelo hash do `llm_string` do LangChain, que já
+    contém o modelo, a temperatura e os stop tokens, concatenado ao prompt completo.
+    Quando o arquivo ultrapassa `max_bytes`, as entradas menos usadas recentemente
+    são removidas (LRU por tamanho).
+    """
+
+    def __init__(self, database_path: str, max_bytes: int):
+        self.database_path = str(database_path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        Path(self.database_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.database_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_completions (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_completions_last_access ON llm_completions (last_access)"
+        )
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_completions"
+        ).fetchone()[0]
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        """Gera a chave da entrada a partir do modelo/parâmetros e do prompt completo"""
+        digest = hashlib.sha256()
+        digest.update(llm_string.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """Busca uma completion já obtida para o mesmo modelo e prompt"""
+        key = self.make_key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM llm_completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE llm_completions SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+
+        try:
+            return [loads(generation) for generation in json.loads(row[0])]
+        except Exception as e:
+            print(f"⚠️ Aviso: Entrada inválida no cache de completions, ignorando: {e}")
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """Armazena a completion e aplica a evicção LRU se o limite de tamanho for excedido"""
+        key = self.make_key(prompt, llm_string)
+        value = json.dumps([dumps(generation) for generation in return_val])
+        size = len(value.encode("utf-8"))
+        now = time.time()
+
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size FROM llm_completions WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_completions (key, value, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Remove as entradas menos usadas recentemente até voltar a 90% do limite"""
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT key, size FROM llm_completions ORDER BY last_access ASC"
+        )
+        to_delete = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            to_delete.append((key,))
+            self._total_bytes -= size
+
+        self._conn.executemany("DELETE FROM llm_completions WHERE key = ?", to_delete)
+        self.evictions += len(to_delete)
+
+    def clear(self, **kwargs: Any) -> None:
+        """Remove todas as completions armazenadas"""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_completions")
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna estatísticas de uso do cache"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_completions").fetchone()[0]
+        return {
+            "entries": entries,
+            "size_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,214 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from api.services.metrics import metrics
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Identifica erros de cota/limite de taxa do provedor (HTTP 429 / ResourceExhausted)"""
+    text = f"{type(error).__name__} {error}".lower()
+    return "429" in text or "resourceexhausted" in text or "resource exhausted" in text or "rate limit" in text or "quota" in text
+
+class PoolMember:
+    """Cliente de LLM associado a uma chave/endpoint, com limite de concorrência adaptativo (AIMD)"""
+
+    def __init__(self, name: str, client: Any, max_concurrency: int):
+        self.name = name
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+
+    @property
+    def available(self) -> float:
+        return self.limit - self.in_flight
+
+    def on_success(self) -> None:
+        """Aumento aditivo: +1 vaga a cada `limit` sucessos"""
+        self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+
+    def on_rate_limited(self) -> None:
+        """Redução multiplicativa ao receber 429"""
+        self.limit = max(1.0, self.limit / 2.0)
+
+class LLMPool:
+    """Pool de clientes de LLM com balanceamento, requisições hedged e concorrência adaptativa
+
+    - Cada chamada vai para o membro com mais vagas livres
+    - Se a chamada demorar mais que o p95 das latências observadas (com piso em
+      `hedge_min_delay`), uma duplicata é disparada em outro membro e vence a
+      primeira resposta bem-sucedida
+    - O limite de concorrência de cada membro cai pela metade a cada 429 e volta a
+      crescer aditivamente com sucessos; chamadas recusadas por cota são repetidas
+      em outro membro
+
+    É agnóstico ao provedor: `call` recebe uma função que faz a chamada usando o
+    cliente do membro escolhido, o que permite testar o pool com clientes falsos.
+    Com um `breaker`, cada chamada passa pelo circuito antes de ocupar uma vaga.
+    """
+
+    def __init__(self, members: Sequence[Tuple[str, Any]], max_concurrency_per_member: int = 4,
+                 hedge_enabled: bool = True, hedge_min_delay: float = 2.0,
+                 hedge_quantile: float = 0.95, min_latency_samples: int = 20,
+                 acquire_timeout: float = 120.0, breaker: Any = None):
+        if not members:
+            raise ValueError("O pool de LLM precisa de pelo menos um membro")
+
+        self.members = [PoolMember(name, client, max_concurrency_per_member) for name, client in members]
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_quantile = hedge_quantile
+        self.min_latency_samples = min_latency_samples
+        self.acquire_timeout = acquire_timeout
+        self.breaker = breaker
+
+        self._condition = threading.Condition()
+        self._latencies: Deque[float] = deque(maxlen=256)
+        # Chamadas perdedoras de um hedge continuam rodando até o fim, por isso há folga de threads
+        self._executor = ThreadPoolExecutor(
+            max_workers=2 * max_concurrency_per_member * len(self.members),
+            thread_name_prefix="llm-pool"
+        )
+        for member in self.members:
+            self._publish_limit(member)
+
+    def _publish_limit(self, member: PoolMember) -> None:
+        metrics.set_gauge("rag_llm_concurrency_limit", member.limit, member=member.name)
+
+    def hedge_delay(self) -> float:
+        """Tempo de espera antes de disparar a duplicata de uma chamada lenta"""
+        with self._condition:
+            if len(self._latencies) < self.min_latency_samples:
+                return self.hedge_min_delay
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(round(self.hedge_quantile * (len(ordered) - 1))))
+        return max(self.hedge_min_delay, ordered[index])
+
+    def _acquire(self, exclude: Optional[PoolMember] = None, block: bool = True) -> Optional[PoolMember]:
+        """Reserva uma vaga no membro com mais capacidade livre"""
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._condition:
+            while True:
+                candidates = [m for m in self.members if m is not exclude and m.available >= 1]
+                if candidates:
+                    member = max(candidates, key=lambda m: (m.available, -m.in_flight))
+                    member.in_flight += 1
+                    return member
+                if not block:
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError("Nenhuma chave de LLM disponível no pool (limite de concorrência atingido)")
+                self._condition.wait(timeout=remaining)
+
+    def _release(self, member: PoolMember, latency: Optional[float], error: Optional[BaseException]) -> None:
+        with self._condition:
+            member.in_flight -= 1
+            if error is None:
+                member.on_success()
+                if latency is not None:
+                    self._latencies.append(latency)
+            elif is_rate_limit_error(error):
+                member.on_rate_limited()
+            self._publish_limit(member)
+            self._condition.notify_all()
+
+        if error is None:
+            metrics.observe("rag_llm_latency_seconds", latency, member=member.name)
+        elif is_rate_limit_error(error):
+            metrics.inc("rag_llm_rate_limited_total", member=member.name)
+        else:
+            metrics.inc("rag_llm_errors_total", member=member.name)
+
+    def _submit(self, member: PoolMember, fn: Callable[[Any], Any]) -> Future:
+        """Executa a chamada em uma thread do pool, liberando a vaga ao terminar"""
+        def _run():
+            start_time = time.monotonic()
+            try:
+                result = fn(member.client)
+            except BaseException as e:
+                self._release(member, None, e)
+                raise
+            self._release(member, time.monotonic() - start_time, None)
+            return result
+
+        metrics.inc("rag_llm_calls_total", member=member.name)
+        try:
+            return self._executor.submit(_run)
+        except RuntimeError as e:
+            # Pool encerrado (close): a vaga reservada não seria liberada por _run
+            self._release(member, None, e)
+            raise
+
+    def call(self, fn: Callable[[Any], Any]) -> Any:
+        """Executa `fn(cliente)` em um membro do pool, com hedge e repetição em caso de 429"""
+        if self.breaker is None:
+            return self._call(fn)
+
+        # O circuito vê o resultado final da chamada (após hedge e repetições)
+        token = self.breaker.before_call()
+        try:
+            result = self._call(fn)
+        except BaseException as e:
+            self.breaker.after_call(token, e)
+            raise
+        self.breaker.after_call(token)
+        return result
+
+    def _call(self, fn: Callable[[Any], Any]) -> Any:
+        last_error: Optional[BaseException] = None
+        tried: List[PoolMember] = []
+
+        for _ in range(len(self.members)):
+            exclude = tried[-1] if tried else None
+            member = self._acquire(exclude=exclude if len(self.members) > 1 else None)
+            tried.append(member)
+            try:
+                return self._call_with_hedge(member, fn)
+            except BaseException as e:
+                last_error = e
+                if not is_rate_limit_error(e):
+                    raise
+
+        raise last_error
+
+    def _call_with_hedge(self, primary: PoolMember, fn: Callable[[Any], Any]) -> Any:
+        futures: Dict[Future, PoolMember] = {self._submit(primary, fn): primary}
+        if not self.hedge_enabled:
+            return next(iter(futures)).result()
+
+        done, _ = wait(futures, timeout=self.hedge_delay())
+        if not done:
+            # Chamada lenta: disparar duplicata, de preferência em outro membro
+            hedge_member = self._acquire(exclude=primary, block=False) or self._acquire(block=False)
+            if hedge_member is not None:
+                metrics.inc("rag_llm_hedges_total")
+                futures[self._submit(hedge_member, fn)] = hedge_member
+
+        pending = set(futures)
+        first_error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    if futures[future] is not primary:
+                        metrics.inc("rag_llm_hedge_wins_total")
+                    return future.result()
+                first_error = first_error or error
+
+        raise first_error
+
+    def close(self) -> None:
+        """Encerra as threads do pool sem esperar as chamadas em andamento (ex: perdedoras de um hedge)"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_status(self) -> List[Dict[str, Any]]:
+        """Retorna o estado de cada membro do pool"""
+        with self._condition:
+            return [
+                {"name": m.name, "limit": round(m.limit, 2), "in_flight": m.in_flight, "max_concurrency": m.max_concurrency}
+                for m in self.members
+            ]
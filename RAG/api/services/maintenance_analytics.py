@@ -0,0 +1,219 @@
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+from api.services.metrics import metrics
+
+# Séries da categoria 'Uso do Motor' (horas por dia em cada status)
+ENGINE_SERIES = ["Chave-Ligada", "Marcha Lenta", "Carga Baixa", "Carga Média", "Carga Alta"]
+ACTIVE_SERIES = ["Marcha Lenta", "Carga Baixa", "Carga Média", "Carga Alta"]
+
+# Peso de cada status do motor no índice de carga (0 = ocioso, 1 = carga máxima)
+LOAD_WEIGHTS = {"Marcha Lenta": 0.0, "Carga Baixa": 0.33, "Carga Média": 0.66, "Carga Alta": 1.0}
+
+DEFAULT_TOP = 10
+DEFAULT_WINDOW_DAYS = 7
+ANOMALY_Z = 3.0
+
+class MaintenanceAnalytics:
+    """Análise preditiva de manutenção sobre as séries diárias de uso do motor
+
+    As horas diárias de cada status do motor são carregadas uma única vez em uma
+    matriz NumPy (status x chassi x dia) e recarregadas apenas quando o banco muda
+    (o arquivo principal ou o -wal, onde ficam as gravações até o checkpoint). Cada chamada calcula, em uma passada vetorizada, o perfil de carga
+    em janela móvel, as horas acumuladas em carga alta, a proporção de marcha lenta
+    e os dias anômalos (z-score das horas ativas) e devolve o ranking de chassis.
+    """
+
+    def __init__(self, database_path: str):
+        self.database_path = str(database_path)
+        self._lock = threading.Lock()
+        self._version: Optional[Tuple[Any, ...]] = None
+        self.chassis = np.empty(0, dtype=np.int64)
+        self.days = np.empty(0, dtype="datetime64[D]")
+        self.hours = np.zeros((len(ENGINE_SERIES), 0, 0))
+        self.observed = np.zeros((0, 0), dtype=bool)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Memória ocupada pelas matrizes carregadas"""
+        return self.chassis.nbytes + self.days.nbytes + self.hours.nbytes + self.observed.nbytes
+
+    def _file_version(self) -> Tuple[Any, ...]:
+        """Versão do banco: stat do arquivo principal e do -wal
+
+        Em modo WAL as gravações (ex: ingestão) ficam no -wal até o checkpoint, sem mudar
+        o arquivo principal.
+        """
+        version = []
+        for path in (Path(self.database_path), Path(f"{self.database_path}-wal")):
+            try:
+                stat = path.stat()
+                version.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
+
+    def _load(self) -> None:
+        """Carrega (ou recarrega, se o banco mudou) as séries diárias de uso do motor"""
+        version = self._file_version()
+        with self._lock:
+            if self._version == version:
+                return
+
+            start_time = time.time()
+            conn = sqlite3.connect(f"file:{quote(self.database_path)}?mode=ro", uri=True)
+            try:
+                rows = conn.execute(
+                    "SELECT Chassi, date(Data), Serie, SUM(Valor) FROM Telemetria "
+                    "WHERE Categoria = 'Uso do Motor' GROUP BY 1, 2, 3"
+                ).fetchall()
+            finally:
+                conn.close()
+
+            series_index = {serie: i for i, serie in enumerate(ENGINE_SERIES)}
+            rows = [row for row in rows if row[2] in series_index and row[1] is not None]
+
+            chassi_col = np.array([row[0] for row in rows], dtype=np.int64)
+            day_col = np.array([row[1] for row in rows], dtype="datetime64[D]")
+            serie_col = np.array([series_index[row[2]] for row in rows], dtype=np.int64)
+            value_col = np.array([row[3] or 0.0 for row in rows], dtype=np.float64)
+
+            chassis, chassi_idx = np.unique(chassi_col, return_inverse=True)
+            if len(rows):
+                days = np.arange(day_col.min(), day_col.max() + np.timedelta64(1, "D"))
+            else:
+                days = np.empty(0, dtype="datetime64[D]")
+            day_idx = (day_col - days[0]).astype(np.int64) if len(rows) else day_col.astype(np.int64)
+
+            hours = np.zeros((len(ENGINE_SERIES), len(chassis), len(days)))
+            np.add.at(hours, (serie_col, chassi_idx, day_idx), value_col)
+            observed = np.zeros((len(chassis), len(days)), dtype=bool)
+            observed[chassi_idx, day_idx] = True
+
+            self.chassis, self.days, self.hours, self.observed = chassis, days, hours, observed
+            self._version = version
+            print(f"📈 Séries de uso carregadas: {len(chassis)} chassis x {len(days)} dias "
+                  f"em {time.time() - start_time:.2f}s")
+
+    def analyze(self, top: int = DEFAULT_TOP, window_days: int = DEFAULT_WINDOW_DAYS,
+                start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+        """Calcula os indicadores de desgaste por chassi e o ranking de prioridade de manutenção"""
+        self._load()
+
+        day_mask = np.ones(len(self.days), dtype=bool)
+        if start:
+            day_mask &= self.days >= np.datetime64(start, "D")
+        if end:
+            day_mask &= self.days <= np.datetime64(end, "D")
+
+        hours = self.hours[:, :, day_mask]
+        observed = self.observed[:, day_mask]
+        if hours.shape[1] == 0 or hours.shape[2] == 0:
+            return {"ranking": [], "chassis": 0, "days": 0}
+
+        serie = {name: hours[i] for i, name in enumerate(ENGINE_SERIES)}
+        active = sum(serie[name] for name in ACTIVE_SERIES)
+        load = sum(serie[name] * weight for name, weight in LOAD_WEIGHTS.items())
+
+        # Perfil de carga: média móvel do índice de carga diário (somas cumulativas)
+        window = max(1, min(window_days, active.shape[1]))
+        cum_load = np.cumsum(np.pad(load, ((0, 0), (1, 0))), axis=1)
+        cum_active = np.cumsum(np.pad(active, ((0, 0), (1, 0))), axis=1)
+        rolling_load = cum_load[:, window:] - cum_load[:, :-window]
+        rolling_active = cum_active[:, window:] - cum_active[:, :-window]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rolling_profile = np.where(rolling_active > 0, rolling_load / rolling_active, 0.0)
+        recent_load = rolling_profile[:, -1]
+        peak_load = rolling_profile.max(axis=1)
+
+        high_load_hours = serie["Carga Alta"].sum(axis=1)
+        active_hours = active.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            idle_ratio = np.where(active_hours > 0, serie["Marcha Lenta"].sum(axis=1) / active_hours, 0.0)
+
+        # Dias anômalos: horas ativas com z-score acima do limite (por chassi, só dias observados)
+        observed_days = observed.sum(axis=1)
+        mean = np.where(observed, active, 0.0).sum(axis=1) / np.maximum(observed_days, 1)
+        variance = np.where(observed, (active - mean[:, None]) ** 2, 0.0).sum(axis=1) / np.maximum(observed_days, 1)
+        std = np.sqrt(variance)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z_scores = np.where(std[:, None] > 0, (active - mean[:, None]) / std[:, None], 0.0)
+        anomalies = (observed & (np.abs(z_scores) > ANOMALY_Z)).sum(axis=1)
+
+        # Prioridade: desgaste acumulado e carga recente relativos à frota, mais anomalias
+        def _fleet_z(values: np.ndarray) -> np.ndarray:
+            spread = values.std()
+            return (values - values.mean()) / spread if spread > 0 else np.zeros_like(values)
+
+        score = _fleet_z(high_load_hours) + _fleet_z(recent_load) + 0.5 * _fleet_z(anomalies.astype(float))
+        order = np.argsort(-score)[:max(1, top)]
+
+        metrics.inc("rag_maintenance_analyses_total")
+        return {
+            "chassis": int(len(self.chassis)),
+            "days": int(hours.shape[2]),
+            "window_days": window,
+            "ranking": [
+                {
+                    "Chassi": int(self.chassis[i]),
+                    "Pontuacao": round(float(score[i]), 3),
+                    "HorasCargaAlta": round(float(high_load_hours[i]), 2),
+                    "HorasAtivas": round(float(active_hours[i]), 2),
+                    "ProporcaoMarchaLenta": round(float(idle_ratio[i]), 3),
+                    "CargaRecente": round(float(recent_load[i]), 3),
+                    "CargaPico": round(float(peak_load[i]), 3),
+                    "DiasAnomalos": int(anomalies[i]),
+                }
+                for i in order
+            ],
+        }
+
+    def run(self, tool_input: str) -> str:
+        """Ponto de entrada da ferramenta do agente: parâmetros 'chave=valor' e ranking em Markdown"""
+        params = dict(re.findall(r"(\w+)\s*=\s*([\w\-]+)", tool_input or ""))
+        try:
+            result = self.analyze(
+                top=int(params.get("top", DEFAULT_TOP)),
+                window_days=int(params.get("janela", DEFAULT_WINDOW_DAYS)),
+                start=params.get("inicio"),
+                end=params.get("fim"),
+            )
+        except Exception as e:
+            return f"Erro na análise de manutenção: {e}"
+
+        if not result["ranking"]:
+            return "Nenhum dado de 'Uso do Motor' encontrado para o período."
+
+        columns = list(result["ranking"][0].keys())
+        lines = [
+            f"Ranking de prioridade de manutenção ({result['chassis']} chassis, {result['days']} dias, "
+            f"janela móvel de {result['window_days']} dias):",
+            "",
+            "| " + " | ".join(columns) + " |",
+            "|" + "---|" * len(columns),
+        ]
+        lines += ["| " + " | ".join(str(row[c]) for c in columns) + " |" for row in result["ranking"]]
+        lines += [
+            "",
+            "Pontuacao = z(HorasCargaAlta) + z(CargaRecente) + 0.5*z(DiasAnomalos), relativos à frota. "
+            "CargaRecente/CargaPico: índice de carga (0 = marcha lenta, 1 = carga alta) na janela móvel. "
+            f"DiasAnomalos: dias com horas ativas a mais de {ANOMALY_Z:g} desvios da média do chassi.",
+        ]
+        return "\n".join(lines)
+
+    def tool_description(self) -> str:
+        return f"""
+Use esta ferramenta para perguntas sobre manutenção preventiva, desgaste ou padrões anômalos de uso dos chassis.
+Ela calcula em uma única chamada, a partir da categoria 'Uso do Motor': horas acumuladas em carga alta, perfil de carga
+em janela móvel, proporção de marcha lenta e dias anômalos (z-score), e devolve os chassis ranqueados por prioridade.
+A entrada são parâmetros opcionais 'chave=valor' separados por vírgula: top (padrão {DEFAULT_TOP}), janela (dias,
+padrão {DEFAULT_WINDOW_DAYS}), inicio e fim (datas AAAA-MM-DD). Ex: top=5, janela=14, inicio=2024-01-01
+A saída é uma tabela Markdown com o ranking.
+"""
@@ -0,0 +1,131 @@
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+class _Summary:
+    """Resumo de uma série de observações (contagem, soma, extremos e percentis)"""
+
+    def __init__(self, reservoir_size: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.recent: Deque[float] = deque(maxlen=reservoir_size)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.recent.append(value)
+
+    def percentile(self, q: float) -> float:
+        """Percentil aproximado sobre as observações mais recentes"""
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+class MetricsRegistry:
+    """Registro de métricas em memória do processo (contadores, gauges e resumos)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._summaries: Dict[str, Dict[LabelKey, _Summary]] = {}
+
+    @staticmethod
+    def _label_key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        """Incrementa um contador"""
+        key = self._label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        """Define o valor atual de um gauge"""
+        key = self._label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def add_gauge(self, name: str, delta: float, **labels: Any) -> None:
+        """Soma um delta ao valor atual de um gauge"""
+        key = self._label_key(labels)
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + delta
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Registra uma observação (ex: latência) em um resumo"""
+        key = self._label_key(labels)
+        with self._lock:
+            self._summaries.setdefault(name, {}).setdefault(key, _Summary()).observe(value)
+
+    def get_counter(self, name: str, **labels: Any) -> float:
+        """Retorna o valor atual de um contador"""
+        with self._lock:
+            return self._counters.get(name, {}).get(self._label_key(labels), 0.0)
+
+    def get_percentile(self, name: str, q: float, **labels: Any) -> float:
+        """Retorna um percentil de um resumo (0.0 se não houver observações)"""
+        with self._lock:
+            summary = self._summaries.get(name, {}).get(self._label_key(labels))
+            return summary.percentile(q) if summary else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Retorna todas as métricas em formato serializável"""
+        def _series(values: Dict[LabelKey, Any], convert) -> list:
+            return [{"labels": dict(key), "value": convert(value)} for key, value in values.items()]
+
+        with self._lock:
+            return {
+                "counters": {name: _series(values, float) for name, values in self._counters.items()},
+                "gauges": {name: _series(values, float) for name, values in self._gauges.items()},
+                "summaries": {name: _series(values, lambda s: s.to_dict()) for name, values in self._summaries.items()},
+            }
+
+    def render_prometheus(self) -> str:
+        """Renderiza as métricas no formato texto do Prometheus"""
+        def _labels(key: LabelKey, extra: Dict[str, str] = None) -> str:
+            pairs = list(key) + sorted((extra or {}).items())
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for name, values in self._counters.items():
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{_labels(key)} {value}" for key, value in values.items())
+            for name, values in self._gauges.items():
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(f"{name}{_labels(key)} {value}" for key, value in values.items())
+            for name, values in self._summaries.items():
+                lines.append(f"# TYPE {name} summary")
+                for key, summary in values.items():
+                    for q in (0.5, 0.95, 0.99):
+                        lines.append(f"{name}{_labels(key, {'quantile': str(q)})} {summary.percentile(q)}")
+                    lines.append(f"{name}_sum{_labels(key)} {summary.total}")
+                    lines.append(f"{name}_count{_labels(key)} {summary.count}")
+        return "\n".join(lines) + "\n"
+
+# Instância global das métricas
+metrics = MetricsRegistry()
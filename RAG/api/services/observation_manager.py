@@ -0,0 +1,190 @@
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from numbers import Number
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config.settings import settings
+from api.services.metrics import metrics
+from api.services.prompt_builder import estimate_tokens
+
+class ObservationStore:
+    """Resultados completos das consultas do agente, mantidos no servidor
+
+    O LLM recebe apenas um resumo limitado dos resultados grandes; a versão completa
+    fica aqui (LRU limitado por número de resultados e pela memória estimada das
+    linhas) e pode ser obtida por GET /results/{id}. Um resultado maior que o limite
+    de memória inteiro não é guardado.
+    """
+
+    def __init__(self, max_results: int, max_memory_bytes: int):
+        self.max_results = max_results
+        self.max_memory_bytes = max_memory_bytes
+        self._lock = threading.Lock()
+        self._results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._total_bytes = 0
+
+    def put(self, sql: str, columns: List[str], rows: List[tuple]) -> Optional[str]:
+        """Guarda o resultado e devolve seu id, ou None se ele sozinho passar do limite de memória"""
+        size_bytes = estimate_rows_bytes(rows)
+        if size_bytes > self.max_memory_bytes:
+            metrics.inc("rag_observations_not_stored_total")
+            return None
+
+        result_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._results[result_id] = {
+                "result_id": result_id, "sql": sql, "columns": columns, "rows": rows, "size_bytes": size_bytes,
+            }
+            self._total_bytes += size_bytes
+            while len(self._results) > self.max_results or self._total_bytes > self.max_memory_bytes:
+                _, evicted = self._results.popitem(last=False)
+                self._total_bytes -= evicted["size_bytes"]
+            metrics.set_gauge("rag_observation_store_bytes", self._total_bytes)
+        return result_id
+
+    def get(self, result_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._results.get(result_id)
+            if result is not None:
+                self._results.move_to_end(result_id)
+            return result
+
+def estimate_rows_bytes(rows: Sequence[tuple]) -> int:
+    """Memória aproximada das linhas (lista, tuplas e valores), em bytes"""
+    total = sys.getsizeof(rows)
+    for row in rows:
+        total += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return total
+
+def _cell(value: Any, max_length: int = 100) -> str:
+    text = str(value)
+    return text if len(text) <= max_length else text[:max_length] + "..."
+
+def markdown_rows(columns: List[str], rows: Sequence[tuple]) -> List[str]:
+    lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+    lines += ["| " + " | ".join(_cell(v) for v in row) + " |" for row in rows]
+    return lines
+
+def column_stats(columns: List[str], rows: Sequence[tuple]) -> List[str]:
+    """Estatísticas por coluna: mín/máx/média das numéricas, distintos das demais"""
+    stats = []
+    for index, column in enumerate(columns):
+        values = [row[index] for row in rows if row[index] is not None]
+        numeric = [v for v in values if isinstance(v, Number) and not isinstance(v, bool)]
+        if values and len(numeric) == len(values):
+            stats.append(f"- {column}: mín {min(numeric):g}, máx {max(numeric):g}, média {sum(numeric) / len(numeric):g}")
+        else:
+            distinct = len(set(map(str, values)))
+            stats.append(f"- {column}: {distinct} valores distintos, {len(rows) - len(values)} nulos")
+    return stats
+
+def summarize_result(result_id: Optional[str], columns: List[str], rows: Sequence[tuple],
+                     head_rows: int, tail_rows: int) -> str:
+    """Resumo limitado de um resultado grande: contagem, primeiras/últimas linhas e estatísticas
+
+    Sem `result_id`, o resultado completo não foi guardado (grande demais para o servidor).
+    """
+    omitted = len(rows) - head_rows - tail_rows
+    stored = (
+        f"resultado completo guardado no servidor com id {result_id}" if result_id
+        else "resultado completo grande demais para ser guardado no servidor"
+    )
+    lines = [
+        f"Resultado com {len(rows)} linhas e {len(columns)} colunas ({stored}). "
+        f"Primeiras {head_rows} e últimas {tail_rows} linhas:",
+        "",
+    ]
+    lines += markdown_rows(columns, list(rows[:head_rows]))
+    lines.append(f"| ... {omitted} linhas omitidas ... |")
+    lines += ["| " + " | ".join(_cell(v) for v in row) + " |" for row in rows[-tail_rows:]] if tail_rows else []
+    lines += ["", "Estatísticas das colunas:"] + column_stats(columns, rows)
+    lines += ["", "Para uma resposta menor, refine a consulta (agregação, filtros ou LIMIT)."]
+    if result_id:
+        lines[-1] += (
+            f" Se a resposta final for este resultado completo, informe na Resposta o id {result_id} e o resumo acima."
+        )
+    return "\n".join(lines)
+
+def render_observation(sql: str, columns: List[str], rows: List[tuple]) -> str:
+    """Observação entregue ao LLM: o resultado inteiro se for pequeno, senão um resumo limitado"""
+    if not rows:
+        return ""
+
+    # Resultados pequenos seguem inalterados, no formato do SQLDatabase.run
+    if len(rows) <= settings.observation_max_rows:
+        return str([tuple(_cell(v, 300) if isinstance(v, str) else v for v in row) for row in rows])
+
+    result_id = observation_store.put(sql, columns, rows)
+    metrics.inc("rag_observations_summarized_total")
+    return summarize_result(
+        result_id, columns, rows,
+        head_rows=settings.observation_head_rows,
+        tail_rows=settings.observation_tail_rows,
+    )
+
+def compact_scratchpad(steps: List[Tuple[Any, str]], token_budget: int, keep_last_steps: int,
+                       observation_prefix: str, llm_prefix: str) -> str:
+    """Monta o scratchpad do ReAct, resumindo os passos mais antigos se o orçamento de tokens for excedido"""
+    def _full(action, observation) -> str:
+        return f"{action.log}\n{observation_prefix}{observation}\n{llm_prefix}"
+
+    full = "".join(_full(action, observation) for action, observation in steps)
+    if estimate_tokens(full) <= token_budget or len(steps) <= keep_last_steps:
+        return full
+
+    split = len(steps) - keep_last_steps
+    older, recent = steps[:split], steps[split:]
+    lines = ["[Passos anteriores resumidos para economizar contexto]"]
+    for number, (action, observation) in enumerate(older, start=1):
+        first_line = str(observation).strip().split("\n", 1)[0]
+        lines.append(
+            f"Passo {number}: Action: {action.tool} | Action Input: {_cell(action.tool_input, 300)} "
+            f"| Observation: {_cell(first_line, 200)}"
+        )
+    metrics.inc("rag_scratchpad_compactions_total")
+    return "\n".join(lines) + "\n" + "".join(_full(action, observation) for action, observation in recent)
+
+def build_query_tool(db: Any, rewrite: Optional[Callable[[str], str]] = None):
+    """Ferramenta sql_db_query que devolve ao LLM um resumo limitado dos resultados grandes
+
+    `rewrite`, se informado, transforma a consulta antes da execução (poda de partições);
+    o resultado continua guardado com a consulta escrita pelo agente.
+    """
+    from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
+
+    class BoundedQuerySQLDataBaseTool(QuerySQLDataBaseTool):
+        def _run(self, query: str, run_manager: Any = None) -> str:
+            try:
+                result = self.db._execute(rewrite(query) if rewrite else query)
+            except Exception as e:
+                return f"Error: {e}"
+
+            if not result:
+                return ""
+            return render_observation(query, list(result[0].keys()), [tuple(row.values()) for row in result])
+
+    return BoundedQuerySQLDataBaseTool(db=db)
+
+def build_compacting_agent_class():
+    """ZeroShotAgent cujo scratchpad é compactado quando passa do orçamento de tokens"""
+    from langchain.agents import ZeroShotAgent
+
+    class CompactingZeroShotAgent(ZeroShotAgent):
+        def _construct_scratchpad(self, intermediate_steps):
+            return compact_scratchpad(
+                intermediate_steps,
+                token_budget=settings.scratchpad_token_budget,
+                keep_last_steps=settings.scratchpad_keep_last_steps,
+                observation_prefix=self.observation_prefix,
+                llm_prefix=self.llm_prefix,
+            )
+
+    return CompactingZeroShotAgent
+
+# Instância global dos resultados completos
+observation_store = ObservationStore(
+    max_results=settings.observation_store_max_results,
+    max_memory_bytes=int(settings.observation_store_max_memory_mb * 1024 * 1024),
+)
@@ -0,0 +1,191 @@
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+from api.services.metrics import metrics
+from api.utils.storage_layout import FACT_TABLE, Partition, detect_layout, list_partitions, telemetria_union_sql
+
+# Valor comparado com Data: literal de texto ou date()/datetime() com argumentos literais
+_VALUE = r"'[^']*'|(?:date|datetime)\s*\(\s*'[^']*'(?:\s*,\s*'[^']*')*\s*\)"
+_PREDICATE = re.compile(
+    rf"(?<![\w.])(?:(\w+)\s*\.\s*)?Data\s*(>=|<=|=|>|<|BETWEEN)\s*({_VALUE})(?:\s+AND\s+({_VALUE}))?",
+    re.IGNORECASE,
+)
+_REFERENCE = re.compile(r"\b(FROM|JOIN)\s+Telemetria\b(?!\s*\.)", re.IGNORECASE)
+_ALIAS = re.compile(r"\s+(?:(AS)\s+)?([A-Za-z_]\w*)", re.IGNORECASE)
+
+# Palavras que podem seguir "FROM Telemetria" sem serem um alias
+_KEYWORDS = {
+    "WHERE", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "NATURAL", "OUTER", "ON", "USING",
+    "GROUP", "ORDER", "LIMIT", "HAVING", "WINDOW", "UNION", "EXCEPT", "INTERSECT",
+}
+
+# Construções em que um predicado sobre Data não filtra necessariamente a Telemetria
+_UNSAFE = re.compile(r"\b(OR|NOT|CASE|HAVING|UNION|EXCEPT|INTERSECT)\b", re.IGNORECASE)
+
+# Limites da Data em epoch na tabela de fatos não particionada (0001-01-01 a 9999-12-31 23:59:59)
+MIN_EPOCH, MAX_EPOCH = -62135596800, 253402300799
+
+# Valores comparados com Data convertíveis em epoch sem mudar a ordem do texto
+_FULL_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+_DAY_PREFIX = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+def _text(epoch: int) -> str:
+    """Epoch no formato de Data da view ('AAAA-MM-DD HH:MM:SS')"""
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def _epoch_range(conditions: List[Tuple[str, str]]) -> Optional[Tuple[int, int]]:
+    """Intervalo [início, fim] em epoch que contém todas as linhas que satisfazem as condições
+
+    As condições comparam a Data em texto; um valor no formato da view ('AAAA-MM-DD HH:MM:SS')
+    vira o epoch exato, os demais (ex: '2024-03-01', '2024-03-01T12:00') valem pelo dia
+    inteiro, o que nunca exclui uma linha que a condição aceitaria. Sem nenhum valor
+    reconhecido, devolve None.
+    """
+    start, end, found = MIN_EPOCH, MAX_EPOCH, False
+    for op, value in conditions:
+        try:
+            if _FULL_TIMESTAMP.fullmatch(value):
+                exact = datetime.strptime(value, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+                first = last = int(exact.timestamp())
+            elif _DAY_PREFIX.match(value):
+                day = datetime.strptime(value[:10], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+                first = int(day.timestamp())
+                last = int((day + timedelta(days=1)).timestamp()) - 1
+            else:
+                continue
+        except (TypeError, ValueError, OverflowError):
+            continue
+        found = True
+        if op in (">=", ">"):
+            start = max(start, first)
+        else:
+            end = min(end, last)
+    return (start, end) if found else None
+
+class PartitionPruner:
+    """Reescreve consultas à Telemetria normalizada ou particionada para usar os filtros de Data
+
+    A view Telemetria converte Data para texto (e, no layout particionado, une todas as
+    partições mensais), então um filtro por período compara uma expressão calculada,
+    não usa os índices da tabela de fatos e, particionada, varre o histórico inteiro.
+    Quando a consulta tem um único SELECT sobre a Telemetria e os filtros de Data são
+    condições ligadas por AND (sem OR, NOT ou CASE), a referência à view é trocada pela
+    união apenas das partições que podem conter linhas no período, cada uma filtrada
+    pelo intervalo equivalente em epoch na coluna física `f.Data`. Nos demais casos a
+    consulta segue inalterada: a reescrita nunca muda o resultado, apenas evita leituras.
+    """
+
+    def __init__(self, partitions: List[Partition], partitioned: bool = True):
+        # Cada partição com o menor e o maior valor possível de Data em texto
+        self.partitioned = partitioned
+        self.partitions = [(partition, _text(partition[1]), _text(partition[2] - 1)) for partition in partitions]
+        self._evaluator = sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_database(cls, database_path: str) -> Optional["PartitionPruner"]:
+        """Pruner do banco, ou None se a Telemetria estiver no layout original (Data já é uma coluna)"""
+        conn = sqlite3.connect(f"file:{quote(database_path)}?mode=ro", uri=True)
+        try:
+            layout = detect_layout(conn)
+            if layout == "partitioned":
+                return cls(list_partitions(conn))
+            if layout == "normalized":
+                # Uma única "partição": a tabela de fatos inteira
+                return cls([(FACT_TABLE, MIN_EPOCH, MAX_EPOCH + 1)], partitioned=False)
+            return None
+        finally:
+            conn.close()
+
+    def refresh(self, database_path: str) -> None:
+        """Relê as partições registradas (ex: partições criadas pela ingestão de leituras)"""
+        if not self.partitioned:
+            return
+        conn = sqlite3.connect(f"file:{quote(database_path)}?mode=ro", uri=True)
+        try:
+            partitions = list_partitions(conn)
+        finally:
+            conn.close()
+        self.partitions = [(partition, _text(partition[1]), _text(partition[2] - 1)) for partition in partitions]
+    
+    def _value(self, expression: str) -> Optional[str]:
+        if expression.startswith("'"):
+            return expression[1:-1]
+        # date('now', '-3 months') e similares são avaliados pelo próprio SQLite
+        try:
+            with self._lock:
+                return self._evaluator.execute(f"SELECT {expression}").fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+    def bounds(self, sql: str, alias: str) -> List[Tuple[str, str]]:
+        """Condições (operador, valor) sobre Data da Telemetria encontradas na consulta"""
+        conditions = []
+        for match in _PREDICATE.finditer(sql):
+            qualifier, operator, first, second = match.groups()
+            if qualifier and qualifier.lower() not in (alias.lower(), "telemetria"):
+                continue
+            operator = operator.upper()
+            if operator == "BETWEEN":
+                if second is None:
+                    continue
+                values = [(">=", self._value(first)), ("<=", self._value(second))]
+            elif operator == "=":
+                value = self._value(first)
+                values = [(">=", value), ("<=", value)]
+            else:
+                values = [(operator, self._value(first))]
+            conditions.extend((op, value) for op, value in values if value is not None)
+        return conditions
+
+    def select(self, conditions: List[Tuple[str, str]]) -> List[Partition]:
+        """Partições que podem conter linhas que satisfazem todas as condições"""
+        selected = []
+        for partition, first, last in self.partitions:
+            if all(
+                (op == ">=" and last >= value) or (op == ">" and last > value)
+                or (op == "<=" and first <= value) or (op == "<" and first < value)
+                for op, value in conditions
+            ):
+                selected.append(partition)
+        return selected
+
+    def rewrite(self, sql: str) -> str:
+        """Consulta com a Telemetria restrita às partições e ao intervalo de Data filtrados (ou inalterada)"""
+        references = list(_REFERENCE.finditer(sql))
+        if (
+            len(references) != 1
+            or len(re.findall(r"\bTelemetria\b(?!\s*\.)", sql, re.IGNORECASE)) != 1
+            or len(re.findall(r"\bSELECT\b", sql, re.IGNORECASE)) != 1
+            or _UNSAFE.search(sql)
+        ):
+            return sql
+
+        reference = references[0]
+        alias_match = _ALIAS.match(sql, reference.end())
+        has_alias = bool(alias_match) and (
+            alias_match.group(1) is not None or alias_match.group(2).upper() not in _KEYWORDS
+        )
+        alias = alias_match.group(2) if has_alias else "Telemetria"
+
+        conditions = self.bounds(sql, alias)
+        if not conditions:
+            metrics.inc("rag_partition_pruning_total", status="unfiltered")
+            return sql
+
+        selected = self.select(conditions)
+        data_range = _epoch_range(conditions)
+        if self.partitioned:
+            metrics.observe("rag_partitions_scanned", len(selected))
+            metrics.inc("rag_partition_pruning_total", status="pruned" if len(selected) < len(self.partitions) else "all")
+        if len(selected) == len(self.partitions) and data_range is None:
+            return sql
+
+        metrics.inc("rag_data_filter_pushdown_total", layout="partitioned" if self.partitioned else "normalized")
+        subquery = f"({telemetria_union_sql(selected, data_range)})" + ("" if has_alias else " AS Telemetria")
+        start = reference.end() - len("Telemetria")
+        return sql[:start] + subquery + sql[reference.end():]
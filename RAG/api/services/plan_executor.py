@@ -0,0 +1,196 @@
+import contextvars
+import json
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+from api.services.metrics import metrics
+from api.services.observation_manager import render_observation
+
+# Referência ao resultado de outro passo dentro do SQL, ex: WHERE Valor > {{p1}}
+STEP_REFERENCE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+# Filtro rápido de consultas de leitura, para recusar o plano cedo; quem impede escritas
+# (ex: WITH ... DELETE) é o autorizador das conexões do pool (read_pool.read_only_authorizer)
+READ_ONLY_SQL = re.compile(r"^(WITH|SELECT)\b", re.IGNORECASE)
+
+class PlanError(ValueError):
+    """Plano inválido (JSON malformado, dependências inexistentes ou cíclicas, SQL não permitido)"""
+
+class PlanStep:
+    """Passo do plano: uma consulta SELECT e os passos de que depende"""
+
+    def __init__(self, step_id: str, goal: str, sql: str, depends_on: List[str]):
+        self.step_id = step_id
+        self.goal = goal
+        self.sql = sql
+        self.depends_on = depends_on
+        self.resolved_sql: Optional[str] = None
+        self.columns: List[str] = []
+        self.rows: List[tuple] = []
+        self.error: Optional[str] = None
+        self.duration = 0.0
+
+def build_plan_prompt(question: str, schema: str, max_steps: int) -> str:
+    """Prompt da etapa de planejamento: o LLM devolve os passos SQL e suas dependências em JSON"""
+    return f"""Você é um especialista em SQLite que atende analistas de uma locadora de maquinário agrícola.
+
+{schema}
+Planeje a resposta ao pedido abaixo como uma lista de consultas SQLite (somente SELECT). Passos sem dependência
+entre si são executados em paralelo, então separe cálculos auxiliares independentes em passos próprios. Um passo
+pode usar o resultado de outro escrevendo {{{{id}}}} no SQL: um resultado de uma única célula vira o valor literal
+(ex: WHERE Valor > {{{{p1}}}}) e um resultado de uma coluna vira uma lista para IN (ex: Chassi IN ({{{{p2}}}})).
+O passo final deve produzir exatamente a resposta pedida, com colunas de nomes descritivos.
+
+Responda APENAS com JSON, no máximo {max_steps} passos:
+{{"passos": [{{"id": "p1", "objetivo": "...", "sql": "SELECT ...", "depende_de": []}}], "passo_final": "p1"}}
+
+Pedidos sem relação com o banco ou que modifiquem dados: {{"erro": "<motivo>"}}
+
+Pedido: {question}
+"""
+
+def build_compose_prompt(question: str, steps: List[PlanStep]) -> str:
+    """Prompt da etapa final: redigir Resposta e Justificativa a partir dos resultados do plano"""
+    sections = []
+    for step in steps:
+        outcome = f"Erro: {step.error}" if step.error else (render_observation(step.resolved_sql, step.columns, step.rows) or "(sem linhas)")
+        sections.append(f"Passo {step.step_id} ({step.goal}):\n{step.resolved_sql or step.sql}\nResultado: {outcome}")
+    results = "\n\n".join(sections)
+    return f"""Você é um especialista em SQLite que atende analistas de uma locadora de maquinário agrícola.
+As consultas abaixo foram executadas para responder ao pedido. Redija a resposta final com base APENAS nesses
+resultados (NUNCA invente valores), no formato pedido pelo usuário (tabelas em Markdown).
+
+Pedido: {question}
+
+{results}
+
+Responda exatamente neste formato:
+### Resposta:
+<<resultado do passo final, no formato adequado ao pedido>>
+
+### Justificativa:
+<<relação entre o pedido e as consultas, explicitando as suposições feitas>>
+"""
+
+def extract_json(text: str) -> Dict[str, Any]:
+    """Objeto JSON da resposta do LLM, com ou sem bloco ```json"""
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    candidate = fenced.group(1) if fenced else text
+    start, end = candidate.find("{"), candidate.rfind("}")
+    if start < 0 or end < start:
+        raise PlanError("Resposta do planejamento não contém JSON")
+    try:
+        return json.loads(candidate[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise PlanError(f"JSON do plano inválido: {e}")
+
+def parse_plan(text: str, max_steps: int) -> Dict[str, Any]:
+    """Valida o plano do LLM; retorna {"error": motivo} ou {"steps": [...], "final": id}"""
+    data = extract_json(text)
+    if data.get("erro"):
+        return {"error": str(data["erro"])}
+
+    raw_steps = data.get("passos") or []
+    if not raw_steps:
+        raise PlanError("Plano sem passos")
+    if len(raw_steps) > max_steps:
+        raise PlanError(f"Plano com {len(raw_steps)} passos (máximo {max_steps})")
+
+    steps: Dict[str, PlanStep] = {}
+    for raw in raw_steps:
+        step_id = str(raw.get("id", "")).strip()
+        sql = str(raw.get("sql", "")).strip().rstrip(";")
+        if not step_id or step_id in steps:
+            raise PlanError(f"Id de passo ausente ou repetido: {step_id!r}")
+        if not READ_ONLY_SQL.match(sql):
+            raise PlanError(f"O passo {step_id} não é uma consulta SELECT")
+        depends_on = [str(d) for d in raw.get("depende_de") or []]
+        # Referências no SQL também são dependências
+        depends_on += [ref for ref in STEP_REFERENCE.findall(sql) if ref not in depends_on]
+        steps[step_id] = PlanStep(step_id, str(raw.get("objetivo", "")), sql, depends_on)
+
+    for step in steps.values():
+        unknown = [d for d in step.depends_on if d not in steps]
+        if unknown:
+            raise PlanError(f"O passo {step.step_id} depende de passos inexistentes: {unknown}")
+
+    # Ordenação topológica (Kahn) para rejeitar ciclos
+    remaining = {step_id: set(step.depends_on) for step_id, step in steps.items()}
+    while remaining:
+        ready = [step_id for step_id, deps in remaining.items() if not deps]
+        if not ready:
+            raise PlanError(f"Dependências cíclicas entre os passos: {sorted(remaining)}")
+        for step_id in ready:
+            del remaining[step_id]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+    final = str(data.get("passo_final") or raw_steps[-1].get("id"))
+    if final not in steps:
+        raise PlanError(f"Passo final inexistente: {final}")
+    return {"steps": list(steps.values()), "final": final}
+
+def _sql_literal(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+def resolve_references(sql: str, results: Dict[str, PlanStep]) -> str:
+    """Substitui {{id}} pelo valor (uma célula) ou pela lista de valores (uma coluna) do passo"""
+    def _replace(match: "re.Match") -> str:
+        step = results[match.group(1)]
+        if len(step.columns) != 1:
+            raise PlanError(f"O passo {step.step_id} é referenciado mas retorna {len(step.columns)} colunas")
+        values = [row[0] for row in step.rows]
+        return ", ".join(_sql_literal(v) for v in values) if values else "NULL"
+
+    return STEP_REFERENCE.sub(_replace, sql)
+
+def execute_plan(steps: List[PlanStep], pool: Any, max_parallel: int) -> None:
+    """Executa os passos respeitando as dependências; passos independentes rodam em paralelo"""
+    by_id = {step.step_id: step for step in steps}
+    finished: Dict[str, PlanStep] = {}
+    pending = list(steps)
+
+    def _run(step: PlanStep) -> None:
+        start_time = time.time()
+        try:
+            step.columns, step.rows = pool.execute(step.resolved_sql)
+        except Exception as e:
+            step.error = str(e)
+        step.duration = time.time() - start_time
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel), thread_name_prefix="plan-step") as executor:
+        running = {}
+        while pending or running:
+            for step in [s for s in pending if all(d in finished for d in s.depends_on)]:
+                pending.remove(step)
+                failed = [d for d in step.depends_on if by_id[d].error]
+                if failed:
+                    step.error = f"Dependência com erro: {', '.join(failed)}"
+                    finished[step.step_id] = step
+                    continue
+                try:
+                    step.resolved_sql = resolve_references(step.sql, finished)
+                except PlanError as e:
+                    step.error = str(e)
+                    finished[step.step_id] = step
+                    continue
+                # O contexto (sessão da consulta) acompanha o passo até a thread do pool
+                running[executor.submit(contextvars.copy_context().run, _run, step)] = step
+
+            if not running:
+                # Passos liberados por dependências com erro: reavaliar os pendentes
+                if pending and any(all(d in finished for d in s.depends_on) for s in pending):
+                    continue
+                break
+
+            metrics.observe("rag_plan_parallel_steps", len(running))
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                finished[step.step_id] = step
@@ -0,0 +1,82 @@
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+
+from api.services.llm_pool import LLMPool
+
+class PooledChatModel(BaseChatModel):
+    """Chat model do LangChain que distribui as chamadas entre os membros de um LLMPool
+
+    Os parâmetros de identificação (usados como chave do cache de completions)
+    incluem apenas modelo e temperatura, de modo que a mesma completion é
+    reaproveitada independentemente da chave que a produziu.
+    """
+
+    pool: Any
+    model_name: str
+    temperature: float = 0.0
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def _llm_type(self) -> str:
+        return "pooled-chat-model"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model_name, "temperature": self.temperature}
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return self.pool.call(lambda client: client._generate(messages, stop=stop, **kwargs))
+
+def _bind_api_key(chat_model: Any, api_key: str, api_endpoint: Optional[str]) -> None:
+    """Associa um cliente gRPC próprio (chave/endpoint) ao ChatGoogleGenerativeAI
+
+    O google-generativeai fixado usa um cliente padrão global (o último `configure`
+    vence); sem isso todos os membros acabariam usando a mesma chave.
+    """
+    import google.ai.generativelanguage as glm
+
+    client_options = {"api_key": api_key}
+    if api_endpoint:
+        client_options["api_endpoint"] = api_endpoint
+    chat_model.client._client = glm.GenerativeServiceClient(client_options=client_options)
+
+def parse_key_spec(spec: str) -> tuple:
+    """Separa uma entrada 'chave' ou 'chave@endpoint' da configuração"""
+    api_key, _, api_endpoint = spec.partition("@")
+    return api_key.strip(), (api_endpoint.strip() or None)
+
+def build_gemini_pool(api_keys: List[str], model_name: str, temperature: float,
+                      max_concurrency_per_key: int, hedge_enabled: bool,
+                      hedge_min_delay: float) -> PooledChatModel:
+    """Monta um PooledChatModel com um ChatGoogleGenerativeAI por chave/endpoint configurado"""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from api.services.circuit_breaker import llm_breaker
+
+    members = []
+    for index, spec in enumerate(api_keys):
+        api_key, api_endpoint = parse_key_spec(spec)
+        client = ChatGoogleGenerativeAI(model=model_name, temperature=temperature, google_api_key=api_key)
+        if len(api_keys) > 1 or api_endpoint:
+            _bind_api_key(client, api_key, api_endpoint)
+        members.append((f"{model_name}#{index}", client))
+
+    pool = LLMPool(
+        members,
+        max_concurrency_per_member=max_concurrency_per_key,
+        hedge_enabled=hedge_enabled,
+        hedge_min_delay=hedge_min_delay,
+        breaker=llm_breaker,
+    )
+    return PooledChatModel(pool=pool, model_name=model_name, temperature=temperature)
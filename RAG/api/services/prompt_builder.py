@@ -0,0 +1,164 @@
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+# Categorias e séries da Telemetria: unidade, descrição e palavras que as associam a uma pergunta
+CATEGORIES: Dict[str, Dict] = {
+    "Uso do Motor": {
+        "unit": "hr",
+        "description": "horas 'hr' em cada status do motor",
+        "series": {
+            "Chave-Ligada": "motor desligado",
+            "Marcha Lenta": "ligado, improdutivo",
+            "Carga Baixa": "baixo uso",
+            "Carga Média": "uso regular",
+            "Carga Alta": "uso intenso",
+        },
+        "keywords": ["hora", "tempo", "ocios", "improdut", "manuten", "desgaste", "trabalh", "produtiv"],
+    },
+    "Uso do Combustível do Motor": {
+        "unit": "l",
+        "description": "litros 'l' consumidos em cada status do motor",
+        "series": {
+            "Chave-Ligada": "motor desligado",
+            "Marcha Lenta": "ligado, improdutivo",
+            "Carga Baixa": "baixo uso",
+            "Carga Média": "uso regular",
+            "Carga Alta": "uso intenso",
+        },
+        "keywords": ["combust", "litro", "consum", "gasto", "diesel", "eficien", "abastec"],
+    },
+    "Uso da Configuração do Modo do Motor": {
+        "unit": "hr",
+        "description": "horas 'hr' em cada configuração do motor",
+        "series": {
+            "HP": "alta potência",
+            "P": "padrão",
+            "E": "econômico",
+        },
+        "keywords": ["modo", "configura", "potencia", "economic", "padrao", "hp"],
+    },
+}
+
+# Status do motor, comuns às categorias de uso e de combustível: sozinhos, indicam 'Uso do Motor'
+STATUS_KEYWORDS = ["carga", "marcha", "lenta", "ligad", "intens", "motor"]
+
+# As tabelas vêm do esquema lido do banco (SchemaCatalog), a mesma fonte de /database/schema
+SCHEMA_SECTION = """Esquema:
+```sql
+{tables}
+```
+Valores de Categoria e Serie{pruned_note}:
+{categories}
+{statistics}"""
+
+COMPACT_PROMPT = """Você é um especialista em SQLite que atende analistas de uma locadora de maquinário agrícola. Responda
+cada pedido com base em consultas concretas ao banco (ferramentas: {tools}).
+
+{schema}
+Regras:
+- Somente SELECT, sintaxe SQLite válida, apenas as colunas necessárias, com nomes descritivos
+- Quebre problemas complexos em passos menores; use as estatísticas pré-calculadas em vez de consultas auxiliares
+- Trate erros das ferramentas explicando causa e correção; NUNCA alucine
+- Action Input é string pura, sem blocos Markdown
+- A Resposta é o resultado da ÚLTIMA Observation, no formato pedido (tabelas em Markdown)
+- Manutenção preventiva, desgaste ou uso anômalo: UMA chamada de '{maintenance_tool}'; em Consulta, escreva a chamada feita em vez do bloco sql
+- Pedido sem relação com o banco ou que modifica dados: responda imediatamente com "Final Answer: **ERRO:** <motivo>"
+{shots}
+Formato ReAct (nunca misture os dois casos):
+Thought: <raciocínio completo>
+Action: <ferramenta>
+Action Input: <entrada>
+
+ou, ao concluir:
+Thought: <confirmação de que a resposta vem da última Observation>
+Final Answer:
+### Consulta:
+```sql
+<consulta validada>
+```
+### Resposta:
+<resultado>
+### Justificativa:
+<relação entre pedido e consulta, com as suposições feitas>
+"""
+
+def _fold(text: str) -> str:
+    """Minúsculas sem acentos, para comparar palavras-chave"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+def select_categories(question: str, available: Optional[List[str]] = None) -> List[str]:
+    """Categorias (dentre as existentes no banco) relevantes para a pergunta; todas, se nenhuma for reconhecida"""
+    available = list(CATEGORIES) if available is None else available
+    folded = _fold(question or "")
+    words = set(re.findall(r"\w+", folded))
+
+    def _matches(keyword: str) -> bool:
+        # Palavras-chave curtas (ex: 'hp') só contam como palavra inteira
+        return keyword in words if len(keyword) <= 2 else keyword in folded
+
+    selected = [
+        name for name in available
+        if name in CATEGORIES and any(map(_matches, CATEGORIES[name]["keywords"]))
+    ]
+    if not selected and "Uso do Motor" in available and any(map(_matches, STATUS_KEYWORDS)):
+        selected = ["Uso do Motor"]
+    return selected or list(available)
+
+def build_schema_section(question: str, statistics_catalog=None, schema=None) -> str:
+    """Esquema, categorias/séries relevantes à pergunta e suas estatísticas pré-calculadas
+
+    `schema` é o SchemaCatalog do banco; sem ele, usa o esquema documentado.
+    """
+    if schema is None:
+        from api.services.schema_catalog import SchemaCatalog
+        schema = SchemaCatalog.documented()
+
+    available = schema.category_names()
+    categories = select_categories(question, available)
+    lines = []
+    for name in categories:
+        known = CATEGORIES.get(name, {})
+        descriptions = known.get("series", {})
+        series = ", ".join(
+            f"{serie} ({descriptions[serie]})" if serie in descriptions else serie
+            for serie in schema.categories[name]["series"]
+        )
+        lines.append(f"- {name} [{known.get('description') or schema.categories[name]['unit']}]: {series}")
+
+    pruned_note = ""
+    if len(categories) < len(available):
+        others = ", ".join(name for name in available if name not in categories)
+        pruned_note = f" relevantes (também existem: {others})"
+
+    statistics = ""
+    if statistics_catalog is not None and statistics_catalog.metadata:
+        statistics = f"\nEstatísticas pré-calculadas:\n{statistics_catalog.summary(categories)}\n"
+
+    return SCHEMA_SECTION.format(
+        tables=schema.render_tables(compact=True),
+        pruned_note=pruned_note,
+        categories="\n".join(lines),
+        statistics=statistics,
+    )
+
+def build_compact_prompt(question: str, tools: List[str], maintenance_tool: str,
+                         statistics_catalog=None, shots: str = "", schema=None) -> str:
+    """Prompt compacto: instruções sem repetição e apenas as categorias relevantes à pergunta"""
+    return COMPACT_PROMPT.format(
+        tools=", ".join(tools),
+        schema=build_schema_section(question, statistics_catalog, schema),
+        maintenance_tool=maintenance_tool,
+        shots=f"\n{shots.strip()}\n" if shots and shots.strip() else "",
+    )
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Estimativa offline do número de tokens (palavras e pontuação, palavras longas em pedaços de 4 caracteres)
+
+    O tokenizador do Gemini só está disponível pela API; a estimativa serve para
+    comparar variantes de prompt entre si.
+    """
+    if not text:
+        return 0
+    return sum(max(1, -(-len(piece) // 4)) for piece in re.findall(r"\w+|[^\w\s]", text))
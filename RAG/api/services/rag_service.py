@@ -1,23 +1,52 @@
 import time
-import pandas as pd
-import sqlite3
+import re
+import threading
+import unicodedata
 from pathlib import Path
-from typing import Dict, Any, Optional
-from langchain.agents import ZeroShotAgent
-from langchain.agents.agent import AgentExecutor
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
-from langchain_community.utilities import SQLDatabase
-from langchain.chains import LLMMathChain
-from langchain.agents import Tool
-from typing import List, Any
+from typing import Dict, Any, Optional, List
 
 from config.settings import settings
+from api.services.metrics import metrics
+from api.services.single_flight import SingleFlight
+from api.services.circuit_breaker import AnswerCache, CircuitOpenError, llm_breaker
+from api.services.session_store import session_authorizer, session_store
+from api.services.prompt_builder import build_schema_section, estimate_tokens
 import os
 from datetime import datetime
 
+# Importante: langchain, o cliente do Gemini e o SQLAlchemy são importados dentro
+# dos métodos de inicialização. Assim a aplicação sobe (e responde /health) sem
+# pagar o custo dessas importações, que fica por conta do aquecimento em background.
+
+# Nome da ferramenta de análise preditiva de manutenção registrada no agente
+MAINTENANCE_TOOL_NAME = "analise_manutencao"
+
+# Nome da ferramenta de consulta ao catálogo de estatísticas pré-calculadas
+STATISTICS_TOOL_NAME = "estatisticas_telemetria"
+
+# Modos de execução de uma consulta: agente ReAct, plano com passos SQL executados pelo
+# servidor ou consulta única gerada em uma chamada (os dois últimos recaem no agente)
+QUERY_MODES = ("agent", "plan", "fast")
+
+# Ferramentas do agente, usadas no prompt compacto antes de o agente ser montado
+DEFAULT_TOOL_NAMES = [
+    "sql_db_query", "sql_db_schema", "sql_db_list_tables", "sql_db_query_checker",
+    "Calculadora Matemática", MAINTENANCE_TOOL_NAME,
+]
+
+def build_llm_call_counter():
+    """Callback que conta as chamadas ao LLM feitas durante uma consulta"""
+    from langchain_core.callbacks import BaseCallbackHandler
+    
+    class LLMCallCounter(BaseCallbackHandler):
+        def __init__(self):
+            self.calls = 0
+        
+        def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+            self.calls += 1
+    
+    return LLMCallCounter()
+
 def simple_similarity(str1: str, str2: str) -> float:
     """Função simples de similaridade para substituir jellyfish temporariamente"""
     try:
@@ -51,34 +80,133 @@ def simple_similarity(str1: str, str2: str) -> float:
         print(f"⚠️ Aviso: Erro na função simple_similarity: {e}")
         return 0.0
 
+def normalize_question(question: str) -> str:
+    """Normaliza uma pergunta para identificar pedidos equivalentes (caixa, espaços e pontuação final)"""
+    if not isinstance(question, str):
+        return ""
+    normalized = unicodedata.normalize("NFC", question).lower()
+    normalized = re.sub(r"\s+", " ", normalized).strip()
+    return normalized.rstrip("?!. ")
+
 class RAGService:
     """Serviço para gerenciar consultas RAG usando LangChain e Gemini"""
     
-    def __init__(self):
+    def __init__(self, database_path: Optional[str] = None, name: Optional[str] = None):
+        # Banco atendido por esta instância (o pool de serviços cria uma por banco registrado)
+        self.database_path = str(database_path or settings.database_path)
+        self.name = name or settings.default_database
+        # Assinatura dos arquivos (banco e consultas validadas) lidos na inicialização
+        self.snapshot = None
+        # Atualização dos dados após a ingestão: no máximo uma em andamento e uma pendente
+        self._refresh_lock = threading.Lock()
+        self._refresh_state_lock = threading.Lock()
+        self._refresh_running = False
+        self._refresh_scheduled = False
+        self._refresh_dirty = False
+        self._last_refresh = float("-inf")
         self.db = None
         self.llm = None
+        # LLM de cada modelo (o padrão e os da cascata), cada um com seu pool de threads
+        self.llms: Dict[str, Any] = {}
         self.toolkit = None
         self.tools = None
-        self.df_consultas_validadas = None
+        self.consultas_validadas: List[Dict[str, str]] = []
         self.agent_executor = None
-        self._initialize_service()
+        self.llm_cache = None
+        self.maintenance_analytics = None
+        self.statistics_catalog = None
+        self.approximate_sample = None
+        # A amostra é sorteada (ou carregada) na primeira consulta aproximada, não na inicialização
+        self._sample_lock = threading.Lock()
+        self._sample_attempted = False
+        self.read_pool = None
+        self.partition_pruner = None
+        # Esquema lido do banco uma única vez por instância (endpoint e prompts)
+        self.schema_catalog = None
+        self._schema_lock = threading.Lock()
+        self.plan_llm = None
+        self.fast_llm = None
+        
+        # Coalescência de perguntas idênticas em andamento
+        self._single_flight = SingleFlight()
+        
+        # Últimas respostas, servidas em modo degradado quando o circuito do LLM abre
+        self.answer_cache = AnswerCache(settings.degraded_answer_cache_size)
+        
+        # Estado da inicialização preguiçosa
+        self._init_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._warmup_thread: Optional[threading.Thread] = None
+        self.init_error: Optional[str] = None
+        self.init_duration: Optional[float] = None
+    
+    @property
+    def is_ready(self) -> bool:
+        """Indica se o agente já foi construído e pode atender consultas"""
+        return self._ready.is_set()
+    
+    def start_warmup(self) -> None:
+        """Dispara a inicialização do serviço em uma thread de background"""
+        if self.is_ready or (self._warmup_thread and self._warmup_thread.is_alive()):
+            return
+        
+        def _warmup():
+            try:
+                self.ensure_initialized()
+                print(f"✅ Serviço RAG aquecido em {self.init_duration:.2f}s")
+            except Exception as e:
+                print(f"❌ Erro no aquecimento do serviço RAG: {e}")
+        
+        self._warmup_thread = threading.Thread(target=_warmup, name="rag-warmup", daemon=True)
+        self._warmup_thread.start()
+    
+    def ensure_initialized(self) -> None:
+        """Garante que o serviço foi inicializado, inicializando-o na primeira chamada"""
+        if self.is_ready:
+            return
+        
+        with self._init_lock:
+            # Outra thread pode ter concluído a inicialização enquanto esperávamos
+            if self.is_ready:
+                return
+            
+            start_time = time.time()
+            try:
+                self._initialize_service()
+                self.init_error = None
+                self.init_duration = time.time() - start_time
+                self._ready.set()
+            except Exception as e:
+                self.init_error = str(e)
+                raise
     
     def _initialize_service(self):
         """Inicializa o serviço RAG seguindo o fluxo do case_agentes_projeto_final.py"""
         try:
+            # Registrada antes da leitura: mudanças durante a inicialização também geram recarga
+            from api.services.hot_reload import snapshot_signature
+            self.snapshot = snapshot_signature(self.snapshot_paths())
+            
             # Configurar o LLM com Gemini
-            if not settings.google_api_key:
+            if not settings.google_api_keys:
                 raise ValueError("GOOGLE_API_KEY não configurada")
             
             os.environ['GOOGLE_API_KEY'] = settings.google_api_key
-            self.llm = ChatGoogleGenerativeAI(
-                model=settings.model_name, 
-                temperature=0
-            )
+            
+            # Cache persistente das completions individuais do loop ReAct
+            self._initialize_llm_cache()
+            
+            # Pool de clientes: uma instância do Gemini por chave configurada,
+            # com hedge de chamadas lentas e concorrência adaptativa por chave
+            self.llm = self._build_llm(settings.model_name)
             
             # Conectar ao banco
             self._connect_database()
             
+            # O catálogo recalculado é gravado no próprio banco: essa escrita não deve gerar recarga
+            if self.statistics_catalog is not None and self.statistics_catalog.persisted:
+                self._renew_database_snapshot()
+            
             # Carregar consultas validadas (se existir)
             self._load_validated_queries()
             
@@ -88,36 +216,332 @@ class RAGService:
         except Exception as e:
             raise RuntimeError(f"Erro ao inicializar serviço RAG: {str(e)}")
     
+    def _build_llm(self, model_name: str):
+        """Cria o LLM (pool de chaves do Gemini) para o modelo informado"""
+        from api.services.pooled_chat_model import build_gemini_pool
+        
+        return build_gemini_pool(
+            api_keys=settings.google_api_keys,
+            model_name=model_name,
+            temperature=0,
+            max_concurrency_per_key=settings.llm_max_concurrency_per_key,
+            hedge_enabled=settings.llm_hedge_enabled,
+            hedge_min_delay=settings.llm_hedge_min_delay_seconds
+        )
+    
+    def _initialize_llm_cache(self):
+        """Instala o cache SQLite de completions usado pelo LLM do agente"""
+        if not settings.llm_cache_enabled:
+            return
+        
+        try:
+            from langchain.globals import get_llm_cache, set_llm_cache
+            from api.services.llm_cache import SQLiteCompletionCache
+            
+            # Com vários bancos, as instâncias do serviço compartilham o mesmo cache
+            if isinstance(get_llm_cache(), SQLiteCompletionCache):
+                self.llm_cache = get_llm_cache()
+                return
+            
+            self.llm_cache = SQLiteCompletionCache(
+                settings.llm_cache_path,
+                max_bytes=int(settings.llm_cache_max_mb * 1024 * 1024)
+            )
+            # A versão fixada do langchain-core só suporta cache global; como este
+            # processo usa um único modelo, o efeito é o de um cache por instância
+            set_llm_cache(self.llm_cache)
+        except Exception as e:
+            print(f"⚠️ Aviso: Não foi possível inicializar o cache de completions: {e}")
+            self.llm_cache = None
+    
     def _connect_database(self):
         """Conecta ao banco de dados SQLite"""
         try:
-            db_path = Path(settings.database_path)
+            db_path = Path(self.database_path)
             if not db_path.exists():
                 raise FileNotFoundError(f"Banco de dados não encontrado: {db_path}")
             
-            self.db = SQLDatabase.from_uri(f'sqlite:///{db_path}')
+            import sqlite3
+            from urllib.parse import quote
+            from langchain_community.utilities import SQLDatabase
+            
+            def _connect():
+                # Cada conexão do agente enxerga também as tabelas das sessões de conversa. Sem cache de
+                # comandos preparados: o autorizador, que restringe as tabelas à sessão da consulta,
+                # só é consultado na preparação
+                conn = sqlite3.connect(f"file:{quote(str(db_path))}", uri=True, check_same_thread=False,
+                                       cached_statements=0)
+                session_store.attach(conn)
+                return conn
+            
+            # No layout normalizado a Telemetria é uma view sobre tabelas internas,
+            # que ficam ocultas do agente para manter o esquema do prompt
+            from api.utils.storage_layout import INTERNAL_TABLES, internal_tables_present
+            from api.services.statistics_catalog import CATALOG_TABLES
+            from api.services.approximate_query import SAMPLE_TABLES
+            
+            # O catálogo de estatísticas é criado antes, para que suas tabelas também fiquem ocultas
+            self._load_statistics_catalog(db_path)
+            self.get_schema()
+            
+            conn = sqlite3.connect(f"file:{quote(str(db_path))}?mode=ro", uri=True)
+            try:
+                internal_tables = internal_tables_present(conn, INTERNAL_TABLES + CATALOG_TABLES + SAMPLE_TABLES)
+            finally:
+                conn.close()
+            
+            self.db = SQLDatabase.from_uri(
+                f'sqlite:///{db_path}',
+                engine_args={"creator": _connect},
+                view_support=bool(internal_tables),
+                ignore_tables=internal_tables or None
+            )
+            
+            from api.services.maintenance_analytics import MaintenanceAnalytics
+            self.maintenance_analytics = MaintenanceAnalytics(str(db_path))
+            
+            # Com a Telemetria normalizada ou particionada, os filtros de Data das consultas passam
+            # para a coluna em epoch da tabela de fatos (e só as partições do período são lidas)
+            from api.services.partition_pruning import PartitionPruner
+            self.partition_pruner = PartitionPruner.from_database(str(db_path))
+            rewrite = self.partition_pruner.rewrite if self.partition_pruner else None
+            
+            # Conexões somente leitura para os passos do modo plano, executados em paralelo
+            from api.services.read_pool import ReadConnectionPool
+            
+            def _connect_readonly():
+                conn = sqlite3.connect(f"file:{quote(str(db_path))}?mode=ro", uri=True, check_same_thread=False,
+                                       cached_statements=0)
+                session_store.attach(conn)
+                return conn
+            
+            self.read_pool = ReadConnectionPool(
+                _connect_readonly, size=settings.read_pool_size, rewrite=rewrite,
+                timeout=settings.read_pool_timeout_seconds, authorizer=session_authorizer,
+            )
             
         except Exception as e:
             raise RuntimeError(f"Erro ao conectar ao banco: {str(e)}")
     
+    def _load_statistics_catalog(self, db_path: Path):
+        """Carrega (ou calcula na primeira vez) o catálogo de estatísticas da Telemetria"""
+        from api.services.statistics_catalog import StatisticsCatalog
+        
+        try:
+            self.statistics_catalog = StatisticsCatalog(str(db_path))
+            self.statistics_catalog.load_or_build()
+        except Exception as e:
+            print(f"⚠️ Aviso: Não foi possível carregar o catálogo de estatísticas: {e}")
+            self.statistics_catalog = None
+    
+    def _get_approximate_sample(self):
+        """Amostra estratificada, carregada (ou sorteada) na primeira consulta aproximada
+        
+        Sortear a amostra varre a Telemetria inteira; feito na inicialização, o custo seria
+        pago a cada partida e a cada mudança dos dados mesmo sem nenhuma consulta aproximada.
+        """
+        if settings.approximate_sample_rate <= 0:
+            return None
+        with self._sample_lock:
+            if self.approximate_sample is None and not self._sample_attempted:
+                self._sample_attempted = True
+                self._load_approximate_sample(Path(self.database_path))
+                # As tabelas da amostra gravadas agora não devem disparar a recarga da instância
+                self._renew_database_snapshot()
+            return self.approximate_sample
+    
+    def _load_approximate_sample(self, db_path: Path):
+        """Carrega (ou sorteia na primeira vez) a amostra estratificada das consultas aproximadas"""
+        from api.services.approximate_query import StratifiedSample
+        
+        if settings.approximate_sample_rate <= 0:
+            return
+        try:
+            self.approximate_sample = StratifiedSample(
+                str(db_path), settings.approximate_sample_rate, settings.approximate_min_stratum_rows
+            )
+            self.approximate_sample.load_or_build()
+        except Exception as e:
+            # Banco somente leitura sem amostra persistida: as consultas aproximadas rodam exatas
+            print(f"⚠️ Aviso: Não foi possível carregar a amostra estratificada: {e}")
+            self.approximate_sample = None
+    
+    def get_schema(self):
+        """Esquema do banco (SchemaCatalog), lido na primeira chamada e reaproveitado depois
+        
+        Se o banco não puder ser lido, retorna o esquema documentado sem guardá-lo.
+        """
+        from api.services.schema_catalog import SchemaCatalog
+        
+        with self._schema_lock:
+            if self.schema_catalog is None:
+                try:
+                    self.schema_catalog = SchemaCatalog.introspect(self.database_path, self.statistics_catalog)
+                except Exception as e:
+                    print(f"⚠️ Aviso: Não foi possível ler o esquema do banco: {e}")
+                    return SchemaCatalog.documented()
+            return self.schema_catalog
+    
+    def snapshot_paths(self) -> List[str]:
+        """Arquivos cuja troca exige recarregar a instância"""
+        paths = [self.database_path]
+        if settings.validated_queries_path:
+            paths.append(settings.validated_queries_path)
+        return paths
+    
+    @property
+    def refreshing(self) -> bool:
+        """Se há atualização dos dados após a ingestão em andamento ou pendente (a recarga espera por ela)"""
+        return self._refresh_running or self._refresh_scheduled
+    
+    def request_refresh(self) -> None:
+        """Agenda `refresh_data` após um checkpoint da ingestão, agrupando pedidos seguidos
+        
+        O escritor faz checkpoint a cada pausa da ingestão (frações de segundo) e cada
+        atualização recalcula catálogo e amostra: com uma ingestão contínua, uma thread
+        por checkpoint se acumularia na fila. Há no máximo uma thread por instância e uma
+        atualização pendente, executada no mínimo INGEST_REFRESH_MIN_INTERVAL_SECONDS
+        depois da anterior.
+        """
+        with self._refresh_state_lock:
+            self._refresh_dirty = True
+            if self._refresh_scheduled:
+                metrics.inc("rag_data_refresh_coalesced_total", database=self.name)
+                return
+            self._refresh_scheduled = True
+        threading.Thread(target=self._refresh_loop, name="data-refresh", daemon=True).start()
+    
+    def _refresh_loop(self) -> None:
+        while True:
+            remaining = self._last_refresh + settings.ingest_refresh_min_interval_seconds - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            with self._refresh_state_lock:
+                if not self._refresh_dirty:
+                    self._refresh_scheduled = False
+                    return
+                self._refresh_dirty = False
+            self.refresh_data()
+            self._last_refresh = time.monotonic()
+    
+    def refresh_data(self) -> None:
+        """Atualiza o que depende das linhas da Telemetria após a ingestão, sem reconstruir a instância
+        
+        As leituras gravadas por POST /telemetry mudam o arquivo do banco, o que levaria a
+        recarga a montar uma instância nova (clientes do LLM, agente, catálogo, amostra e
+        esquema). Aqui só as partições da poda, o catálogo de estatísticas, a amostra e o
+        esquema são relidos, e a assinatura do banco passa a ser a do arquivo atualizado.
+        """
+        if not self.is_ready:
+            return
+        from api.services.schema_catalog import SchemaCatalog
+        
+        with self._refresh_lock:
+            self._refresh_running = True
+            start_time = time.time()
+            try:
+                db_path = Path(self.database_path)
+                if self.partition_pruner is not None:
+                    self.partition_pruner.refresh(self.database_path)
+                self._load_statistics_catalog(db_path)
+                if self.approximate_sample is not None:
+                    self._load_approximate_sample(db_path)
+                schema = SchemaCatalog.introspect(self.database_path, self.statistics_catalog)
+                with self._schema_lock:
+                    self.schema_catalog = schema
+                self._renew_database_snapshot()
+                metrics.observe("rag_data_refresh_seconds", time.time() - start_time, database=self.name)
+                print(f"♻️ Dados do banco '{self.name}' atualizados após a ingestão em {time.time() - start_time:.2f}s")
+            except Exception as e:
+                print(f"⚠️ Aviso: Não foi possível atualizar os dados após a ingestão: {e}")
+            finally:
+                self._refresh_running = False
+    
+    def _renew_database_snapshot(self) -> None:
+        """Assinatura do banco renovada depois de gravações da própria instância (catálogo e amostra)"""
+        import sqlite3
+        from api.services.hot_reload import snapshot_signature
+        
+        if self.snapshot is None:
+            return
+        # Tabelas gravadas no WAL vão para o arquivo principal antes da assinatura
+        conn = sqlite3.connect(self.database_path, timeout=30)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        finally:
+            conn.close()
+        database = snapshot_signature([self.database_path])[0]
+        self.snapshot = tuple(database if entry[0] == self.database_path else entry for entry in self.snapshot)
+    
     def _load_validated_queries(self):
-        """Carrega consultas validadas (opcional)"""
+        """Carrega consultas validadas (opcional): pares {'Pedido', 'Consulta'} de um CSV ou JSON"""
         try:
-            # Por enquanto, vamos usar um DataFrame vazio
-            # Em produção, você pode carregar de um arquivo Excel ou banco
-            self.df_consultas_validadas = pd.DataFrame(columns=['Pedido', 'Consulta'])
+            self.consultas_validadas = []
+            path = settings.validated_queries_path
+            if not path or not Path(path).exists():
+                return
+            
+            if path.lower().endswith(".json"):
+                import json
+                
+                with open(path, encoding="utf-8") as f:
+                    rows = json.load(f)
+            else:
+                import csv
+                
+                with open(path, encoding="utf-8-sig", newline="") as f:
+                    rows = list(csv.DictReader(f))
+            
+            self.consultas_validadas = [
+                {"Pedido": row["Pedido"], "Consulta": row["Consulta"]}
+                for row in rows if row.get("Pedido") and row.get("Consulta")
+            ]
+            print(f"📚 {len(self.consultas_validadas)} consultas validadas carregadas")
         except Exception as e:
             print(f"Aviso: Não foi possível carregar consultas validadas: {e}")
-            self.df_consultas_validadas = pd.DataFrame(columns=['Pedido', 'Consulta'])
+            self.consultas_validadas = []
+    
+    def _build_system_prompt(self, query: str, variant: Optional[str] = None,
+                             similarity_threshold: Optional[float] = None) -> str:
+        """Monta o system prompt da pergunta na variante configurada ("compact" ou "full")"""
+        variant = variant or settings.prompt_variant
+        if variant == "full":
+            return self._get_system_prompt(query, similarity_threshold) + "\n\nUse as ferramentas disponíveis."
+        
+        from api.services.prompt_builder import build_compact_prompt
+        
+        tools = [tool.name for tool in self.tools] if self.tools else DEFAULT_TOOL_NAMES
+        return build_compact_prompt(
+            query,
+            tools=tools,
+            maintenance_tool=MAINTENANCE_TOOL_NAME,
+            statistics_catalog=self.statistics_catalog,
+            shots=self._get_similar_shots(query, similarity_threshold),
+            schema=self.schema_catalog
+        )
     
-    def _get_system_prompt(self, query: str) -> str:
+    def _get_system_prompt(self, query: str, similarity_threshold: Optional[float] = None) -> str:
         """Gera o prompt do sistema baseado na consulta, seguindo o formato original"""
         try:
             # Garantir que query seja uma string válida
             if not isinstance(query, str):
                 query = str(query) if query is not None else ""
             
-            shots = self._get_similar_shots(query)
+            shots = self._get_similar_shots(query, similarity_threshold)
+            
+            # Esquema e categorias renderizados do esquema lido do banco (mesma fonte de /database/schema)
+            from api.services.schema_catalog import SchemaCatalog
+            schema = self.schema_catalog or SchemaCatalog.documented()
+            
+            # Estatísticas pré-calculadas dispensam consultas exploratórias de médias, faixas e contagens
+            statistics = ""
+            if self.statistics_catalog and self.statistics_catalog.metadata:
+                statistics = f"""
+Estatísticas pré-calculadas do banco (use-as como critério em vez de consultas auxiliares; detalhes
+e percentis adicionais na ferramenta '{STATISTICS_TOOL_NAME}'):
+
+{self.statistics_catalog.summary()}
+"""
             
             system_prompt = f"""
 Você é um sistema especialista em escrever consultas SQLite a partir de descrições textuais. Seu papel é
@@ -217,47 +641,15 @@ feitas para você serão realizadas por analistas de dados da empresa que buscam
 para os clientes. Segue o esquema físico do banco de dados da empresa:
 
 ```sql
--- Tabela relacionando dados de clientes e seus contratos de locação de veículos
-CREATE TABLE Chassis (
-  Chassi INTEGER PRIMARY KEY, -- ID do chassi, que identifica uma máquina
-  Contrato INTEGER, -- ID do contrato, que pode incluir vários chassis
-  Cliente INTEGER, -- ID do cliente, que pode estar envolvido em vários contratos e ter vários chassis
-  Modelo INTEGER -- ID do modelo, que pode categorizar vários chassis
-);
-
--- Tabela contendo dados diários dos veículos obtidos por sensores
-CREATE TABLE Telemetria (
-  Chassi INTEGER, -- ID do chassi
-  UnidadeMedida TEXT, -- Unidade de medida do valor descrito no campo Valor ('l' para litros ou 'hr' para horas)
-  Categoria TEXT, -- Nome da categoria da informação sensoriada
-  Data TIMESTAMP, -- Data e hora de captação do dado
-  Serie TEXT, -- Nome da subcategoria do tipo de dado sensoriado pelo sensor
-  Valor REAL -- Valor capturado pelo sensor, medido na UnidadeMedida, sobre a informação descrita pela Categoria e Serie
-  PRIMARY KEY (Chassi, Categoria, Serie, Data)
-);
+{schema.render_tables()}
 ```
 
 Além disso, temos a caracterização do conjunto de valores assumidos pelos campos de Categoria e Serie. As categorias são
 expressas pelas strings nos tópicos principais e as séries, nas strings dos subtópicos (cada uma é descrita pelos comentários
 entre colchetes e em itálico):
 
-- Uso do Motor _[Tempo (em horas 'hr') em cada status de motor]_
-  - Chave-Ligada _[Motor desligado]_
-  - Marcha Lenta _[Motor ligado, mas improdutivo]_
-  - Carga Baixa _[Motor ligado, mas com baixo uso]_
-  - Carga Média _[Motor ligado com uso regular]_
-  - Carga Alta _[Motor ligado com uso intenso]_
-- Uso do Combustível do Motor _[Consumo de combustível (em litros 'l') em cada status de motor]_
-  - Chave-Ligada _[Motor desligado]_
-  - Marcha Lenta _[Motor ligado, mas improdutivo]_
-  - Carga Baixa _[Motor ligado, mas com baixo uso]_
-  - Carga Média _[Motor ligado com uso regular]_
-  - Carga Alta _[Motor ligado com uso intenso]_
-- Uso da Configuração do Modo do Motor _[Tempo (em horas 'hr') em cada configuração de motor]_
-  - HP _[Modo de Alta Potência]_
-  - P _[Modo Padrão]_
-  - E _[Modo Econômico]_
-
+{schema.render_categories()}
+{statistics}
 Antes de pensar em qualquer consulta, verifique se é possível extrair elementos desse esquema físico do pedido do usuário.
 Lembre-se que o seu papel é ajudar no processo de extração de dados do banco da empresa, e que você deve ser capaz tanto
 de raciocinar sobre os pedidos quanto de escrever consultas SQLite efetivas, concisas e bem explicadas. Serão humanos os
@@ -277,6 +669,7 @@ Algumas restrições que você DEVE seguir em qualquer resposta sua é:
 - Tratamento de erros: você SEMPRE deve tratar os erros que receber de observações de ferramentas, declarando qual seu motivo e como consertá-lo
 - Proibição de alucinação: NUNCA alucine respostas
 - String pura no 'Action Input': o campo 'Action Input' só deve ser preenchido com strings puras, NUNCA com blocos Markdown
+- Manutenção preventiva: para perguntas sobre manutenção, desgaste ou padrões anômalos de uso, use UMA chamada da ferramenta 'analise_manutencao' em vez de várias consultas SQL; no campo 'Consulta', escreva a chamada feita (ex: analise_manutencao top=10) em vez do bloco sql
 
 {shots}
 
@@ -302,24 +695,25 @@ Final Answer: <<se quiser encerrar, use este campo como resposta final>>
             # Retornar um prompt básico em caso de erro
             return """Você é um sistema especialista em escrever consultas SQLite. Use as ferramentas disponíveis para responder às perguntas."""
     
-    def _get_similar_shots(self, query: str) -> str:
+    def _get_similar_shots(self, query: str, similarity_threshold: Optional[float] = None) -> str:
         """Obtém exemplos similares de consultas"""
         try:
-            # Verificar se o DataFrame está vazio ou se a query é inválida
-            if (self.df_consultas_validadas is None or 
-                self.df_consultas_validadas.empty or 
+            # Verificar se há consultas validadas ou se a query é inválida
+            if (not self.consultas_validadas or 
                 not isinstance(query, str) or 
                 not query.strip()):
                 return ""
             
+            threshold = similarity_threshold if similarity_threshold is not None else settings.similarity_threshold
+            
             shots = ""
-            for idx, linha in self.df_consultas_validadas.iterrows():
+            for linha in self.consultas_validadas:
                 # Verificar se as colunas existem e contêm strings válidas
                 if ('Pedido' in linha and 'Consulta' in linha and 
                     isinstance(linha['Pedido'], str) and 
                     isinstance(linha['Consulta'], str)):
                     
-                    if simple_similarity(linha['Pedido'], query) > 0.7:
+                    if simple_similarity(linha['Pedido'], query) > threshold:
                         shots += f"""
 ---
 **PEDIDO DO USUÁRIO:** {linha['Pedido']}
@@ -342,63 +736,35 @@ Final Answer: <<se quiser encerrar, use este campo como resposta final>>
             return ""
     
     def _initialize_agent(self):
-        """Inicializa o agente seguindo o fluxo do case_agentes_projeto_final.py"""
+        """Inicializa os agentes da cascata de modelos seguindo o fluxo do case_agentes_projeto_final.py"""
         try:
             print("🔧 Inicializando agente RAG...")
             
-            # Criar o Toolkit SQL
-            self.toolkit = SQLDatabaseToolkit(db=self.db, llm=self.llm)
+            from langchain.prompts import PromptTemplate
             
-            # Criar a Calculadora com LLMMathChain (como no original)
-            math_chain = LLMMathChain.from_llm(llm=self.llm, verbose=True)
-            math_tool = Tool(
-                name="Calculadora Matemática",
-                func=math_chain.run,
-                description="""
-Use esta ferramenta para realizar operações aritméticas.
-Use se precisar realizar alguma operação matemática não suportada por SQLite em algum conjunto de dados.
-A entrada é uma expressão aritmética a ser resolvida.
-A saída é o resultado do cálculo da expressão aritmética.
-"""
+            # O system prompt é montado por pergunta (variável `system_prompt`), o que
+            # permite podar o esquema e escolher exemplos de acordo com o pedido
+            agent_prompt = PromptTemplate(
+                input_variables=["system_prompt", "input", "agent_scratchpad"],
+                template="{system_prompt}\n\nPergunta: {input}\n{agent_scratchpad}"
             )
             
-            # Obter ferramentas do toolkit SQL e adicionar a calculadora
-            self.tools = self.toolkit.get_tools() + [math_tool]
-            
-            # Criar o prompt personalizado com o contexto do schema
-            try:
-                prompt_prefix = self._get_system_prompt("") + "\n\nUse as ferramentas disponíveis."
-                prompt_suffix = "\n\nPergunta: {input}\n{agent_scratchpad}"
-                
-                # Prompt final do agente
-                agent_prompt = PromptTemplate(
-                    input_variables=["input", "agent_scratchpad"],
-                    template=prompt_prefix + prompt_suffix
-                )
-            except Exception as prompt_error:
-                print(f"⚠️ Aviso: Erro ao criar prompt personalizado, usando prompt padrão: {prompt_error}")
-                # Usar prompt padrão em caso de erro
-                agent_prompt = PromptTemplate(
-                    input_variables=["input", "agent_scratchpad"],
-                    template="""Você é um sistema especialista em escrever consultas SQLite. Use as ferramentas disponíveis para responder às perguntas.
-
-Pergunta: {input}
-{agent_scratchpad}"""
-                )
-            
-            # Criar a LLMChain com o prompt customizado
-            llm_chain = LLMChain(llm=self.llm, prompt=agent_prompt)
+            # Um agente por nível da cascata (modelo mais leve primeiro), cada um
+            # com seu próprio LLM e orçamento de iterações
+            llms = self.llms = {settings.model_name: self.llm}
+            self.agent_executors = []
+            for tier in settings.model_cascade:
+                if tier.model not in llms:
+                    llms[tier.model] = self._build_llm(tier.model)
+                executor = self._build_agent_executor(llms[tier.model], agent_prompt, tier.max_iterations)
+                self.agent_executors.append((tier, executor))
+                print(f"   🪜 Nível da cascata: {tier.model} (até {tier.max_iterations} iterações)")
             
-            # Criar o agente com a LLMChain
-            agent = ZeroShotAgent(llm_chain=llm_chain, tools=self.tools)
-            
-            # Executor final do agente
-            self.agent_executor = AgentExecutor.from_agent_and_tools(
-                agent=agent,
-                tools=self.tools,
-                verbose=True,
-                handle_parsing_errors=True
-            )
+            # O último nível (modelo mais forte) é o agente padrão e também planeja no modo plano
+            self.agent_executor = self.agent_executors[-1][1]
+            self.plan_llm = llms[settings.model_cascade[-1].model]
+            # O modo rápido usa o primeiro nível: uma única consulta, com o agente como reserva
+            self.fast_llm = llms[settings.model_cascade[0].model]
             
             print("✅ Agente RAG inicializado com sucesso")
             
@@ -406,7 +772,101 @@ Pergunta: {input}
             print(f"❌ Erro ao inicializar agente: {str(e)}")
             raise RuntimeError(f"Erro ao inicializar agente: {str(e)}")
     
-    def query(self, query_text: str) -> Dict[str, Any]:
+    def _build_agent_executor(self, llm, agent_prompt, max_iterations: int):
+        """Monta o executor do agente ReAct (toolkit SQL + calculadora) para um LLM"""
+        from langchain.agents import Tool
+        from langchain.agents.agent import AgentExecutor
+        from langchain.chains import LLMChain, LLMMathChain
+        from langchain_community.agent_toolkits import SQLDatabaseToolkit
+        
+        # Criar o Toolkit SQL
+        self.toolkit = SQLDatabaseToolkit(db=self.db, llm=llm)
+        
+        # Criar a Calculadora com LLMMathChain (como no original)
+        math_chain = LLMMathChain.from_llm(llm=llm, verbose=True)
+        math_tool = Tool(
+            name="Calculadora Matemática",
+            func=math_chain.run,
+            description="""
+Use esta ferramenta para realizar operações aritméticas.
+Use se precisar realizar alguma operação matemática não suportada por SQLite em algum conjunto de dados.
+A entrada é uma expressão aritmética a ser resolvida.
+A saída é o resultado do cálculo da expressão aritmética.
+"""
+        )
+        
+        # Análise preditiva de manutenção vetorizada (uma chamada em vez de várias consultas)
+        maintenance_tool = Tool(
+            name=MAINTENANCE_TOOL_NAME,
+            func=self.maintenance_analytics.run,
+            description=self.maintenance_analytics.tool_description()
+        )
+        
+        # Obter ferramentas do toolkit SQL e adicionar a calculadora e a análise de manutenção;
+        # a sql_db_query do toolkit é trocada por uma que resume resultados grandes
+        from api.services.observation_manager import build_query_tool
+        
+        sql_tools = [tool for tool in self.toolkit.get_tools() if tool.name != "sql_db_query"]
+        rewrite = self.partition_pruner.rewrite if self.partition_pruner else None
+        self.tools = [build_query_tool(self.db, rewrite)] + sql_tools + [math_tool, maintenance_tool]
+        
+        # Catálogo de estatísticas: resposta imediata, sem varrer a Telemetria
+        if self.statistics_catalog and self.statistics_catalog.metadata:
+            self.tools.append(Tool(
+                name=STATISTICS_TOOL_NAME,
+                func=self.statistics_catalog.run,
+                description=self.statistics_catalog.tool_description()
+            ))
+        
+        # Criar a LLMChain com o prompt customizado
+        llm_chain = LLMChain(llm=llm, prompt=agent_prompt)
+        
+        # Criar o agente com a LLMChain; o scratchpad é compactado acima do orçamento de tokens
+        from api.services.observation_manager import build_compacting_agent_class
+        
+        agent = build_compacting_agent_class()(llm_chain=llm_chain, tools=self.tools)
+        
+        # Executor final do agente
+        return AgentExecutor.from_agent_and_tools(
+            agent=agent,
+            tools=self.tools,
+            verbose=True,
+            handle_parsing_errors=True,
+            max_iterations=max_iterations
+        )
+    
+    def query(self, query_text: str, similarity_threshold: Optional[float] = None,
+              session_id: Optional[str] = None, mode: Optional[str] = None,
+              approximate: bool = False) -> Dict[str, Any]:
+        """Executa uma consulta, coalescendo perguntas idênticas que já estão em andamento"""
+        if similarity_threshold is None:
+            similarity_threshold = settings.similarity_threshold
+        mode = mode or settings.default_query_mode
+        
+        # Perguntas de uma sessão dependem do contexto dela e não são coalescidas com outras
+        key = (normalize_question(query_text), similarity_threshold, session_id, mode, approximate)
+        metrics.inc("rag_queries_total")
+        
+        def _run():
+            # As conexões do agente só leem as tabelas desta sessão
+            with session_store.scope(session_id):
+                return self._run_query(query_text, similarity_threshold, session_id, mode, approximate)
+        
+        result, shared = self._single_flight.do(key, _run)
+        
+        if shared:
+            metrics.inc("rag_queries_coalesced_total")
+            print(f"🔗 Consulta coalescida com execução em andamento: {query_text}")
+        
+        # Cada chamador recebe sua própria cópia, com a pergunta como foi enviada
+        response = dict(result)
+        response["query"] = query_text if isinstance(query_text, str) else response["query"]
+        response["coalesced"] = shared
+        return response
+    
+    def _run_query(self, query_text: str, similarity_threshold: float,
+                   session_id: Optional[str] = None, mode: str = "agent",
+                   approximate: bool = False) -> Dict[str, Any]:
         """Executa uma consulta usando o agente RAG seguindo o fluxo original"""
         start_time = time.time()
         
@@ -417,41 +877,388 @@ Pergunta: {input}
             if not isinstance(query_text, str):
                 query_text = str(query_text) if query_text is not None else ""
             
+            # Inicializar sob demanda caso o aquecimento ainda não tenha terminado
+            self.ensure_initialized()
+            
             if not self.agent_executor:
                 raise RuntimeError("Agente não foi inicializado corretamente")
             
-            # Executar a consulta usando o agente (como no original)
-            response = self.agent_executor.invoke({
-                "input": query_text,
-                "agent_scratchpad": ""
-            })
+            # Em uma sessão, a pergunta leva o contexto do turno anterior
+            agent_input = query_text
+            if session_id:
+                context = session_store.build_context(session_id)
+                if context:
+                    agent_input = f"{query_text}\n{context}"
             
-            execution_time = time.time() - start_time
+            # Resposta aproximada: a consulta gerada é executada localmente sobre a amostra,
+            # o que só acontece no modo rápido
+            approximation = {} if approximate else None
+            if approximate:
+                mode = "fast"
             
-            # Extrair informações da resposta
-            output = response.get("output", "")
+            # Modos plano e rápido: o agente ReAct só é usado se eles não resolverem a pergunta
+            counter = build_llm_call_counter()
+            output = None
+            # Colunas e linhas do resultado final, quando os modos plano e rápido já o produziram
+            produced: Dict[str, Any] = {}
+            if mode in ("plan", "fast"):
+                try:
+                    if mode == "plan":
+                        output = self._run_plan(agent_input, [counter], produced)
+                        # O plano usa o último nível da cascata (self.plan_llm)
+                        level = len(settings.model_cascade) - 1
+                    else:
+                        output = self._run_fast(agent_input, [counter], approximation, produced, similarity_threshold)
+                        level = 0
+                    model = settings.model_cascade[level].model
+                except CircuitOpenError:
+                    raise
+                except Exception as e:
+                    metrics.inc("rag_query_fallbacks_total", mode=mode)
+                    print(f"⚠️ Modo {mode} falhou, usando o agente: {e}")
+                    mode = "agent"
+                    produced.clear()
             
-            # Garantir que output seja uma string válida
-            if not isinstance(output, str):
-                output = str(output) if output is not None else ""
+            if output is None:
+                output, model, level = self._run_agent_cascade(agent_input, [counter], similarity_threshold)
+            
+            execution_time = time.time() - start_time
+            metrics.observe("rag_query_duration_seconds", execution_time, mode=mode)
+            metrics.observe("rag_llm_calls", counter.calls, mode=mode)
             
             # Tentar extrair a consulta SQL e resultado
             sql_query, result, justification = self._parse_agent_response(output)
             
-            return {
+            # Guardar o resultado do turno como tabela da sessão para as próximas perguntas
+            result_table = None
+            if session_id:
+                turn = session_store.record_turn(
+                    session_id, query_text, self._extract_sql_block(output) or None,
+                    self._turn_result(output, produced)
+                )
+                result_table = turn.get("table")
+            
+            response = {
                 "query": query_text,
                 "sql_query": sql_query,
                 "result": result,
                 "justification": justification,
                 "execution_time": execution_time,
                 "timestamp": datetime.now().isoformat(),
-                "raw_response": output
+                "raw_response": output,
+                "model": model,
+                "cascade_level": level,
+                "mode": mode,
+                "llm_calls": counter.calls,
+                "session_id": session_id,
+                "result_table": result_table,
+                "approximate": bool(approximation),
+                "approximation": approximation or None,
+                "degraded": False,
+                "degraded_source": None
             }
+            # Respostas de sessão dependem do contexto da conversa e não são reaproveitadas
+            if not session_id:
+                self.answer_cache.put(normalize_question(query_text), response)
+            return response
             
+        except CircuitOpenError as e:
+            return self._run_degraded(query_text, session_id, start_time, e, similarity_threshold)
         except Exception as e:
+            metrics.inc("rag_query_errors_total")
             print(f"❌ Erro na execução da consulta: {str(e)}")
             raise RuntimeError(f"Erro na execução da consulta: {str(e)}")
     
+    def _run_agent_cascade(self, agent_input: str, callbacks: Optional[list] = None,
+                           similarity_threshold: Optional[float] = None) -> tuple:
+        """Executa o agente ReAct na cascata de modelos; retorna (saída, modelo, nível)"""
+        # O system prompt é reenviado a cada iteração do agente: quanto menor, menor
+        # o custo e o tempo até o primeiro token de todas as chamadas
+        system_prompt = self._build_system_prompt(agent_input, similarity_threshold=similarity_threshold)
+        metrics.observe("rag_prompt_tokens", estimate_tokens(system_prompt), variant=settings.prompt_variant)
+        
+        # Executar a consulta na cascata: modelos mais leves primeiro, escalando
+        # para o próximo nível quando a resposta falha nas verificações locais
+        for level, (tier, executor) in enumerate(self.agent_executors):
+            is_last_level = level == len(self.agent_executors) - 1
+            
+            try:
+                # Executar a consulta usando o agente (como no original)
+                response = executor.invoke({
+                    "system_prompt": system_prompt,
+                    "input": agent_input,
+                    "agent_scratchpad": ""
+                }, config={"callbacks": callbacks})
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if is_last_level:
+                    raise
+                failure = "error"
+                print(f"⚠️ Erro no nível {tier.model} da cascata: {e}")
+            else:
+                # Extrair informações da resposta
+                output = response.get("output", "")
+                
+                # Garantir que output seja uma string válida
+                if not isinstance(output, str):
+                    output = str(output) if output is not None else ""
+                
+                failure = None if is_last_level else self._check_answer(output)
+            
+            if failure is None:
+                metrics.inc("rag_cascade_resolved_total", model=tier.model)
+                break
+            
+            metrics.inc("rag_cascade_escalations_total", model=tier.model, reason=failure)
+            print(f"🪜 Escalando de {tier.model} para o próximo nível da cascata (motivo: {failure})")
+        
+        return output, tier.model, level
+    
+    def _run_degraded(self, query_text: str, session_id: Optional[str], start_time: float,
+                      error: CircuitOpenError, similarity_threshold: Optional[float] = None) -> Dict[str, Any]:
+        """Modo degradado, sem o LLM: a última resposta da mesma pergunta (ou de uma similar) ou
+        a consulta validada mais parecida, executada localmente; sem nenhuma, falha rápido"""
+        question = normalize_question(query_text)
+        threshold = similarity_threshold if similarity_threshold is not None else settings.similarity_threshold
+        
+        cached = dict(self.answer_cache.items())
+        if question in cached:
+            source, answer = "answer_cache", cached[question]
+        else:
+            scored = [(simple_similarity(other, question), other) for other in cached]
+            score, other = max(scored, default=(0.0, None), key=lambda item: item[0])
+            source, answer = ("similar_answer", cached[other]) if score > threshold else (None, None)
+        
+        if answer is not None:
+            note = f"Resposta de {answer['timestamp'][:16].replace('T', ' ')} para a pergunta \"{answer['query']}\""
+            response = dict(answer, query=query_text)
+        else:
+            answer = self._run_validated_query(query_text, question, threshold)
+            if answer is None:
+                metrics.inc("rag_degraded_answers_total", source="none")
+                raise error
+            source, (pedido, response) = "validated_query", answer
+            note = f"Consulta validada do pedido \"{pedido}\", executada sem o LLM"
+        
+        metrics.inc("rag_degraded_answers_total", source=source)
+        print(f"🛟 Resposta em modo degradado ({source}): {query_text}")
+        response.update({
+            "justification": f"Resposta em modo degradado (LLM indisponível). {note}.\n\n{response['justification']}",
+            "execution_time": time.time() - start_time,
+            "llm_calls": 0,
+            "session_id": session_id,
+            "result_table": None,
+            "degraded": True,
+            "degraded_source": source
+        })
+        return response
+    
+    def _run_validated_query(self, query_text: str, question: str, threshold: float) -> Optional[tuple]:
+        """Executa a consulta validada do pedido mais parecido; retorna (pedido, resposta) ou None"""
+        from api.services.fast_query import format_answer
+        
+        scored = [
+            (simple_similarity(normalize_question(row["Pedido"]), question), row) for row in self.consultas_validadas
+        ]
+        score, row = max(scored, default=(0.0, None), key=lambda item: item[0])
+        if row is None or score <= threshold:
+            return None
+        try:
+            columns, rows = self.read_pool.execute(row["Consulta"])
+        except Exception as e:
+            print(f"⚠️ Consulta validada não executa: {e}")
+            return None
+        
+        output = format_answer(row["Consulta"], columns, rows, f"Consulta validada para: {row['Pedido']}")
+        sql_query, result, justification = self._parse_agent_response(output)
+        return row["Pedido"], {
+            "query": query_text,
+            "sql_query": sql_query,
+            "result": result,
+            "justification": justification,
+            "timestamp": datetime.now().isoformat(),
+            "raw_response": output,
+            "model": None,
+            "cascade_level": None,
+            "mode": None,
+            "approximate": False,
+            "approximation": None
+        }
+    
+    def _turn_result(self, output: str, produced: Dict[str, Any]) -> Optional[tuple]:
+        """Resultado (colunas, linhas) do turno para a tabela da sessão
+        
+        Os modos plano e rápido já têm as linhas; no agente, o SQL final é executado pelo
+        pool (com a poda de partições), limitado às linhas que a tabela da sessão guarda.
+        """
+        if produced:
+            return produced["columns"], produced["rows"]
+        sql = self._extract_sql_block(output)
+        if not sql:
+            return None
+        try:
+            return self.read_pool.execute(sql, max_rows=session_store.max_rows_per_table)
+        except Exception as e:
+            print(f"⚠️ Aviso: Não foi possível obter o resultado do turno da sessão: {e}")
+            return None
+    
+    def _run_plan(self, agent_input: str, callbacks: Optional[list] = None,
+                  produced: Optional[Dict[str, Any]] = None) -> str:
+        """Modo plano: uma chamada planeja os passos SQL, o servidor os executa (independentes em
+        paralelo) e uma segunda chamada redige a resposta a partir dos resultados
+        
+        Com `produced` (um dicionário), ele recebe as colunas e linhas do passo final.
+        """
+        from api.services.plan_executor import (
+            build_compose_prompt, build_plan_prompt, execute_plan, parse_plan
+        )
+        
+        schema = build_schema_section(agent_input, self.statistics_catalog, self.schema_catalog)
+        plan_text = self.plan_llm.invoke(
+            build_plan_prompt(agent_input, schema, settings.plan_max_steps), config={"callbacks": callbacks}
+        ).content
+        plan = parse_plan(plan_text, settings.plan_max_steps)
+        
+        # Pedido recusado pelo planejador (fora do escopo ou que modifica dados)
+        if "error" in plan:
+            metrics.inc("rag_plan_executions_total", status="refused")
+            return f"**ERRO:** {plan['error']}"
+        
+        steps = plan["steps"]
+        metrics.observe("rag_plan_steps", len(steps))
+        execute_plan(steps, self.read_pool, settings.plan_max_parallel_steps)
+        
+        final = next(step for step in steps if step.step_id == plan["final"])
+        if final.error:
+            metrics.inc("rag_plan_executions_total", status="error")
+            raise RuntimeError(f"Passo final {final.step_id} falhou: {final.error}")
+        
+        if produced is not None:
+            produced.update(columns=final.columns, rows=final.rows)
+        print(f"🗺️ Plano executado: {len(steps)} passos")
+        composed = self.plan_llm.invoke(build_compose_prompt(agent_input, steps), config={"callbacks": callbacks}).content
+        metrics.inc("rag_plan_executions_total", status="ok")
+        return f"### Consulta:\n```sql\n{final.resolved_sql}\n```\n\n{composed.strip()}"
+    
+    def _run_fast(self, agent_input: str, callbacks: Optional[list] = None,
+                  approximation: Optional[Dict[str, Any]] = None,
+                  produced: Optional[Dict[str, Any]] = None,
+                  similarity_threshold: Optional[float] = None) -> str:
+        """Modo rápido: uma chamada gera a consulta, que é validada, executada e formatada localmente
+        
+        Com `approximation` (um dicionário), consultas de agregação são estimadas na amostra
+        estratificada e o dicionário é preenchido com os detalhes da estimativa. Com `produced`,
+        ele recebe as colunas e linhas do resultado.
+        """
+        from api.services.fast_query import (
+            FastQueryError, build_fast_prompt, format_answer, parse_fast_response
+        )
+        
+        schema = build_schema_section(agent_input, self.statistics_catalog, self.schema_catalog)
+        prompt = build_fast_prompt(agent_input, schema, self._get_similar_shots(agent_input, similarity_threshold))
+        response = parse_fast_response(self.fast_llm.invoke(prompt, config={"callbacks": callbacks}).content)
+        
+        # Pedido recusado (fora do escopo ou que modifica dados)
+        if "error" in response:
+            metrics.inc("rag_fast_executions_total", status="refused")
+            return f"**ERRO:** {response['error']}"
+        if "agent" in response:
+            metrics.inc("rag_fast_executions_total", status="agent")
+            raise FastQueryError(f"Pergunta exige o agente: {response['agent']}")
+        
+        justification = response["justification"]
+        estimate = self._estimate(response["sql"]) if approximation is not None else None
+        if estimate is not None:
+            columns, rows = estimate["columns"], estimate["rows"]
+            approximation.update({
+                "confidence": estimate["confidence"],
+                "sample_rate": estimate["sample_rate"],
+                "sample_rows": estimate["sample_rows"],
+                "table_rows": estimate["table_rows"],
+                "intervals": estimate["intervals"][:settings.fast_max_answer_rows],
+            })
+            justification += (
+                f"\n\nResultado aproximado: estimado em uma amostra estratificada por Chassi/Categoria/Serie "
+                f"({estimate['sample_rows']} de {estimate['table_rows']} linhas da Telemetria); as colunas ± "
+                f"trazem a margem de erro do intervalo de confiança de {estimate['confidence']:.0%}."
+            )
+        else:
+            try:
+                columns, rows = self.read_pool.execute(response["sql"])
+            except Exception as e:
+                metrics.inc("rag_fast_executions_total", status="error")
+                raise FastQueryError(f"Consulta não executa: {e}")
+        
+        # Resultado vazio é inesperado, como na cascata: o agente investiga
+        if not rows:
+            metrics.inc("rag_fast_executions_total", status="empty")
+            raise FastQueryError("Consulta sem resultado")
+        
+        metrics.inc("rag_fast_executions_total", status="ok")
+        if produced is not None:
+            produced.update(columns=columns, rows=rows)
+        return format_answer(response["sql"], columns, rows, justification)
+    
+    def _estimate(self, sql: str) -> Optional[Dict[str, Any]]:
+        """Estimativa da consulta na amostra estratificada, ou None se ela deve rodar exata"""
+        import sqlite3
+        from api.services.approximate_query import ApproximateQueryError
+        
+        sample = self._get_approximate_sample()
+        if sample is None:
+            metrics.inc("rag_approximate_queries_total", status="unavailable")
+            return None
+        try:
+            with self.read_pool.connection() as conn:
+                estimate = sample.estimate(conn, sql, settings.approximate_confidence)
+        except (ApproximateQueryError, sqlite3.Error) as e:
+            metrics.inc("rag_approximate_queries_total", status="exact")
+            print(f"🎯 Consulta executada de forma exata: {e}")
+            return None
+        
+        metrics.inc("rag_approximate_queries_total", status="approximate")
+        return estimate
+    
+    def _check_answer(self, output: str) -> Optional[str]:
+        """Verificações locais da resposta de um nível da cascata; retorna o motivo da falha ou None"""
+        # Agente interrompido pelo orçamento de iterações ou sem resposta final
+        if not output.strip() or "Agent stopped due to iteration limit" in output:
+            return "parse"
+        
+        # Recusas explícitas (pedido fora do escopo ou de modificação) são respostas válidas
+        if "**ERRO:**" in output:
+            return None
+        
+        # Respostas da análise de manutenção não têm bloco sql
+        sql = self._extract_sql_block(output)
+        if not sql and MAINTENANCE_TOOL_NAME not in output:
+            return "parse"
+        
+        # A consulta precisa compilar no banco (EXPLAIN não executa a consulta); as conexões
+        # do pool têm as tabelas das sessões anexadas, usadas pelas perguntas de continuação
+        if sql:
+            try:
+                with self.read_pool.connection() as conn:
+                    conn.execute(f"EXPLAIN {sql}")
+            except Exception as e:
+                print(f"⚠️ Consulta da resposta não executa: {e}")
+                return "sql"
+        
+        # Resultado vazio é inesperado: as perguntas são sobre dados existentes
+        if "### Resposta:" not in output:
+            return "parse"
+        resposta = output.split("### Resposta:", 1)[1].split("### Justificativa:", 1)[0]
+        if resposta.strip("`[]() \n").lower() in ("", "none", "null", "nenhum resultado"):
+            return "empty"
+        
+        return None
+    
+    def _extract_sql_block(self, output: str) -> str:
+        """Extrai a consulta completa do bloco ```sql da resposta final"""
+        match = re.search(r"```sql\s*(.*?)```", output, re.DOTALL | re.IGNORECASE)
+        return match.group(1).strip().rstrip(";") if match else ""
+    
     def _parse_agent_response(self, output: str) -> tuple:
         """Extrai informações estruturadas da resposta do agente"""
         try:
@@ -564,17 +1371,30 @@ Pergunta: {input}
             db_connected = self.db is not None
             
             # Testar configuração do Gemini
-            gemini_configured = bool(settings.google_api_key)
+            gemini_configured = bool(settings.google_api_keys)
             
             # Testar se o agente foi inicializado
             agent_initialized = self.agent_executor is not None
             
+            # O circuito reflete se o Gemini está respondendo, não só se está configurado
+            llm_circuit = llm_breaker.status()
+            
+            if db_connected and gemini_configured and agent_initialized:
+                status = "healthy" if llm_circuit["state"] in ("closed", "disabled") else "degraded"
+            elif self.init_error is None and gemini_configured:
+                # Aquecimento ainda em andamento (ou não iniciado)
+                status = "starting"
+            else:
+                status = "unhealthy"
+            
             return {
-                "status": "healthy" if db_connected and gemini_configured and agent_initialized else "unhealthy",
+                "status": status,
                 "database_connected": db_connected,
                 "gemini_configured": gemini_configured,
                 "agent_initialized": agent_initialized,
-                "database_path": str(settings.database_path)
+                "llm_circuit": llm_circuit,
+                "database": self.name,
+                "database_path": self.database_path
             }
             
         except Exception as e:
@@ -585,6 +1405,40 @@ Pergunta: {input}
                 "gemini_configured": False,
                 "agent_initialized": False
             }
+    
+    def memory_estimate_bytes(self) -> int:
+        """Memória estimada da instância: overhead fixo (agente, toolkit, clientes) e matrizes carregadas"""
+        estimate = int(settings.service_pool_instance_overhead_mb * 1024 * 1024)
+        if self.maintenance_analytics is not None:
+            estimate += self.maintenance_analytics.memory_bytes
+        return estimate
+    
+    def close(self) -> None:
+        """Libera as conexões e as threads dos pools de LLM da instância (chamado quando o pool a descarta)"""
+        for llm in self.llms.values():
+            pool = getattr(llm, "pool", None)
+            if pool is not None:
+                pool.close()
+        if self.read_pool is not None:
+            self.read_pool.close()
+        if self.db is not None:
+            self.db._engine.dispose()
+    
+    def get_readiness(self) -> Dict[str, Any]:
+        """Retorna se o serviço já está pronto para atender consultas"""
+        if self.is_ready:
+            status = "ready"
+        elif self.init_error is not None:
+            status = "failed"
+        else:
+            status = "warming_up"
+        
+        return {
+            "ready": self.is_ready,
+            "status": status,
+            "error": self.init_error,
+            "init_duration": self.init_duration
+        }
 
-# Instância global do serviço
+# Instância global do serviço (construção barata; o agente é montado em background)
 rag_service = RAGService() 
\ No newline at end of file
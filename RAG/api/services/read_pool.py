@@ -0,0 +1,118 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from api.services.metrics import metrics
+
+# PRAGMAs de leitura do esquema, usados pela reflexão do SQLAlchemy e pelo agente
+SCHEMA_PRAGMAS = {
+    "table_info", "table_xinfo", "table_list", "index_list", "index_info", "index_xinfo",
+    "foreign_key_list", "database_list", "collation_list", "function_list",
+}
+
+# PRAGMAs que alteram o estado quando recebem um valor: liberados apenas na forma de consulta
+QUERY_PRAGMAS = {
+    "read_uncommitted", "page_size", "page_count", "data_version", "schema_version",
+    "user_version", "journal_mode", "query_only",
+}
+
+_READ_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_TRANSACTION}
+if hasattr(sqlite3, "SQLITE_RECURSIVE"):
+    _READ_ACTIONS.add(sqlite3.SQLITE_RECURSIVE)
+
+def read_only_authorizer(action: int, arg1: Optional[str], arg2: Optional[str],
+                         database: Optional[str], source: Optional[str]) -> int:
+    """Autorizador do SQLite que só permite leitura em todos os bancos da conexão
+
+    `mode=ro` protege apenas o arquivo principal; o banco das sessões, anexado às
+    mesmas conexões, continua gravável. Checar o prefixo do SQL (SELECT/WITH) não
+    basta: `WITH q AS (SELECT 1) DELETE FROM ...` é uma escrita. O autorizador é
+    consultado pelo SQLite na compilação de cada comando e recusa qualquer escrita,
+    ATTACH/DETACH e PRAGMAs que alteram estado.
+    """
+    if action in _READ_ACTIONS:
+        return sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_PRAGMA:
+        name = (arg1 or "").lower()
+        if name in SCHEMA_PRAGMAS or (name in QUERY_PRAGMAS and arg2 is None):
+            return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+def make_read_only(connection: sqlite3.Connection,
+                   authorizer: Callable[..., int] = read_only_authorizer) -> sqlite3.Connection:
+    """Instala o autorizador somente leitura na conexão (depois de ATTACHs necessários)"""
+    connection.set_authorizer(authorizer)
+    return connection
+
+class ReadConnectionPool:
+    """Pool de conexões de leitura ao banco, para consultas executadas em paralelo
+
+    Conexões sqlite3 não podem ser usadas por duas threads ao mesmo tempo; cada
+    consulta empresta uma conexão exclusiva e a devolve ao terminar. As conexões
+    são criadas sob demanda até `size` e reaproveitadas depois. `rewrite`, se
+    informado, é aplicado a cada consulta antes da execução (poda de partições).
+    Cada conexão criada recebe o autorizador somente leitura (`authorizer`): as
+    consultas do pool vêm do LLM (modos plano e rápido).
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], size: int,
+                 rewrite: Optional[Callable[[str], str]] = None, timeout: float = 30.0,
+                 authorizer: Callable[..., int] = read_only_authorizer):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self._authorizer = authorizer
+        self._rewrite = rewrite
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Empresta uma conexão do pool (espera até `timeout` se todas estiverem em uso)"""
+        conn = self._acquire()
+        metrics.add_gauge("rag_read_pool_in_use", 1)
+        try:
+            yield conn
+        finally:
+            metrics.add_gauge("rag_read_pool_in_use", -1)
+            self._idle.put(conn)
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return make_read_only(self._connect(), self._authorizer)
+                except Exception:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            metrics.inc("rag_read_pool_timeouts_total")
+            raise RuntimeError(
+                f"Nenhuma conexão de leitura livre após {self.timeout:g}s (READ_POOL_SIZE={self.size})"
+            )
+
+    def execute(self, sql: str, max_rows: Optional[int] = None) -> Tuple[List[str], List[tuple]]:
+        """Executa uma consulta e retorna (colunas, linhas), no máximo `max_rows` linhas se informado"""
+        if self._rewrite is not None:
+            sql = self._rewrite(sql)
+        with self.connection() as conn:
+            cursor = conn.execute(sql)
+            columns = [c[0] for c in cursor.description] if cursor.description else []
+            return columns, cursor.fetchall() if max_rows is None else cursor.fetchmany(max_rows)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
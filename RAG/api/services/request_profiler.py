@@ -0,0 +1,183 @@
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from config.settings import settings
+from api.services.metrics import metrics
+
+# (função, arquivo, linha da definição), da raiz da pilha até o frame em execução
+Frame = Tuple[str, str, int]
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def _short_path(filename: str) -> str:
+    """Caminho legível do arquivo: relativo ao projeto ou a partir do pacote instalado"""
+    if filename.startswith(_PROJECT_ROOT + os.sep):
+        return os.path.relpath(filename, _PROJECT_ROOT)
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+class Profile:
+    """Pilhas amostradas de uma requisição, exportáveis em formato colapsado ou speedscope"""
+
+    def __init__(self, request_id: str, name: str, stacks: Counter, interval: float,
+                 duration: float, metadata: Optional[Dict[str, Any]] = None):
+        self.request_id = request_id
+        self.name = name
+        self.stacks = stacks
+        self.interval = interval
+        self.duration = duration
+        self.metadata = metadata or {}
+        self.created_at = time.time()
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    @staticmethod
+    def _label(frame: Frame) -> str:
+        function, filename, line = frame
+        return f"{function} ({_short_path(filename)}:{line})"
+
+    def to_collapsed(self) -> str:
+        """Uma linha por pilha distinta, `raiz;...;folha contagem` (flamegraph.pl, speedscope)"""
+        lines = [
+            ";".join(self._label(frame).replace(";", ",") for frame in stack) + f" {count}"
+            for stack, count in self.stacks.most_common()
+        ]
+        return "\n".join(lines) + "\n"
+
+    def to_speedscope(self) -> Dict[str, Any]:
+        """Perfil no formato do speedscope (https://www.speedscope.app), pesos em milissegundos"""
+        frames: List[Dict[str, Any]] = []
+        index: Dict[Frame, int] = {}
+        samples, weights = [], []
+        # O peso de cada amostra é o tempo de parede medido, não o intervalo nominal
+        weight = self.duration * 1000 / self.samples if self.samples else 0.0
+        for stack, count in self.stacks.most_common():
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": _short_path(frame[1]), "line": frame[2]})
+            samples.append([index[frame] for frame in stack])
+            weights.append(count * weight)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "visagio-rag",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": self.duration * 1000,
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+    def to_summary(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "duration_seconds": self.duration,
+            "created_at": self.created_at,
+            **self.metadata,
+        }
+
+class SamplingProfiler:
+    """Profiler por amostragem de pilhas das threads de uma requisição
+
+    Uma thread auxiliar lê `sys._current_frames()` a cada `interval` segundos e conta a
+    pilha das threads registradas com `run` (a thread do threadpool que executa a
+    consulta). As amostras são de tempo de parede: a espera pela resposta do Gemini
+    aparece como a pilha que aguarda o pool de LLM, ao lado do tempo de SQL, de
+    importações e do parsing da resposta. Nada disso existe quando a requisição não
+    pede profiling.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._threads: Set[int] = set()
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self.duration = 0.0
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.duration = time.perf_counter() - self._started
+        return self._stacks
+
+    def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Executa `fn` na thread atual, que passa a ser amostrada enquanto ele roda"""
+        ident = threading.get_ident()
+        self._threads.add(ident)
+        try:
+            return fn(*args)
+        finally:
+            self._threads.discard(ident)
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in tuple(self._threads):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                if stack:
+                    self._stacks[tuple(reversed(stack))] += 1
+            del frames
+
+class ProfileStore:
+    """Perfis recentes por id da requisição (LRU limitado por número de perfis)"""
+
+    def __init__(self, max_profiles: int):
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+        self._profiles: "OrderedDict[str, Profile]" = OrderedDict()
+
+    def put(self, profile: Profile) -> None:
+        with self._lock:
+            self._profiles[profile.request_id] = profile
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+        metrics.inc("rag_profiles_total")
+
+    def get(self, request_id: str) -> Optional[Profile]:
+        with self._lock:
+            return self._profiles.get(request_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [profile.to_summary() for profile in reversed(self._profiles.values())]
+
+def profiling_authorized(token: Optional[str]) -> bool:
+    """O profiling só é liberado com PROFILING_ADMIN_TOKEN configurado e o mesmo token na requisição"""
+    return bool(settings.profiling_admin_token) and token is not None and hmac.compare_digest(
+        token.encode(), settings.profiling_admin_token.encode()
+    )
+
+# Instância global dos perfis guardados
+profile_store = ProfileStore(max_profiles=settings.profiling_max_profiles)
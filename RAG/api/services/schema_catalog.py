@@ -0,0 +1,232 @@
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+from api.services.approximate_query import SAMPLE_TABLES
+from api.services.metrics import metrics
+from api.services.prompt_builder import CATEGORIES
+from api.services.statistics_catalog import CATALOG_TABLES
+from api.utils.storage_layout import INTERNAL_TABLES, internal_tables_present
+
+# Descrições das tabelas e colunas visíveis ao agente (tabelas novas aparecem sem descrição)
+TABLE_DESCRIPTIONS = {
+    "Chassis": "Tabela relacionando dados de clientes e seus contratos de locação de veículos",
+    "Telemetria": "Tabela contendo dados diários dos veículos obtidos por sensores",
+}
+COLUMN_DESCRIPTIONS = {
+    "Chassis": {
+        "Chassi": "ID do chassi, que identifica uma máquina",
+        "Contrato": "ID do contrato, que pode incluir vários chassis",
+        "Cliente": "ID do cliente, que pode estar envolvido em vários contratos e ter vários chassis",
+        "Modelo": "ID do modelo, que pode categorizar vários chassis",
+    },
+    "Telemetria": {
+        "Chassi": "ID do chassi",
+        "UnidadeMedida": "Unidade de medida do valor descrito no campo Valor ('l' para litros ou 'hr' para horas)",
+        "Categoria": "Nome da categoria da informação sensoriada",
+        "Data": "Data e hora de captação do dado",
+        "Serie": "Nome da subcategoria do tipo de dado sensoriado pelo sensor",
+        "Valor": "Valor capturado pelo sensor, medido na UnidadeMedida, sobre a informação descrita pela Categoria e Serie",
+    },
+}
+
+# Resumo de cada tabela no prompt compacto
+TABLE_NOTES = {
+    "Chassis": "um contrato/cliente tem vários chassis",
+    "Telemetria": "dados diários dos sensores; Valor medido em UnidadeMedida",
+}
+
+# Esquema documentado: tipos das colunas de views (que o SQLite não informa) e esquema
+# usado apenas quando o banco não pode ser lido (ex: prompt montado sem banco)
+DOCUMENTED_TABLES = {
+    "Chassis": {
+        "columns": [("Chassi", "INTEGER"), ("Contrato", "INTEGER"), ("Cliente", "INTEGER"), ("Modelo", "INTEGER")],
+        "primary_key": ["Chassi"],
+    },
+    "Telemetria": {
+        "columns": [("Chassi", "INTEGER"), ("UnidadeMedida", "TEXT"), ("Categoria", "TEXT"),
+                    ("Data", "TIMESTAMP"), ("Serie", "TEXT"), ("Valor", "REAL")],
+        "primary_key": ["Chassi", "Categoria", "Serie", "Data"],
+    },
+}
+
+SCHEMA_NOTE = "Este esquema representa dados de telemetria de uma empresa locadora de maquinário agrícola."
+
+class SchemaCatalog:
+    """Esquema do banco lido do próprio SQLite: tabelas, colunas, índices e valores de Categoria/Serie
+
+    É montado uma vez por instância do serviço (cada versão do banco, já que a
+    recarga cria uma nova instância) e é a única fonte do esquema: serve o
+    endpoint /database/schema (com ETag) e a seção de esquema dos prompts.
+    """
+
+    def __init__(self, tables: Dict[str, Dict[str, Any]], categories: Dict[str, Dict[str, Any]],
+                 source: str = "introspected"):
+        # Tabelas documentadas primeiro, as demais (ex: rollups) em ordem alfabética
+        self.tables = {name: tables[name] for name in sorted(tables, key=lambda t: (t not in DOCUMENTED_TABLES, t))}
+        self.categories = categories
+        self.source = source
+        # Versão do esquema: muda sempre que algo do conteúdo servido muda
+        canonical = json.dumps({"tables": tables, "categories": categories}, sort_keys=True, ensure_ascii=False)
+        self.etag = f'"{hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]}"'
+
+    @classmethod
+    def documented(cls) -> "SchemaCatalog":
+        """Esquema documentado (sem leitura do banco)"""
+        tables = {
+            name: {
+                "type": "table",
+                "columns": [{"name": column, "type": kind, "not_null": False} for column, kind in table["columns"]],
+                "primary_key": table["primary_key"],
+                "indexes": [],
+            }
+            for name, table in DOCUMENTED_TABLES.items()
+        }
+        categories = {
+            name: {"unit": category["unit"], "series": list(category["series"])}
+            for name, category in CATEGORIES.items()
+        }
+        return cls(tables, categories, source="documented")
+
+    @classmethod
+    def introspect(cls, database_path: str, statistics_catalog: Any = None) -> "SchemaCatalog":
+        """Lê o esquema do banco; os pares Categoria/Serie vêm do catálogo de estatísticas, se carregado"""
+        start_time = time.time()
+        conn = sqlite3.connect(f"file:{quote(str(database_path))}?mode=ro", uri=True)
+        try:
+            hidden = set(internal_tables_present(conn, INTERNAL_TABLES + CATALOG_TABLES + SAMPLE_TABLES))
+            objects = conn.execute(
+                "SELECT name, type FROM sqlite_master WHERE type IN ('table', 'view') "
+                "AND name NOT LIKE 'sqlite_%' ORDER BY name"
+            ).fetchall()
+
+            tables = {}
+            for name, kind in objects:
+                if name in hidden:
+                    continue
+                columns = conn.execute(f'PRAGMA table_info("{name}")').fetchall()
+                documented = dict(DOCUMENTED_TABLES.get(name, {}).get("columns", []))
+                indexes = []
+                for _, index, unique, origin, _ in conn.execute(f'PRAGMA index_list("{name}")').fetchall():
+                    index_columns = [row[2] for row in conn.execute(f'PRAGMA index_info("{index}")').fetchall()]
+                    indexes.append({"name": index, "columns": index_columns, "unique": bool(unique), "origin": origin})
+                tables[name] = {
+                    "type": kind,
+                    "columns": [
+                        {"name": c[1], "type": c[2] or documented.get(c[1], ""), "not_null": bool(c[3])}
+                        for c in columns
+                    ],
+                    "primary_key": [c[1] for c in sorted(columns, key=lambda c: c[5]) if c[5]],
+                    "indexes": indexes,
+                }
+
+            if statistics_catalog is not None and statistics_catalog.series:
+                groups = [(row["Categoria"], row["Serie"], row["UnidadeMedida"]) for row in statistics_catalog.series]
+            elif "Telemetria" in tables:
+                groups = conn.execute(
+                    "SELECT DISTINCT Categoria, Serie, UnidadeMedida FROM Telemetria ORDER BY Categoria, Serie"
+                ).fetchall()
+            else:
+                groups = []
+        finally:
+            conn.close()
+
+        categories: Dict[str, Dict[str, Any]] = {}
+        for categoria, serie, unidade in groups:
+            if categoria is None or serie is None:
+                continue
+            category = categories.setdefault(categoria, {"unit": unidade, "series": []})
+            if serie not in category["series"]:
+                category["series"].append(serie)
+
+        # Séries na ordem documentada (status do motor do menor ao maior uso); as novas ao final
+        for name, category in categories.items():
+            known = list(CATEGORIES.get(name, {}).get("series", {}))
+            category["series"].sort(key=lambda s: (known.index(s) if s in known else len(known), s))
+
+        catalog = cls(tables, categories)
+        duration = time.time() - start_time
+        metrics.set_gauge("rag_schema_introspection_seconds", duration)
+        print(f"🗂️ Esquema do banco lido em {duration:.2f}s ({len(tables)} tabelas, {len(categories)} categorias)")
+        return catalog
+
+    def category_names(self) -> List[str]:
+        """Categorias existentes no banco, na ordem documentada (as novas ao final)"""
+        known = list(CATEGORIES)
+        return sorted(self.categories, key=lambda c: (known.index(c) if c in known else len(known), c))
+
+    def render_tables(self, compact: bool = False) -> str:
+        """CREATE TABLE das tabelas visíveis ao agente (uma linha por tabela no formato compacto)"""
+        blocks = []
+        for name, table in self.tables.items():
+            primary_key = table["primary_key"]
+            descriptions = COLUMN_DESCRIPTIONS.get(name, {})
+            columns = []
+            for column in table["columns"]:
+                definition = f"{column['name']} {column['type']}".strip()
+                if primary_key == [column["name"]]:
+                    definition += " PRIMARY KEY"
+                columns.append((definition, descriptions.get(column["name"])))
+            if len(primary_key) > 1:
+                columns.append((f"PRIMARY KEY ({', '.join(primary_key)})", None))
+
+            if compact:
+                note = f" -- {TABLE_NOTES[name]}" if name in TABLE_NOTES else ""
+                blocks.append(f"CREATE TABLE {name} ({', '.join(d for d, _ in columns)});{note}")
+                continue
+
+            lines = [f"-- {TABLE_DESCRIPTIONS[name]}"] if name in TABLE_DESCRIPTIONS else []
+            lines.append(f"CREATE TABLE {name} (")
+            for position, (definition, description) in enumerate(columns):
+                separator = "," if position < len(columns) - 1 else ""
+                lines.append(f"  {definition}{separator}" + (f" -- {description}" if description else ""))
+            lines.append(");")
+            blocks.append("\n".join(lines))
+        return ("\n" if compact else "\n\n").join(blocks)
+
+    def render_categories(self) -> str:
+        """Categorias e séries em tópicos, com as descrições documentadas"""
+        lines = []
+        for name in self.category_names():
+            known = CATEGORIES.get(name, {})
+            lines.append(f"- {name} _[{known.get('description') or self.categories[name]['unit']}]_")
+            for serie in self.categories[name]["series"]:
+                description = known.get("series", {}).get(serie)
+                lines.append(f"  - {serie}" + (f" _[{description}]_" if description else ""))
+        return "\n".join(lines)
+
+    def to_response(self, database_path: Optional[str] = None) -> Dict[str, Any]:
+        """Formato do endpoint /database/schema"""
+        tables = {}
+        for name, table in self.tables.items():
+            descriptions = COLUMN_DESCRIPTIONS.get(name, {})
+            tables[name] = {
+                "description": TABLE_DESCRIPTIONS.get(name, ""),
+                "type": table["type"],
+                "columns": {
+                    column["name"]: {"type": column["type"], "description": descriptions.get(column["name"], "")}
+                    for column in table["columns"]
+                },
+                "primary_key": table["primary_key"],
+                "indexes": table["indexes"],
+            }
+
+        categories = {
+            name: {
+                "description": CATEGORIES.get(name, {}).get("description", ""),
+                "unit": self.categories[name]["unit"],
+                "series": self.categories[name]["series"],
+            }
+            for name in self.category_names()
+        }
+        return {
+            "database_path": database_path,
+            "version": self.etag.strip('"'),
+            "source": self.source,
+            "tables": tables,
+            "categories": categories,
+            "note": SCHEMA_NOTE,
+        }
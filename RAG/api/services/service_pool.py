@@ -0,0 +1,156 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config.settings import settings
+from api.services.metrics import metrics
+from api.services.rag_service import RAGService, rag_service
+
+class DatabaseNotFound(KeyError):
+    """Nome de banco não registrado em DATABASES"""
+
+class ServicePool:
+    """Instâncias aquecidas do serviço RAG, uma por banco registrado
+
+    Cada banco tem seu próprio serviço (conexões, toolkit, prompt do esquema,
+    catálogo e caches), construído na primeira consulta que o seleciona. As
+    instâncias ficam em um LRU limitado por número e pela memória estimada; só
+    são descartadas instâncias sem consultas em andamento, e o serviço do banco
+    padrão nunca é descartado.
+
+    Uma instância pode ser substituída (recarga do banco): consultas novas usam a
+    nova instância, enquanto as em andamento terminam na antiga, que é fechada
+    quando a última delas devolve o empréstimo.
+    """
+
+    def __init__(self, factory: Callable[[str, str], Any], default: Any,
+                 max_instances: int, max_memory_bytes: int):
+        self.factory = factory
+        self.default = default
+        self.max_instances = max_instances
+        self.max_memory_bytes = max_memory_bytes
+        self._lock = threading.Lock()
+        self._services: "OrderedDict[str, Any]" = OrderedDict([(default.name, default)])
+        # Empréstimos em andamento por instância (id) e instâncias substituídas ainda em uso
+        self._leases: Dict[int, int] = {}
+        self._retired: Dict[int, Any] = {}
+
+    def databases(self) -> List[str]:
+        return sorted(set(settings.databases) | {self.default.name})
+
+    def database_path(self, name: Optional[str] = None) -> str:
+        """Caminho do arquivo do banco, sem construir o serviço (consultas diretas ao SQLite)"""
+        name = name or self.default.name
+        if name == self.default.name:
+            return self.default.database_path
+        if name not in settings.databases:
+            raise DatabaseNotFound(f"Banco não registrado: {name}")
+        return settings.databases[name]
+
+    def loaded(self) -> List[Tuple[str, Any]]:
+        """Instâncias carregadas (nome, serviço)"""
+        with self._lock:
+            return list(self._services.items())
+
+    def _get(self, name: str) -> Any:
+        with self._lock:
+            service = self._services.get(name)
+            if service is None:
+                if name not in settings.databases:
+                    raise DatabaseNotFound(f"Banco não registrado: {name}")
+                # Construção barata: o agente é montado na primeira consulta (ensure_initialized)
+                service = self.factory(settings.databases[name], name)
+                self._services[name] = service
+                metrics.inc("rag_service_pool_builds_total", database=name)
+                print(f"🗄️ Serviço criado para o banco '{name}'")
+            self._services.move_to_end(name)
+            self._leases[id(service)] = self._leases.get(id(service), 0) + 1
+            return service
+
+    @contextmanager
+    def lease(self, name: Optional[str] = None) -> Iterator[Any]:
+        """Empresta o serviço do banco; a instância não é fechada enquanto estiver em uso"""
+        service = self._get(name or self.default.name)
+        try:
+            yield service
+        finally:
+            retired = None
+            with self._lock:
+                self._leases[id(service)] -= 1
+                if not self._leases[id(service)]:
+                    del self._leases[id(service)]
+                    retired = self._retired.pop(id(service), None)
+            if retired is not None:
+                print(f"♻️ Instância anterior do banco '{retired.name}' liberada")
+                retired.close()
+            self._evict()
+
+    def query(self, database: Optional[str], *args, **kwargs) -> Dict[str, Any]:
+        """Executa a consulta no serviço do banco selecionado"""
+        with self.lease(database) as service:
+            result = service.query(*args, **kwargs)
+        result["database"] = service.name
+        return result
+
+    def swap(self, name: str, service: Any) -> None:
+        """Substitui atomicamente a instância do banco; a antiga é fechada quando ficar ociosa"""
+        close_now = None
+        with self._lock:
+            old = self._services.get(name)
+            self._services[name] = service
+            if name == self.default.name:
+                self.default = service
+            if old is not None and old is not service:
+                if self._leases.get(id(old)):
+                    self._retired[id(old)] = old
+                else:
+                    close_now = old
+
+        if close_now is not None:
+            close_now.close()
+
+    def _evict(self) -> None:
+        """Descarta as instâncias ociosas menos usadas enquanto o pool excede os limites"""
+        evicted = []
+        with self._lock:
+            while True:
+                total = sum(service.memory_estimate_bytes() for service in self._services.values())
+                if len(self._services) <= self.max_instances and total <= self.max_memory_bytes:
+                    break
+                idle = [name for name, service in self._services.items()
+                        if name != self.default.name and not self._leases.get(id(service))]
+                if not idle:
+                    break
+                evicted.append(self._services.pop(idle[0]))
+            metrics.set_gauge("rag_service_pool_instances", len(self._services))
+            metrics.set_gauge("rag_service_pool_memory_bytes", total)
+
+        for service in evicted:
+            metrics.inc("rag_service_pool_evictions_total")
+            print(f"♻️ Serviço do banco '{service.name}' descartado do pool")
+            service.close()
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Bancos registrados e o estado das instâncias carregadas"""
+        with self._lock:
+            loaded = dict(self._services)
+            leases = dict(self._leases)
+        return [
+            {
+                "name": name,
+                "loaded": name in loaded,
+                "ready": name in loaded and loaded[name].is_ready,
+                "in_use": leases.get(id(loaded[name]), 0) if name in loaded else 0,
+                "memory_estimate_bytes": loaded[name].memory_estimate_bytes() if name in loaded else 0,
+            }
+            for name in self.databases()
+        ]
+
+# Instância global do pool; o serviço do banco padrão começa como a instância global rag_service
+service_pool = ServicePool(
+    RAGService,
+    default=rag_service,
+    max_instances=settings.service_pool_max_instances,
+    max_memory_bytes=int(settings.service_pool_max_memory_mb * 1024 * 1024),
+)
@@ -0,0 +1,245 @@
+import contextvars
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config.settings import settings
+from api.services.metrics import metrics
+from api.services.read_pool import SCHEMA_PRAGMAS, make_read_only, read_only_authorizer
+
+# Nome do schema com que o banco das sessões é anexado às conexões do agente
+SESSION_SCHEMA = "sessao"
+
+# Sessão da consulta em andamento: só as tabelas dela são legíveis pelas conexões do agente
+current_session: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("current_session", default=None)
+
+def session_authorizer(action: int, arg1: Optional[str], arg2: Optional[str],
+                       database: Optional[str], source: Optional[str]) -> int:
+    """Autorizador somente leitura que também restringe as tabelas `sessao.t_*` à sessão da consulta
+
+    As tabelas das sessões ficam no mesmo banco anexado a todas as conexões; sem esta
+    restrição, o SQL gerado para uma sessão poderia ler resultados de outra.
+    """
+    if database == SESSION_SCHEMA:
+        table = arg1 if action == sqlite3.SQLITE_READ else (
+            arg2 if action == sqlite3.SQLITE_PRAGMA and (arg1 or "").lower() in SCHEMA_PRAGMAS else None
+        )
+        if table and table.startswith("t_"):
+            owner = current_session.get()
+            if owner is None or not table.startswith(f"t_{owner}_"):
+                return sqlite3.SQLITE_DENY
+    return read_only_authorizer(action, arg1, arg2, database, source)
+
+class Session:
+    """Conversa de um analista: perguntas anteriores e os resultados materializados de cada turno"""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.turns: List[Dict[str, Any]] = []
+        self.size_bytes = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "created_at": self.created_at,
+            "last_access": self.last_access,
+            "size_bytes": self.size_bytes,
+            "turns": [
+                {k: v for k, v in turn.items() if k != "size_bytes"}
+                for turn in self.turns
+            ],
+        }
+
+class SessionNotFound(KeyError):
+    """Sessão inexistente ou expirada"""
+
+class SessionStore:
+    """Sessões de conversa cujos resultados ficam em tabelas de um SQLite em memória
+
+    O resultado final de cada turno (as linhas já produzidas pela consulta) é gravado
+    em uma tabela de um banco em memória compartilhado, anexado como `sessao` a todas
+    as conexões do agente; cada tabela só é legível durante as consultas da sua
+    sessão (`scope`). Perguntas seguintes recebem no contexto a pergunta, o SQL e o nome da
+    tabela do turno anterior, e podem consultar essa tabela pequena em vez de varrer
+    a Telemetria novamente. Sessões expiram por inatividade e, se a memória total
+    ultrapassar o limite, as menos usadas recentemente são descartadas.
+    """
+
+    def __init__(self, idle_ttl_seconds: float, max_memory_bytes: int, max_rows_per_table: int):
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_memory_bytes = max_memory_bytes
+        self.max_rows_per_table = max_rows_per_table
+        self.memory_uri = f"file:rag_sessoes_{uuid.uuid4().hex}?mode=memory&cache=shared"
+
+        self._lock = threading.RLock()
+        self._sessions: Dict[str, Session] = {}
+        # Conexão que mantém o banco em memória vivo enquanto o processo existir
+        self._holder = sqlite3.connect(self.memory_uri, uri=True, check_same_thread=False)
+
+    def attach(self, connection: Any) -> None:
+        """Anexa o banco das sessões a uma conexão sqlite3 (aberta com uri=True), que passa a ser somente leitura
+
+        O banco em memória é gravável mesmo em conexões `mode=ro`; como essas conexões
+        executam SQL do LLM, o autorizador recusa qualquer escrita depois do ATTACH.
+        """
+        connection.execute(f"ATTACH DATABASE ? AS {SESSION_SCHEMA}", (self.memory_uri,))
+        make_read_only(connection, session_authorizer)
+
+    @contextmanager
+    def scope(self, session_id: Optional[str]) -> Iterator[None]:
+        """Libera a leitura das tabelas da sessão nas conexões anexadas durante o bloco"""
+        token = current_session.set(session_id)
+        try:
+            yield
+        finally:
+            current_session.reset(token)
+
+    def create(self) -> Session:
+        """Cria uma nova sessão"""
+        with self._lock:
+            self._expire_idle()
+            session = Session(uuid.uuid4().hex[:12])
+            self._sessions[session.session_id] = session
+            metrics.set_gauge("rag_sessions_active", len(self._sessions))
+            return session
+
+    def get(self, session_id: str) -> Session:
+        """Retorna a sessão, renovando seu tempo de inatividade"""
+        with self._lock:
+            self._expire_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise SessionNotFound(f"Sessão não encontrada ou expirada: {session_id}")
+            session.last_access = time.time()
+            return session
+
+    def delete(self, session_id: str) -> None:
+        """Remove a sessão e suas tabelas"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                raise SessionNotFound(f"Sessão não encontrada ou expirada: {session_id}")
+            self._drop_tables(session)
+            metrics.set_gauge("rag_sessions_active", len(self._sessions))
+
+    def build_context(self, session_id: str) -> str:
+        """Monta o contexto do turno anterior para a próxima pergunta da sessão"""
+        session = self.get(session_id)
+        if not session.turns:
+            return ""
+
+        last_turn = session.turns[-1]
+        context = f"""
+Contexto da conversa (esta pergunta dá continuidade à anterior):
+- Pergunta anterior: {last_turn['question']}
+- Consulta SQL anterior: {last_turn['sql'] or 'não disponível'}
+"""
+        if last_turn.get("table"):
+            context += f"""- Resultado anterior salvo na tabela `{last_turn['table']}` ({last_turn['rows']} linhas; colunas: {', '.join(last_turn['columns'])})
+
+Se a pergunta for um refinamento do resultado anterior (filtro, agrupamento, ordenação), consulte
+a tabela `{last_turn['table']}` em vez de varrer a tabela Telemetria novamente.
+"""
+        if len(session.turns) > 1:
+            previous = ", ".join(f"`{t['table']}`" for t in session.turns[:-1] if t.get("table"))
+            if previous:
+                context += f"Resultados de turnos mais antigos desta sessão: {previous}\n"
+        return context
+
+    def record_turn(self, session_id: str, question: str, sql: Optional[str],
+                    result: Optional[Tuple[Sequence[str], Sequence[tuple]]] = None) -> Dict[str, Any]:
+        """Registra um turno, gravando em uma tabela da sessão o resultado (colunas, linhas) da consulta final
+
+        O resultado é o que a consulta já produziu: a Telemetria não é lida de novo aqui.
+        """
+        session = self.get(session_id)
+        turn: Dict[str, Any] = {"question": question, "sql": sql, "table": None, "columns": [], "rows": 0}
+
+        with self._lock:
+            if result is not None and result[0]:
+                name = f"t_{session.session_id}_{len(session.turns) + 1}"
+                try:
+                    turn.update(self._materialize(name, result[0], result[1]))
+                except Exception as e:
+                    print(f"⚠️ Aviso: Não foi possível materializar o resultado da sessão: {e}")
+
+            session.turns.append(turn)
+            session.size_bytes += turn.get("size_bytes", 0)
+            self._enforce_memory_cap()
+        return turn
+
+    def _materialize(self, name: str, columns: Sequence[str], rows: Sequence[tuple]) -> Dict[str, Any]:
+        """Grava as linhas pela conexão `_holder` (a única sem o autorizador somente leitura)"""
+        # Nomes de coluna como no resultado, sem repetições (ex: dois COUNT(*))
+        names: List[str] = []
+        for column in columns:
+            candidate, suffix = str(column), 2
+            while candidate in names:
+                candidate, suffix = f"{column}_{suffix}", suffix + 1
+            names.append(candidate)
+        quoted = ", ".join('"' + n.replace('"', '""') + '"' for n in names)
+        rows = list(rows[:int(self.max_rows_per_table)])
+
+        conn = self._holder
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+        try:
+            conn.execute(f"CREATE TABLE {name} ({quoted})")
+            conn.executemany(f"INSERT INTO {name} VALUES ({', '.join('?' * len(names))})", rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            conn.execute(f"DROP TABLE IF EXISTS {name}")
+            raise
+        pages_after = conn.execute("PRAGMA page_count").fetchone()[0]
+
+        metrics.inc("rag_session_tables_total")
+        return {
+            "table": f"{SESSION_SCHEMA}.{name}",
+            "columns": names,
+            "rows": len(rows),
+            "size_bytes": max(0, pages_after - pages_before) * page_size,
+        }
+
+    def _drop_tables(self, session: Session) -> None:
+        for turn in session.turns:
+            if turn.get("table"):
+                try:
+                    self._holder.execute(f"DROP TABLE IF EXISTS {turn['table'].split('.', 1)[1]}")
+                except Exception as e:
+                    print(f"⚠️ Aviso: Erro ao remover tabela da sessão: {e}")
+        self._holder.commit()
+
+    def _expire_idle(self) -> None:
+        now = time.time()
+        expired = [s for s in self._sessions.values() if now - s.last_access > self.idle_ttl_seconds]
+        for session in expired:
+            del self._sessions[session.session_id]
+            self._drop_tables(session)
+            metrics.inc("rag_sessions_expired_total", reason="idle")
+        if expired:
+            metrics.set_gauge("rag_sessions_active", len(self._sessions))
+
+    def _enforce_memory_cap(self) -> None:
+        total = sum(s.size_bytes for s in self._sessions.values())
+        for session in sorted(self._sessions.values(), key=lambda s: s.last_access):
+            if total <= self.max_memory_bytes:
+                break
+            del self._sessions[session.session_id]
+            self._drop_tables(session)
+            total -= session.size_bytes
+            metrics.inc("rag_sessions_expired_total", reason="memory")
+        metrics.set_gauge("rag_sessions_active", len(self._sessions))
+        metrics.set_gauge("rag_sessions_memory_bytes", total)
+
+# Instância global das sessões
+session_store = SessionStore(
+    idle_ttl_seconds=settings.session_idle_ttl_seconds,
+    max_memory_bytes=int(settings.session_max_memory_mb * 1024 * 1024),
+    max_rows_per_table=settings.session_max_rows_per_table,
+)
@@ -0,0 +1,59 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+class _InFlightCall:
+    """Execução em andamento compartilhada pelos chamadores de uma mesma chave"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Coalesce chamadas concorrentes idênticas em uma única execução
+
+    O primeiro chamador de uma chave executa a função; os demais que chegarem
+    enquanto ela está em andamento aguardam e recebem o mesmo resultado (ou o
+    mesmo erro). Depois que a execução termina, a chave é liberada: chamadas
+    posteriores disparam uma nova execução.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _InFlightCall] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Executa `fn` para a chave, retornando (resultado, se_foi_compartilhado)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = _InFlightCall()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
+
+    def in_flight(self) -> int:
+        """Número de chaves com execução em andamento"""
+        with self._lock:
+            return len(self._calls)
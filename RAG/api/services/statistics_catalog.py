@@ -0,0 +1,211 @@
+import json
+import re
+import sqlite3
+import time
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+from api.services.metrics import metrics
+
+# Tabelas laterais do catálogo, gravadas no próprio banco e ocultas do agente
+CATALOG_TABLE = "CatalogoEstatisticas"
+CATALOG_META_TABLE = "CatalogoMetadados"
+CATALOG_TABLES = [CATALOG_TABLE, CATALOG_META_TABLE]
+
+PERCENTILES = (25, 50, 75, 95)
+
+def telemetry_fingerprint(conn: sqlite3.Connection) -> str:
+    """Impressão digital do conteúdo da Telemetria: linhas, última data e soma de Valor
+
+    A soma é o que muda quando um upsert sobrescreve `Valor` sem alterar o número de
+    linhas nem a última data.
+    """
+    rows, last_date, total = conn.execute("SELECT COUNT(*), MAX(Data), TOTAL(Valor) FROM Telemetria").fetchone()
+    return f"{rows}:{last_date}:{total!r}"
+
+class StatisticsCatalog:
+    """Catálogo de estatísticas pré-calculadas da Telemetria
+
+    Guarda contagens, intervalo de datas, valores distintos e, por Categoria/Serie,
+    mínimo, máximo, média e percentis de `Valor`. É calculado uma vez e persistido em
+    tabelas laterais do banco; nas inicializações seguintes só é recalculado se a
+    impressão digital da Telemetria (linhas, última data e soma de Valor) mudar. Um
+    resumo compacto vai para o prompt e o catálogo completo fica disponível como
+    ferramenta barata do agente, evitando consultas exploratórias.
+    """
+
+    def __init__(self, database_path: str):
+        self.database_path = str(database_path)
+        self.metadata: Dict[str, Any] = {}
+        self.series: List[Dict[str, Any]] = []
+        # Se o último load_or_build gravou as tabelas laterais no banco
+        self.persisted = False
+
+    def load_or_build(self) -> None:
+        """Carrega o catálogo persistido ou o recalcula se a Telemetria mudou"""
+        self.persisted = False
+        conn = sqlite3.connect(f"file:{quote(self.database_path)}?mode=ro", uri=True)
+        try:
+            fingerprint = self._fingerprint(conn)
+            if self._load(conn) and self.metadata.get("fingerprint") == fingerprint:
+                return
+
+            start_time = time.time()
+            self.metadata, self.series = self._compute(conn)
+            self.metadata["fingerprint"] = fingerprint
+            self.metadata["built_at"] = time.time()
+        finally:
+            conn.close()
+
+        duration = time.time() - start_time
+        metrics.set_gauge("rag_statistics_catalog_build_seconds", duration)
+        print(f"📊 Catálogo de estatísticas calculado em {duration:.2f}s")
+
+        try:
+            self._persist()
+            self.persisted = True
+        except sqlite3.Error as e:
+            # Banco somente leitura: o catálogo fica apenas em memória neste processo
+            print(f"⚠️ Aviso: Não foi possível persistir o catálogo de estatísticas: {e}")
+
+    def _fingerprint(self, conn: sqlite3.Connection) -> str:
+        return telemetry_fingerprint(conn)
+
+    def _load(self, conn: sqlite3.Connection) -> bool:
+        try:
+            metadata = dict(conn.execute(f"SELECT Chave, Valor FROM {CATALOG_META_TABLE}").fetchall())
+            cursor = conn.execute(f"SELECT * FROM {CATALOG_TABLE} ORDER BY Categoria, Serie")
+        except sqlite3.OperationalError:
+            return False
+
+        columns = [c[0] for c in cursor.description]
+        self.series = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        self.metadata = {key: json.loads(value) for key, value in metadata.items()}
+        return True
+
+    def _compute(self, conn: sqlite3.Connection) -> tuple:
+        import numpy as np
+
+        rows, first_date, last_date, days, chassis = conn.execute(
+            "SELECT COUNT(*), MIN(Data), MAX(Data), COUNT(DISTINCT date(Data)), COUNT(DISTINCT Chassi) FROM Telemetria"
+        ).fetchone()
+        metadata: Dict[str, Any] = {
+            "linhas_telemetria": rows,
+            "data_inicial": first_date,
+            "data_final": last_date,
+            "dias_distintos": days,
+            "chassis_com_telemetria": chassis,
+        }
+        try:
+            metadata.update(zip(
+                ("chassis", "contratos", "clientes", "modelos"),
+                conn.execute(
+                    "SELECT COUNT(*), COUNT(DISTINCT Contrato), COUNT(DISTINCT Cliente), COUNT(DISTINCT Modelo) FROM Chassis"
+                ).fetchone()
+            ))
+        except sqlite3.OperationalError:
+            pass
+
+        # Uma única passada ordenada pelos grupos: uma consulta por grupo varreria a tabela
+        # inteira para cada um (sem índice em Categoria/Serie/UnidadeMedida)
+        series = []
+        cursor = conn.execute(
+            "SELECT Categoria, Serie, UnidadeMedida, Valor FROM Telemetria "
+            "WHERE Valor IS NOT NULL AND Categoria IS NOT NULL AND Serie IS NOT NULL AND UnidadeMedida IS NOT NULL "
+            "ORDER BY Categoria, Serie, UnidadeMedida"
+        )
+        for (categoria, serie, unidade), rows in groupby(cursor, key=itemgetter(0, 1, 2)):
+            values = np.fromiter((row[3] for row in rows), dtype=np.float64)
+            percentiles = np.percentile(values, PERCENTILES)
+            series.append({
+                "Categoria": categoria,
+                "Serie": serie,
+                "UnidadeMedida": unidade,
+                "Linhas": int(len(values)),
+                "Minimo": float(values.min()),
+                "Maximo": float(values.max()),
+                "Media": float(values.mean()),
+                **{f"P{p}": float(v) for p, v in zip(PERCENTILES, percentiles)},
+            })
+        return metadata, series
+
+    def _persist(self) -> None:
+        conn = sqlite3.connect(self.database_path, timeout=30)
+        try:
+            with conn:
+                conn.execute(f"DROP TABLE IF EXISTS {CATALOG_TABLE}")
+                conn.execute(f"DROP TABLE IF EXISTS {CATALOG_META_TABLE}")
+                conn.execute(f"CREATE TABLE {CATALOG_META_TABLE} (Chave TEXT PRIMARY KEY, Valor TEXT)")
+                conn.execute(
+                    f"CREATE TABLE {CATALOG_TABLE} (Categoria TEXT, Serie TEXT, UnidadeMedida TEXT, Linhas INTEGER, "
+                    "Minimo REAL, Maximo REAL, Media REAL, "
+                    + ", ".join(f"P{p} REAL" for p in PERCENTILES) + ")"
+                )
+                conn.executemany(
+                    f"INSERT INTO {CATALOG_META_TABLE} VALUES (?, ?)",
+                    [(key, json.dumps(value)) for key, value in self.metadata.items()],
+                )
+                if self.series:
+                    columns = list(self.series[0].keys())
+                    conn.executemany(
+                        f"INSERT INTO {CATALOG_TABLE} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                        [tuple(row[c] for c in columns) for row in self.series],
+                    )
+        finally:
+            conn.close()
+
+    def _format_table(self, series: List[Dict[str, Any]]) -> str:
+        header = "| Categoria | Serie | Unid. | Linhas | Mín | Média | P50 | P95 | Máx |"
+        lines = [header, "|---|---|---|---|---|---|---|---|---|"]
+        for row in series:
+            lines.append(
+                f"| {row['Categoria']} | {row['Serie']} | {row['UnidadeMedida']} | {row['Linhas']} | "
+                f"{row['Minimo']:.2f} | {row['Media']:.2f} | {row['P50']:.2f} | {row['P95']:.2f} | {row['Maximo']:.2f} |"
+            )
+        return "\n".join(lines)
+
+    def summary(self, categories: Optional[List[str]] = None) -> str:
+        """Resumo compacto para o system prompt, opcionalmente restrito a algumas categorias"""
+        if not self.metadata:
+            return ""
+        m = self.metadata
+        header = (
+            f"Telemetria: {m['linhas_telemetria']} linhas de {m['data_inicial']} a {m['data_final']} "
+            f"({m['dias_distintos']} dias), {m['chassis_com_telemetria']} chassis com dados"
+        )
+        if "chassis" in m:
+            header += (f"; Chassis: {m['chassis']} chassis, {m['contratos']} contratos, "
+                       f"{m['clientes']} clientes, {m['modelos']} modelos")
+        series = [row for row in self.series if categories is None or row["Categoria"] in categories]
+        return f"{header}.\n\nValor por Categoria/Serie:\n{self._format_table(series)}"
+
+    def run(self, tool_input: str) -> str:
+        """Ponto de entrada da ferramenta do agente: filtra o catálogo por texto de Categoria/Serie"""
+        if not self.metadata:
+            return "Catálogo de estatísticas indisponível."
+
+        terms = [t.strip().lower() for t in re.split(r"[,;]", tool_input or "") if t.strip()]
+        series = [
+            row for row in self.series
+            if all(t in f"{row['Categoria']} {row['Serie']}".lower() for t in terms)
+        ] if terms else self.series
+
+        columns = ["Categoria", "Serie", "UnidadeMedida", "Linhas", "Minimo", "Media", "Maximo"] + [f"P{p}" for p in PERCENTILES]
+        lines = [self.summary().split("\n", 1)[0], "", "| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+        lines += [
+            "| " + " | ".join(f"{row[c]:.3f}" if isinstance(row[c], float) else str(row[c]) for c in columns) + " |"
+            for row in series
+        ]
+        if not series:
+            lines.append("Nenhuma Categoria/Serie corresponde ao filtro.")
+        return "\n".join(lines)
+
+    def tool_description(self) -> str:
+        return """
+Use esta ferramenta ANTES de escrever consultas auxiliares para obter médias, mínimos, máximos ou percentis de Valor,
+contagens de linhas, intervalo de datas ou número de chassis/clientes/contratos/modelos: os valores já estão pré-calculados.
+A entrada é um filtro opcional de texto sobre Categoria/Serie (ex: Uso do Motor, Carga Alta); vazio retorna tudo.
+A saída é uma tabela Markdown com as estatísticas.
+"""
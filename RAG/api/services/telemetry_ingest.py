@@ -0,0 +1,471 @@
+import csv
+import hmac
+import json
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from api.services.metrics import metrics
+from api.services.prompt_builder import CATEGORIES
+from api.utils.storage_layout import (
+    DIMENSION_TABLES, FACT_TABLE, PARTITION_PREFIX, create_partition, detect_layout, list_partitions, rebuild_view
+)
+
+# Colunas de uma leitura (esquema da Telemetria)
+READING_COLUMNS = ("Chassi", "UnidadeMedida", "Categoria", "Data", "Serie", "Valor")
+TEXT_COLUMNS = ("UnidadeMedida", "Categoria", "Serie")
+
+# Erros de validação devolvidos por requisição (os demais são apenas contados)
+MAX_REPORTED_ERRORS = 20
+
+# Lote validado: colunas em arrays numpy (Data em epoch UTC)
+Batch = Dict[str, np.ndarray]
+
+class IngestError(ValueError):
+    """Corpo da requisição em formato inválido (JSON malformado, CSV sem cabeçalho, tipo não suportado)"""
+
+class IngestRejected(Exception):
+    """Lote recusado porque o escritor está com muitas linhas pendentes"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class IngestConflict(RuntimeError):
+    """O banco não aceita a gravação no estado atual (ex: chaves duplicadas na Telemetria original)"""
+
+def ingest_authorized(token: Optional[str]) -> bool:
+    """A ingestão só é liberada com INGEST_TOKEN configurado e o mesmo token na requisição"""
+    return bool(settings.ingest_token) and token is not None and hmac.compare_digest(
+        token.encode(), settings.ingest_token.encode()
+    )
+
+class ReadingsParser:
+    """Lê leituras de um corpo JSON (lista de objetos), NDJSON ou CSV recebido em partes
+
+    NDJSON e CSV são processados linha a linha conforme os bytes chegam, de modo que
+    lotes grandes são validados e enfileirados sem guardar o corpo inteiro em memória.
+    """
+
+    FORMATS = {
+        "application/json": "json",
+        "application/x-ndjson": "ndjson",
+        "application/ndjson": "ndjson",
+        "application/jsonl": "ndjson",
+        "text/csv": "csv",
+    }
+
+    def __init__(self, content_type: str):
+        media_type = (content_type or "application/json").split(";")[0].strip().lower()
+        if media_type not in self.FORMATS:
+            raise IngestError(f"Content-Type não suportado: {media_type} (use {', '.join(self.FORMATS)})")
+        self.format = self.FORMATS[media_type]
+        self._buffer = b""
+        self._header: Optional[List[str]] = None
+        self.line = 0
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        """Leituras completas contidas nos bytes recebidos até agora"""
+        self._buffer += chunk
+        if self.format == "json":
+            return []
+        lines = self._buffer.split(b"\n")
+        self._buffer = lines.pop()
+        return self._parse_lines(lines)
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Leituras restantes no fim do corpo"""
+        buffer, self._buffer = self._buffer, b""
+        if self.format != "json":
+            return self._parse_lines([buffer])
+        try:
+            data = json.loads(buffer or b"[]")
+        except ValueError as e:
+            raise IngestError(f"JSON inválido: {e}")
+        if isinstance(data, dict):
+            data = data.get("readings")
+        if not isinstance(data, list):
+            raise IngestError('O corpo JSON deve ser uma lista de leituras ou {"readings": [...]}')
+        return data
+
+    def _parse_lines(self, lines: List[bytes]) -> List[Dict[str, Any]]:
+        records = []
+        for raw in lines:
+            self.line += 1
+            text = raw.decode("utf-8-sig" if self.line == 1 else "utf-8").strip()
+            if not text:
+                continue
+            if self.format == "ndjson":
+                try:
+                    records.append(json.loads(text))
+                except ValueError as e:
+                    raise IngestError(f"Linha {self.line} não é um JSON válido: {e}")
+                continue
+
+            values = next(csv.reader([text]))
+            if self._header is None:
+                self._header = [value.strip() for value in values]
+                missing = set(READING_COLUMNS) - set(self._header)
+                if missing:
+                    raise IngestError(f"Cabeçalho do CSV sem as colunas: {', '.join(sorted(missing))}")
+                continue
+            records.append(dict(zip(self._header, values)))
+        return records
+
+def _as_float(values: np.ndarray) -> np.ndarray:
+    """Valores numéricos (NaN onde não há número)"""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        converted = np.full(len(values), np.nan)
+        for index, value in enumerate(values):
+            try:
+                converted[index] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return converted
+
+def _as_datetime(values: np.ndarray) -> np.ndarray:
+    """Datas ISO em datetime64[s] (NaT onde a data não é reconhecida)"""
+    try:
+        return np.asarray(values, dtype="datetime64[s]")
+    except (TypeError, ValueError):
+        converted = np.full(len(values), np.datetime64("NaT"), dtype="datetime64[s]")
+        for index, value in enumerate(values):
+            try:
+                converted[index] = np.datetime64(value, "s")
+            except (TypeError, ValueError):
+                pass
+        return converted
+
+def validate_readings(records: List[Any], offset: int = 0) -> Tuple[Batch, int, List[Dict[str, Any]]]:
+    """Valida as leituras em bloco; retorna (lote válido, rejeitadas, primeiros erros)
+
+    Cada coluna é convertida uma vez para um array e as regras são aplicadas ao array
+    inteiro: Chassi inteiro não negativo, Data ISO, Valor finito, textos não vazios e,
+    para as categorias conhecidas, a unidade de medida documentada. `offset` é a
+    posição da primeira leitura no corpo da requisição (para os erros reportados).
+    """
+    count = len(records)
+    columns = {
+        column: np.array([record.get(column) if isinstance(record, dict) else None for record in records], dtype=object)
+        for column in READING_COLUMNS
+    }
+    reasons = np.full(count, None, dtype=object)
+
+    def reject(mask: np.ndarray, reason: str) -> None:
+        reasons[mask & np.equal(reasons, None)] = reason
+
+    chassi = _as_float(columns["Chassi"])
+    with np.errstate(invalid="ignore"):
+        reject(~np.isfinite(chassi) | (chassi < 0) | (chassi != np.round(chassi)), "Chassi deve ser um inteiro não negativo")
+    data = _as_datetime(columns["Data"])
+    reject(np.isnat(data), "Data deve estar no formato ISO (AAAA-MM-DD HH:MM:SS)")
+    valor = _as_float(columns["Valor"])
+    reject(~np.isfinite(valor), "Valor deve ser numérico")
+
+    texts = {}
+    for column in TEXT_COLUMNS:
+        present = np.not_equal(columns[column], None)
+        text = np.char.strip(columns[column].astype(str))
+        reject(~present | (np.char.str_len(text) == 0), f"{column} não pode ser vazio")
+        texts[column] = text.astype(object)
+
+    # Categorias documentadas têm unidade fixa (horas ou litros)
+    for categoria, category in CATEGORIES.items():
+        reject((texts["Categoria"] == categoria) & (texts["UnidadeMedida"] != category["unit"]),
+               f"UnidadeMedida de '{categoria}' deve ser '{category['unit']}'")
+
+    valid = np.equal(reasons, None)
+    rejected = np.flatnonzero(~valid)
+    errors = [{"index": int(offset + index), "error": reasons[index]} for index in rejected[:MAX_REPORTED_ERRORS]]
+    batch = {
+        "Chassi": chassi[valid].astype(np.int64),
+        "UnidadeMedida": texts["UnidadeMedida"][valid],
+        "Categoria": texts["Categoria"][valid],
+        "Data": data[valid].astype(np.int64),
+        "Serie": texts["Serie"][valid],
+        "Valor": valor[valid],
+    }
+    return batch, len(rejected), errors
+
+class TelemetryWriter:
+    """Único escritor da Telemetria de um banco: lotes enfileirados, gravados em transações grandes
+
+    As requisições validam suas leituras e enfileiram lotes; uma única thread os agrupa
+    (até `commit_rows` linhas ou `commit_interval` segundos de espera por mais lotes) e
+    grava cada grupo em uma transação, com upsert na chave (Chassi, Categoria, Serie,
+    Data): uma leitura repetida substitui o Valor anterior. O banco fica em modo WAL,
+    então as consultas continuam lendo o último estado confirmado durante a escrita.
+    Cada lote é confirmado ao chamador (Future) só depois do COMMIT. Com mais de
+    `max_pending_rows` linhas na fila, novos lotes são recusados (IngestRejected).
+    """
+
+    def __init__(self, database_path: str, commit_rows: int = 50000, commit_interval: float = 0.05,
+                 max_pending_rows: int = 500000,
+                 on_partitions_created: Optional[Callable[[str], None]] = None,
+                 on_checkpoint: Optional[Callable[[str], None]] = None):
+        self.database_path = str(database_path)
+        self.commit_rows = commit_rows
+        self.commit_interval = commit_interval
+        self.max_pending_rows = max_pending_rows
+        self.on_partitions_created = on_partitions_created
+        self.on_checkpoint = on_checkpoint
+        self._queue: "queue.Queue[Tuple[Batch, Future]]" = queue.Queue()
+        self._pending_rows = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._key_checked = False
+        self._key_error: Optional[str] = None
+        self.committed_rows = 0
+        self.last_commit_seconds: Optional[float] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Grava os lotes já enfileirados e encerra a thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def submit(self, batch: Batch) -> Future:
+        """Enfileira um lote validado; o Future termina com o número de linhas gravadas"""
+        rows = len(batch["Chassi"])
+        future: Future = Future()
+        if not rows:
+            future.set_result(0)
+            return future
+        with self._lock:
+            if self._pending_rows + rows > self.max_pending_rows:
+                metrics.inc("rag_ingest_rejected_batches_total")
+                raise IngestRejected(f"Escritor da Telemetria com {self._pending_rows} linhas pendentes", retry_after=1)
+            self._pending_rows += rows
+            metrics.set_gauge("rag_ingest_pending_rows", self._pending_rows)
+        self._queue.put((batch, future))
+        return future
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "database_path": self.database_path,
+            "pending_rows": self._pending_rows,
+            "committed_rows": self.committed_rows,
+            "last_commit_seconds": self.last_commit_seconds,
+        }
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(self.database_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        dirty = False
+        try:
+            while not (self._stop.is_set() and self._queue.empty()):
+                try:
+                    items = [self._queue.get(timeout=0.2)]
+                except queue.Empty:
+                    # Fila ociosa: o WAL é transferido para o arquivo principal e os serviços do
+                    # banco atualizam catálogo, amostra e partições (sem recarga completa)
+                    if dirty:
+                        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+                        dirty = False
+                        self._notify(self.on_checkpoint, "avisar o checkpoint")
+                    continue
+
+                rows = len(items[0][0]["Chassi"])
+                deadline = time.monotonic() + self.commit_interval
+                while rows < self.commit_rows:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    items.append(item)
+                    rows += len(item[0]["Chassi"])
+
+                self._commit(conn, items, rows)
+                dirty = True
+        finally:
+            conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, items: List[Tuple[Batch, Future]], rows: int) -> None:
+        batch = {column: np.concatenate([item[0][column] for item in items]) for column in READING_COLUMNS}
+        start_time = time.perf_counter()
+        created: List[str] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            layout = detect_layout(conn)
+            if layout == "raw":
+                self._write_raw(conn, batch)
+            else:
+                created = self._write_facts(conn, batch, layout)
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"❌ Erro ao gravar {rows} leituras: {e}")
+            metrics.inc("rag_ingest_rows_total", rows, status="failed")
+            for _, future in items:
+                future.set_exception(e)
+            return
+        finally:
+            with self._lock:
+                self._pending_rows -= rows
+                metrics.set_gauge("rag_ingest_pending_rows", self._pending_rows)
+
+        duration = time.perf_counter() - start_time
+        self.committed_rows += rows
+        self.last_commit_seconds = duration
+        metrics.observe("rag_ingest_commit_seconds", duration)
+        metrics.observe("rag_ingest_commit_rows", rows)
+        metrics.inc("rag_ingest_rows_total", rows, status="committed")
+        # As requisições já gravadas são respondidas antes dos avisos aos serviços
+        for item, future in items:
+            future.set_result(len(item["Chassi"]))
+        if created:
+            self._notify(self.on_partitions_created, "avisar as partições criadas")
+
+    def _notify(self, callback: Optional[Callable[[str], None]], action: str) -> None:
+        """Executa um aviso aos serviços na thread do escritor; um erro nele não derruba o escritor"""
+        if callback is None:
+            return
+        try:
+            callback(self.database_path)
+        except Exception as e:
+            metrics.inc("rag_ingest_callback_errors_total")
+            print(f"⚠️ Aviso: Erro ao {action} do banco {self.database_path}: {e}")
+
+    def _ensure_key(self, conn: sqlite3.Connection) -> None:
+        """Índice único na chave da Telemetria original, exigido pelo upsert
+
+        Com leituras repetidas na chave o índice não pode ser criado: a ingestão no layout
+        original é recusada (IngestConflict) até que as repetições sejam removidas (a migração
+        também as recusa). A recusa fica guardada para não varrer a tabela a cada lote.
+        """
+        if self._key_checked:
+            return
+        if self._key_error:
+            raise IngestConflict(self._key_error)
+        key = {"Chassi", "Categoria", "Serie", "Data"}
+        for _, index, unique, _, _ in conn.execute("PRAGMA index_list('Telemetria')").fetchall():
+            columns = {row[2] for row in conn.execute(f'PRAGMA index_info("{index}")').fetchall()}
+            if unique and columns == key:
+                break
+        else:
+            duplicates = conn.execute(
+                "SELECT COUNT(*) FROM (SELECT 1 FROM Telemetria GROUP BY Chassi, Categoria, Serie, Data HAVING COUNT(*) > 1)"
+            ).fetchone()[0]
+            if duplicates:
+                self._key_error = (
+                    f"A Telemetria tem {duplicates} chaves (Chassi, Categoria, Serie, Data) repetidas e não aceita "
+                    "o upsert das leituras; remova as leituras repetidas antes"
+                )
+                print(f"❌ {self._key_error}")
+                raise IngestConflict(self._key_error)
+            print("🔑 Criando índice único na chave da Telemetria para o upsert das leituras")
+            conn.execute("CREATE UNIQUE INDEX idx_telemetria_chave ON Telemetria (Chassi, Categoria, Serie, Data)")
+        self._key_checked = True
+
+    def _write_raw(self, conn: sqlite3.Connection, batch: Batch) -> None:
+        self._ensure_key(conn)
+        # Mesmo formato de Data da tabela original ('AAAA-MM-DD HH:MM:SS')
+        data = np.char.replace(np.datetime_as_string(batch["Data"].astype("datetime64[s]"), unit="s"), "T", " ")
+        conn.executemany(
+            "INSERT INTO Telemetria (Chassi, UnidadeMedida, Categoria, Data, Serie, Valor) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (Chassi, Categoria, Serie, Data) DO UPDATE SET "
+            "UnidadeMedida = excluded.UnidadeMedida, Valor = excluded.Valor",
+            zip(batch["Chassi"].tolist(), batch["UnidadeMedida"].tolist(), batch["Categoria"].tolist(),
+                data.tolist(), batch["Serie"].tolist(), batch["Valor"].tolist()),
+        )
+
+    def _dimension_ids(self, conn: sqlite3.Connection, table: str, names: np.ndarray) -> np.ndarray:
+        """Códigos da dimensão para cada nome (nomes novos são cadastrados)"""
+        unique, inverse = np.unique(names.astype(str), return_inverse=True)
+        conn.executemany(f"INSERT OR IGNORE INTO {table} (Nome) VALUES (?)", [(name,) for name in unique.tolist()])
+        ids = dict(conn.execute(
+            f"SELECT Nome, Id FROM {table} WHERE Nome IN ({','.join('?' * len(unique))})", unique.tolist()
+        ).fetchall())
+        return np.array([ids[name] for name in unique.tolist()], dtype=np.int64)[inverse]
+
+    def _write_facts(self, conn: sqlite3.Connection, batch: Batch, layout: str) -> List[str]:
+        """Grava no layout normalizado ou particionado; retorna as partições criadas"""
+        ids = {column: self._dimension_ids(conn, table, batch[column]) for column, table in DIMENSION_TABLES.items()}
+        columns = (batch["Chassi"], ids["Categoria"], ids["Serie"], ids["UnidadeMedida"], batch["Data"], batch["Valor"])
+
+        targets: List[Tuple[str, np.ndarray]] = []
+        created: List[str] = []
+        if layout == "partitioned":
+            # Uma partição por mês; meses novos ganham partição (e a view é recriada)
+            months = np.char.replace(np.datetime_as_string(batch["Data"].astype("datetime64[s]"), unit="M"), "-", "")
+            existing = {name for name, _, _ in list_partitions(conn)}
+            for month in np.unique(months).tolist():
+                name = f"{PARTITION_PREFIX}{month}"
+                if name not in existing:
+                    create_partition(conn, month)
+                    created.append(name)
+                targets.append((name, months == month))
+            if created:
+                rebuild_view(conn)
+                print(f"🗓️ Partições criadas pela ingestão: {', '.join(created)}")
+        else:
+            targets.append((FACT_TABLE, np.ones(len(batch["Chassi"]), dtype=bool)))
+
+        for table, mask in targets:
+            conn.executemany(
+                f"INSERT INTO {table} (Chassi, CategoriaId, SerieId, UnidadeMedidaId, Data, Valor) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (Chassi, CategoriaId, SerieId, Data) DO UPDATE SET "
+                "UnidadeMedidaId = excluded.UnidadeMedidaId, Valor = excluded.Valor",
+                zip(*(column[mask].tolist() for column in columns)),
+            )
+        return created
+
+class TelemetryIngest:
+    """Escritores da Telemetria por arquivo de banco (um único escritor por arquivo)"""
+
+    def __init__(self, commit_rows: int, commit_interval: float, max_pending_rows: int):
+        self.commit_rows = commit_rows
+        self.commit_interval = commit_interval
+        self.max_pending_rows = max_pending_rows
+        self.on_partitions_created: Optional[Callable[[str], None]] = None
+        self.on_checkpoint: Optional[Callable[[str], None]] = None
+        self._writers: Dict[str, TelemetryWriter] = {}
+        self._lock = threading.Lock()
+
+    def writer(self, database_path: str) -> TelemetryWriter:
+        """Escritor do banco, criado e iniciado no primeiro lote"""
+        with self._lock:
+            writer = self._writers.get(database_path)
+            if writer is None:
+                writer = TelemetryWriter(
+                    database_path, self.commit_rows, self.commit_interval, self.max_pending_rows,
+                    on_partitions_created=self.on_partitions_created, on_checkpoint=self.on_checkpoint
+                )
+                writer.start()
+                self._writers[database_path] = writer
+                print(f"✍️ Escritor da Telemetria iniciado para {database_path}")
+            return writer
+
+    def status(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [writer.status() for writer in self._writers.values()]
+
+    def close(self) -> None:
+        with self._lock:
+            writers, self._writers = list(self._writers.values()), {}
+        for writer in writers:
+            writer.stop()
+
+# Instância global dos escritores da Telemetria
+telemetry_ingest = TelemetryIngest(
+    commit_rows=settings.ingest_commit_rows,
+    commit_interval=settings.ingest_commit_interval_ms / 1000,
+    max_pending_rows=settings.ingest_max_pending_rows,
+)
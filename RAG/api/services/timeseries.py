@@ -0,0 +1,170 @@
+import sqlite3
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+from api.utils.storage_layout import FACT_TABLE, detect_layout, list_partitions
+
+# Métodos de redução de pontos: LTTB preserva a forma visual da curva; minmax preserva
+# os extremos de cada intervalo (picos de consumo, por exemplo)
+DOWNSAMPLING_METHODS = ("lttb", "minmax", "none")
+
+# Limites do intervalo quando não informados (o fim é 9999-12-31 23:59:59)
+MIN_EPOCH, MAX_EPOCH = 0, 253402300799
+
+def _epoch(value: Optional[str], default: int, end_of_day: bool = False) -> int:
+    """Data ISO (ex: 2024-01-31 ou 2024-01-31T12:00:00) em epoch UTC
+
+    Com `end_of_day`, uma data sem horário é o último segundo do dia (fim inclusivo do intervalo).
+    """
+    if not value:
+        return default
+    moment = datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+    if end_of_day:
+        try:
+            date.fromisoformat(value)
+        except ValueError:
+            pass  # Com horário: usado como informado
+        else:
+            moment += timedelta(days=1, seconds=-1)
+    return int(moment.timestamp())
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Índices dos pontos escolhidos pelo Largest-Triangle-Three-Buckets"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Primeiro e último pontos fixos; os demais divididos em threshold - 2 baldes
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    # Média de cada balde (o vértice C do triângulo é a média do balde seguinte)
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    mean_x = np.append(sums_x / counts, x[-1])
+    mean_y = np.append(sums_y / counts, y[-1])
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], y[previous]
+        cx, cy = mean_x[bucket + 1], mean_y[bucket + 1]
+        areas = np.abs((ax - cx) * (y[start:end] - ay) - (ax - x[start:end]) * (cy - ay))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+def minmax(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Índices do mínimo e do máximo de cada intervalo (até threshold pontos no total)"""
+    n = len(x)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+
+    buckets = threshold // 2
+    bucket_of = np.minimum((np.arange(n) * buckets) // n, buckets - 1)
+    edges = np.searchsorted(bucket_of, np.arange(buckets))
+
+    # Ordenando por (balde, valor), o primeiro e o último de cada balde são o mínimo e o máximo
+    order = np.lexsort((y, bucket_of))
+    ends = np.append(edges[1:], n) - 1
+    selected = np.unique(np.concatenate([order[edges], order[ends]]))
+    return selected
+
+def read_series(conn: sqlite3.Connection, chassis: List[int], categoria: str, serie: str,
+                start: int, end: int) -> Tuple[Optional[str], Dict[int, Tuple[np.ndarray, np.ndarray]]]:
+    """Lê a série de cada chassi no intervalo [start, end] (epoch) com varredura pelo índice
+
+    Retorna a unidade de medida (None sem medições) e, por chassi, os arrays de tempo (epoch) e valor.
+    """
+    placeholders = ",".join("?" * len(chassis))
+    layout = detect_layout(conn)
+    if layout in ("normalized", "partitioned"):
+        # Chave (Chassi, CategoriaId, SerieId, Data) com Data em epoch: faixa contígua do índice
+        ids = conn.execute(
+            "SELECT (SELECT Id FROM DimCategoria WHERE Nome = ?), (SELECT Id FROM DimSerie WHERE Nome = ?)",
+            (categoria, serie),
+        ).fetchone()
+        if ids[0] is None or ids[1] is None:
+            return None, {}
+
+        # No layout particionado, só as partições mensais que cruzam o intervalo são lidas
+        if layout == "partitioned":
+            tables = [name for name, first, last in list_partitions(conn) if first <= end and last > start]
+        else:
+            tables = [FACT_TABLE]
+        if not tables:
+            return None, {}
+
+        branch = (
+            "SELECT f.Chassi, f.Data, f.Valor, f.UnidadeMedidaId FROM {table} f "
+            f"WHERE f.Chassi IN ({placeholders}) AND f.CategoriaId = ? AND f.SerieId = ? "
+            "AND f.Data BETWEEN ? AND ?"
+        )
+        rows = conn.execute(
+            " UNION ALL ".join(branch.format(table=table) for table in tables) + " ORDER BY 1, 2",
+            (*chassis, ids[0], ids[1], start, end) * len(tables),
+        ).fetchall()
+        unit = conn.execute("SELECT Nome FROM DimUnidadeMedida WHERE Id = ?", (rows[0][3],)).fetchone()[0] if rows else None
+    else:
+        # Layout original: Data em texto ISO, comparável como string dentro da chave primária
+        rows = conn.execute(
+            f"SELECT Chassi, CAST(strftime('%s', Data) AS INTEGER), Valor, UnidadeMedida FROM Telemetria "
+            f"WHERE Chassi IN ({placeholders}) AND Categoria = ? AND Serie = ? "
+            "AND Data BETWEEN datetime(?, 'unixepoch') AND datetime(?, 'unixepoch') ORDER BY Chassi, Data",
+            (*chassis, categoria, serie, start, end),
+        ).fetchall()
+        unit = rows[0][3] if rows else None
+
+    series: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+    if rows:
+        data = np.array([row[:3] for row in rows], dtype=np.float64)
+        bounds = np.flatnonzero(np.diff(data[:, 0])) + 1
+        for block in np.split(data, bounds):
+            series[int(block[0, 0])] = (block[:, 1].astype(np.int64), block[:, 2])
+    return unit, series
+
+def build_timeseries(database_path: str, chassis: List[int], categoria: str, serie: str,
+                     start: Optional[str] = None, end: Optional[str] = None,
+                     points: int = 500, method: str = "lttb") -> Dict[str, Any]:
+    """Séries reduzidas a até `points` pontos por chassi, em arrays colunares (t em epoch, v)"""
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f"Método inválido: {method} (use {', '.join(DOWNSAMPLING_METHODS)})")
+    if not chassis:
+        raise ValueError("Informe ao menos um chassi")
+
+    start_time = time.perf_counter()
+    conn = sqlite3.connect(f"file:{quote(database_path)}?mode=ro", uri=True)
+    try:
+        unit, series = read_series(
+            conn, chassis, categoria, serie, _epoch(start, MIN_EPOCH), _epoch(end, MAX_EPOCH, end_of_day=True)
+        )
+    finally:
+        conn.close()
+
+    downsample = {"lttb": lttb, "minmax": minmax}.get(method)
+    result, points_in, points_out = [], 0, 0
+    for chassi in chassis:
+        t, v = series.get(chassi, (np.empty(0, dtype=np.int64), np.empty(0)))
+        points_in += len(t)
+        if downsample is not None:
+            index = downsample(t.astype(np.float64), v, points)
+            t, v = t[index], v[index]
+        points_out += len(t)
+        result.append({"chassi": chassi, "t": t.tolist(), "v": np.round(v, 6).tolist()})
+
+    return {
+        "categoria": categoria,
+        "serie": serie,
+        "unidade": unit,
+        "method": method,
+        "points_in": points_in,
+        "points_out": points_out,
+        "series": result,
+        "elapsed_ms": (time.perf_counter() - start_time) * 1000,
+    }
@@ -0,0 +1,130 @@
+import gzip
+import json
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import orjson
+except ImportError:  # dependência opcional: sem ela, usa o json da biblioteca padrão
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # dependência opcional: sem ela, apenas gzip é oferecido
+    brotli = None
+
+# Codificações oferecidas, da preferida para a menos preferida
+SUPPORTED_ENCODINGS = (("br",) if brotli is not None else ()) + ("gzip",)
+
+# Tipos de conteúdo que valem a pena comprimir
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+def dumps(content: Any) -> bytes:
+    """Serializa em JSON compacto (orjson se instalado)"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=str).encode("utf-8")
+
+class CompactJSONResponse(JSONResponse):
+    """JSONResponse serializada com orjson (ou json compacto, sem espaços)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def project(payload: Dict[str, Any], fields: Optional[str], allowed: Iterable[str]) -> Dict[str, Any]:
+    """Mantém apenas os campos pedidos em `fields` (separados por vírgula)"""
+    if not fields:
+        return payload
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = sorted(set(requested) - set(allowed))
+    if unknown:
+        raise ValueError(f"Campos inválidos em fields: {', '.join(unknown)}")
+    return {field: payload[field] for field in requested if field in payload}
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Se o header If-None-Match inclui a ETag (comparação fraca, como em GET condicional)"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in [tag.removeprefix("W/") for tag in tags]
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Codificação escolhida a partir do header Accept-Encoding (respeitando q=0)"""
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        if params.strip().startswith("q="):
+            try:
+                weight = float(params.strip()[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    candidates = [
+        (weights.get(encoding, weights.get("*", 0.0)), -rank, encoding)
+        for rank, encoding in enumerate(SUPPORTED_ENCODINGS)
+    ]
+    weight, _, encoding = max(candidates)
+    return encoding if weight > 0 else None
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=min(level, 11))
+    return gzip.compress(body, compresslevel=min(level, 9))
+
+class CompressionMiddleware:
+    """Comprime (brotli ou gzip, conforme Accept-Encoding) respostas JSON e texto
+
+    Apenas respostas de corpo único acima de `minimum_size` bytes são comprimidas;
+    respostas em streaming e já codificadas passam inalteradas.
+    """
+
+    def __init__(self, app: Any, minimum_size: int = 1024, level: int = 6):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Dict[str, Any]] = None
+
+        async def send_compressed(message: Dict[str, Any]) -> None:
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # O início é retido até conhecer o corpo (os headers dependem da compressão)
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            compressible = headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            if (message.get("more_body") or len(body) < self.minimum_size
+                    or not compressible or "content-encoding" in headers):
+                await send(start_message)
+                start_message = None
+                await send(message)
+                return
+
+            compressed = compress(body, encoding, self.level)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            start_message = None
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
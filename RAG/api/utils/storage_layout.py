@@ -0,0 +1,281 @@
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+# Tabelas físicas do layout normalizado; o agente enxerga apenas a view Telemetria
+DIMENSION_TABLES = {
+    "Categoria": "DimCategoria",
+    "Serie": "DimSerie",
+    "UnidadeMedida": "DimUnidadeMedida",
+}
+FACT_TABLE = "TelemetriaFato"
+
+# Layout particionado: uma tabela de fatos por mês (TelemetriaFato_AAAAMM) e o
+# registro das partições com o intervalo [Inicio, Fim) de cada uma em epoch
+PARTITION_TABLE = "TelemetriaParticao"
+PARTITION_PREFIX = f"{FACT_TABLE}_"
+
+INTERNAL_TABLES = list(DIMENSION_TABLES.values()) + [FACT_TABLE, PARTITION_TABLE]
+
+# Partição (nome, início e fim em epoch, fim exclusivo)
+Partition = Tuple[str, int, int]
+
+def telemetria_select_sql(fact_table: str, data_range: Optional[Tuple[int, int]] = None) -> str:
+    """SELECT com o esquema (e o formato de Data) da tabela original sobre uma tabela de fatos
+
+    `data_range` (início e fim inclusivos em epoch) filtra a coluna física `f.Data`, que usa
+    os índices da tabela de fatos; o filtro sobre a Data em texto da view não os usa.
+    """
+    where = f"\nWHERE f.Data BETWEEN {int(data_range[0])} AND {int(data_range[1])}" if data_range else ""
+    return f"""SELECT
+  f.Chassi AS Chassi,
+  u.Nome AS UnidadeMedida,
+  c.Nome AS Categoria,
+  datetime(f.Data, 'unixepoch') AS Data,
+  s.Nome AS Serie,
+  f.Valor AS Valor
+FROM {fact_table} f
+JOIN DimCategoria c ON c.Id = f.CategoriaId
+JOIN DimSerie s ON s.Id = f.SerieId
+JOIN DimUnidadeMedida u ON u.Id = f.UnidadeMedidaId{where}"""
+
+def telemetria_union_sql(partitions: List[Partition], data_range: Optional[Tuple[int, int]] = None) -> str:
+    """União (UNION ALL) das partições com o esquema da Telemetria"""
+    if not partitions:
+        return (
+            "SELECT NULL AS Chassi, NULL AS UnidadeMedida, NULL AS Categoria, "
+            "NULL AS Data, NULL AS Serie, NULL AS Valor WHERE 0"
+        )
+    return "\nUNION ALL\n".join(telemetria_select_sql(name, data_range) for name, _, _ in partitions)
+
+# View de compatibilidade: mesmo esquema (e mesmo formato de Data) da tabela original
+TELEMETRIA_VIEW_SQL = f"CREATE VIEW Telemetria AS\n{telemetria_select_sql(FACT_TABLE)}"
+
+FACT_TABLE_DDL = """
+CREATE TABLE {table} (
+  Chassi INTEGER NOT NULL,
+  CategoriaId INTEGER NOT NULL REFERENCES DimCategoria (Id),
+  SerieId INTEGER NOT NULL REFERENCES DimSerie (Id),
+  UnidadeMedidaId INTEGER NOT NULL REFERENCES DimUnidadeMedida (Id),
+  Data INTEGER NOT NULL,
+  Valor REAL,
+  PRIMARY KEY (Chassi, CategoriaId, SerieId, Data)
+) WITHOUT ROWID
+"""
+
+def detect_layout(conn: sqlite3.Connection) -> str:
+    """Identifica o layout de armazenamento da Telemetria ('raw', 'normalized' ou 'partitioned')"""
+    objects = dict(conn.execute("SELECT name, type FROM sqlite_master WHERE type IN ('table', 'view')").fetchall())
+    if objects.get(PARTITION_TABLE) == "table":
+        return "partitioned"
+    if objects.get(FACT_TABLE) == "table":
+        return "normalized"
+    if objects.get("Telemetria") == "table":
+        return "raw"
+    raise RuntimeError("Tabela Telemetria não encontrada no banco")
+
+def internal_tables_present(conn: sqlite3.Connection, candidates: Optional[List[str]] = None) -> List[str]:
+    """Tabelas internas existentes no banco (ocultas do agente), incluindo as partições mensais"""
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    partitions = sorted(name for name in names if name.startswith(PARTITION_PREFIX))
+    return [name for name in (candidates or INTERNAL_TABLES) if name in names] + partitions
+
+def list_partitions(conn: sqlite3.Connection) -> List[Partition]:
+    """Partições registradas, em ordem cronológica"""
+    return [
+        tuple(row) for row in
+        conn.execute(f"SELECT Nome, Inicio, Fim FROM {PARTITION_TABLE} ORDER BY Inicio").fetchall()
+    ]
+
+def _month_bounds(month: str) -> Tuple[int, int]:
+    """Início e fim (exclusivo) em epoch UTC do mês AAAAMM"""
+    year, number = int(month[:4]), int(month[4:])
+    start = datetime(year, number, 1, tzinfo=timezone.utc)
+    end = datetime(year + number // 12, number % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp()), int(end.timestamp())
+
+def create_partition(conn: sqlite3.Connection, month: str) -> Partition:
+    """Cria (se não existir) a partição do mês AAAAMM e a registra; não recria a view"""
+    name = f"{PARTITION_PREFIX}{month}"
+    start, end = _month_bounds(month)
+    conn.execute(FACT_TABLE_DDL.format(table=f"IF NOT EXISTS {name}"))
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_categoria_serie_data ON {name} (CategoriaId, SerieId, Data)")
+    conn.execute(f"INSERT OR IGNORE INTO {PARTITION_TABLE} (Nome, Inicio, Fim) VALUES (?, ?, ?)", (name, start, end))
+    return name, start, end
+
+def rebuild_view(conn: sqlite3.Connection) -> None:
+    """Recria a view Telemetria sobre as partições registradas"""
+    conn.execute("DROP VIEW IF EXISTS Telemetria")
+    conn.execute(f"CREATE VIEW Telemetria AS\n{telemetria_union_sql(list_partitions(conn))}")
+
+def migrate_to_normalized(database_path: str, vacuum: bool = True) -> Dict[str, Any]:
+    """Migra a Telemetria para o layout com dicionários e Data em epoch (in-place)
+
+    - Categoria, Serie e UnidadeMedida vão para tabelas de dimensão com códigos inteiros
+    - Data passa a ser um inteiro (segundos desde a epoch)
+    - TelemetriaFato é WITHOUT ROWID, agrupada pela chave (Chassi, Categoria, Serie, Data)
+    - A view Telemetria preserva o esquema usado no prompt do agente
+    """
+    start_time = time.time()
+    conn = sqlite3.connect(database_path, isolation_level=None)
+    try:
+        if detect_layout(conn) != "raw":
+            raise RuntimeError("O banco já está no layout normalizado")
+
+        source_rows = conn.execute("SELECT COUNT(*) FROM Telemetria").fetchone()[0]
+        invalid_dates = conn.execute(
+            "SELECT COUNT(*) FROM Telemetria WHERE strftime('%s', Data) IS NULL"
+        ).fetchone()[0]
+        if invalid_dates:
+            raise RuntimeError(f"{invalid_dates} linhas com Data em formato não reconhecido; migração abortada")
+        # O JOIN com as dimensões descartaria essas linhas (e o relatório as contaria como duplicadas)
+        null_dimensions = conn.execute(
+            "SELECT COUNT(*) FROM Telemetria WHERE "
+            + " OR ".join(f"{column} IS NULL" for column in DIMENSION_TABLES)
+        ).fetchone()[0]
+        if null_dimensions:
+            raise RuntimeError(
+                f"{null_dimensions} linhas com {', '.join(DIMENSION_TABLES)} nulo; migração abortada"
+            )
+        # A tabela de fatos tem a chave (Chassi, Categoria, Serie, Data), usada pelo upsert da
+        # ingestão; leituras repetidas nela não são descartadas em silêncio
+        key = "Chassi, Categoria, Serie, CAST(strftime('%s', Data) AS INTEGER)"
+        duplicates = conn.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM Telemetria GROUP BY {key} HAVING COUNT(*) > 1)"
+        ).fetchone()[0]
+        if duplicates:
+            examples = conn.execute(
+                f"SELECT Chassi, Categoria, Serie, datetime(MIN(Data)), COUNT(*) FROM Telemetria "
+                f"GROUP BY {key} HAVING COUNT(*) > 1 ORDER BY 1, 2, 3, 4 LIMIT 10"
+            ).fetchall()
+            listed = "; ".join(
+                f"Chassi {chassi}, {categoria}, {serie}, {data} ({count} linhas)"
+                for chassi, categoria, serie, data, count in examples
+            )
+            raise RuntimeError(
+                f"{duplicates} chaves (Chassi, Categoria, Serie, Data) repetidas; migração abortada. "
+                f"Remova as leituras repetidas antes. Exemplos: {listed}"
+            )
+
+        conn.execute("BEGIN")
+        for column, table in DIMENSION_TABLES.items():
+            conn.execute(f"CREATE TABLE {table} (Id INTEGER PRIMARY KEY, Nome TEXT NOT NULL UNIQUE)")
+            conn.execute(
+                f"INSERT INTO {table} (Nome) SELECT DISTINCT {column} FROM Telemetria "
+                f"WHERE {column} IS NOT NULL ORDER BY {column}"
+            )
+
+        conn.execute(FACT_TABLE_DDL.format(table=FACT_TABLE))
+        conn.execute(
+            f"""
+            INSERT INTO {FACT_TABLE} (Chassi, CategoriaId, SerieId, UnidadeMedidaId, Data, Valor)
+            SELECT t.Chassi, c.Id, s.Id, u.Id, CAST(strftime('%s', t.Data) AS INTEGER), t.Valor
+            FROM Telemetria t
+            JOIN DimCategoria c ON c.Nome = t.Categoria
+            JOIN DimSerie s ON s.Nome = t.Serie
+            JOIN DimUnidadeMedida u ON u.Nome = t.UnidadeMedida
+            """
+        )
+        conn.execute(f"CREATE INDEX idx_{FACT_TABLE}_categoria_serie_data ON {FACT_TABLE} (CategoriaId, SerieId, Data)")
+
+        migrated_rows = conn.execute(f"SELECT COUNT(*) FROM {FACT_TABLE}").fetchone()[0]
+        if migrated_rows != source_rows:
+            raise RuntimeError(f"{source_rows - migrated_rows} linhas não migradas; migração abortada")
+        conn.execute("DROP TABLE Telemetria")
+        conn.execute(TELEMETRIA_VIEW_SQL)
+        conn.execute("COMMIT")
+
+        if vacuum:
+            conn.execute("VACUUM")
+        conn.execute("ANALYZE")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    return {
+        "source_rows": source_rows,
+        "migrated_rows": migrated_rows,
+        "duration_seconds": time.time() - start_time,
+    }
+
+def migrate_to_partitioned(database_path: str, vacuum: bool = True) -> Dict[str, Any]:
+    """Particiona a Telemetria por mês (in-place), normalizando antes se necessário
+
+    - Cada mês vai para uma tabela TelemetriaFato_AAAAMM com a mesma chave da tabela de fatos
+    - TelemetriaParticao registra o intervalo de cada partição (usado para podar partições)
+    - A view Telemetria passa a ser a união (UNION ALL) das partições, com o mesmo esquema
+    """
+    start_time = time.time()
+    conn = sqlite3.connect(database_path, isolation_level=None)
+    try:
+        layout = detect_layout(conn)
+    finally:
+        conn.close()
+    if layout == "partitioned":
+        raise RuntimeError("O banco já está no layout particionado")
+    if layout == "raw":
+        migrate_to_normalized(database_path, vacuum=False)
+
+    conn = sqlite3.connect(database_path, isolation_level=None)
+    try:
+        conn.execute("BEGIN")
+        conn.execute(f"CREATE TABLE {PARTITION_TABLE} (Nome TEXT PRIMARY KEY, Inicio INTEGER NOT NULL, Fim INTEGER NOT NULL)")
+        months = [
+            row[0] for row in
+            conn.execute(f"SELECT DISTINCT strftime('%Y%m', Data, 'unixepoch') FROM {FACT_TABLE} ORDER BY 1")
+        ]
+        for month in months:
+            name, start, end = create_partition(conn, month)
+            conn.execute(
+                f"INSERT INTO {name} SELECT * FROM {FACT_TABLE} WHERE Data >= ? AND Data < ?", (start, end)
+            )
+
+        conn.execute("DROP VIEW Telemetria")
+        conn.execute(f"DROP TABLE {FACT_TABLE}")
+        rebuild_view(conn)
+        conn.execute("COMMIT")
+
+        if vacuum:
+            conn.execute("VACUUM")
+        conn.execute("ANALYZE")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    return {"partitions": len(months), "duration_seconds": time.time() - start_time}
+
+def drop_partitions_before(database_path: str, cutoff: str, vacuum: bool = True) -> List[str]:
+    """Retenção: remove as partições inteiramente anteriores a `cutoff` (data ISO)
+
+    Apagar um mês é um DROP TABLE da partição, sem DELETE linha a linha.
+    """
+    cutoff_epoch = int(datetime.fromisoformat(cutoff).replace(tzinfo=timezone.utc).timestamp())
+    conn = sqlite3.connect(database_path, isolation_level=None)
+    try:
+        if detect_layout(conn) != "partitioned":
+            raise RuntimeError("A retenção por partição exige o layout particionado")
+
+        dropped = [name for name, _, end in list_partitions(conn) if end <= cutoff_epoch]
+        conn.execute("BEGIN")
+        for name in dropped:
+            conn.execute(f"DROP TABLE {name}")
+            conn.execute(f"DELETE FROM {PARTITION_TABLE} WHERE Nome = ?", (name,))
+        rebuild_view(conn)
+        conn.execute("COMMIT")
+
+        if vacuum and dropped:
+            conn.execute("VACUUM")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return dropped
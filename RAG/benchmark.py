@@ -0,0 +1,578 @@
+#!/usr/bin/env python3
+"""
+Benchmarks offline da API Visagio RAG
+
+Uso:
+    python benchmark.py startup [--runs N] [--warmup]
+    python benchmark.py storage [--database PATH] [--chassis N] [--days N] [--runs N]
+    python benchmark.py partitions [--chassis N] [--days N] [--runs N]
+    python benchmark.py approximate [--chassis N] [--days N] [--runs N] [--rate F]
+    python benchmark.py ingest [--rows N] [--batch N] [--producers N]
+    python benchmark.py prompt [--database PATH] [--iterations N]
+    python benchmark.py modes [--modes agent,fast,plan] [--runs N]
+    python benchmark.py payload [--rows N] [--iterations N]
+"""
+
+import argparse
+import json
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+current_dir = Path(__file__).parent
+sys.path.insert(0, str(current_dir))
+
+# Script executado em um processo limpo para medir o cold start de um worker.
+# Mede o tempo até a aplicação poder responder /health e o RSS nesse momento;
+# com --warmup, também mede o aquecimento completo do agente.
+_STARTUP_PROBE = r"""
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+from api.main import app
+from api.services.rag_service import rag_service
+result = {{
+    "import_seconds": time.perf_counter() - start,
+    "import_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules_loaded": sorted(m for m in ("pandas", "langchain", "langchain_google_genai", "langchain_community") if m in sys.modules),
+}}
+if {warmup!r}:
+    try:
+        rag_service.ensure_initialized()
+        result["warmup_seconds"] = rag_service.init_duration
+    except Exception as e:
+        result["warmup_error"] = str(e)
+    result["warmup_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps(result))
+"""
+
+
+def _run_probe(script: str) -> dict:
+    """Executa um script de medição em um subprocesso e retorna o JSON impresso"""
+    completed = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=str(current_dir),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def benchmark_startup(runs: int, warmup: bool) -> None:
+    """Mede o tempo de cold start e o RSS por worker"""
+    print(f"⏱️  Medindo cold start ({runs} execuções)...")
+    samples = [_run_probe(_STARTUP_PROBE.format(root=str(current_dir), warmup=warmup)) for _ in range(runs)]
+
+    import_times = [s["import_seconds"] for s in samples]
+    import_rss = [s["import_rss_mb"] for s in samples]
+    print(f"   Import da aplicação: mediana {statistics.median(import_times):.3f}s "
+          f"(min {min(import_times):.3f}s, max {max(import_times):.3f}s)")
+    print(f"   RSS após import:     mediana {statistics.median(import_rss):.1f} MB")
+    print(f"   Módulos pesados carregados no import: {samples[0]['heavy_modules_loaded'] or 'nenhum'}")
+
+    if warmup:
+        if "warmup_error" in samples[0]:
+            print(f"   ⚠️ Aquecimento falhou: {samples[0]['warmup_error']}")
+        else:
+            warmup_times = [s["warmup_seconds"] for s in samples]
+            print(f"   Aquecimento do agente: mediana {statistics.median(warmup_times):.3f}s")
+        print(f"   RSS após aquecimento: mediana {statistics.median(s['warmup_rss_mb'] for s in samples):.1f} MB")
+
+
+# Séries por categoria, como no banco de telemetria real
+_TELEMETRY_SERIES = {
+    ("Uso do Motor", "hr"): ["Chave-Ligada", "Marcha Lenta", "Carga Baixa", "Carga Média", "Carga Alta"],
+    ("Uso do Combustível do Motor", "l"): ["Chave-Ligada", "Marcha Lenta", "Carga Baixa", "Carga Média", "Carga Alta"],
+    ("Uso da Configuração do Modo do Motor", "hr"): ["HP", "P", "E"],
+}
+
+# Consultas representativas dos pedidos dos analistas (mesmo SQL nos dois layouts)
+_STORAGE_QUERIES = {
+    "horas em carga alta por chassi": """
+        SELECT Chassi, SUM(Valor) FROM Telemetria
+        WHERE Categoria = 'Uso do Motor' AND Serie = 'Carga Alta'
+        GROUP BY Chassi ORDER BY 2 DESC LIMIT 10
+    """,
+    "consumo total por série": """
+        SELECT Serie, SUM(Valor) FROM Telemetria
+        WHERE Categoria = 'Uso do Combustível do Motor' GROUP BY Serie
+    """,
+    "proporção de marcha lenta por cliente": """
+        SELECT c.Cliente,
+               SUM(CASE WHEN t.Serie = 'Marcha Lenta' THEN t.Valor ELSE 0 END) / SUM(t.Valor)
+        FROM Telemetria t JOIN Chassis c ON c.Chassi = t.Chassi
+        WHERE t.Categoria = 'Uso do Motor' GROUP BY c.Cliente
+    """,
+    "uso mensal de um chassi": """
+        SELECT strftime('%Y-%m', Data), Serie, SUM(Valor) FROM Telemetria
+        WHERE Chassi = 1 AND Data >= '2024-03-01' AND Data < '2024-06-01'
+        GROUP BY 1, 2
+    """,
+}
+
+
+def build_synthetic_database(path: str, chassis: int, days: int, seed: int = 42) -> None:
+    """Gera um banco no layout original (strings repetidas e Data em TEXT) para benchmarks"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE Chassis (Chassi INTEGER PRIMARY KEY, Contrato INTEGER, Cliente INTEGER, Modelo INTEGER)")
+    conn.execute(
+        "CREATE TABLE Telemetria (Chassi INTEGER, UnidadeMedida TEXT, Categoria TEXT, "
+        "Data TIMESTAMP, Serie TEXT, Valor REAL)"
+    )
+    conn.executemany(
+        "INSERT INTO Chassis VALUES (?, ?, ?, ?)",
+        [(c, c // 3, c // 7, c % 5) for c in range(1, chassis + 1)],
+    )
+    start = datetime(2024, 1, 1)
+    for chassi in range(1, chassis + 1):
+        rows = []
+        for day in range(days):
+            data = (start + timedelta(days=day)).strftime("%Y-%m-%d %H:%M:%S")
+            for (categoria, unidade), series in _TELEMETRY_SERIES.items():
+                for serie in series:
+                    rows.append((chassi, unidade, categoria, data, serie, round(rng.uniform(0, 8), 3)))
+        conn.executemany("INSERT INTO Telemetria VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def _time_queries(path: str, queries: dict, runs: int, rewrite=None) -> dict:
+    """Mediana do tempo de cada consulta (a primeira execução aquece o cache de páginas)"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    timings = {}
+    for name, sql in queries.items():
+        if rewrite is not None:
+            sql = rewrite(sql)
+        conn.execute(sql).fetchall()
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            conn.execute(sql).fetchall()
+            samples.append(time.perf_counter() - start)
+        timings[name] = statistics.median(samples)
+    conn.close()
+    return timings
+
+
+def benchmark_storage(database: str, chassis: int, days: int, runs: int) -> None:
+    """Compara tamanho do arquivo e tempo das consultas de exemplo nos dois layouts"""
+    from api.utils.storage_layout import migrate_to_normalized
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_path = str(Path(tmp) / "raw.db")
+        normalized_path = str(Path(tmp) / "normalized.db")
+
+        if database:
+            shutil.copyfile(database, raw_path)
+        else:
+            print(f"🧪 Gerando banco sintético ({chassis} chassis x {days} dias)...")
+            build_synthetic_database(raw_path, chassis, days)
+        conn = sqlite3.connect(raw_path)
+        conn.execute("VACUUM")
+        conn.close()
+
+        shutil.copyfile(raw_path, normalized_path)
+        report = migrate_to_normalized(normalized_path)
+        print(f"🔄 Migração: {report['migrated_rows']} linhas em {report['duration_seconds']:.2f}s")
+
+        raw_size, normalized_size = Path(raw_path).stat().st_size, Path(normalized_path).stat().st_size
+        print(f"📦 Tamanho do arquivo: {raw_size / 1024 / 1024:.1f} MB -> {normalized_size / 1024 / 1024:.1f} MB "
+              f"({100 * (1 - normalized_size / raw_size):.0f}% menor)")
+
+        raw_times = _time_queries(raw_path, _STORAGE_QUERIES, runs)
+        normalized_times = _time_queries(normalized_path, _STORAGE_QUERIES, runs)
+        print(f"⏱️  Consultas de exemplo (mediana de {runs} execuções):")
+        for name in _STORAGE_QUERIES:
+            print(f"   {name:<40} {raw_times[name] * 1000:8.1f} ms -> {normalized_times[name] * 1000:8.1f} ms "
+                  f"({raw_times[name] / normalized_times[name]:.1f}x)")
+
+
+# Consultas por período recente (o banco sintético começa em 2024-01-01)
+_PERIOD_QUERIES = {
+    "último mês": """
+        SELECT Chassi, SUM(Valor) FROM Telemetria
+        WHERE Categoria = 'Uso do Motor' AND Data >= '2024-12-01' GROUP BY Chassi
+    """,
+    "último trimestre": """
+        SELECT Serie, SUM(Valor) FROM Telemetria
+        WHERE Categoria = 'Uso do Combustível do Motor' AND Data BETWEEN '2024-10-01' AND '2024-12-31 23:59:59'
+        GROUP BY Serie
+    """,
+    "ano inteiro": """
+        SELECT Serie, SUM(Valor) FROM Telemetria
+        WHERE Categoria = 'Uso do Motor' GROUP BY Serie
+    """,
+}
+
+
+def benchmark_partitions(chassis: int, days: int, runs: int) -> None:
+    """Compara consultas por período no layout normalizado e no particionado (com e sem reescrita dos filtros de Data)"""
+    from api.utils.storage_layout import drop_partitions_before, migrate_to_normalized, migrate_to_partitioned
+    from api.services.partition_pruning import PartitionPruner
+
+    with tempfile.TemporaryDirectory() as tmp:
+        normalized_path = str(Path(tmp) / "normalized.db")
+        partitioned_path = str(Path(tmp) / "partitioned.db")
+
+        print(f"🧪 Gerando banco sintético ({chassis} chassis x {days} dias)...")
+        build_synthetic_database(normalized_path, chassis, days)
+        shutil.copyfile(normalized_path, partitioned_path)
+        migrate_to_normalized(normalized_path)
+        report = migrate_to_partitioned(partitioned_path)
+        print(f"🔄 {report['partitions']} partições mensais criadas em {report['duration_seconds']:.2f}s")
+
+        pruner = PartitionPruner.from_database(partitioned_path)
+        normalized_pruner = PartitionPruner.from_database(normalized_path)
+        normalized_times = _time_queries(normalized_path, _PERIOD_QUERIES, runs)
+        pushdown_times = _time_queries(normalized_path, _PERIOD_QUERIES, runs, rewrite=normalized_pruner.rewrite)
+        view_times = _time_queries(partitioned_path, _PERIOD_QUERIES, runs)
+        pruned_times = _time_queries(partitioned_path, _PERIOD_QUERIES, runs, rewrite=pruner.rewrite)
+        # Sem reescrita, o filtro sobre a Data em texto da view não usa os índices da tabela de fatos
+        print(f"⏱️  Consultas por período (mediana de {runs} execuções): "
+              "normalizado pela view | normalizado com Data em epoch | view das partições | com poda")
+        for name in _PERIOD_QUERIES:
+            print(f"   {name:<20} {normalized_times[name] * 1000:8.1f} ms | {pushdown_times[name] * 1000:8.1f} ms | "
+                  f"{view_times[name] * 1000:8.1f} ms | {pruned_times[name] * 1000:8.1f} ms "
+                  f"({normalized_times[name] / pruned_times[name]:.1f}x)")
+
+        # Retenção: apagar meses antigos é um DROP TABLE por partição
+        conn = sqlite3.connect(normalized_path)
+        start = time.perf_counter()
+        conn.execute("DELETE FROM TelemetriaFato WHERE Data < CAST(strftime('%s', '2024-07-01') AS INTEGER)")
+        conn.commit()
+        delete_seconds = time.perf_counter() - start
+        conn.close()
+        start = time.perf_counter()
+        dropped = drop_partitions_before(partitioned_path, "2024-07-01", vacuum=False)
+        print(f"🗑️  Retenção de 6 meses: DELETE {delete_seconds * 1000:.1f} ms -> "
+              f"DROP de {len(dropped)} partições {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+# Agregações exploratórias sobre o histórico inteiro
+_AGGREGATE_QUERIES = {
+    "total por série": """
+        SELECT Serie, SUM(Valor) AS Total FROM Telemetria
+        WHERE Categoria = 'Uso do Combustível do Motor' GROUP BY Serie
+    """,
+    "média por cliente": """
+        SELECT c.Cliente, AVG(t.Valor) AS Media FROM Telemetria t JOIN Chassis c ON c.Chassi = t.Chassi
+        WHERE t.Categoria = 'Uso do Motor' AND t.Serie = 'Carga Alta' GROUP BY c.Cliente
+    """,
+    "linhas por chassi": """
+        SELECT Chassi, COUNT(*) AS Linhas FROM Telemetria WHERE Valor > 4 GROUP BY Chassi
+    """,
+}
+
+
+def benchmark_approximate(chassis: int, days: int, runs: int, rate: float) -> None:
+    """Compara agregações exatas com as estimadas na amostra estratificada (tempo e erro relativo)"""
+    from api.services.approximate_query import StratifiedSample
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "telemetria.db")
+        print(f"🧪 Gerando banco sintético ({chassis} chassis x {days} dias)...")
+        build_synthetic_database(path, chassis, days)
+        sample = StratifiedSample(path, rate, min_rows=30)
+        sample.load_or_build()
+
+        exact_times = _time_queries(path, _AGGREGATE_QUERIES, runs)
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        print(f"⏱️  Agregações (mediana de {runs} execuções): exata | aproximada | erro relativo máximo (margem média)")
+        for name, sql in _AGGREGATE_QUERIES.items():
+            exact = {row[0]: row[1] for row in conn.execute(sql).fetchall()}
+            samples = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                estimate = sample.estimate(conn, sql, 0.95)
+                samples.append(time.perf_counter() - start)
+            approximate_time = statistics.median(samples)
+            errors = [abs(row[1] - exact[row[0]]) / abs(exact[row[0]]) for row in estimate["rows"] if exact.get(row[0])]
+            margins = [row[2] / abs(row[1]) for row in estimate["rows"] if row[1]]
+            print(f"   {name:<20} {exact_times[name] * 1000:8.1f} ms | {approximate_time * 1000:8.1f} ms "
+                  f"({exact_times[name] / approximate_time:.0f}x) | {max(errors):.2%} (±{statistics.mean(margins):.2%})")
+        conn.close()
+
+
+def _synthetic_readings(rows: int, seed: int = 7) -> list:
+    """Leituras novas (2025 em diante) no formato aceito por POST /telemetry"""
+    rng = random.Random(seed)
+    series = [(categoria, unidade, serie) for (categoria, unidade), values in _TELEMETRY_SERIES.items() for serie in values]
+    start = datetime(2025, 1, 1)
+    readings = []
+    for index in range(rows):
+        categoria, unidade, serie = series[index % len(series)]
+        step = index // len(series)
+        readings.append({
+            "Chassi": 1 + step % 50, "UnidadeMedida": unidade, "Categoria": categoria,
+            "Data": (start + timedelta(minutes=step // 50)).strftime("%Y-%m-%d %H:%M:%S"),
+            "Serie": serie, "Valor": round(rng.uniform(0, 8), 3),
+        })
+    return readings
+
+
+def benchmark_ingest(rows: int, batch: int, producers: int) -> None:
+    """Vazão sustentada de POST /telemetry por layout, latência de confirmação e de leitura durante a carga"""
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from api.services.telemetry_ingest import TelemetryWriter, validate_readings
+    from api.utils.storage_layout import migrate_to_normalized, migrate_to_partitioned
+
+    readings = _synthetic_readings(rows)
+    chunks = [readings[start:start + batch] for start in range(0, rows, batch)]
+    with tempfile.TemporaryDirectory() as tmp:
+        base_path = str(Path(tmp) / "base.db")
+        print(f"🧪 Gerando banco sintético e {rows} leituras em lotes de {batch} ({producers} produtores)...")
+        build_synthetic_database(base_path, 50, 30)
+
+        # Referência: uma transação por leitura, como um cliente ingênuo faria
+        naive_path = str(Path(tmp) / "naive.db")
+        shutil.copyfile(base_path, naive_path)
+        conn = sqlite3.connect(naive_path, isolation_level=None)
+        naive_rows = min(rows, 2000)
+        start = time.perf_counter()
+        for reading in readings[:naive_rows]:
+            conn.execute("INSERT INTO Telemetria VALUES (:Chassi, :UnidadeMedida, :Categoria, :Data, :Serie, :Valor)", reading)
+        naive_rate = naive_rows / (time.perf_counter() - start)
+        conn.close()
+        print(f"🐢 Uma transação por leitura: {naive_rate:,.0f} linhas/s")
+
+        print("⏱️  Ingestão por layout: linhas/s | confirmação p50/p99 | consulta durante a carga p50/p99")
+        for layout, migrate in (("raw", None), ("normalized", migrate_to_normalized), ("partitioned", migrate_to_partitioned)):
+            path = str(Path(tmp) / f"{layout}.db")
+            shutil.copyfile(base_path, path)
+            if migrate is not None:
+                migrate(path, vacuum=False)
+            writer = TelemetryWriter(path, max_pending_rows=max(rows, 500000))
+            writer.start()
+
+            acks, reads = [], []
+            done = threading.Event()
+
+            def _produce(chunk):
+                submitted = time.perf_counter()
+                validated, _, _ = validate_readings(chunk)
+                writer.submit(validated).result()
+                acks.append(time.perf_counter() - submitted)
+
+            def _read():
+                reader = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+                while not done.is_set():
+                    started = time.perf_counter()
+                    reader.execute("SELECT Serie, SUM(Valor) FROM Telemetria WHERE Chassi = 7 GROUP BY Serie").fetchall()
+                    reads.append(time.perf_counter() - started)
+                    time.sleep(0.005)
+                reader.close()
+
+            reader_thread = threading.Thread(target=_read)
+            reader_thread.start()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=producers) as executor:
+                list(executor.map(_produce, chunks))
+            elapsed = time.perf_counter() - start
+            done.set()
+            reader_thread.join()
+            writer.stop()
+
+            ack_p50, ack_p99 = statistics.quantiles(acks, n=100)[49::49] if len(acks) > 1 else (acks[0], acks[0])
+            read_p50, read_p99 = statistics.quantiles(reads, n=100)[49::49] if len(reads) > 1 else (reads[0], reads[0])
+            print(f"   {layout:<12} {rows / elapsed:10,.0f} | {ack_p50 * 1000:7.1f} / {ack_p99 * 1000:7.1f} ms | "
+                  f"{read_p50 * 1000:6.1f} / {read_p99 * 1000:6.1f} ms ({rows / elapsed / naive_rate:.0f}x)")
+
+
+# Perguntas de exemplo dos analistas (as mesmas de /examples)
+_EXAMPLE_QUESTIONS = [
+    "Quais são os 5 chassis com maior consumo de combustível em carga alta?",
+    "Qual a proporção de tempo em marcha lenta de cada cliente?",
+    "Quanto tempo cada modelo passou no modo econômico?",
+    "É possível identificar equipamentos com manutenção preventiva necessária com base nos padrões de uso?",
+    "Quantos contratos ativos existem?",
+]
+
+# Tokens acrescentados ao scratchpad por iteração do agente (Thought + Action + Observation)
+_SCRATCHPAD_TOKENS_PER_ITERATION = 250
+
+
+def benchmark_prompt(database: str, iterations: int) -> None:
+    """Relatório de tokens por variante de prompt e o custo projetado do loop do agente"""
+    from api.services.prompt_builder import estimate_tokens
+    from api.services.rag_service import RAGService
+
+    service = RAGService()
+    if database:
+        service._load_statistics_catalog(Path(database))
+
+    # O prompt é reenviado a cada iteração, junto com o scratchpad crescente
+    def _loop_tokens(prompt_tokens: int) -> int:
+        return sum(prompt_tokens + i * _SCRATCHPAD_TOKENS_PER_ITERATION for i in range(iterations))
+
+    print(f"🧮 Tokens estimados do system prompt (loop de {iterations} iterações):")
+    totals = {"full": 0, "compact": 0}
+    for question in _EXAMPLE_QUESTIONS:
+        tokens = {variant: estimate_tokens(service._build_system_prompt(question, variant)) for variant in totals}
+        for variant in totals:
+            totals[variant] += _loop_tokens(tokens[variant])
+        print(f"   {question[:60]:<60} full {tokens['full']:5d}  compact {tokens['compact']:5d} "
+              f"({100 * (1 - tokens['compact'] / tokens['full']):.0f}% menor)")
+
+    print(f"   Tokens de entrada no loop, somando as perguntas: full {totals['full']}, compact {totals['compact']} "
+          f"({100 * (1 - totals['compact'] / totals['full']):.0f}% menor)")
+
+
+def benchmark_payload(rows: int, iterations: int) -> None:
+    """Tamanho e tempo de serialização da resposta de /query: JSON padrão vs compacto, compressão e projeção"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from api.models.query_models import QueryResponse
+    from api.utils.response_encoding import CompactJSONResponse, SUPPORTED_ENCODINGS, compress, dumps, orjson, project
+
+    # Resultado típico: tabela Markdown com uma linha por chassi
+    rng = random.Random(42)
+    table = "\n".join(
+        ["| Chassi | Cliente | Modelo | Horas em Carga Alta | Consumo (l) |", "| --- | --- | --- | --- | --- |"]
+        + [f"| {c} | {c // 7} | {c % 5} | {rng.uniform(0, 900):.2f} | {rng.uniform(0, 9000):.2f} |" for c in range(1, rows + 1)]
+    )
+    sql = ("SELECT t.Chassi, c.Cliente, c.Modelo, SUM(CASE WHEN t.Serie = 'Carga Alta' THEN t.Valor END), "
+           "SUM(CASE WHEN t.Categoria = 'Uso do Combustível do Motor' THEN t.Valor END) "
+           "FROM Telemetria t JOIN Chassis c ON c.Chassi = t.Chassi GROUP BY t.Chassi ORDER BY 4 DESC")
+    response = QueryResponse(
+        query="Quais chassis têm mais horas em carga alta e qual o consumo de cada um?",
+        sql_query=sql, result=table,
+        justification="A consulta soma as horas em carga alta e o consumo de combustível por chassi. " * 4,
+        execution_time=12.3, model="gemini-2.5-flash", mode="agent", llm_calls=4, database="default",
+    )
+
+    def _median(function) -> float:
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            function()
+            samples.append(time.perf_counter() - start)
+        return statistics.median(samples)
+
+    default_body = JSONResponse(jsonable_encoder(response)).body
+    compact_body = CompactJSONResponse(jsonable_encoder(response)).body
+    default_time = _median(lambda: JSONResponse(jsonable_encoder(response)).body)
+    compact_time = _median(lambda: CompactJSONResponse(jsonable_encoder(response)).body)
+    print(f"🧾 Resposta de /query com {rows} linhas no resultado "
+          f"(serializador: {'orjson' if orjson is not None else 'json compacto'})")
+    print(f"   JSON padrão      {len(default_body):8d} bytes  {default_time * 1e6:8.1f} µs")
+    print(f"   JSON compacto    {len(compact_body):8d} bytes  {compact_time * 1e6:8.1f} µs")
+
+    for encoding in SUPPORTED_ENCODINGS:
+        body = compress(compact_body, encoding, 6)
+        elapsed = _median(lambda: compress(compact_body, encoding, 6))
+        print(f"   + {encoding:<14} {len(body):8d} bytes  {elapsed * 1e6:8.1f} µs "
+              f"({100 * (1 - len(body) / len(default_body)):.0f}% menor)")
+
+    projected = dumps(project(response.model_dump(mode="json"), "sql_query,result", QueryResponse.model_fields))
+    print(f"   fields=sql_query,result: {len(projected)} bytes ({len(compress(projected, 'gzip', 6))} bytes com gzip)")
+
+
+def benchmark_modes(modes: list, runs: int) -> None:
+    """Latência e chamadas ao LLM por modo de consulta nas perguntas de exemplo (requer GOOGLE_API_KEY)"""
+    from api.services.rag_service import rag_service
+    from config.settings import settings
+
+    # Sem o cache de completions, para medir as chamadas reais ao LLM
+    settings.llm_cache_enabled = False
+    rag_service.ensure_initialized()
+
+    totals = {mode: {"latency": [], "calls": [], "fallbacks": 0} for mode in modes}
+    for question in _EXAMPLE_QUESTIONS:
+        print(f"❓ {question}")
+        for mode in modes:
+            for _ in range(runs):
+                try:
+                    result = rag_service.query(question, mode=mode)
+                except RuntimeError as e:
+                    print(f"   {mode:<6} erro: {e}")
+                    continue
+                totals[mode]["latency"].append(result["execution_time"])
+                totals[mode]["calls"].append(result["llm_calls"])
+                totals[mode]["fallbacks"] += result["mode"] != mode
+                print(f"   {mode:<6} {result['execution_time']:6.2f}s  {result['llm_calls']:2d} chamadas  "
+                      f"(executado como {result['mode']})")
+
+    print("📊 Resumo por modo:")
+    for mode, values in totals.items():
+        if not values["latency"]:
+            continue
+        print(f"   {mode:<6} latência mediana {statistics.median(values['latency']):6.2f}s  "
+              f"chamadas médias {statistics.mean(values['calls']):4.1f}  "
+              f"recaídas no agente {values['fallbacks']}/{len(values['latency'])}")
+
+
+def main():
+    """Função principal do benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmarks offline da API Visagio RAG")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    startup_parser = subparsers.add_parser("startup", help="Tempo de cold start e RSS por worker")
+    startup_parser.add_argument("--runs", type=int, default=5, help="Número de processos medidos")
+    startup_parser.add_argument("--warmup", action="store_true", help="Também mede o aquecimento do agente")
+
+    storage_parser = subparsers.add_parser("storage", help="Layout original vs normalizado da Telemetria")
+    storage_parser.add_argument("--database", help="Banco real a comparar (padrão: banco sintético)")
+    storage_parser.add_argument("--chassis", type=int, default=200, help="Chassis do banco sintético")
+    storage_parser.add_argument("--days", type=int, default=365, help="Dias de telemetria do banco sintético")
+    storage_parser.add_argument("--runs", type=int, default=5, help="Execuções por consulta")
+
+    partitions_parser = subparsers.add_parser("partitions", help="Consultas por período com a Telemetria particionada")
+    partitions_parser.add_argument("--chassis", type=int, default=200, help="Chassis do banco sintético")
+    partitions_parser.add_argument("--days", type=int, default=365, help="Dias de telemetria do banco sintético")
+    partitions_parser.add_argument("--runs", type=int, default=5, help="Execuções por consulta")
+
+    approximate_parser = subparsers.add_parser("approximate", help="Agregações exatas vs estimadas na amostra")
+    approximate_parser.add_argument("--chassis", type=int, default=200, help="Chassis do banco sintético")
+    approximate_parser.add_argument("--days", type=int, default=365, help="Dias de telemetria do banco sintético")
+    approximate_parser.add_argument("--runs", type=int, default=5, help="Execuções por consulta")
+    approximate_parser.add_argument("--rate", type=float, default=0.01, help="Fração sorteada por estrato")
+
+    ingest_parser = subparsers.add_parser("ingest", help="Vazão sustentada da ingestão de leituras")
+    ingest_parser.add_argument("--rows", type=int, default=200000, help="Leituras enviadas por layout")
+    ingest_parser.add_argument("--batch", type=int, default=5000, help="Leituras por requisição")
+    ingest_parser.add_argument("--producers", type=int, default=4, help="Requisições simultâneas")
+
+    prompt_parser = subparsers.add_parser("prompt", help="Tokens por variante de system prompt")
+    prompt_parser.add_argument("--database", help="Banco para incluir o catálogo de estatísticas no prompt")
+    prompt_parser.add_argument("--iterations", type=int, default=5, help="Iterações do agente por pergunta")
+
+    modes_parser = subparsers.add_parser("modes", help="Latência e chamadas ao LLM por modo de consulta")
+    modes_parser.add_argument("--modes", default="agent,fast,plan", help="Modos comparados, separados por vírgula")
+    modes_parser.add_argument("--runs", type=int, default=1, help="Execuções por pergunta e modo")
+
+    payload_parser = subparsers.add_parser("payload", help="Tamanho e serialização da resposta de /query")
+    payload_parser.add_argument("--rows", type=int, default=100, help="Linhas da tabela no resultado")
+    payload_parser.add_argument("--iterations", type=int, default=200, help="Repetições por medição")
+
+    args = parser.parse_args()
+
+    if args.command == "startup":
+        benchmark_startup(args.runs, args.warmup)
+    elif args.command == "storage":
+        benchmark_storage(args.database, args.chassis, args.days, args.runs)
+    elif args.command == "partitions":
+        benchmark_partitions(args.chassis, args.days, args.runs)
+    elif args.command == "approximate":
+        benchmark_approximate(args.chassis, args.days, args.runs, args.rate)
+    elif args.command == "ingest":
+        benchmark_ingest(args.rows, args.batch, args.producers)
+    elif args.command == "prompt":
+        benchmark_prompt(args.database, args.iterations)
+    elif args.command == "payload":
+        benchmark_payload(args.rows, args.iterations)
+    elif args.command == "modes":
+        benchmark_modes([mode.strip() for mode in args.modes.split(",") if mode.strip()], args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,31 @@
 from pydantic import BaseModel, ConfigDict
 from pathlib import Path
 import os
-from typing import Optional
+from typing import Optional, List, Dict
+
+class CascadeTier(BaseModel):
+    """Nível da cascata de modelos: modelo e orçamento de iterações do agente"""
+    model: str
+    max_iterations: int = 15
+
+def parse_model_cascade(value: str, default_model: str) -> List[CascadeTier]:
+    """Interpreta MODEL_CASCADE no formato 'modelo:iteracoes,modelo:iteracoes' (do mais leve ao mais forte)"""
+    tiers = []
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        model, _, max_iterations = entry.strip().partition(":")
+        tiers.append(CascadeTier(model=model.strip(), max_iterations=int(max_iterations or 15)))
+    return tiers or [CascadeTier(model=default_model)]
+
+def parse_databases(value: str) -> Dict[str, str]:
+    """Interpreta DATABASES no formato 'nome=caminho,nome=caminho'"""
+    databases = {}
+    for entry in value.split(","):
+        name, _, path = entry.partition("=")
+        if name.strip() and path.strip():
+            databases[name.strip()] = path.strip()
+    return databases
 
 class Settings(BaseModel):
     model_config = ConfigDict(protected_namespaces=())
@@ -13,16 +37,127 @@ class Settings(BaseModel):
     
     # Database Settings
     database_path: str = "Bases_VAI - oficial real.db"
+    # Bancos selecionáveis pelo campo "database" das requisições (nome -> caminho);
+    # o banco de database_path é sempre registrado com o nome default_database
+    databases: Dict[str, str] = {}
+    default_database: str = "default"
+    # Pool de serviços aquecidos (um por banco): LRU limitado por número de instâncias
+    # e pela memória estimada (overhead fixo por instância + matrizes carregadas)
+    service_pool_max_instances: int = 4
+    service_pool_max_memory_mb: float = 2048
+    service_pool_instance_overhead_mb: float = 64
+    # Consultas validadas (pares Pedido/Consulta em CSV ou JSON) usadas como exemplos no prompt
+    validated_queries_path: str = ""
+    # Recarga sem downtime quando o banco ou as consultas validadas mudam
+    hot_reload_enabled: bool = True
+    hot_reload_poll_seconds: float = 5.0
     
     # Gemini Settings
     google_api_key: str = ""
+    # Chaves (ou 'chave@endpoint') usadas pelo pool de LLM; por padrão, apenas GOOGLE_API_KEY
+    google_api_keys: List[str] = []
+    
+    # LLM Pool Settings
+    llm_max_concurrency_per_key: int = 4
+    llm_hedge_enabled: bool = True
+    llm_hedge_min_delay_seconds: float = 2.0
     
     # LangChain Settings
     model_name: str = "gemini-2.5-flash"
     temperature: float = 0.0
+    # Cascata de modelos (do mais leve ao mais forte); por padrão, apenas model_name
+    model_cascade: List[CascadeTier] = []
+    # Variante do system prompt: "compact" (enxuto, poda por pergunta) ou "full" (original)
+    prompt_variant: str = "compact"
+    
+    # Modo padrão das consultas: "agent" (ReAct sequencial), "plan" (plano de consultas
+    # com passos independentes em paralelo e uma chamada final de redação) ou "fast"
+    # (uma chamada gera a consulta, executada e formatada localmente)
+    default_query_mode: str = "agent"
+    plan_max_steps: int = 8
+    plan_max_parallel_steps: int = 4
+    # Conexões de leitura usadas pelos passos do plano executados em paralelo
+    read_pool_size: int = 4
+    # Espera máxima por uma conexão livre do pool antes de falhar a consulta
+    read_pool_timeout_seconds: float = 30.0
+    # Linhas do resultado incluídas na resposta do modo rápido (o restante fica em /results/{id})
+    fast_max_answer_rows: int = 100
+    # Consultas aproximadas (approximate=true): fração da Telemetria sorteada em cada estrato
+    # Chassi/Categoria/Serie na primeira consulta aproximada (0 desliga a amostra), mínimo de linhas
+    # por estrato e nível de confiança
+    approximate_sample_rate: float = 0.01
+    approximate_min_stratum_rows: int = 30
+    approximate_confidence: float = 0.95
+    
+    # Ingestão de leituras (POST /telemetry): linhas validadas por lote do corpo, linhas por
+    # transação do escritor, espera por mais lotes antes do COMMIT e limite de linhas na fila
+    ingest_parse_rows: int = 10000
+    ingest_commit_rows: int = 50000
+    ingest_commit_interval_ms: float = 50.0
+    ingest_max_pending_rows: int = 500000
+    # Token exigido no header X-Ingest-Token (vazio desativa a ingestão)
+    ingest_token: str = ""
+    # Intervalo mínimo entre as atualizações dos dados (catálogo, amostra) após a ingestão
+    ingest_refresh_min_interval_seconds: float = 5.0
     
     # Similarity Settings
     similarity_threshold: float = 0.7
+    
+    # LLM Completion Cache Settings
+    llm_cache_enabled: bool = True
+    llm_cache_path: str = "llm_cache.sqlite"
+    llm_cache_max_mb: float = 64.0
+    
+    # Admission Control Settings
+    admission_max_concurrency: int = 4
+    admission_max_queue: int = 32
+    admission_max_queue_per_client: int = 8
+    admission_max_wait_seconds: float = 30.0
+    
+    # Conversation Session Settings
+    session_idle_ttl_seconds: float = 1800.0
+    session_max_memory_mb: float = 256.0
+    session_max_rows_per_table: int = 100000
+    
+    # Observation Settings (resultados grandes e scratchpad do agente)
+    observation_max_rows: int = 50
+    observation_head_rows: int = 10
+    observation_tail_rows: int = 5
+    observation_store_max_results: int = 200
+    observation_store_max_memory_mb: float = 128.0
+    scratchpad_token_budget: int = 3000
+    scratchpad_keep_last_steps: int = 2
+    
+    # Async Job Settings
+    jobs_database_path: str = "jobs.sqlite"
+    job_workers: int = 2
+    job_lease_seconds: float = 600.0
+    job_max_attempts: int = 3
+    job_poll_interval_seconds: float = 1.0
+    
+    # Startup Settings
+    warmup_on_startup: bool = True
+    
+    # Response Settings (compressão negociada pelo Accept-Encoding)
+    response_compression_enabled: bool = True
+    response_compression_min_bytes: int = 1024
+    response_compression_level: int = 6
+    
+    # Circuito do LLM: abre por taxa de erro ou de chamadas lentas na janela; aberto, as
+    # consultas são respondidas em modo degradado (últimas respostas e consultas validadas)
+    llm_breaker_enabled: bool = True
+    llm_breaker_window_seconds: float = 60.0
+    llm_breaker_min_calls: int = 10
+    llm_breaker_error_rate: float = 0.5
+    llm_breaker_slow_call_seconds: float = 30.0
+    llm_breaker_slow_call_rate: float = 0.8
+    llm_breaker_open_seconds: float = 30.0
+    degraded_answer_cache_size: int = 500
+    
+    # Profiling sob demanda (X-Profile ou ?profile=true com o token de admin; vazio desativa)
+    profiling_admin_token: str = ""
+    profiling_sample_interval_ms: float = 5.0
+    profiling_max_profiles: int = 20
 
 def load_settings() -> Settings:
     """Carrega as configurações do arquivo .env ou variáveis de ambiente"""
@@ -32,21 +167,108 @@ def load_settings() -> Settings:
         from dotenv import load_dotenv
         load_dotenv(env_file)
     
+    # Chaves do pool de LLM: GOOGLE_API_KEYS (separadas por vírgula) ou GOOGLE_API_KEY
+    google_api_key = os.getenv("GOOGLE_API_KEY", "")
+    google_api_keys = [k.strip() for k in os.getenv("GOOGLE_API_KEYS", "").split(",") if k.strip()]
+    if not google_api_keys and google_api_key:
+        google_api_keys = [google_api_key]
+    if not google_api_key and google_api_keys:
+        google_api_key = google_api_keys[0].partition("@")[0]
+    
     # Criar configurações com valores das variáveis de ambiente
     settings = Settings(
-        google_api_key=os.getenv("GOOGLE_API_KEY", ""),
+        google_api_key=google_api_key,
+        google_api_keys=google_api_keys,
+        llm_max_concurrency_per_key=int(os.getenv("LLM_MAX_CONCURRENCY_PER_KEY", "4")),
+        llm_hedge_enabled=os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true",
+        llm_hedge_min_delay_seconds=float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "2.0")),
         database_path=os.getenv("DATABASE_PATH", "Bases_VAI - oficial real.db"),
+        databases=parse_databases(os.getenv("DATABASES", "")),
+        default_database=os.getenv("DEFAULT_DATABASE", "default"),
+        service_pool_max_instances=int(os.getenv("SERVICE_POOL_MAX_INSTANCES", "4")),
+        service_pool_max_memory_mb=float(os.getenv("SERVICE_POOL_MAX_MEMORY_MB", "2048")),
+        service_pool_instance_overhead_mb=float(os.getenv("SERVICE_POOL_INSTANCE_OVERHEAD_MB", "64")),
+        validated_queries_path=os.getenv("VALIDATED_QUERIES_PATH", ""),
+        hot_reload_enabled=os.getenv("HOT_RELOAD_ENABLED", "true").lower() == "true",
+        hot_reload_poll_seconds=float(os.getenv("HOT_RELOAD_POLL_SECONDS", "5")),
         api_title=os.getenv("API_TITLE", "Visagio RAG API"),
         api_version=os.getenv("API_VERSION", "1.0.0"),
         api_description=os.getenv("API_DESCRIPTION", "API para consultas RAG em banco de dados SQLite usando LangChain e Gemini"),
         model_name=os.getenv("MODEL_NAME", "gemini-2.5-flash"),
         temperature=float(os.getenv("TEMPERATURE", "0.0")),
-        similarity_threshold=float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
+        model_cascade=parse_model_cascade(
+            os.getenv("MODEL_CASCADE", ""), os.getenv("MODEL_NAME", "gemini-2.5-flash")
+        ),
+        prompt_variant=os.getenv("PROMPT_VARIANT", "compact").lower(),
+        default_query_mode=os.getenv("DEFAULT_QUERY_MODE", "agent").lower(),
+        plan_max_steps=int(os.getenv("PLAN_MAX_STEPS", "8")),
+        plan_max_parallel_steps=int(os.getenv("PLAN_MAX_PARALLEL_STEPS", "4")),
+        read_pool_size=int(os.getenv("READ_POOL_SIZE", "4")),
+        read_pool_timeout_seconds=float(os.getenv("READ_POOL_TIMEOUT_SECONDS", "30")),
+        fast_max_answer_rows=int(os.getenv("FAST_MAX_ANSWER_ROWS", "100")),
+        approximate_sample_rate=float(os.getenv("APPROXIMATE_SAMPLE_RATE", "0.01")),
+        approximate_min_stratum_rows=int(os.getenv("APPROXIMATE_MIN_STRATUM_ROWS", "30")),
+        approximate_confidence=float(os.getenv("APPROXIMATE_CONFIDENCE", "0.95")),
+        ingest_parse_rows=int(os.getenv("INGEST_PARSE_ROWS", "10000")),
+        ingest_commit_rows=int(os.getenv("INGEST_COMMIT_ROWS", "50000")),
+        ingest_commit_interval_ms=float(os.getenv("INGEST_COMMIT_INTERVAL_MS", "50")),
+        ingest_max_pending_rows=int(os.getenv("INGEST_MAX_PENDING_ROWS", "500000")),
+        ingest_token=os.getenv("INGEST_TOKEN", ""),
+        ingest_refresh_min_interval_seconds=float(os.getenv("INGEST_REFRESH_MIN_INTERVAL_SECONDS", "5")),
+        similarity_threshold=float(os.getenv("SIMILARITY_THRESHOLD", "0.7")),
+        llm_cache_enabled=os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true",
+        llm_cache_path=os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite"),
+        llm_cache_max_mb=float(os.getenv("LLM_CACHE_MAX_MB", "64")),
+        admission_max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", "4")),
+        admission_max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+        admission_max_queue_per_client=int(os.getenv("ADMISSION_MAX_QUEUE_PER_CLIENT", "8")),
+        admission_max_wait_seconds=float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "30")),
+        session_idle_ttl_seconds=float(os.getenv("SESSION_IDLE_TTL_SECONDS", "1800")),
+        session_max_memory_mb=float(os.getenv("SESSION_MAX_MEMORY_MB", "256")),
+        session_max_rows_per_table=int(os.getenv("SESSION_MAX_ROWS_PER_TABLE", "100000")),
+        observation_max_rows=int(os.getenv("OBSERVATION_MAX_ROWS", "50")),
+        observation_head_rows=int(os.getenv("OBSERVATION_HEAD_ROWS", "10")),
+        observation_tail_rows=int(os.getenv("OBSERVATION_TAIL_ROWS", "5")),
+        observation_store_max_results=int(os.getenv("OBSERVATION_STORE_MAX_RESULTS", "200")),
+        observation_store_max_memory_mb=float(os.getenv("OBSERVATION_STORE_MAX_MEMORY_MB", "128")),
+        scratchpad_token_budget=int(os.getenv("SCRATCHPAD_TOKEN_BUDGET", "3000")),
+        scratchpad_keep_last_steps=int(os.getenv("SCRATCHPAD_KEEP_LAST_STEPS", "2")),
+        jobs_database_path=os.getenv("JOBS_DATABASE_PATH", "jobs.sqlite"),
+        job_workers=int(os.getenv("JOB_WORKERS", "2")),
+        job_lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "600")),
+        job_max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+        job_poll_interval_seconds=float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1.0")),
+        warmup_on_startup=os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true",
+        response_compression_enabled=os.getenv("RESPONSE_COMPRESSION_ENABLED", "true").lower() == "true",
+        response_compression_min_bytes=int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024")),
+        response_compression_level=int(os.getenv("RESPONSE_COMPRESSION_LEVEL", "6")),
+        llm_breaker_enabled=os.getenv("LLM_BREAKER_ENABLED", "true").lower() == "true",
+        llm_breaker_window_seconds=float(os.getenv("LLM_BREAKER_WINDOW_SECONDS", "60")),
+        llm_breaker_min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "10")),
+        llm_breaker_error_rate=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+        llm_breaker_slow_call_seconds=float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "30")),
+        llm_breaker_slow_call_rate=float(os.getenv("LLM_BREAKER_SLOW_CALL_RATE", "0.8")),
+        llm_breaker_open_seconds=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30")),
+        degraded_answer_cache_size=int(os.getenv("DEGRADED_ANSWER_CACHE_SIZE", "500")),
+        profiling_admin_token=os.getenv("PROFILING_ADMIN_TOKEN", ""),
+        profiling_sample_interval_ms=float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "5")),
+        profiling_max_profiles=int(os.getenv("PROFILING_MAX_PROFILES", "20"))
     )
     
     # Garantir que o caminho do banco seja absoluto
     if not os.path.isabs(settings.database_path):
         settings.database_path = str(Path(__file__).parent.parent / settings.database_path)
+    settings.databases = {
+        name: path if os.path.isabs(path) else str(Path(__file__).parent.parent / path)
+        for name, path in settings.databases.items()
+    }
+    settings.databases[settings.default_database] = settings.database_path
+    if settings.validated_queries_path and not os.path.isabs(settings.validated_queries_path):
+        settings.validated_queries_path = str(Path(__file__).parent.parent / settings.validated_queries_path)
+    if not os.path.isabs(settings.jobs_database_path):
+        settings.jobs_database_path = str(Path(__file__).parent.parent / settings.jobs_database_path)
+    if not os.path.isabs(settings.llm_cache_path):
+        settings.llm_cache_path = str(Path(__file__).parent.parent / settings.llm_cache_path)
     
     return settings
 
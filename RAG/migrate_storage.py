@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Migra a Telemetria para o layout normalizado (dicionários + Data em epoch)
+
+Por padrão o banco original é preservado e o resultado é gravado em --output;
+use --in-place para migrar o próprio arquivo configurado em DATABASE_PATH.
+Com --layout partitioned a Telemetria também é particionada por mês, e
+--drop-before AAAA-MM-DD aplica a retenção removendo as partições antigas.
+"""
+
+import argparse
+import shutil
+import sys
+from pathlib import Path
+
+# Adicionar o diretório atual ao PYTHONPATH
+current_dir = Path(__file__).parent
+sys.path.insert(0, str(current_dir))
+
+def main():
+    """Função principal da migração"""
+    from config.settings import settings
+    from api.utils.storage_layout import drop_partitions_before, migrate_to_normalized, migrate_to_partitioned
+
+    parser = argparse.ArgumentParser(description="Migra a Telemetria para o layout normalizado")
+    parser.add_argument("--database", default=settings.database_path, help="Banco de origem")
+    parser.add_argument("--layout", choices=["normalized", "partitioned"], default="normalized",
+                        help="Layout de destino (partitioned: uma tabela de fatos por mês)")
+    parser.add_argument("--drop-before", help="Retenção: remove as partições anteriores à data (AAAA-MM-DD)")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--output", help="Arquivo de destino (cópia migrada)")
+    group.add_argument("--in-place", action="store_true", help="Migra o próprio banco de origem")
+    args = parser.parse_args()
+
+    source = Path(args.database)
+    if not source.exists():
+        print(f"❌ Banco de dados não encontrado: {source}")
+        sys.exit(1)
+
+    if args.drop_before:
+        if not args.in_place:
+            print("❌ A retenção é aplicada no próprio banco; use --in-place")
+            sys.exit(1)
+        try:
+            dropped = drop_partitions_before(str(source), args.drop_before)
+        except Exception as e:
+            print(f"❌ Erro na retenção: {e}")
+            sys.exit(1)
+        print(f"🗑️ {len(dropped)} partições removidas: {', '.join(dropped) or '-'}")
+        return
+
+    target = source if args.in_place else Path(args.output)
+    if not args.in_place:
+        shutil.copyfile(source, target)
+
+    size_before = source.stat().st_size
+    print(f"🔄 Migrando {target}...")
+    try:
+        if args.layout == "partitioned":
+            report = migrate_to_partitioned(str(target))
+        else:
+            report = migrate_to_normalized(str(target))
+    except Exception as e:
+        print(f"❌ Erro na migração: {e}")
+        sys.exit(1)
+
+    size_after = target.stat().st_size
+    if args.layout == "partitioned":
+        print(f"✅ Telemetria particionada em {report['partitions']} meses em {report['duration_seconds']:.1f}s")
+    else:
+        print(f"✅ {report['migrated_rows']} linhas migradas em {report['duration_seconds']:.1f}s")
+    print(f"📦 Tamanho: {size_before / 1024 / 1024:.1f} MB -> {size_after / 1024 / 1024:.1f} MB "
+          f"({100 * (1 - size_after / size_before):.0f}% menor)")
+
+if __name__ == "__main__":
+    main()
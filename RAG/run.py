@@ -28,7 +28,7 @@ def main():
     from dotenv import load_dotenv
     load_dotenv()
     
-    if not os.getenv("GOOGLE_API_KEY"):
+    if not os.getenv("GOOGLE_API_KEY") and not os.getenv("GOOGLE_API_KEYS"):
         print("❌ GOOGLE_API_KEY não configurada no arquivo .env")
         print("🔑 Configure sua chave da API do Gemini no arquivo .env")
         return
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from api.services.admission import AdmissionController, AdmissionRejected
+
+def _controller(**overrides):
+    options = dict(max_concurrency=1, max_queue=4, max_wait_seconds=1.0, max_queue_per_client=4)
+    options.update(overrides)
+    return AdmissionController(**options)
+
+def test_concurrency_limit_and_release():
+    """Testa que a vaga liberada é entregue à próxima requisição da fila"""
+    async def scenario():
+        controller = _controller()
+        await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0.01)
+        assert controller.active == 1
+        assert controller.queued == 1
+
+        controller.release()
+        await waiter
+        assert controller.active == 1
+        assert controller.queued == 0
+
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+def test_queue_full_rejects_with_retry_after():
+    """Testa a recusa imediata quando a fila está cheia"""
+    async def scenario():
+        controller = _controller(max_queue=1)
+        await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire("c")
+        assert exc_info.value.reason == "queue_full"
+        assert exc_info.value.retry_after >= 1
+
+        controller.release()
+        await waiter
+        controller.release()
+
+    asyncio.run(scenario())
+
+def test_max_wait_timeout():
+    """Testa que a espera por vaga é limitada"""
+    async def scenario():
+        controller = _controller(max_wait_seconds=0.05)
+        await controller.acquire("a")
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire("b")
+        assert exc_info.value.reason == "timeout"
+        assert controller.queued == 0
+
+    asyncio.run(scenario())
+
+def test_round_robin_between_clients():
+    """Testa que um cliente com rajada não passa na frente dos demais"""
+    async def scenario():
+        controller = _controller(max_queue=10)
+        order = []
+
+        async def request(client_id):
+            await controller.acquire(client_id)
+            order.append(client_id)
+
+        await controller.acquire("ocupado")
+        tasks = [asyncio.create_task(request(c)) for c in ["a", "a", "a", "b"]]
+        await asyncio.sleep(0.01)
+
+        for _ in tasks:
+            controller.release()
+            await asyncio.sleep(0.01)
+
+        assert order[:2] == ["a", "b"]
+
+    asyncio.run(scenario())
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -23,6 +23,92 @@ def test_health_endpoint():
     assert "database_connected" in data
     assert "gemini_configured" in data
 
+def test_ready_endpoint():
+    """Testa o endpoint de readiness"""
+    response = client.get("/ready")
+    # 200 quando o agente está pronto, 503 durante o aquecimento ou após falha
+    assert response.status_code in [200, 503]
+    data = response.json()
+    assert "ready" in data
+    assert "status" in data
+    assert data["status"] in ["warming_up", "ready", "failed"]
+
+def test_metrics_endpoint():
+    """Testa o endpoint de métricas"""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    data = response.json()
+    assert "counters" in data
+    assert "gauges" in data
+    assert "summaries" in data
+
+    response = client.get("/metrics", params={"format": "prometheus"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+def test_session_lifecycle():
+    """Testa a criação, consulta e remoção de uma sessão de conversa"""
+    response = client.post("/sessions")
+    assert response.status_code == 201
+    session_id = response.json()["session_id"]
+
+    response = client.get(f"/sessions/{session_id}")
+    assert response.status_code == 200
+    assert response.json()["turns"] == []
+
+    assert client.delete(f"/sessions/{session_id}").status_code == 204
+    assert client.get(f"/sessions/{session_id}").status_code == 404
+
+def test_query_with_unknown_session():
+    """Testa consulta com sessão inexistente"""
+    response = client.post("/query", json={"query": "E por mês?", "session_id": "inexistente"})
+    assert response.status_code == 404
+
+@pytest.fixture
+def jobs_file(tmp_path, monkeypatch):
+    """Fila de jobs em um diretório temporário (os testes não deixam jobs.sqlite no repositório)"""
+    from api.services import job_queue as job_queue_module
+    monkeypatch.setattr(job_queue_module.settings, "jobs_database_path", str(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(job_queue_module, "_job_queue", None)
+    return tmp_path / "jobs.sqlite"
+
+def test_job_lifecycle(jobs_file):
+    """Testa a criação e a consulta de um job assíncrono"""
+    assert not jobs_file.exists()
+    response = client.post("/jobs", json={"query": "É possível identificar equipamentos com manutenção preventiva necessária?"})
+    assert response.status_code == 202
+    data = response.json()
+    assert data["status"] in ["queued", "running", "succeeded", "failed"]
+
+    response = client.get(f"/jobs/{data['job_id']}")
+    assert response.status_code == 200
+    assert response.json()["job_id"] == data["job_id"]
+
+    assert jobs_file.exists()
+
+def test_job_with_session_is_rejected(jobs_file):
+    """Testa que jobs não aceitam sessão (as sessões não são visíveis ao worker.py)"""
+    session_id = client.post("/sessions").json()["session_id"]
+    response = client.post("/jobs", json={"query": "E por mês?", "session_id": session_id})
+    assert response.status_code == 400
+    assert not jobs_file.exists()
+
+def test_unknown_job(jobs_file):
+    """Testa consulta de job inexistente"""
+    assert client.get("/jobs/inexistente").status_code == 404
+
+def test_result_pages():
+    """Testa a paginação de um resultado completo guardado no servidor"""
+    from api.services.observation_manager import observation_store
+
+    result_id = observation_store.put("SELECT ...", ["Chassi", "Total"], [(i, i * 2) for i in range(100)])
+    response = client.get(f"/results/{result_id}?offset=90&limit=20")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_rows"] == 100
+    assert data["rows"][0] == [90, 180] and len(data["rows"]) == 10
+    assert client.get("/results/inexistente").status_code == 404
+
 def test_examples_endpoint():
     """Testa o endpoint de exemplos"""
     response = client.get("/examples")
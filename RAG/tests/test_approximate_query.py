@@ -0,0 +1,136 @@
+import json
+import random
+import sqlite3
+
+import pytest
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from api.services.approximate_query import ApproximateQueryError, StratifiedSample, parse_aggregate_query
+from api.services import rag_service as rag_service_module
+from api.services.rag_service import RAGService
+from api.services.read_pool import ReadConnectionPool
+from api.services.schema_catalog import SchemaCatalog
+
+def _database(path, chassis=20, days=500):
+    """Telemetria com valores que crescem com o chassi (estratos heterogêneos)"""
+    rng = random.Random(3)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE Chassis (Chassi INTEGER PRIMARY KEY, Contrato INTEGER, Cliente INTEGER, Modelo INTEGER)")
+    conn.execute(
+        "CREATE TABLE Telemetria (Chassi INTEGER, UnidadeMedida TEXT, Categoria TEXT, "
+        "Data TIMESTAMP, Serie TEXT, Valor REAL)"
+    )
+    conn.executemany("INSERT INTO Chassis VALUES (?, ?, ?, ?)", [(c, c, c % 4, 1) for c in range(1, chassis + 1)])
+    conn.executemany(
+        "INSERT INTO Telemetria VALUES (?, 'hr', 'Uso do Motor', ?, ?, ?)",
+        [
+            (chassi, f"2024-01-01 {day:05d}", serie, rng.uniform(0, 8) * chassi)
+            for chassi in range(1, chassis + 1) for day in range(days) for serie in ("Carga Alta", "Marcha Lenta")
+        ],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+@pytest.fixture
+def sample(tmp_path):
+    path = _database(str(tmp_path / "telemetria.db"))
+    sample = StratifiedSample(path, rate=0.05, min_rows=30)
+    sample.load_or_build()
+    return sample
+
+def test_parse_aggregate_query():
+    """Testa a decomposição das consultas suportadas e a recusa das demais"""
+    query = parse_aggregate_query(
+        "SELECT c.Cliente, ROUND(SUM(t.Valor), 2) AS Total FROM Telemetria t "
+        "JOIN Chassis c ON c.Chassi = t.Chassi WHERE t.Serie = 'Carga Alta' GROUP BY 1 ORDER BY Total DESC LIMIT 3"
+    )
+    assert [item["name"] for item in query["items"]] == ["Cliente", "Total"]
+    assert query["items"][1]["function"] == "SUM" and query["items"][1]["round"] == 2
+    assert query["source"].startswith("FROM AmostraTelemetria t JOIN Chassis")
+    assert query["groups"] == ["c.Cliente"] and query["order"] == [(1, True)] and query["limit"] == 3
+
+    for sql in (
+        "SELECT Chassi, MAX(Valor) FROM Telemetria GROUP BY Chassi",
+        "SELECT COUNT(DISTINCT Chassi) FROM Telemetria",
+        "SELECT Chassi FROM Telemetria",
+        "SELECT Serie, SUM(Valor) FROM Telemetria GROUP BY Serie HAVING SUM(Valor) > 10",
+        "SELECT ROUND(SUM(Valor) / COUNT(*), 2) FROM Telemetria",
+        "SELECT Chassi, SUM(Valor) FROM (SELECT * FROM Telemetria) GROUP BY Chassi",
+    ):
+        with pytest.raises(ApproximateQueryError):
+            parse_aggregate_query(sql)
+
+def test_estimates_cover_exact_results(sample):
+    """Testa que SUM, COUNT e AVG estimados ficam dentro da margem de erro do valor exato"""
+    sql = (
+        "SELECT Serie, SUM(Valor) AS Total, COUNT(*) AS Linhas, AVG(Valor) AS Media FROM Telemetria "
+        "WHERE Chassi > 5 GROUP BY Serie ORDER BY Serie"
+    )
+    conn = sqlite3.connect(sample.database_path)
+    exact = conn.execute(sql).fetchall()
+    estimate = sample.estimate(conn, sql, 0.95)
+    conn.close()
+
+    assert estimate["columns"] == [
+        "Serie", "Total", "Total ± (IC 95%)", "Linhas", "Linhas ± (IC 95%)", "Media", "Media ± (IC 95%)"
+    ]
+    assert [row[0] for row in estimate["rows"]] == ["Carga Alta", "Marcha Lenta"]
+    for (serie, total, linhas, media), row in zip(exact, estimate["rows"]):
+        # Margem de 95%; 3x a margem torna o teste estável apesar do sorteio
+        assert 0 < row[2] and abs(row[1] - total) <= 3 * row[2]
+        assert abs(row[5] - media) <= 3 * row[6]
+        # O filtro coincide com os estratos inteiros: a contagem é exata
+        assert row[3] == linhas and row[4] == 0
+    assert estimate["sample_rows"] < estimate["table_rows"] / 10
+    assert estimate["intervals"][0]["Total"][0] < estimate["rows"][0][1] < estimate["intervals"][0]["Total"][1]
+
+def test_sample_is_persisted_hidden_and_reused(sample):
+    """Testa que a amostra fica em tabelas ocultas e só é sorteada de novo se a Telemetria mudar"""
+    built_at = sample.metadata["built_at"]
+    reloaded = StratifiedSample(sample.database_path, rate=0.05, min_rows=30)
+    reloaded.load_or_build()
+    assert reloaded.metadata["built_at"] == built_at
+    assert reloaded.strata == sample.strata
+    assert set(SchemaCatalog.introspect(sample.database_path).tables) == {"Chassis", "Telemetria"}
+
+    with sqlite3.connect(sample.database_path) as conn:
+        conn.execute("INSERT INTO Telemetria VALUES (1, 'hr', 'Uso do Motor', '2025-01-01', 'Carga Alta', 1.0)")
+    reloaded.load_or_build()
+    assert reloaded.metadata["built_at"] != built_at
+    assert reloaded.metadata["linhas_telemetria"] == 20 * 500 * 2 + 1
+
+def test_fast_mode_flags_approximate_answers(sample, monkeypatch):
+    """Testa o modo rápido aproximado: colunas de margem, detalhes da estimativa e recaída na consulta exata"""
+    path = sample.database_path
+    service = RAGService(path)
+    service.read_pool = ReadConnectionPool(
+        lambda: sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False), size=2
+    )
+    answer = lambda sql: json.dumps({"sql": sql, "justificativa": "Total por série."})
+    try:
+        service.fast_llm = FakeListChatModel(responses=[
+            answer("SELECT Serie, ROUND(SUM(Valor), 1) AS Total FROM Telemetria GROUP BY Serie"),
+            answer("SELECT Serie, MAX(Valor) AS Maximo FROM Telemetria GROUP BY Serie"),
+        ])
+        # A amostra só é carregada na primeira consulta aproximada
+        monkeypatch.setattr(rag_service_module.settings, "approximate_sample_rate", sample.rate)
+        monkeypatch.setattr(rag_service_module.settings, "approximate_min_stratum_rows", sample.min_rows)
+        assert service.approximate_sample is None
+        approximation = {}
+        output = service._run_fast("Qual o total por série?", None, approximation)
+        assert service.approximate_sample.metadata["built_at"] == sample.metadata["built_at"]
+        assert "| Serie | Total | Total ± (IC 95%) |" in output
+        assert "Resultado aproximado" in output
+        assert approximation["confidence"] == 0.95 and len(approximation["intervals"]) == 2
+
+        # MAX não é estimável pela amostra: a consulta roda exata e nada é preenchido
+        approximation = {}
+        output = service._run_fast("Qual o máximo por série?", None, approximation)
+        assert approximation == {}
+        assert "Resultado aproximado" not in output
+    finally:
+        service.read_pool.close()
+
+if __name__ == "__main__":
+    pytest.main([__file__])
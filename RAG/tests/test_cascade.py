@@ -0,0 +1,92 @@
+import sqlite3
+
+import pytest
+
+from api.services import rag_service as rag_service_module
+from api.services.rag_service import RAGService
+from api.services.read_pool import ReadConnectionPool
+from api.services.session_store import session_authorizer, session_store
+from config.settings import parse_model_cascade
+
+ANSWER = """### Consulta:
+```sql
+SELECT Categoria, COUNT(*) AS Total
+FROM Telemetria
+GROUP BY Categoria
+```
+
+### Resposta:
+{resposta}
+
+### Justificativa:
+Contagem de registros por categoria."""
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    db_path = tmp_path / "telemetria.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE Telemetria (Chassi INTEGER, Categoria TEXT, Valor REAL)")
+    monkeypatch.setattr(rag_service_module.settings, "database_path", str(db_path))
+    service = RAGService()
+
+    def _connect():
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False, cached_statements=0)
+        session_store.attach(conn)
+        return conn
+
+    service.read_pool = ReadConnectionPool(_connect, size=1, authorizer=session_authorizer)
+    yield service
+    service.read_pool.close()
+
+def test_parse_model_cascade():
+    """Testa a leitura da configuração da cascata"""
+    tiers = parse_model_cascade("gemini-2.0-flash-lite:6, gemini-2.5-flash", "gemini-2.5-flash")
+    assert [(t.model, t.max_iterations) for t in tiers] == [("gemini-2.0-flash-lite", 6), ("gemini-2.5-flash", 15)]
+    assert parse_model_cascade("", "gemini-2.5-flash")[0].model == "gemini-2.5-flash"
+
+def test_valid_answer_is_accepted(service):
+    """Testa que uma resposta válida não escala"""
+    assert service._check_answer(ANSWER.format(resposta="| Uso do Motor | 10 |")) is None
+
+def test_invalid_sql_escalates(service):
+    """Testa que uma consulta que não compila escala para o próximo nível"""
+    output = ANSWER.format(resposta="10").replace("FROM Telemetria", "FROM TabelaInexistente")
+    assert service._check_answer(output) == "sql"
+
+def test_session_follow_up_is_accepted(service):
+    """Testa que a consulta sobre a tabela do turno anterior compila (banco das sessões anexado)"""
+    session = session_store.create()
+    turn = session_store.record_turn(session.session_id, "Registros por chassi",
+                                     "SELECT Categoria, Chassi FROM Telemetria", (["Categoria", "Chassi"], [("Uso do Motor", 1)]))
+    try:
+        output = ANSWER.format(resposta="| Uso do Motor | 10 |").replace("FROM Telemetria", f"FROM {turn['table']}")
+        with session_store.scope(session.session_id):
+            assert service._check_answer(output) is None
+        assert service._check_answer(output) == "sql"
+    finally:
+        session_store.delete(session.session_id)
+
+def test_empty_result_escalates(service):
+    """Testa que um resultado vazio escala para o próximo nível"""
+    assert service._check_answer(ANSWER.format(resposta="[]")) == "empty"
+
+def test_iteration_limit_escalates(service):
+    """Testa que o esgotamento do orçamento de iterações escala"""
+    assert service._check_answer("Agent stopped due to iteration limit or time limit.") == "parse"
+
+def test_refusal_is_accepted(service):
+    """Testa que recusas explícitas são respostas válidas"""
+    assert service._check_answer("**ERRO:** O pedido envolve modificação do banco de dados") is None
+
+def test_close_shuts_down_every_model_pool(service):
+    """Testa que descartar a instância encerra os pools de LLM de todos os níveis da cascata"""
+    from api.services.llm_pool import LLMPool
+    from api.services.pooled_chat_model import PooledChatModel
+
+    pools = {model: LLMPool([(model, object())], hedge_enabled=False) for model in ("leve", "forte")}
+    service.llms = {model: PooledChatModel(pool=pool, model_name=model) for model, pool in pools.items()}
+    service.close()
+    assert all(pool._executor._shutdown for pool in pools.values())
+
+if __name__ == "__main__":
+    pytest.main([__file__])
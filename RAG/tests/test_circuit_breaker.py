@@ -0,0 +1,186 @@
+import sqlite3
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.services import rag_service as rag_service_module
+from api.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from api.services.llm_pool import LLMPool
+from api.services.rag_service import RAGService
+from api.services.read_pool import ReadConnectionPool
+
+class FailingProvider:
+    """Provedor falso que sempre falha (Gemini fora do ar)"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def complete(self, prompt):
+        self.calls += 1
+        raise RuntimeError("503 Service Unavailable")
+
+class PooledExecutor:
+    """Agente falso: respostas do cache de completions saem sem chamar o LLM; as demais passam pelo pool"""
+
+    def __init__(self, pool, cached=None):
+        self.pool = pool
+        self.cached = cached or {}
+
+    def invoke(self, inputs, config=None):
+        if inputs["input"] in self.cached:
+            return {"output": self.cached[inputs["input"]]}
+        return {"output": self.pool.call(lambda client: client.complete(inputs["input"]))}
+
+def _open_breaker():
+    breaker = CircuitBreaker(min_calls=1, open_seconds=60)
+    breaker.after_call(breaker.before_call(), RuntimeError("503"))
+    assert breaker.state == "open"
+    return breaker
+
+def test_breaker_opens_on_errors_and_recovers_through_probe():
+    """Testa abertura pela taxa de erro, recusa rápida e fechamento após a chamada de teste"""
+    breaker = CircuitBreaker(min_calls=4, error_rate=0.5, open_seconds=0.05)
+    for error in (None, None, RuntimeError("500")):
+        breaker.after_call(breaker.before_call(), error)
+    assert breaker.state == "closed"
+    breaker.after_call(breaker.before_call(), RuntimeError("500"))
+    assert breaker.state == "open" and breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    probe = breaker.before_call()
+    assert breaker.state == "half_open"
+    # Uma chamada de teste por vez
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.after_call(probe, RuntimeError("500"))
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    breaker.after_call(breaker.before_call())
+    assert breaker.state == "closed" and breaker.status()["calls_in_window"] == 0
+
+def test_only_the_probe_decides_half_open():
+    """Testa que uma chamada antiga, iniciada antes da abertura, não fecha nem reabre o circuito"""
+    breaker = CircuitBreaker(min_calls=2, open_seconds=0.05)
+    stale = breaker.before_call()
+    breaker.after_call(breaker.before_call(), RuntimeError("500"))
+    breaker.after_call(breaker.before_call(), RuntimeError("500"))
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    probe = breaker.before_call()
+    breaker.after_call(stale)
+    assert breaker.state == "half_open" and breaker.is_open()
+    breaker.after_call(probe)
+    assert breaker.state == "closed"
+
+def test_stuck_probe_reopens_the_circuit():
+    """Testa que uma chamada de teste travada reabre o circuito e, depois dele, outra chamada de teste passa"""
+    breaker = CircuitBreaker(min_calls=1, slow_call_seconds=0.05, open_seconds=0.05)
+    breaker.after_call(breaker.before_call(), RuntimeError("500"))
+    time.sleep(0.06)
+    stuck = breaker.before_call()
+    assert breaker.state == "half_open"
+
+    time.sleep(0.06)
+    assert breaker.is_open() and breaker.state == "open"
+    assert breaker.reason == "chamada de teste travada"
+    time.sleep(0.06)
+    probe = breaker.before_call()
+    breaker.after_call(probe)
+    assert breaker.state == "closed"
+
+    # O teste travado que termina depois não conta de novo
+    breaker.after_call(stuck, RuntimeError("timeout"))
+    assert breaker.state == "closed" and breaker.status()["in_flight"] == 0
+
+def test_breaker_opens_on_stuck_calls():
+    """Testa que chamadas travadas abrem o circuito antes de terminarem"""
+    breaker = CircuitBreaker(min_calls=3, slow_call_seconds=0.05, slow_call_rate=0.8)
+    tokens = [breaker.before_call() for _ in range(3)]
+    assert not breaker.is_open()
+    time.sleep(0.06)
+    assert breaker.is_open()
+    assert breaker.status()["in_flight"] == 3
+    for token in tokens:
+        breaker.after_call(token)
+
+def test_pool_fails_fast_when_open():
+    """Testa que o pool para de chamar o provedor com o circuito aberto"""
+    provider = FailingProvider()
+    breaker = CircuitBreaker(min_calls=3, open_seconds=60)
+    pool = LLMPool([("fake", provider)], hedge_enabled=False, breaker=breaker)
+    for _ in range(3):
+        with pytest.raises(RuntimeError, match="503"):
+            pool.call(lambda client: client.complete("oi"))
+    with pytest.raises(CircuitOpenError):
+        pool.call(lambda client: client.complete("oi"))
+    assert provider.calls == 3
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """Serviço pronto com o LLM fora do ar, uma consulta validada e o circuito aberto"""
+    path = str(tmp_path / "telemetria.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE Chassis (Chassi INTEGER PRIMARY KEY, Cliente INTEGER)")
+        conn.executemany("INSERT INTO Chassis VALUES (?, ?)", [(1, 10), (2, 10), (3, 20)])
+    service = RAGService(path, "frota")
+    breaker = _open_breaker()
+    service.agent_executor = PooledExecutor(LLMPool([("fake", FailingProvider())], hedge_enabled=False, breaker=breaker), {
+        "Qual a resposta em cache?": "### Consulta:\n```sql\nSELECT COUNT(*) FROM Chassis\n```\n\n"
+                                     "### Resposta:\n3\n\n### Justificativa:\nContagem.",
+    })
+    service.agent_executors = [(rag_service_module.settings.model_cascade[-1], service.agent_executor)]
+    service._ready.set()
+    service.read_pool = ReadConnectionPool(
+        lambda: sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False), size=1
+    )
+    service.consultas_validadas = [
+        {"Pedido": "quantos chassis existem por cliente", "Consulta": "SELECT Cliente, COUNT(*) AS Chassis FROM Chassis GROUP BY Cliente"}
+    ]
+    monkeypatch.setattr(rag_service_module, "llm_breaker", breaker)
+    yield service
+    service.read_pool.close()
+
+def test_degraded_answers_while_open(service):
+    """Testa as respostas sem LLM: última resposta, consulta validada e falha rápida"""
+    service.answer_cache.put("qual o total de chassis", {
+        "query": "Qual o total de chassis?", "sql_query": "SELECT COUNT(*) FROM Chassis", "result": "3",
+        "justification": "Contagem.", "timestamp": "2024-05-01T10:00:00", "mode": "fast", "model": "gemini",
+        "approximate": False, "approximation": None,
+    })
+    cached = service.query("qual o total de chassis?")
+    assert cached["degraded"] and cached["degraded_source"] == "answer_cache"
+    assert cached["result"] == "3" and cached["llm_calls"] == 0
+    assert "modo degradado" in cached["justification"]
+
+    validated = service.query("Quantos chassis existem por cliente?")
+    assert validated["degraded_source"] == "validated_query"
+    assert "SELECT Cliente, COUNT(*)" in validated["sql_query"]
+    assert "| 10 | 2 |" in validated["result"]
+
+    with pytest.raises(CircuitOpenError) as error:
+        service.query("Qual o consumo médio em marcha lenta?")
+    assert error.value.retry_after > 0
+
+def test_cached_completions_answer_while_open(service):
+    """Testa que o circuito aberto não impede respostas que não chamam o LLM (cache de completions)"""
+    response = service.query("Qual a resposta em cache?", mode="agent")
+    assert not response["degraded"] and response["result"].strip() == "3"
+
+def test_health_reports_breaker(service):
+    """Testa que o estado do circuito aparece em /health e rebaixa o status"""
+    service.db = object()
+    status = service.get_health_status()
+    assert status["llm_circuit"]["state"] == "open"
+    assert status["status"] in ("degraded", "unhealthy")
+
+    response = TestClient(app).get("/health")
+    assert response.json()["llm_circuit"]["state"] == "open"
+
+if __name__ == "__main__":
+    pytest.main([__file__])
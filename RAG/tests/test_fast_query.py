@@ -0,0 +1,78 @@
+import json
+import sqlite3
+
+import pytest
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from api.services.fast_query import FastQueryError, format_answer, parse_fast_response
+from api.services.observation_manager import observation_store
+from api.services.rag_service import RAGService, build_llm_call_counter
+from api.services.read_pool import ReadConnectionPool
+
+@pytest.fixture
+def service(tmp_path):
+    path = tmp_path / "telemetria.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE Telemetria (Chassi INTEGER, Serie TEXT, Valor REAL)")
+        conn.executemany(
+            "INSERT INTO Telemetria VALUES (?, ?, ?)",
+            [(i % 10, "Carga Alta" if i % 2 else "Marcha Lenta", float(i)) for i in range(100)],
+        )
+    service = RAGService()
+    service.read_pool = ReadConnectionPool(
+        lambda: sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False), size=2
+    )
+    yield service
+    service.read_pool.close()
+
+def _answer(sql, justification="Soma por série."):
+    return "```json\n" + json.dumps({"sql": sql, "justificativa": justification}) + "\n```"
+
+def test_parse_fast_response():
+    """Testa a validação da resposta do modo rápido"""
+    assert parse_fast_response(_answer("SELECT 1;")) == {"sql": "SELECT 1", "justification": "Soma por série."}
+    assert parse_fast_response('{"erro": "Pedido modifica dados"}') == {"error": "Pedido modifica dados"}
+    assert parse_fast_response('{"agente": "Várias etapas"}') == {"agent": "Várias etapas"}
+    with pytest.raises(FastQueryError):
+        parse_fast_response(_answer("DROP TABLE Telemetria"))
+    with pytest.raises(FastQueryError):
+        parse_fast_response("SELECT 1")
+
+def test_large_answer_is_truncated_and_kept_server_side(monkeypatch):
+    """Testa que respostas grandes mostram as primeiras linhas e guardam o resultado completo"""
+    from api.services import fast_query
+
+    monkeypatch.setattr(fast_query.settings, "fast_max_answer_rows", 5)
+    output = format_answer("SELECT x", ["x"], [(i,) for i in range(50)], "Todas as linhas.")
+
+    # Cabeçalho e 5 linhas
+    assert output.count("\n| ") == 6
+    result_id = output.split("GET /results/", 1)[1].split(")", 1)[0]
+    assert len(observation_store.get(result_id)["rows"]) == 50
+
+def test_fast_mode_answers_with_one_llm_call(service):
+    """Testa o modo rápido de ponta a ponta: uma chamada ao LLM e resposta formatada localmente"""
+    service.fast_llm = FakeListChatModel(responses=[
+        _answer("SELECT Serie, SUM(Valor) AS Total FROM Telemetria GROUP BY Serie ORDER BY Serie")
+    ])
+    counter = build_llm_call_counter()
+
+    output = service._run_fast("Qual o total por série?", [counter])
+    assert counter.calls == 1
+    assert output.startswith("### Consulta:\n```sql\nSELECT Serie")
+    assert "| Carga Alta | 2500.0 |" in output
+    assert "| Marcha Lenta | 2450.0 |" in output
+
+@pytest.mark.parametrize("response", [
+    _answer("SELECT * FROM Inexistente"),
+    _answer("SELECT * FROM Telemetria WHERE Valor < 0"),
+    '{"agente": "Exige análise de manutenção"}',
+])
+def test_fast_mode_failures_raise_for_agent_fallback(service, response):
+    """Testa que consultas inválidas, vazias ou pedidos de agente levam ao agente completo"""
+    service.fast_llm = FakeListChatModel(responses=[response])
+    with pytest.raises(FastQueryError):
+        service._run_fast("Pergunta qualquer")
+
+if __name__ == "__main__":
+    pytest.main([__file__])
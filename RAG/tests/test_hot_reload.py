@@ -0,0 +1,190 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from api.services import rag_service as rag_service_module
+from api.services import service_pool as service_pool_module
+from api.services.hot_reload import HotReloader, snapshot_signature
+from api.services.rag_service import RAGService
+from api.services.service_pool import ServicePool
+
+class FakeService:
+    fail_next = False
+
+    def __init__(self, database_path, name):
+        self.database_path = database_path
+        self.name = name
+        self.is_ready = False
+        self.closed = False
+        self.snapshot = None
+
+    def snapshot_paths(self):
+        return [self.database_path]
+
+    def ensure_initialized(self):
+        if FakeService.fail_next:
+            FakeService.fail_next = False
+            raise RuntimeError("banco corrompido")
+        self.snapshot = snapshot_signature(self.snapshot_paths())
+        with open(self.database_path) as f:
+            self.content = f.read()
+        self.is_ready = True
+
+    def query(self, query_text, *args, **kwargs):
+        return {"query": query_text, "content": self.content}
+
+    def memory_estimate_bytes(self):
+        return 0
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    path = tmp_path / "telemetria.db"
+    path.write_text("v1")
+    monkeypatch.setattr(service_pool_module.settings, "databases", {"default": str(path)})
+
+    default = FakeService(str(path), "default")
+    default.ensure_initialized()
+    pool = ServicePool(FakeService, default, max_instances=4, max_memory_bytes=1 << 30)
+    return path, pool, HotReloader(pool, poll_interval=0.01)
+
+def _replace(path, content):
+    # Novo snapshot escrito ao lado e renomeado por cima (troca atômica do arquivo)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(content)
+    os.replace(tmp, path)
+
+def test_changed_database_is_reloaded_after_stabilizing(setup):
+    """Testa que a troca do arquivo é aplicada na segunda verificação e as novas consultas usam o novo snapshot"""
+    path, pool, reloader = setup
+    old = pool.default
+    assert reloader.check() == []
+
+    _replace(path, "v2")
+    assert reloader.check() == []  # aguardando estabilidade
+    assert reloader.check() == ["default"]
+
+    assert pool.default is not old and old.closed
+    assert pool.query(None, "Pergunta")["content"] == "v2"
+    assert reloader.check() == []
+
+def test_in_flight_requests_finish_on_old_snapshot(setup):
+    """Testa que a instância anterior só é fechada quando a consulta em andamento termina"""
+    path, pool, reloader = setup
+    with pool.lease() as old:
+        _replace(path, "v2")
+        reloader.check()
+        assert reloader.check() == ["default"]
+        assert not old.closed
+        assert old.query("Pergunta")["content"] == "v1"
+        assert pool.query(None, "Pergunta")["content"] == "v2"
+    assert old.closed
+
+def test_failed_reload_keeps_current_instance(setup):
+    """Testa que uma recarga com erro mantém a instância atual e não é repetida para o mesmo arquivo"""
+    path, pool, reloader = setup
+    old = pool.default
+    FakeService.fail_next = True
+
+    _replace(path, "v2")
+    reloader.check()
+    assert reloader.check() == []
+    assert pool.default is old and not old.closed
+    assert reloader.check() == [] and reloader.check() == []
+
+def test_ingest_refresh_does_not_trigger_full_reload(tmp_path, monkeypatch):
+    """Testa que a atualização após a ingestão relê os dados e renova a assinatura, sem recarga"""
+    path = tmp_path / "telemetria.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE Telemetria (Chassi INTEGER, UnidadeMedida TEXT, Categoria TEXT, "
+                     "Data TIMESTAMP, Serie TEXT, Valor REAL)")
+        conn.execute("INSERT INTO Telemetria VALUES (1, 'hr', 'Uso do Motor', '2024-01-01 00:00:00', 'Carga Alta', 2.0)")
+    monkeypatch.setattr(service_pool_module.settings, "databases", {"default": str(path)})
+    monkeypatch.setattr(rag_service_module.settings, "validated_queries_path", "")
+
+    service = RAGService(str(path), "default")
+    service._load_statistics_catalog(path)
+    service.snapshot = snapshot_signature(service.snapshot_paths())
+    service._ready.set()
+    pool = ServicePool(FakeService, service, max_instances=4, max_memory_bytes=1 << 30)
+    reloader = HotReloader(pool, poll_interval=0.01)
+
+    # Escrita da ingestão (em WAL, transferida ao arquivo como no escritor ocioso)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("INSERT INTO Telemetria VALUES (2, 'hr', 'Uso do Motor', '2024-01-02 00:00:00', 'Marcha Lenta', 1.0)")
+    conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+    conn.close()
+
+    service.refresh_data()
+    assert not service.refreshing
+    assert {row["Serie"] for row in service.statistics_catalog.series} == {"Carga Alta", "Marcha Lenta"}
+    assert reloader.check() == [] and reloader.check() == []
+    assert pool.default is service
+
+def test_ingest_refreshes_are_coalesced(monkeypatch):
+    """Testa que checkpoints seguidos da ingestão viram uma atualização pendente, espaçadas pelo intervalo mínimo"""
+    monkeypatch.setattr(rag_service_module.settings, "ingest_refresh_min_interval_seconds", 0.2)
+    service = RAGService(":memory:", "default")
+    runs = []
+    monkeypatch.setattr(service, "refresh_data", lambda: (runs.append(time.monotonic()), time.sleep(0.05)))
+
+    threads_before = threading.active_count()
+    for _ in range(50):
+        service.request_refresh()
+        time.sleep(0.002)
+    assert service.refreshing
+    assert threading.active_count() <= threads_before + 1
+
+    deadline = time.monotonic() + 5
+    while service.refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not service.refreshing
+    assert len(runs) == 2 and runs[1] - runs[0] >= 0.2
+
+def test_catalog_written_during_startup_does_not_trigger_reload(tmp_path, monkeypatch):
+    """Testa que as tabelas do catálogo gravadas na inicialização não contam como mudança do banco"""
+    path = tmp_path / "telemetria.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE Telemetria (Chassi INTEGER, UnidadeMedida TEXT, Categoria TEXT, "
+                     "Data TIMESTAMP, Serie TEXT, Valor REAL)")
+        conn.execute("INSERT INTO Telemetria VALUES (1, 'hr', 'Uso do Motor', '2024-01-01 00:00:00', 'Carga Alta', 2.0)")
+    monkeypatch.setattr(rag_service_module.settings, "validated_queries_path", "")
+    monkeypatch.setattr(rag_service_module.settings, "google_api_keys", ["chave"])
+    monkeypatch.setattr(rag_service_module.settings, "google_api_key", "chave")
+    # Sem LLM nem agente: só a conexão ao banco (catálogo, esquema e pool) é exercitada
+    for method in ("_initialize_llm_cache", "_build_llm", "_initialize_agent"):
+        monkeypatch.setattr(RAGService, method, lambda self, *args: None)
+
+    service = RAGService(str(path), "default")
+    service.ensure_initialized()
+    assert service.statistics_catalog.persisted
+    assert service.snapshot == snapshot_signature(service.snapshot_paths())
+
+    pool = ServicePool(FakeService, service, max_instances=4, max_memory_bytes=1 << 30)
+    reloader = HotReloader(pool, poll_interval=0.01)
+    assert reloader.check() == [] and reloader.check() == []
+    service.close()
+
+def test_validated_queries_are_loaded_from_csv_and_json(tmp_path, monkeypatch):
+    """Testa a leitura das consultas validadas usadas como exemplos"""
+    csv_path = tmp_path / "consultas.csv"
+    csv_path.write_text("Pedido,Consulta\nQuantos chassis existem?,SELECT COUNT(*) FROM Chassis\n", encoding="utf-8")
+    json_path = tmp_path / "consultas.json"
+    json_path.write_text(json.dumps([{"Pedido": "Quantos contratos?", "Consulta": "SELECT COUNT(DISTINCT Contrato) FROM Chassis"}]))
+
+    service = RAGService()
+    for path, pedido in ((csv_path, "Quantos chassis existem?"), (json_path, "Quantos contratos?")):
+        monkeypatch.setattr(rag_service_module.settings, "validated_queries_path", str(path))
+        service._load_validated_queries()
+        assert [q["Pedido"] for q in service.consultas_validadas] == [pedido]
+        assert str(path) in service.snapshot_paths()
+
+if __name__ == "__main__":
+    pytest.main([__file__])
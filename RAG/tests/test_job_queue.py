@@ -0,0 +1,117 @@
+import sqlite3
+import time
+
+import pytest
+
+from api.services.job_queue import JobQueue, JobWorkerPool
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(tmp_path / "jobs.sqlite", lease_seconds=60, max_attempts=2)
+
+def test_global_queue_is_created_on_first_use(tmp_path, monkeypatch):
+    """Testa que importar o módulo não cria o arquivo da fila: ele só aparece no primeiro uso"""
+    from api.services import job_queue as job_queue_module
+    path = tmp_path / "jobs.sqlite"
+    monkeypatch.setattr(job_queue_module.settings, "jobs_database_path", str(path))
+    monkeypatch.setattr(job_queue_module, "_job_queue", None)
+    assert not path.exists()
+    queue = job_queue_module.get_job_queue()
+    assert path.exists() and job_queue_module.get_job_queue() is queue
+
+def test_connections_are_closed(queue, monkeypatch):
+    """Testa que cada operação fecha a conexão que abriu"""
+    opened = []
+    connect = queue._connect
+
+    def _tracked():
+        conn = connect()
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(queue, "_connect", _tracked)
+    job_id = queue.enqueue({"query": "p1"})
+    queue.claim("w1")
+    queue.extend_lease(job_id, "w1")
+    queue.complete(job_id, "w1", {"result": "ok"})
+    queue.counts()
+    assert len(opened) == 6  # claim também lê o job com get
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+def test_claim_reports_busy_database(tmp_path):
+    """Testa que o erro de banco ocupado no BEGIN IMMEDIATE chega ao worker (sem 'no transaction is active')"""
+    queue = JobQueue(tmp_path / "jobs.sqlite", lease_seconds=60, max_attempts=2, busy_timeout=0.05)
+    queue.enqueue({"query": "p1"})
+    holder = sqlite3.connect(queue.database_path, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="database is locked"):
+            queue.claim("w1")
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+    assert queue.claim("w1") is not None
+
+def test_enqueue_claim_complete(queue):
+    """Testa o ciclo de vida de um job"""
+    job_id = queue.enqueue({"query": "Qual a categoria mais utilizada?"})
+    assert queue.get(job_id)["status"] == "queued"
+
+    job = queue.claim("w1")
+    assert job["id"] == job_id
+    assert job["status"] == "running"
+    assert job["payload"]["query"] == "Qual a categoria mais utilizada?"
+
+    queue.complete(job_id, "w1", {"result": "Uso do Motor"})
+    job = queue.get(job_id)
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"result": "Uso do Motor"}
+
+def test_job_is_claimed_only_once(queue):
+    """Testa que dois workers não reivindicam o mesmo job"""
+    queue.enqueue({"query": "p1"})
+    assert queue.claim("w1") is not None
+    assert queue.claim("w2") is None
+
+def test_expired_lease_is_reclaimed_until_max_attempts(queue):
+    """Testa que jobs de workers mortos voltam para a fila e falham após o limite de tentativas"""
+    queue.lease_seconds = 0.01
+    job_id = queue.enqueue({"query": "p1"})
+
+    assert queue.claim("morto-1")["id"] == job_id
+    time.sleep(0.05)
+    assert queue.claim("morto-2")["attempts"] == 2
+    time.sleep(0.05)
+    assert queue.claim("w3") is None
+    assert queue.get(job_id)["status"] == "failed"
+
+def test_jobs_survive_restart(tmp_path):
+    """Testa que a fila persiste entre instâncias (reinicialização)"""
+    job_id = JobQueue(tmp_path / "jobs.sqlite", lease_seconds=60, max_attempts=2).enqueue({"query": "p1"})
+    assert JobQueue(tmp_path / "jobs.sqlite", lease_seconds=60, max_attempts=2).claim("w1")["id"] == job_id
+
+def test_worker_pool_executes_jobs(queue):
+    """Testa que os workers executam o handler e registram resultado e erro"""
+    def handler(payload):
+        if payload["query"] == "falha":
+            raise RuntimeError("Erro na execução da consulta")
+        return {"result": payload["query"].upper()}
+
+    ok_id = queue.enqueue({"query": "ok"})
+    failing_id = queue.enqueue({"query": "falha"})
+
+    pool = JobWorkerPool(queue, handler, workers=2, poll_interval=0.01)
+    pool.start()
+    deadline = time.time() + 5
+    while time.time() < deadline and queue.counts()["queued"] + queue.counts()["running"] > 0:
+        time.sleep(0.02)
+    pool.stop()
+
+    assert queue.get(ok_id)["result"] == {"result": "OK"}
+    assert queue.get(failing_id)["status"] == "failed"
+    assert "Erro na execução" in queue.get(failing_id)["error"]
+
+if __name__ == "__main__":
+    pytest.main([__file__])
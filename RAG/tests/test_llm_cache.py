@@ -0,0 +1,52 @@
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+
+from api.services.llm_cache import SQLiteCompletionCache
+
+LLM_STRING = "model=gemini-2.5-flash temperature=0"
+
+def _generation(text: str):
+    return [ChatGeneration(message=AIMessage(content=text))]
+
+def test_lookup_miss_then_hit(tmp_path):
+    """Testa que uma completion armazenada é reaproveitada"""
+    cache = SQLiteCompletionCache(tmp_path / "cache.sqlite", max_bytes=1024 * 1024)
+    assert cache.lookup("prompt", LLM_STRING) is None
+
+    cache.update("prompt", LLM_STRING, _generation("Thought: ok"))
+    cached = cache.lookup("prompt", LLM_STRING)
+
+    assert cached[0].message.content == "Thought: ok"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_key_depends_on_model_parameters(tmp_path):
+    """Testa que o mesmo prompt com outro modelo não reaproveita a entrada"""
+    cache = SQLiteCompletionCache(tmp_path / "cache.sqlite", max_bytes=1024 * 1024)
+    cache.update("prompt", LLM_STRING, _generation("resposta"))
+    assert cache.lookup("prompt", "model=gemini-2.5-pro temperature=0") is None
+
+def test_persists_across_instances(tmp_path):
+    """Testa que as entradas sobrevivem a uma reinicialização"""
+    path = tmp_path / "cache.sqlite"
+    SQLiteCompletionCache(path, max_bytes=1024 * 1024).update("prompt", LLM_STRING, _generation("persistida"))
+    cached = SQLiteCompletionCache(path, max_bytes=1024 * 1024).lookup("prompt", LLM_STRING)
+    assert cached[0].message.content == "persistida"
+
+def test_lru_eviction_by_size(tmp_path):
+    """Testa que as entradas menos usadas recentemente são removidas ao exceder o limite"""
+    cache = SQLiteCompletionCache(tmp_path / "cache.sqlite", max_bytes=4096)
+    for i in range(20):
+        cache.update(f"prompt {i}", LLM_STRING, _generation("x" * 200))
+        # Manter a primeira entrada como a mais recentemente usada
+        cache.lookup("prompt 0", LLM_STRING)
+
+    stats = cache.stats()
+    assert stats["size_bytes"] <= 4096
+    assert stats["evictions"] > 0
+    assert cache.lookup("prompt 0", LLM_STRING) is not None
+    assert cache.lookup("prompt 1", LLM_STRING) is None
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from api.services.llm_pool import LLMPool
+from api.services.pooled_chat_model import PooledChatModel
+
+class FakeProvider:
+    """Provedor falso: responde após `delay` segundos ou falha com 429"""
+
+    def __init__(self, name, delay=0.0, rate_limited=False):
+        self.name = name
+        self.delay = delay
+        self.rate_limited = rate_limited
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, prompt):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.rate_limited:
+            raise RuntimeError("429 Resource has been exhausted (e.g. check quota).")
+        return f"{self.name}: {prompt}"
+
+def test_calls_are_spread_across_members():
+    """Testa que chamadas concorrentes são distribuídas entre as chaves"""
+    providers = [FakeProvider("a", delay=0.05), FakeProvider("b", delay=0.05)]
+    pool = LLMPool([(p.name, p) for p in providers], max_concurrency_per_member=2, hedge_enabled=False)
+
+    threads = [threading.Thread(target=pool.call, args=(lambda c: c.complete("oi"),)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert providers[0].calls == 2
+    assert providers[1].calls == 2
+
+def test_slow_call_is_hedged():
+    """Testa que uma chamada lenta dispara uma duplicata e vence a resposta mais rápida"""
+    slow, fast = FakeProvider("lento", delay=1.0), FakeProvider("rapido", delay=0.01)
+    pool = LLMPool([("lento", slow), ("rapido", fast)], hedge_enabled=True, hedge_min_delay=0.05)
+    # Forçar a primeira escolha no membro lento
+    pool.members[1].in_flight = 10
+
+    def _release_fast_after_primary():
+        time.sleep(0.02)
+        pool.members[1].in_flight = 0
+
+    threading.Thread(target=_release_fast_after_primary).start()
+    start_time = time.monotonic()
+    result = pool.call(lambda c: c.complete("oi"))
+
+    assert result == "rapido: oi"
+    assert time.monotonic() - start_time < 0.5
+
+def test_rate_limit_halves_concurrency_and_retries_elsewhere():
+    """Testa o AIMD: 429 reduz o limite da chave e a chamada é repetida em outra"""
+    limited, healthy = FakeProvider("limitada", rate_limited=True), FakeProvider("saudavel")
+    pool = LLMPool([("limitada", limited), ("saudavel", healthy)], max_concurrency_per_member=4, hedge_enabled=False)
+    pool.members[1].in_flight = 1  # Primeira escolha: membro limitado
+
+    result = pool.call(lambda c: c.complete("oi"))
+    pool.members[1].in_flight = 0
+
+    assert result == "saudavel: oi"
+    assert pool.members[0].limit == 2.0
+
+    # Sucessos aumentam o limite aditivamente
+    for _ in range(10):
+        pool.members[0].on_success()
+    assert 2.0 < pool.members[0].limit <= 4.0
+
+def test_close_stops_the_pool_threads():
+    """Testa que close encerra as threads do pool e recusa novas chamadas sem prender vagas"""
+    pool = LLMPool([("a", FakeProvider("a"))], hedge_enabled=False)
+    assert pool.call(lambda c: c.complete("oi")) == "a: oi"
+    threads = list(pool._executor._threads)
+    assert threads
+
+    pool.close()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert not any(thread.is_alive() for thread in threads)
+    with pytest.raises(RuntimeError):
+        pool.call(lambda c: c.complete("oi"))
+    assert pool.get_status()[0]["in_flight"] == 0
+
+def test_pooled_chat_model_with_fake_provider():
+    """Testa o adaptador LangChain sobre provedores falsos"""
+    members = [("fake#0", FakeListChatModel(responses=["Final Answer: 42"]))]
+    llm = PooledChatModel(pool=LLMPool(members, hedge_enabled=False), model_name="fake")
+    assert llm.invoke("pergunta").content == "Final Answer: 42"
+
+if __name__ == "__main__":
+    pytest.main([__file__])
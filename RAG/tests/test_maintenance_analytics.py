@@ -0,0 +1,78 @@
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+from api.services.maintenance_analytics import MaintenanceAnalytics
+
+def _engine_rows(chassi, day, marcha_lenta, baixa, media, alta):
+    data = f"{day.isoformat()} 00:00:00"
+    values = {"Chave-Ligada": 1.0, "Marcha Lenta": marcha_lenta, "Carga Baixa": baixa,
+              "Carga Média": media, "Carga Alta": alta}
+    return [(chassi, "hr", "Uso do Motor", data, serie, valor) for serie, valor in values.items()]
+
+@pytest.fixture
+def telemetry_database(tmp_path):
+    """Frota com um chassi em carga alta constante e outro com um dia anômalo"""
+    path = str(tmp_path / "telemetria.db")
+    rows = []
+    start = date(2024, 1, 1)
+    for offset in range(30):
+        day = start + timedelta(days=offset)
+        rows += _engine_rows(1, day, 1.0, 3.0, 2.0, 0.5)
+        rows += _engine_rows(2, day, 1.0, 3.0, 2.0, 0.5 if offset != 20 else 12.0)
+        rows += _engine_rows(3, day, 0.5, 1.0, 2.0, 6.0)
+    # Outras categorias não entram na análise
+    rows.append((1, "l", "Uso do Combustível do Motor", "2024-01-01 00:00:00", "Carga Alta", 100.0))
+
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE Telemetria (Chassi INTEGER, UnidadeMedida TEXT, Categoria TEXT, "
+        "Data TIMESTAMP, Serie TEXT, Valor REAL)"
+    )
+    conn.executemany("INSERT INTO Telemetria VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    return path
+
+def test_ranking_and_indicators(telemetry_database):
+    """Testa os indicadores calculados e a ordem do ranking"""
+    result = MaintenanceAnalytics(telemetry_database).analyze(top=3, window_days=7)
+    ranking = {row["Chassi"]: row for row in result["ranking"]}
+
+    assert result["chassis"] == 3 and result["days"] == 30
+    assert result["ranking"][0]["Chassi"] == 3
+    assert ranking[3]["HorasCargaAlta"] == pytest.approx(180.0)
+    assert ranking[1]["ProporcaoMarchaLenta"] == pytest.approx(1.0 / 6.5, abs=1e-3)
+    assert ranking[2]["DiasAnomalos"] == 1
+    assert ranking[1]["DiasAnomalos"] == 0
+
+def test_period_filter(telemetry_database):
+    """Testa o recorte por período"""
+    result = MaintenanceAnalytics(telemetry_database).analyze(start="2024-01-01", end="2024-01-10")
+    ranking = {row["Chassi"]: row for row in result["ranking"]}
+    assert result["days"] == 10
+    assert ranking[3]["HorasCargaAlta"] == pytest.approx(60.0)
+
+def test_tool_output_is_markdown_table(telemetry_database):
+    """Testa a saída da ferramenta do agente"""
+    output = MaintenanceAnalytics(telemetry_database).run("top=2, janela=14")
+    assert "| Chassi |" in output
+    assert output.count("\n| ") == 3  # cabeçalho + 2 chassis
+
+def test_reloads_on_wal_writes(telemetry_database):
+    """Testa que gravações ainda no -wal (sem checkpoint) recarregam as séries"""
+    writer = sqlite3.connect(telemetry_database)
+    writer.execute("PRAGMA journal_mode=WAL")
+    writer.execute("PRAGMA wal_autocheckpoint=0")
+    analytics = MaintenanceAnalytics(telemetry_database)
+    assert analytics.analyze()["chassis"] == 3
+
+    writer.executemany("INSERT INTO Telemetria VALUES (?, ?, ?, ?, ?, ?)",
+                       _engine_rows(4, date(2024, 1, 5), 1.0, 1.0, 1.0, 1.0))
+    writer.commit()
+    assert analytics.analyze()["chassis"] == 4
+    writer.close()
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,79 @@
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+from langchain_community.utilities import SQLDatabase
+
+from api.services.observation_manager import (
+    ObservationStore, build_query_tool, compact_scratchpad, estimate_rows_bytes, observation_store, summarize_result,
+)
+from api.services.prompt_builder import estimate_tokens
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "telemetria.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE Telemetria (Chassi INTEGER, Serie TEXT, Valor REAL)")
+        conn.executemany(
+            "INSERT INTO Telemetria VALUES (?, ?, ?)",
+            [(i, "Carga Alta" if i % 2 else "Marcha Lenta", i * 0.5) for i in range(5000)],
+        )
+    return SQLDatabase.from_uri(f"sqlite:///{path}")
+
+def test_small_result_is_unchanged(db):
+    """Testa que resultados pequenos chegam ao LLM como no SQLDatabase.run"""
+    sql = "SELECT Chassi, Valor FROM Telemetria WHERE Chassi < 3"
+    assert build_query_tool(db).run(sql) == db.run(sql)
+
+def test_large_result_is_summarized_and_kept_server_side(db):
+    """Testa que um resultado de 5.000 linhas vira um resumo limitado e fica completo no servidor"""
+    output = build_query_tool(db).run("SELECT * FROM Telemetria")
+
+    assert "5000 linhas" in output
+    assert "Valor: mín 0, máx 2499.5" in output
+    assert "Serie: 2 valores distintos" in output
+    assert estimate_tokens(output) < 1000
+
+    result_id = output.split("com id ", 1)[1].split(")", 1)[0]
+    assert len(observation_store.get(result_id)["rows"]) == 5000
+
+def test_errors_are_returned_to_the_agent(db):
+    """Testa que erros de SQL voltam como observação"""
+    assert build_query_tool(db).run("SELECT * FROM Inexistente").startswith("Error:")
+
+def test_store_is_bounded_by_memory():
+    """Testa que a memória estimada limita os resultados guardados, além da contagem"""
+    rows = [(i, "Carga Alta", i * 0.5) for i in range(1000)]
+    size = estimate_rows_bytes(rows)
+    store = ObservationStore(max_results=200, max_memory_bytes=int(size * 2.5))
+
+    ids = [store.put("SELECT ...", ["Chassi", "Serie", "Valor"], rows) for _ in range(3)]
+    assert store.get(ids[0]) is None
+    assert all(store.get(result_id) is not None for result_id in ids[1:])
+
+    # Um resultado maior que o limite inteiro não é guardado (e não despeja os demais)
+    assert store.put("SELECT ...", ["Chassi", "Serie", "Valor"], rows * 3) is None
+    assert all(store.get(result_id) is not None for result_id in ids[1:])
+    summary = summarize_result(None, ["Chassi", "Serie", "Valor"], rows, head_rows=2, tail_rows=1)
+    assert "grande demais para ser guardado" in summary and "com id" not in summary
+
+def test_scratchpad_stays_bounded():
+    """Testa que os passos antigos são resumidos quando o orçamento de tokens é excedido"""
+    def _step(i):
+        action = SimpleNamespace(tool="sql_db_query", tool_input=f"SELECT {i}",
+                                 log=f"Thought: passo {i}\nAction: sql_db_query\nAction Input: SELECT {i}")
+        return action, f"Resultado {i}\n" + "linha longa de resultado " * 100
+
+    sizes = []
+    for n in (3, 6, 12):
+        scratchpad = compact_scratchpad([_step(i) for i in range(n)], token_budget=1500, keep_last_steps=2,
+                                        observation_prefix="Observation: ", llm_prefix="Thought:")
+        sizes.append(estimate_tokens(scratchpad))
+        assert "Thought: passo %d" % (n - 1) in scratchpad
+        assert scratchpad.count("linha longa de resultado " * 100) == 2
+
+    # Cada passo resumido custa poucos tokens: o crescimento é pequeno
+    assert sizes[-1] - sizes[0] < 400
+
+if __name__ == "__main__":
+    pytest.main([__file__])
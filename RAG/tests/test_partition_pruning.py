@@ -0,0 +1,145 @@
+import sqlite3
+
+import pytest
+
+from api.services.partition_pruning import PartitionPruner
+from api.services.timeseries import build_timeseries
+from api.utils.storage_layout import (
+    detect_layout, drop_partitions_before, internal_tables_present, list_partitions, migrate_to_normalized,
+    migrate_to_partitioned,
+)
+
+ROWS = [
+    (1, "hr", "Uso do Motor", "2024-01-15 00:00:00", "Carga Alta", 2.5),
+    (1, "hr", "Uso do Motor", "2024-02-10 00:00:00", "Carga Alta", 3.0),
+    (1, "hr", "Uso do Motor", "2024-03-01 00:00:00", "Marcha Lenta", 1.0),
+    (2, "hr", "Uso do Motor", "2024-03-31 23:59:59", "Carga Alta", 4.0),
+    (2, "l", "Uso do Combustível do Motor", "2024-04-02 12:00:00", "Carga Alta", 30.0),
+]
+
+def _raw_database(path):
+    """Banco no layout original da Telemetria"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE Chassis (Chassi INTEGER PRIMARY KEY, Contrato INTEGER, Cliente INTEGER, Modelo INTEGER)")
+    conn.execute(
+        "CREATE TABLE Telemetria (Chassi INTEGER, UnidadeMedida TEXT, Categoria TEXT, "
+        "Data TIMESTAMP, Serie TEXT, Valor REAL)"
+    )
+    conn.executemany("INSERT INTO Chassis VALUES (?, 1, 1, 1)", [(1,), (2,)])
+    conn.executemany("INSERT INTO Telemetria VALUES (?, ?, ?, ?, ?, ?)", ROWS)
+    conn.commit()
+    conn.close()
+    return path
+
+@pytest.fixture
+def database(tmp_path):
+    """Banco no layout original migrado para partições mensais"""
+    path = _raw_database(str(tmp_path / "telemetria.db"))
+    migrate_to_partitioned(path)
+    return path
+
+@pytest.fixture
+def normalized_database(tmp_path):
+    """Banco no layout original migrado para o normalizado"""
+    path = _raw_database(str(tmp_path / "telemetria.db"))
+    migrate_to_normalized(path)
+    return path
+
+def _names(partitions):
+    return [name for name, _, _ in partitions]
+
+def test_monthly_partitions_behind_view(database):
+    """Testa que cada mês vira uma partição e a view Telemetria preserva esquema e linhas"""
+    conn = sqlite3.connect(database)
+    assert detect_layout(conn) == "partitioned"
+    assert _names(list_partitions(conn)) == [f"TelemetriaFato_2024{m:02d}" for m in (1, 2, 3, 4)]
+
+    columns = [c[1] for c in conn.execute("PRAGMA table_info(Telemetria)")]
+    assert columns == ["Chassi", "UnidadeMedida", "Categoria", "Data", "Serie", "Valor"]
+    assert sorted(conn.execute("SELECT * FROM Telemetria").fetchall()) == sorted(ROWS)
+    assert "TelemetriaFato_202403" in internal_tables_present(conn)
+    conn.close()
+
+def test_rewrite_reads_only_partitions_in_period(database):
+    """Testa que filtros por Data limitam a consulta às partições do período, com o mesmo resultado"""
+    pruner = PartitionPruner.from_database(database)
+    conn = sqlite3.connect(database)
+    queries = [
+        "SELECT SUM(Valor) FROM Telemetria WHERE Data >= '2024-03-01' AND Categoria = 'Uso do Motor'",
+        "SELECT SUM(t.Valor) FROM Telemetria t JOIN Chassis c ON c.Chassi = t.Chassi "
+        "WHERE t.Data BETWEEN '2024-02-01' AND '2024-03-01 00:00:00'",
+        "SELECT COUNT(*) FROM Telemetria AS tel WHERE tel.Data < '2024-02-01 00:00:00'",
+        "SELECT COUNT(*) FROM Telemetria WHERE Data = '2024-04-02 12:00:00'",
+    ]
+    expected_partitions = [["202403", "202404"], ["202402", "202403"], ["202401"], ["202404"]]
+    for sql, months in zip(queries, expected_partitions):
+        rewritten = pruner.rewrite(sql)
+        assert rewritten != sql
+        assert [m for m in ("202401", "202402", "202403", "202404") if f"TelemetriaFato_{m}" in rewritten] == months
+        assert conn.execute(rewritten).fetchall() == conn.execute(sql).fetchall()
+    conn.close()
+
+def test_rewrite_keeps_queries_it_cannot_prove(database):
+    """Testa que consultas com OR, subconsultas ou sem filtro de Data seguem inalteradas"""
+    pruner = PartitionPruner.from_database(database)
+    unchanged = [
+        "SELECT COUNT(*) FROM Telemetria WHERE Data >= '2024-03-01' OR Chassi = 1",
+        "SELECT COUNT(*) FROM Telemetria WHERE Chassi IN (SELECT Chassi FROM Chassis) AND Data >= '2024-03-01'",
+        "SELECT SUM(Valor) FROM Telemetria WHERE Categoria = 'Uso do Motor'",
+        "SELECT SUM(CASE WHEN Data >= '2024-03-01' THEN Valor END) FROM Telemetria",
+        "SELECT COUNT(*) FROM Chassis",
+    ]
+    for sql in unchanged:
+        assert pruner.rewrite(sql) == sql
+
+    # date('now', ...) é avaliado: nenhuma partição de 2024 está no futuro distante
+    sql = "SELECT COUNT(*) FROM Telemetria WHERE Data >= date('now', '+100 years')"
+    conn = sqlite3.connect(database)
+    assert conn.execute(pruner.rewrite(sql)).fetchone()[0] == 0
+    conn.close()
+    assert PartitionPruner.from_database(database).rewrite(sql) != sql
+
+def test_rewrite_filters_epoch_column_in_normalized_layout(normalized_database):
+    """Testa que no layout normalizado os filtros de Data viram um intervalo em epoch sobre a tabela de fatos"""
+    pruner = PartitionPruner.from_database(normalized_database)
+    conn = sqlite3.connect(normalized_database)
+    queries = [
+        "SELECT SUM(Valor) FROM Telemetria WHERE Data >= '2024-03-01' AND Categoria = 'Uso do Motor'",
+        "SELECT COUNT(*) FROM Telemetria t WHERE t.Data BETWEEN '2024-02-01' AND '2024-03-31 23:59:59'",
+        "SELECT COUNT(*) FROM Telemetria WHERE Data < '2024-03-31T23:59:59'",
+        "SELECT COUNT(*) FROM Telemetria WHERE Data = '2024-04-02 12:00:00'",
+        # Fora do formato da view: a ordem do texto é diferente da ordem das datas
+        "SELECT COUNT(*) FROM Telemetria WHERE Data <= '2024-3-1'",
+    ]
+    for sql in queries:
+        rewritten = pruner.rewrite(sql)
+        assert conn.execute(rewritten).fetchall() == conn.execute(sql).fetchall()
+    conn.close()
+
+    # 2024-02-01 00:00:00 a 2024-03-31 23:59:59 em epoch, na coluna física (indexada)
+    assert "WHERE f.Data BETWEEN 1706745600 AND 1711929599" in pruner.rewrite(queries[1])
+    # Dia inteiro quando o valor não está no formato da view
+    assert "WHERE f.Data BETWEEN -62135596800 AND 1711929599" in pruner.rewrite(queries[2])
+    assert pruner.rewrite(queries[-1]) == queries[-1]
+
+def test_retention_drops_whole_partitions(database):
+    """Testa que a retenção remove partições inteiras e a view continua consultável"""
+    assert drop_partitions_before(database, "2024-03-15") == ["TelemetriaFato_202401", "TelemetriaFato_202402"]
+    conn = sqlite3.connect(database)
+    assert _names(list_partitions(conn)) == ["TelemetriaFato_202403", "TelemetriaFato_202404"]
+    assert conn.execute("SELECT COUNT(*) FROM Telemetria").fetchone()[0] == 3
+    conn.close()
+
+    assert len(drop_partitions_before(database, "2025-01-01")) == 2
+    conn = sqlite3.connect(database)
+    assert conn.execute("SELECT COUNT(*) FROM Telemetria").fetchone()[0] == 0
+    conn.close()
+
+def test_timeseries_reads_partitioned_layout(database):
+    """Testa que o endpoint de séries lê apenas as partições que cruzam o intervalo"""
+    result = build_timeseries(database, [1, 2], "Uso do Motor", "Carga Alta", "2024-02-01", "2024-03-31T23:59:59")
+    assert [(s["chassi"], s["v"]) for s in result["series"]] == [(1, [3.0]), (2, [4.0])]
+    assert result["unidade"] == "hr"
+
+if __name__ == "__main__":
+    pytest.main([__file__])
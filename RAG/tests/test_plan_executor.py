@@ -0,0 +1,142 @@
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from api.services.plan_executor import PlanError, execute_plan, parse_plan
+from api.services.rag_service import RAGService
+from api.services.read_pool import ReadConnectionPool
+
+def _plan(steps, final=None):
+    return json.dumps({"passos": steps, "passo_final": final or steps[-1]["id"]})
+
+def _step(step_id, sql, depends_on=()):
+    return {"id": step_id, "objetivo": f"passo {step_id}", "sql": sql, "depende_de": list(depends_on)}
+
+@pytest.fixture
+def pool(tmp_path):
+    path = tmp_path / "telemetria.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE Telemetria (Chassi INTEGER, Serie TEXT, Valor REAL)")
+        conn.executemany(
+            "INSERT INTO Telemetria VALUES (?, ?, ?)",
+            [(i % 10, "Carga Alta" if i % 2 else "Marcha Lenta", float(i)) for i in range(100)],
+        )
+    pool = ReadConnectionPool(
+        lambda: sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False), size=4
+    )
+    yield pool
+    pool.close()
+
+def test_pool_connections_are_read_only_and_bounded(tmp_path):
+    """Testa o autorizador das conexões do pool, a vaga devolvida em falha e a espera limitada"""
+    path = tmp_path / "telemetria.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE Telemetria (Chassi INTEGER)")
+    failures = [RuntimeError("banco indisponível")]
+
+    def _connect():
+        if failures:
+            raise failures.pop()
+        return sqlite3.connect(path, check_same_thread=False)
+
+    pool = ReadConnectionPool(_connect, size=1, timeout=0.05)
+    with pytest.raises(RuntimeError, match="indisponível"):
+        pool.execute("SELECT 1")
+    with pool.connection() as conn:
+        with pytest.raises(sqlite3.DatabaseError):
+            conn.execute("WITH q AS (SELECT 1) INSERT INTO Telemetria SELECT * FROM q")
+        with pytest.raises(RuntimeError, match="Nenhuma conexão"):
+            pool.execute("SELECT 1")
+    assert pool.execute("SELECT COUNT(*) FROM Telemetria") == (["COUNT(*)"], [(0,)])
+    pool.close()
+
+def test_parse_plan_rejects_invalid_plans():
+    """Testa a validação do plano: SQL não permitido, dependências inexistentes e ciclos"""
+    with pytest.raises(PlanError):
+        parse_plan(_plan([_step("p1", "DELETE FROM Telemetria")]), 8)
+    with pytest.raises(PlanError):
+        parse_plan(_plan([_step("p1", "SELECT 1", ["p9"])]), 8)
+    with pytest.raises(PlanError):
+        parse_plan(_plan([_step("p1", "SELECT {{p2}}"), _step("p2", "SELECT {{p1}}")]), 8)
+    with pytest.raises(PlanError):
+        parse_plan(_plan([_step(f"p{i}", "SELECT 1") for i in range(3)]), 2)
+    assert parse_plan('```json\n{"erro": "Pedido modifica dados"}\n```', 8) == {"error": "Pedido modifica dados"}
+
+def test_references_become_dependencies():
+    """Testa que {{id}} no SQL cria a dependência mesmo sem depende_de"""
+    plan = parse_plan(_plan([_step("media", "SELECT AVG(Valor) FROM Telemetria"),
+                             _step("acima", "SELECT Chassi FROM Telemetria WHERE Valor > {{media}}")]), 8)
+    assert plan["steps"][1].depends_on == ["media"]
+    assert plan["final"] == "acima"
+
+def test_execute_plan_resolves_references(pool):
+    """Testa a substituição de uma célula (literal) e de uma coluna (lista para IN)"""
+    plan = parse_plan(_plan([
+        _step("media", "SELECT AVG(Valor) FROM Telemetria"),
+        _step("chassis", "SELECT DISTINCT Chassi FROM Telemetria WHERE Chassi < 3"),
+        _step("final", "SELECT Chassi, COUNT(*) FROM Telemetria WHERE Valor > {{media}} "
+                       "AND Chassi IN ({{chassis}}) GROUP BY Chassi ORDER BY Chassi"),
+    ]), 8)
+    execute_plan(plan["steps"], pool, max_parallel=4)
+
+    final = plan["steps"][-1]
+    assert final.error is None
+    assert "Valor > 49.5" in final.resolved_sql and "IN (0, 1, 2)" in final.resolved_sql
+    assert final.rows == [(0, 5), (1, 5), (2, 5)]
+
+def test_independent_steps_run_in_parallel(pool):
+    """Testa que passos sem dependência entre si executam ao mesmo tempo"""
+    active, peak, lock = [0], [0], threading.Lock()
+    execute = pool.execute
+
+    def _slow_execute(sql):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.2)
+        try:
+            return execute(sql)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    pool.execute = _slow_execute
+    plan = parse_plan(_plan([_step(f"p{i}", f"SELECT {i}") for i in range(4)]), 8)
+
+    start = time.time()
+    execute_plan(plan["steps"], pool, max_parallel=4)
+    assert time.time() - start < 0.6
+    assert peak[0] == 4
+
+def test_dependency_errors_propagate(pool):
+    """Testa que um passo com erro marca os dependentes sem executá-los"""
+    plan = parse_plan(_plan([_step("p1", "SELECT * FROM Inexistente"),
+                             _step("p2", "SELECT 1", ["p1"]),
+                             _step("p3", "SELECT 2")], final="p2"), 8)
+    execute_plan(plan["steps"], pool, max_parallel=2)
+
+    errors = {step.step_id: step.error for step in plan["steps"]}
+    assert "no such table" in errors["p1"]
+    assert errors["p2"].startswith("Dependência com erro")
+    assert errors["p3"] is None
+
+def test_plan_mode_answer(pool):
+    """Testa o modo plano de ponta a ponta: planejamento, execução e redação em duas chamadas ao LLM"""
+    service = RAGService()
+    service.read_pool = pool
+    service.plan_llm = FakeListChatModel(responses=[
+        _plan([_step("p1", "SELECT Serie, SUM(Valor) AS Total FROM Telemetria GROUP BY Serie ORDER BY Serie")]),
+        "### Resposta:\n| Serie | Total |\n\n### Justificativa:\nSoma por série.",
+    ])
+
+    output = service._run_plan("Qual o total por série?")
+    assert output.startswith("### Consulta:\n```sql\nSELECT Serie, SUM(Valor)")
+    sql_query, result, _ = service._parse_agent_response(output)
+    assert "| Serie | Total |" in result
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,39 @@
+import pytest
+
+from api.services.prompt_builder import CATEGORIES, estimate_tokens, select_categories
+from api.services.rag_service import RAGService
+
+def test_select_categories_by_question():
+    """Testa a poda de categorias de acordo com a pergunta"""
+    assert select_categories("Quais chassis consumiram mais combustível em carga alta?") == ["Uso do Combustível do Motor"]
+    assert select_categories("Qual cliente tem mais marcha lenta?") == ["Uso do Motor"]
+    assert select_categories("Quanto tempo no modo HP?") == ["Uso do Motor", "Uso da Configuração do Modo do Motor"]
+    # Sem pistas na pergunta, todas as categorias são mantidas
+    assert select_categories("Quantos contratos existem?") == list(CATEGORIES)
+
+def test_compact_prompt_is_smaller_and_keeps_answer_format():
+    """Testa que a variante compacta é menor e mantém as seções que o parser e a cascata esperam"""
+    service = RAGService()
+    question = "Quais chassis consumiram mais combustível?"
+    full = service._build_system_prompt(question, "full")
+    compact = service._build_system_prompt(question, "compact")
+
+    assert estimate_tokens(compact) < estimate_tokens(full) / 2
+    for marker in ("Final Answer:", "### Consulta:", "### Resposta:", "### Justificativa:", "**ERRO:**"):
+        assert marker in compact
+    # Formato ReAct descrito uma única vez e apenas a categoria relevante detalhada
+    assert compact.count("Action Input:") == 1
+    assert "HP (alta potência)" not in compact
+
+def test_request_similarity_threshold_selects_shots():
+    """Testa que o limiar de similaridade da requisição chega à seleção de exemplos"""
+    service = RAGService()
+    service.consultas_validadas = [{"Pedido": "Quais chassis consumiram mais combustível em carga alta?",
+                                    "Consulta": "SELECT Chassi FROM Telemetria"}]
+    question = "Quais chassis consumiram mais combustível?"
+    for variant in ("full", "compact"):
+        assert "SELECT Chassi FROM Telemetria" in service._build_system_prompt(question, variant, similarity_threshold=0.1)
+        assert "SELECT Chassi FROM Telemetria" not in service._build_system_prompt(question, variant, similarity_threshold=0.99)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.services import request_profiler as request_profiler_module
+from api.services.request_profiler import Profile, SamplingProfiler
+from api.services.service_pool import service_pool
+
+def _parse_response(text):
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        text.splitlines()
+    return text
+
+def _slow_query(database, query_text, *args):
+    """Consulta falsa: espera 'o LLM' e depois gasta CPU no parsing da resposta"""
+    time.sleep(0.1)
+    _parse_response(query_text)
+    return {"query": query_text, "sql_query": "SELECT 1", "result": "1", "justification": "", "execution_time": 0.2}
+
+def test_profiler_samples_only_the_request_thread():
+    """Testa a amostragem: as funções da consulta aparecem com o peso do tempo gasto nelas"""
+    profiler = SamplingProfiler(0.002)
+    profiler.start()
+    profiler.run(_slow_query, None, "pergunta")
+    time.sleep(0.05)  # Depois de `run`, a thread não é mais amostrada
+    profile = Profile("abc", "teste", profiler.stop(), profiler.interval, profiler.duration)
+
+    assert profile.samples > 20
+    leaves = {stack[-1][0] for stack in profile.stacks}
+    assert "_parse_response" in leaves
+    assert all(any(frame[0] == "_slow_query" for frame in stack) for stack in profile.stacks)
+
+    collapsed = profile.to_collapsed().splitlines()
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed)
+    assert any("_slow_query (tests/test_request_profiler.py:" in line for line in collapsed)
+
+    speedscope = profile.to_speedscope()
+    sampled = speedscope["profiles"][0]
+    assert sampled["type"] == "sampled" and len(sampled["samples"]) == len(sampled["weights"])
+    assert sum(sampled["weights"]) == pytest.approx(profile.duration * 1000)
+    names = [frame["name"] for frame in speedscope["shared"]["frames"]]
+    assert "_parse_response" in names
+
+def test_profiled_query_endpoint(monkeypatch):
+    """Testa o fluxo completo: pedido com token, id no header, download e acesso negado"""
+    monkeypatch.setattr(request_profiler_module.settings, "profiling_admin_token", "segredo")
+    monkeypatch.setattr(service_pool, "query", _slow_query)
+    client = TestClient(app)
+    body = {"query": "Quantos chassis existem?"}
+
+    # Sem pedido de profiling: nenhum perfil é criado
+    response = client.post("/query", json=body)
+    assert response.status_code == 200 and "x-profile-id" not in response.headers
+
+    assert client.post("/query", json=body, headers={"X-Profile": "true"}).status_code == 403
+    assert client.post("/query", params={"profile": "true"}, json=body,
+                       headers={"X-Admin-Token": "errado"}).status_code == 403
+
+    response = client.post("/query", params={"profile": "true", "fields": "result"}, json=body,
+                           headers={"X-Admin-Token": "segredo"})
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+
+    admin = {"X-Admin-Token": "segredo"}
+    assert profile_id in [p["request_id"] for p in client.get("/profiles", headers=admin).json()["profiles"]]
+    speedscope = client.get(f"/profiles/{profile_id}", headers=admin)
+    assert speedscope.status_code == 200
+    assert "speedscope.json" in speedscope.headers["content-disposition"]
+    assert speedscope.json()["profiles"][0]["type"] == "sampled"
+    collapsed = client.get(f"/profiles/{profile_id}", params={"format": "collapsed"}, headers=admin)
+    assert "_slow_query" in collapsed.text
+
+    assert client.get(f"/profiles/{profile_id}").status_code == 403
+    assert client.get("/profiles/inexistente", headers=admin).status_code == 404
+
+if __name__ == "__main__":
+    pytest.main([__file__])
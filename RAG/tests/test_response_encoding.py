@@ -0,0 +1,71 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.services import service_pool as service_pool_module
+from api.utils.response_encoding import CompactJSONResponse, CompressionMiddleware, negotiate_encoding, project
+
+def test_negotiate_encoding():
+    """Testa a escolha da codificação pelo Accept-Encoding"""
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("deflate") is None
+    assert negotiate_encoding("") is None
+    assert negotiate_encoding("gzip;q=0, identity") is None
+    assert negotiate_encoding("*") in ("br", "gzip")
+
+def test_project_keeps_requested_fields():
+    """Testa a projeção de campos e a recusa de campos desconhecidos"""
+    payload = {"query": "q", "sql_query": "SELECT 1", "result": "1", "justification": "j"}
+    assert project(payload, "sql_query, result", payload) == {"sql_query": "SELECT 1", "result": "1"}
+    assert project(payload, None, payload) is payload
+    with pytest.raises(ValueError):
+        project(payload, "sql_query,raw", payload)
+
+def _app():
+    small = FastAPI(default_response_class=CompactJSONResponse)
+    small.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @small.get("/grande")
+    def grande():
+        return {"linhas": [{"chassi": i, "valor": "Carga Alta"} for i in range(200)]}
+
+    @small.get("/pequena")
+    def pequena():
+        return {"ok": True}
+
+    return small
+
+def test_large_responses_are_compressed():
+    """Testa que respostas grandes são comprimidas e as pequenas seguem sem compressão"""
+    client = TestClient(_app())
+    response = client.get("/grande", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in response.headers["vary"].lower()
+    assert int(response.headers["content-length"]) < len(b'{"chassi":0,"valor":"Carga Alta"}') * 200 / 5
+    assert response.json()["linhas"][199] == {"chassi": 199, "valor": "Carga Alta"}
+
+    assert "content-encoding" not in client.get("/pequena", headers={"Accept-Encoding": "gzip"}).headers
+    raw = client.get("/grande", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+    assert raw.content.startswith(b'{"linhas":[{"chassi":0,')
+
+def test_query_fields_projection(monkeypatch):
+    """Testa que /query?fields= devolve apenas os campos pedidos"""
+    def fake_query(database, query_text, *args, **kwargs):
+        return {
+            "query": query_text, "sql_query": "SELECT 1", "result": "1", "justification": "Consulta simples",
+            "execution_time": 0.1, "model": "m", "mode": "fast", "llm_calls": 1, "database": "default",
+        }
+
+    monkeypatch.setattr(service_pool_module.service_pool, "query", fake_query)
+    client = TestClient(app)
+    response = client.post("/query", params={"fields": "sql_query,result"}, json={"query": "Quantos chassis?"})
+    assert response.status_code == 200
+    assert response.json() == {"sql_query": "SELECT 1", "result": "1"}
+
+    response = client.post("/query", params={"fields": "raw_response"}, json={"query": "Quantos chassis?"})
+    assert response.status_code == 400
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,97 @@
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.services import service_pool as service_pool_module
+from api.services.prompt_builder import build_schema_section
+from api.services.rag_service import RAGService
+from api.services.schema_catalog import SchemaCatalog
+from api.utils.storage_layout import migrate_to_normalized
+
+def _database(path):
+    """Banco pequeno no layout original, com uma tabela de rollup além das documentadas"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE Chassis (Chassi INTEGER PRIMARY KEY, Contrato INTEGER, Cliente INTEGER, Modelo INTEGER)")
+    conn.execute(
+        "CREATE TABLE Telemetria (Chassi INTEGER, UnidadeMedida TEXT, Categoria TEXT, Data TIMESTAMP, "
+        "Serie TEXT, Valor REAL, PRIMARY KEY (Chassi, Categoria, Serie, Data))"
+    )
+    conn.execute("CREATE TABLE ConsumoMensal (Chassi INTEGER, Mes TEXT, Litros REAL)")
+    conn.execute("CREATE INDEX idx_consumo_mes ON ConsumoMensal (Mes)")
+    conn.execute("INSERT INTO Chassis VALUES (1, 10, 100, 1000)")
+    conn.executemany(
+        "INSERT INTO Telemetria VALUES (1, ?, ?, '2024-01-01 00:00:00', ?, 1.0)",
+        [("l", "Uso do Combustível do Motor", "Carga Alta"), ("l", "Uso do Combustível do Motor", "Marcha Lenta"),
+         ("hr", "Uso do Motor", "Carga Alta")],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+@pytest.fixture
+def database(tmp_path):
+    return _database(str(tmp_path / "telemetria.db"))
+
+def test_introspection_reads_tables_indexes_and_categories(database):
+    """Testa que tabelas novas aparecem no esquema e as categorias refletem os dados do banco"""
+    catalog = SchemaCatalog.introspect(database)
+    assert list(catalog.tables) == ["Chassis", "Telemetria", "ConsumoMensal"]
+    assert catalog.tables["Telemetria"]["primary_key"] == ["Chassi", "Categoria", "Serie", "Data"]
+    assert catalog.tables["ConsumoMensal"]["indexes"][0]["columns"] == ["Mes"]
+    # Séries na ordem documentada e apenas as categorias presentes no banco
+    assert catalog.categories["Uso do Combustível do Motor"]["series"] == ["Marcha Lenta", "Carga Alta"]
+    assert "Uso da Configuração do Modo do Motor" not in catalog.categories
+
+    response = catalog.to_response(database)
+    assert response["version"] == catalog.etag.strip('"')
+    assert response["tables"]["ConsumoMensal"]["columns"]["Litros"]["type"] == "REAL"
+    assert "CREATE TABLE ConsumoMensal" in catalog.render_tables()
+
+def test_prompt_schema_section_follows_the_database(database):
+    """Testa que o prompt compacto usa o esquema lido do banco (mesma fonte do endpoint)"""
+    catalog = SchemaCatalog.introspect(database)
+    section = build_schema_section("Qual o consumo em carga alta?", schema=catalog)
+    assert "ConsumoMensal" in section
+    assert "HP (alta potência)" not in section
+
+def test_normalized_view_keeps_documented_types_and_hides_internal_tables(database):
+    """Testa que a view Telemetria do layout normalizado é descrita como a tabela original"""
+    migrate_to_normalized(database, vacuum=False)
+    catalog = SchemaCatalog.introspect(database)
+    assert set(catalog.tables) == {"Chassis", "Telemetria", "ConsumoMensal"}
+    assert catalog.tables["Telemetria"]["type"] == "view"
+    types = {column["name"]: column["type"] for column in catalog.tables["Telemetria"]["columns"]}
+    assert types["Data"] == "TIMESTAMP" and types["Valor"] == "REAL"
+
+def test_service_builds_schema_once_and_falls_back_to_documented(database, tmp_path):
+    """Testa o cache por instância e o esquema documentado quando o banco não pode ser lido"""
+    service = RAGService(database, "frota")
+    assert service.get_schema() is service.get_schema()
+    assert service.get_schema().source == "introspected"
+
+    missing = RAGService(str(tmp_path / "inexistente.db"), "vazio")
+    assert missing.get_schema().source == "documented"
+    assert missing.schema_catalog is None
+
+def test_schema_endpoint_etag(database, monkeypatch):
+    """Testa o endpoint /database/schema: ETag estável, 304 na revalidação e banco desconhecido"""
+    monkeypatch.setattr(service_pool_module.settings, "databases", {"frota": database})
+    client = TestClient(app)
+
+    response = client.get("/database/schema", params={"database": "frota"})
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert "ConsumoMensal" in response.json()["tables"]
+    assert client.get("/database/schema", params={"database": "frota"}).headers["etag"] == etag
+
+    cached = client.get("/database/schema", params={"database": "frota"}, headers={"If-None-Match": f"W/{etag}"})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    stale = client.get("/database/schema", params={"database": "frota"}, headers={"If-None-Match": '"antiga"'})
+    assert stale.status_code == 200
+    assert client.get("/database/schema", params={"database": "outro"}).status_code == 404
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,78 @@
+import pytest
+
+from api.services import service_pool as service_pool_module
+from api.services.service_pool import DatabaseNotFound, ServicePool
+
+class FakeService:
+    def __init__(self, database_path, name, memory=10):
+        self.database_path = database_path
+        self.name = name
+        self.memory = memory
+        self.is_ready = False
+        self.closed = False
+
+    def query(self, query_text, *args, **kwargs):
+        return {"query": query_text, "database_path": self.database_path}
+
+    def memory_estimate_bytes(self):
+        return self.memory
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def databases(monkeypatch):
+    registered = {"default": "/dados/padrao.db", "norte": "/dados/norte.db", "sul": "/dados/sul.db", "leste": "/dados/leste.db"}
+    monkeypatch.setattr(service_pool_module.settings, "databases", registered)
+    return registered
+
+def _pool(max_instances=10, max_memory_bytes=1000):
+    return ServicePool(FakeService, FakeService("/dados/padrao.db", "default"), max_instances, max_memory_bytes)
+
+def test_services_are_built_lazily_per_database(databases):
+    """Testa que cada banco ganha sua instância no primeiro uso e a reaproveita depois"""
+    pool = _pool()
+    assert [(s["name"], s["loaded"]) for s in pool.status()][:2] == [("default", True), ("leste", False)]
+
+    result = pool.query("norte", "Quantos chassis?")
+    assert result == {"query": "Quantos chassis?", "database_path": "/dados/norte.db", "database": "norte"}
+    with pool.lease("norte") as first, pool.lease("norte") as second:
+        assert first is second
+    assert pool.query(None, "Pergunta")["database"] == "default"
+
+    with pytest.raises(DatabaseNotFound):
+        pool.query("oeste", "Pergunta")
+
+def test_least_recently_used_idle_service_is_evicted(databases):
+    """Testa o descarte LRU por número de instâncias, sem descartar o banco padrão"""
+    pool = _pool(max_instances=2)
+    with pool.lease("norte") as norte:
+        pass
+    with pool.lease("sul"):
+        pass
+
+    assert norte.closed
+    assert [s["name"] for s in pool.status() if s["loaded"]] == ["default", "sul"]
+
+def test_services_in_use_are_not_evicted(databases):
+    """Testa que uma instância com consulta em andamento sobrevive ao descarte"""
+    pool = _pool(max_instances=2)
+    with pool.lease("norte") as norte:
+        with pool.lease("sul") as sul:
+            pass
+        assert not norte.closed
+        assert sul.closed
+
+def test_memory_cap_evicts_services(databases):
+    """Testa o descarte pela memória estimada do pool"""
+    pool = _pool(max_memory_bytes=25)
+    with pool.lease("norte") as norte:
+        pass
+    assert not norte.closed
+
+    with pool.lease("sul"):
+        pass
+    assert norte.closed
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,125 @@
+import sqlite3
+import time
+
+import pytest
+
+from api.services.session_store import SessionNotFound, SessionStore
+
+@pytest.fixture
+def database(tmp_path):
+    db_path = tmp_path / "telemetria.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE Telemetria (Chassi INTEGER, Categoria TEXT, Valor REAL)")
+        conn.executemany(
+            "INSERT INTO Telemetria VALUES (?, ?, ?)",
+            [(chassi, "Uso do Motor", float(chassi * 10)) for chassi in range(1, 51)]
+        )
+    return str(db_path)
+
+def _result(database, sql):
+    with sqlite3.connect(database) as conn:
+        cursor = conn.execute(sql)
+        return [c[0] for c in cursor.description], cursor.fetchall()
+
+def _store(**overrides):
+    options = dict(idle_ttl_seconds=60, max_memory_bytes=64 * 1024 * 1024, max_rows_per_table=1000)
+    options.update(overrides)
+    return SessionStore(**options)
+
+def test_turn_result_is_materialized_and_visible_to_attached_connections(database):
+    """Testa que o resultado do turno vira uma tabela consultável pelas conexões do agente"""
+    store = _store()
+    session = store.create()
+    turn = store.record_turn(session.session_id, "Valor por chassi", "SELECT Chassi, Valor FROM Telemetria",
+                             _result(database, "SELECT Chassi, Valor FROM Telemetria"))
+
+    assert turn["rows"] == 50
+    assert turn["columns"] == ["Chassi", "Valor"]
+
+    conn = sqlite3.connect(database, uri=True, cached_statements=0)
+    store.attach(conn)
+    with store.scope(session.session_id):
+        assert conn.execute(f"SELECT COUNT(*) FROM {turn['table']} WHERE Chassi = 12").fetchone()[0] == 1
+
+def test_session_tables_are_readable_only_by_their_session(database):
+    """Testa que o SQL de uma sessão não lê as tabelas de outra (nem fora de sessão)"""
+    store = _store(max_rows_per_table=10)
+    owner, other = store.create(), store.create()
+    columns, rows = _result(database, "SELECT COUNT(*), COUNT(*) FROM Telemetria")
+    turn = store.record_turn(owner.session_id, "Total", "SELECT COUNT(*), COUNT(*) FROM Telemetria", (columns, rows))
+    assert turn["columns"] == ["COUNT(*)", "COUNT(*)_2"]
+
+    conn = sqlite3.connect(database, uri=True, cached_statements=0)
+    store.attach(conn)
+    for session_id in (other.session_id, None):
+        with store.scope(session_id):
+            with pytest.raises(sqlite3.DatabaseError):
+                conn.execute(f"SELECT * FROM {turn['table']}")
+    with store.scope(owner.session_id):
+        assert conn.execute(f"SELECT \"COUNT(*)_2\" FROM {turn['table']}").fetchone() == (50,)
+
+def test_attached_connections_are_read_only(database):
+    """Testa que SQL do LLM não grava nas tabelas das sessões nem no banco principal"""
+    store = _store()
+    session = store.create()
+    turn = store.record_turn(session.session_id, "Valor por chassi", "SELECT Chassi, Valor FROM Telemetria",
+                             _result(database, "SELECT Chassi, Valor FROM Telemetria"))
+
+    conn = sqlite3.connect(database, uri=True, cached_statements=0)
+    store.attach(conn)
+    with store.scope(session.session_id):
+        for sql in (
+            f"WITH q AS (SELECT 1) DELETE FROM {turn['table']}",
+            f"WITH q AS (SELECT 1) INSERT INTO {turn['table']} SELECT * FROM q, q",
+            "WITH q AS (SELECT 1) UPDATE Telemetria SET Valor = 0",
+            "CREATE TABLE sessao.invasora (x)",
+            "ATTACH DATABASE ':memory:' AS outro",
+            "PRAGMA sessao.user_version = 7",
+        ):
+            with pytest.raises(sqlite3.DatabaseError):
+                conn.execute(sql)
+        assert conn.execute(f"SELECT COUNT(*) FROM {turn['table']}").fetchone()[0] == 50
+    assert conn.execute("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 3) "
+                        "SELECT COUNT(*) FROM n").fetchone()[0] == 3
+
+def test_follow_up_context_mentions_previous_turn(database):
+    """Testa que a pergunta seguinte recebe pergunta, SQL e tabela anteriores"""
+    store = _store()
+    session = store.create()
+    turn = store.record_turn(session.session_id, "Valor por chassi", "SELECT Chassi, Valor FROM Telemetria",
+                             _result(database, "SELECT Chassi, Valor FROM Telemetria"))
+
+    context = store.build_context(session.session_id)
+    assert "Valor por chassi" in context
+    assert "SELECT Chassi, Valor FROM Telemetria" in context
+    assert turn["table"] in context
+
+def test_idle_sessions_expire(database):
+    """Testa a expiração de sessões inativas"""
+    store = _store(idle_ttl_seconds=0.05)
+    session = store.create()
+    time.sleep(0.1)
+    with pytest.raises(SessionNotFound):
+        store.get(session.session_id)
+
+def test_memory_cap_evicts_least_recently_used(database):
+    """Testa que o limite de memória descarta as sessões menos usadas recentemente"""
+    store = _store(max_memory_bytes=1)
+    old_session = store.create()
+    store.record_turn(old_session.session_id, "p1", "SELECT * FROM Telemetria", _result(database, "SELECT * FROM Telemetria"))
+    new_session = store.create()
+    store.record_turn(new_session.session_id, "p2", "SELECT * FROM Telemetria", _result(database, "SELECT * FROM Telemetria"))
+
+    with pytest.raises(SessionNotFound):
+        store.get(old_session.session_id)
+
+def test_delete_session(database):
+    """Testa a remoção explícita de uma sessão"""
+    store = _store()
+    session = store.create()
+    store.delete(session.session_id)
+    with pytest.raises(SessionNotFound):
+        store.get(session.session_id)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from api.services.rag_service import normalize_question
+from api.services.single_flight import SingleFlight
+
+def _run_concurrently(single_flight, key, fn, callers):
+    """Dispara `callers` chamadas simultâneas para a mesma chave"""
+    results, errors = [], []
+
+    def _call():
+        try:
+            results.append(single_flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+def test_concurrent_duplicates_share_one_execution():
+    """Testa que chamadas concorrentes idênticas executam a função uma única vez"""
+    single_flight = SingleFlight()
+    executions = []
+
+    def slow_query():
+        executions.append(1)
+        time.sleep(0.2)
+        return {"result": 42}
+
+    results, errors = _run_concurrently(single_flight, "pergunta", slow_query, callers=5)
+
+    assert not errors
+    assert len(executions) == 1
+    assert all(result == {"result": 42} for result, _ in results)
+    assert sum(1 for _, shared in results if shared) == 4
+    assert single_flight.in_flight() == 0
+
+def test_error_is_propagated_to_all_waiters():
+    """Testa que o erro da execução líder é entregue a todos os chamadores"""
+    single_flight = SingleFlight()
+
+    def failing_query():
+        time.sleep(0.2)
+        raise RuntimeError("Gemini indisponível")
+
+    results, errors = _run_concurrently(single_flight, "pergunta", failing_query, callers=3)
+
+    assert not results
+    assert len(errors) == 3
+    assert all(str(e) == "Gemini indisponível" for e in errors)
+
+def test_sequential_calls_are_not_coalesced():
+    """Testa que a chave é liberada depois que a execução termina"""
+    single_flight = SingleFlight()
+    assert single_flight.do("pergunta", lambda: 1) == (1, False)
+    assert single_flight.do("pergunta", lambda: 2) == (2, False)
+
+def test_normalize_question():
+    """Testa a normalização usada como chave de coalescência"""
+    assert normalize_question("  Qual a categoria   mais utilizada? ") == "qual a categoria mais utilizada"
+    assert normalize_question("QUAL A CATEGORIA MAIS UTILIZADA") == "qual a categoria mais utilizada"
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,98 @@
+import sqlite3
+
+import pytest
+
+from api.services.statistics_catalog import CATALOG_TABLE, StatisticsCatalog
+
+@pytest.fixture
+def telemetry_database(tmp_path):
+    """Banco pequeno com duas séries de uso do motor"""
+    path = str(tmp_path / "telemetria.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE Chassis (Chassi INTEGER PRIMARY KEY, Contrato INTEGER, Cliente INTEGER, Modelo INTEGER)")
+    conn.execute(
+        "CREATE TABLE Telemetria (Chassi INTEGER, UnidadeMedida TEXT, Categoria TEXT, "
+        "Data TIMESTAMP, Serie TEXT, Valor REAL)"
+    )
+    conn.executemany("INSERT INTO Chassis VALUES (?, ?, 1, 1)", [(1, 10), (2, 20)])
+    conn.executemany(
+        "INSERT INTO Telemetria VALUES (?, 'hr', 'Uso do Motor', ?, ?, ?)",
+        [(1 + i % 2, f"2024-01-{1 + i:02d} 00:00:00", "Carga Alta", float(i)) for i in range(10)]
+        + [(1, "2024-01-01 00:00:00", "Marcha Lenta", 2.0)],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+def test_catalog_statistics(telemetry_database):
+    """Testa contagens, intervalo de datas e estatísticas de Valor por série"""
+    catalog = StatisticsCatalog(telemetry_database)
+    catalog.load_or_build()
+
+    assert catalog.metadata["linhas_telemetria"] == 11
+    assert catalog.metadata["data_final"] == "2024-01-10 00:00:00"
+    assert catalog.metadata["contratos"] == 2
+    carga_alta = next(row for row in catalog.series if row["Serie"] == "Carga Alta")
+    assert carga_alta["Linhas"] == 10
+    assert carga_alta["Media"] == pytest.approx(4.5)
+    assert carga_alta["P50"] == pytest.approx(4.5)
+    assert carga_alta["Maximo"] == 9.0
+
+def test_groups_are_split_by_unit_in_a_single_pass(telemetry_database):
+    """Testa os grupos da passada ordenada: unidade distinta separa o grupo, Valor nulo e grupo só com nulos ficam de fora"""
+    conn = sqlite3.connect(telemetry_database)
+    conn.executemany("INSERT INTO Telemetria VALUES (1, ?, 'Uso do Motor', '2024-01-02 00:00:00', ?, ?)", [
+        ("min", "Carga Alta", 120.0), ("hr", "Marcha Lenta", None), ("hr", "Carga Baixa", None),
+    ])
+    conn.commit()
+    conn.close()
+
+    catalog = StatisticsCatalog(telemetry_database)
+    catalog.load_or_build()
+    groups = [(row["Serie"], row["UnidadeMedida"], row["Linhas"]) for row in catalog.series]
+    assert groups == [("Carga Alta", "hr", 10), ("Carga Alta", "min", 1), ("Marcha Lenta", "hr", 1)]
+    assert catalog.series[1]["P50"] == 120.0
+
+def test_catalog_is_persisted_and_rebuilt_on_change(telemetry_database):
+    """Testa que o catálogo é reaproveitado entre processos e recalculado quando a Telemetria (ou um Valor) muda"""
+    StatisticsCatalog(telemetry_database).load_or_build()
+    conn = sqlite3.connect(telemetry_database)
+    assert conn.execute(f"SELECT COUNT(*) FROM {CATALOG_TABLE}").fetchone()[0] == 2
+
+    reloaded = StatisticsCatalog(telemetry_database)
+    reloaded.load_or_build()
+    built_at = reloaded.metadata["built_at"]
+
+    conn.execute("INSERT INTO Telemetria VALUES (2, 'hr', 'Uso do Motor', '2024-02-01 00:00:00', 'Carga Alta', 100.0)")
+    conn.commit()
+    conn.close()
+
+    rebuilt = StatisticsCatalog(telemetry_database)
+    rebuilt.load_or_build()
+    assert rebuilt.metadata["built_at"] > built_at
+    assert rebuilt.metadata["linhas_telemetria"] == 12
+
+    # Upsert que só sobrescreve Valor (mesmas linhas e mesma última data) também recalcula
+    conn = sqlite3.connect(telemetry_database)
+    conn.execute("UPDATE Telemetria SET Valor = 200.0 WHERE Chassi = 2 AND Data = '2024-02-01 00:00:00'")
+    conn.commit()
+    conn.close()
+    overwritten = StatisticsCatalog(telemetry_database)
+    overwritten.load_or_build()
+    assert overwritten.metadata["built_at"] > rebuilt.metadata["built_at"]
+    assert max(row["Maximo"] for row in overwritten.series) == 200.0
+
+def test_summary_and_tool(telemetry_database):
+    """Testa o resumo do prompt (sem chaves do PromptTemplate) e o filtro da ferramenta"""
+    catalog = StatisticsCatalog(telemetry_database)
+    catalog.load_or_build()
+
+    summary = catalog.summary()
+    assert "{" not in summary and "}" not in summary
+    assert "Carga Alta" in summary
+
+    output = catalog.run("marcha lenta")
+    assert "Marcha Lenta" in output and "Carga Alta" not in output
+
+if __name__ == "__main__":
+    pytest.main([__file__])
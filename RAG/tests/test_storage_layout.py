@@ -0,0 +1,97 @@
+import sqlite3
+
+import pytest
+
+from api.utils.storage_layout import detect_layout, internal_tables_present, migrate_to_normalized
+
+ROWS = [
+    (1, "hr", "Uso do Motor", "2024-01-01 00:00:00", "Carga Alta", 2.5),
+    (1, "hr", "Uso do Motor", "2024-01-02 00:00:00", "Marcha Lenta", 1.0),
+    (1, "l", "Uso do Combustível do Motor", "2024-01-01 00:00:00", "Carga Alta", 30.0),
+    (2, "hr", "Uso da Configuração do Modo do Motor", "2024-02-10 00:00:00", "HP", 4.0),
+]
+
+@pytest.fixture
+def raw_database(tmp_path):
+    """Banco no layout original da Telemetria"""
+    path = str(tmp_path / "telemetria.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE Chassis (Chassi INTEGER PRIMARY KEY, Contrato INTEGER, Cliente INTEGER, Modelo INTEGER)")
+    conn.execute(
+        "CREATE TABLE Telemetria (Chassi INTEGER, UnidadeMedida TEXT, Categoria TEXT, "
+        "Data TIMESTAMP, Serie TEXT, Valor REAL)"
+    )
+    conn.executemany("INSERT INTO Chassis VALUES (?, 1, 1, 1)", [(1,), (2,)])
+    conn.executemany("INSERT INTO Telemetria VALUES (?, ?, ?, ?, ?, ?)", ROWS)
+    conn.commit()
+    conn.close()
+    return path
+
+def test_view_preserves_schema_and_rows(raw_database):
+    """Testa que a view Telemetria devolve as mesmas linhas e colunas do layout original"""
+    report = migrate_to_normalized(raw_database)
+    assert report["migrated_rows"] == len(ROWS)
+
+    conn = sqlite3.connect(raw_database)
+    assert detect_layout(conn) == "normalized"
+    columns = [c[1] for c in conn.execute("PRAGMA table_info(Telemetria)")]
+    assert columns == ["Chassi", "UnidadeMedida", "Categoria", "Data", "Serie", "Valor"]
+
+    rows = conn.execute("SELECT * FROM Telemetria ORDER BY Chassi, Categoria, Data").fetchall()
+    assert sorted(rows) == sorted(ROWS)
+
+    # Filtros por texto e por data continuam funcionando como antes
+    total = conn.execute(
+        "SELECT SUM(Valor) FROM Telemetria WHERE Categoria = 'Uso do Motor' AND Data < '2024-01-02'"
+    ).fetchone()[0]
+    assert total == 2.5
+    conn.close()
+
+def test_internal_tables_are_hidden_from_agent(raw_database):
+    """Testa que o agente enxerga apenas Chassis e a view Telemetria"""
+    from langchain_community.utilities import SQLDatabase
+
+    migrate_to_normalized(raw_database)
+    conn = sqlite3.connect(raw_database)
+    internal_tables = internal_tables_present(conn)
+    conn.close()
+
+    db = SQLDatabase.from_uri(f"sqlite:///{raw_database}", view_support=True, ignore_tables=internal_tables)
+    assert sorted(db.get_usable_table_names()) == ["Chassis", "Telemetria"]
+
+def test_migration_is_not_repeated(raw_database):
+    """Testa que migrar um banco já normalizado é recusado"""
+    migrate_to_normalized(raw_database)
+    with pytest.raises(RuntimeError):
+        migrate_to_normalized(raw_database)
+
+def test_migration_aborts_on_null_dimensions(raw_database):
+    """Testa que linhas sem Categoria/Serie/UnidadeMedida abortam a migração em vez de sumirem"""
+    conn = sqlite3.connect(raw_database)
+    conn.execute("INSERT INTO Telemetria VALUES (2, 'hr', NULL, '2024-02-11 00:00:00', 'HP', 1.0)")
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(RuntimeError, match="1 linhas com Categoria, Serie, UnidadeMedida nulo"):
+        migrate_to_normalized(raw_database)
+    conn = sqlite3.connect(raw_database)
+    assert detect_layout(conn) == "raw"
+    assert conn.execute("SELECT COUNT(*) FROM Telemetria").fetchone()[0] == len(ROWS) + 1
+    conn.close()
+
+def test_migration_aborts_on_duplicate_keys(raw_database):
+    """Testa que leituras repetidas na chave abortam a migração em vez de serem descartadas"""
+    conn = sqlite3.connect(raw_database)
+    conn.execute("INSERT INTO Telemetria VALUES (1, 'hr', 'Uso do Motor', '2024-01-01 00:00:00', 'Carga Alta', 3.0)")
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(RuntimeError, match="1 chaves .* repetidas.*Chassi 1, Uso do Motor, Carga Alta, 2024-01-01 00:00:00 \\(2 linhas\\)"):
+        migrate_to_normalized(raw_database)
+    conn = sqlite3.connect(raw_database)
+    assert detect_layout(conn) == "raw"
+    assert conn.execute("SELECT SUM(Valor) FROM Telemetria").fetchone()[0] == pytest.approx(40.5)
+    conn.close()
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,198 @@
+import json
+import sqlite3
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.services import service_pool as service_pool_module
+from api.services import telemetry_ingest as telemetry_ingest_module
+from api.services.telemetry_ingest import (
+    IngestConflict, IngestError, IngestRejected, ReadingsParser, TelemetryWriter, telemetry_ingest, validate_readings
+)
+from api.utils.storage_layout import list_partitions, migrate_to_partitioned
+
+def _reading(chassi=1, data="2024-01-01 10:00:00", serie="Carga Alta", valor=1.5,
+             categoria="Uso do Motor", unidade="hr"):
+    return {"Chassi": chassi, "UnidadeMedida": unidade, "Categoria": categoria, "Data": data, "Serie": serie, "Valor": valor}
+
+def _database(path):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE Telemetria (Chassi INTEGER, UnidadeMedida TEXT, Categoria TEXT, "
+        "Data TIMESTAMP, Serie TEXT, Valor REAL)"
+    )
+    conn.execute("INSERT INTO Telemetria VALUES (1, 'hr', 'Uso do Motor', '2024-01-01 00:00:00', 'Carga Alta', 2.0)")
+    conn.commit()
+    conn.close()
+    return path
+
+@pytest.fixture
+def database(tmp_path):
+    return _database(str(tmp_path / "telemetria.db"))
+
+def test_validate_readings_rejects_rows_individually():
+    """Testa a validação em bloco: leituras inválidas são recusadas com o motivo e a posição"""
+    records = [
+        _reading(),
+        _reading(chassi="7", valor="3.25"),
+        _reading(chassi=1.5),
+        _reading(data="ontem"),
+        _reading(valor=None),
+        _reading(serie="  "),
+        _reading(categoria="Uso do Combustível do Motor", unidade="hr"),
+        "não é um objeto",
+    ]
+    batch, rejected, errors = validate_readings(records, offset=100)
+    assert batch["Chassi"].tolist() == [1, 7]
+    assert batch["Valor"].tolist() == [1.5, 3.25]
+    assert rejected == 6
+    assert [error["index"] for error in errors] == [102, 103, 104, 105, 106, 107]
+    assert "Chassi" in errors[0]["error"] and "Data" in errors[1]["error"] and "'l'" in errors[4]["error"]
+
+def test_parser_reads_streams_split_at_any_byte():
+    """Testa NDJSON e CSV recebidos em partes que cortam linhas ao meio, e o JSON em objeto"""
+    body = "\n".join(json.dumps(_reading(chassi=i)) for i in range(5)).encode()
+    parser = ReadingsParser("application/x-ndjson")
+    records = []
+    for start in range(0, len(body), 7):
+        records += parser.feed(body[start:start + 7])
+    records += parser.close()
+    assert [record["Chassi"] for record in records] == [0, 1, 2, 3, 4]
+
+    parser = ReadingsParser("text/csv; charset=utf-8")
+    csv_body = b"Chassi,UnidadeMedida,Categoria,Data,Serie,Valor\r\n3,hr,Uso do Motor,2024-01-01 10:00:00,\"Carga Alta\",1.5\r\n"
+    assert parser.feed(csv_body[:30]) == []
+    records = parser.feed(csv_body[30:]) + parser.close()
+    assert records == [{**_reading(chassi="3", valor="1.5")}]
+
+    parser = ReadingsParser("application/json")
+    parser.feed(json.dumps({"readings": [_reading()]}).encode())
+    assert parser.close() == [_reading()]
+    with pytest.raises(IngestError):
+        ReadingsParser("text/plain")
+    with pytest.raises(IngestError):
+        ReadingsParser("text/csv").feed(b"Chassi,Valor\n")
+
+def test_raw_writer_upserts_in_wal_mode(database):
+    """Testa o escritor no layout original: WAL, índice único criado, leitura repetida substituída e aviso do checkpoint"""
+    checkpoints = []
+    writer = TelemetryWriter(database, commit_rows=1000, commit_interval=0.01, on_checkpoint=checkpoints.append)
+    writer.start()
+    try:
+        first, _, _ = validate_readings([_reading(data="2024-01-01 00:00:00", valor=5.0), _reading(chassi=2)])
+        second, _, _ = validate_readings([_reading(chassi=2, valor=9.0)])
+        futures = [writer.submit(first), writer.submit(second)]
+        assert [future.result(timeout=10) for future in futures] == [2, 1]
+    finally:
+        writer.stop()
+    # Fila ociosa após as gravações: o WAL foi transferido e os serviços avisados
+    assert checkpoints == [database]
+
+    conn = sqlite3.connect(database)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    rows = conn.execute("SELECT Chassi, Data, Valor FROM Telemetria ORDER BY Chassi").fetchall()
+    assert rows == [(1, "2024-01-01 00:00:00", 5.0), (2, "2024-01-01 10:00:00", 9.0)]
+    conn.close()
+
+def test_raw_writer_refuses_duplicate_keys(database):
+    """Testa que chaves repetidas na Telemetria original recusam a ingestão sem recriar o índice a cada lote"""
+    conn = sqlite3.connect(database)
+    conn.execute("INSERT INTO Telemetria SELECT * FROM Telemetria")
+    conn.commit()
+    conn.close()
+
+    writer = TelemetryWriter(database, commit_interval=0.01)
+    writer.start()
+    try:
+        for _ in range(2):
+            batch, _, _ = validate_readings([_reading(chassi=3)])
+            with pytest.raises(IngestConflict, match="remova as leituras repetidas"):
+                writer.submit(batch).result(timeout=10)
+    finally:
+        writer.stop()
+    assert writer._key_error is not None
+
+    conn = sqlite3.connect(database)
+    assert conn.execute("SELECT COUNT(*) FROM Telemetria").fetchone()[0] == 2
+    conn.close()
+
+def test_partitioned_writer_creates_partitions(database):
+    """Testa o escritor no layout particionado: mês novo ganha partição, visível na view"""
+    migrate_to_partitioned(database, vacuum=False)
+    created = []
+    writer = TelemetryWriter(database, commit_interval=0.01, on_partitions_created=created.append)
+    writer.start()
+    try:
+        batch, _, _ = validate_readings([_reading(data="2024-01-02 00:00:00", valor=3.0), _reading(data="2024-03-05")])
+        assert writer.submit(batch).result(timeout=10) == 2
+    finally:
+        writer.stop()
+
+    conn = sqlite3.connect(database)
+    assert [name for name, _, _ in list_partitions(conn)] == ["TelemetriaFato_202401", "TelemetriaFato_202403"]
+    assert conn.execute("SELECT COUNT(*), SUM(Valor) FROM Telemetria").fetchone() == (3, 6.5)
+    conn.close()
+    assert created == [database]
+
+def test_callback_errors_do_not_stop_the_writer(database):
+    """Testa que um erro nos avisos aos serviços não derruba o escritor nem deixa requisições sem resposta"""
+    migrate_to_partitioned(database, vacuum=False)
+
+    def _fail(path):
+        raise RuntimeError("pruner indisponível")
+
+    writer = TelemetryWriter(database, commit_interval=0.01, on_partitions_created=_fail, on_checkpoint=_fail)
+    writer.start()
+    try:
+        for data in ("2024-02-01 00:00:00", "2024-04-01 00:00:00"):
+            batch, _, _ = validate_readings([_reading(data=data)])
+            assert writer.submit(batch).result(timeout=10) == 1
+            time.sleep(0.3)  # Fila ociosa: checkpoint e aviso (que falha)
+        assert writer._thread.is_alive()
+    finally:
+        writer.stop()
+    assert writer.committed_rows == 2
+
+def test_writer_rejects_when_queue_is_full(database):
+    """Testa a contrapressão: lotes acima do limite de linhas pendentes são recusados"""
+    writer = TelemetryWriter(database, max_pending_rows=1)
+    batch, _, _ = validate_readings([_reading(), _reading(chassi=2)])
+    with pytest.raises(IngestRejected):
+        writer.submit(batch)
+
+def test_telemetry_endpoint(database, monkeypatch):
+    """Testa POST /telemetry: NDJSON gravado, leituras inválidas reportadas e erros de requisição"""
+    monkeypatch.setattr(service_pool_module.settings, "databases", {"frota": database})
+    monkeypatch.setattr(telemetry_ingest_module.settings, "ingest_token", "coletor")
+    client = TestClient(app)
+    body = "\n".join(json.dumps(r) for r in [_reading(chassi=5), _reading(chassi=6), _reading(valor="x")])
+    token = {"X-Ingest-Token": "coletor"}
+    try:
+        # Sem o token (ou com outro) nada é gravado
+        for headers in ({}, {"X-Ingest-Token": "errado"}):
+            assert client.post("/telemetry", params={"database": "frota"}, content=body,
+                               headers={"Content-Type": "application/x-ndjson", **headers}).status_code == 403
+
+        response = client.post(
+            "/telemetry", params={"database": "frota"}, content=body,
+            headers={"Content-Type": "application/x-ndjson", **token}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["received"], data["written"], data["rejected"]) == (3, 2, 1)
+        assert data["errors"][0]["index"] == 2
+
+        assert client.post("/telemetry", params={"database": "frota"}, content="x",
+                           headers={"Content-Type": "text/plain", **token}).status_code == 400
+        assert client.post("/telemetry", params={"database": "outro"}, json=[], headers=token).status_code == 404
+    finally:
+        telemetry_ingest.close()
+
+    conn = sqlite3.connect(database)
+    assert conn.execute("SELECT COUNT(*) FROM Telemetria WHERE Chassi IN (5, 6)").fetchone()[0] == 2
+    conn.close()
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,115 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.services import service_pool as service_pool_module
+from api.services.timeseries import build_timeseries, lttb, minmax
+from api.utils.storage_layout import migrate_to_normalized
+
+def _year_database(path, chassis=(1, 2), step_hours=1):
+    """Um ano de medições horárias de Carga Alta por chassi, no layout original"""
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE Telemetria (Chassi INTEGER, UnidadeMedida TEXT, Categoria TEXT, "
+        "Data TIMESTAMP, Serie TEXT, Valor REAL)"
+    )
+    start = datetime(2024, 1, 1)
+    rng = np.random.default_rng(7)
+    for chassi in chassis:
+        steps = 366 * 24 // step_hours
+        values = np.sin(np.arange(steps) / 200.0) * 4 + rng.random(steps) + chassi
+        conn.executemany(
+            "INSERT INTO Telemetria VALUES (?, 'hr', 'Uso do Motor', ?, 'Carga Alta', ?)",
+            [
+                (chassi, (start + timedelta(hours=i * step_hours)).strftime("%Y-%m-%d %H:%M:%S"), float(value))
+                for i, value in enumerate(values)
+            ],
+        )
+    conn.commit()
+    conn.close()
+    return path
+
+@pytest.fixture
+def database(tmp_path):
+    return _year_database(str(tmp_path / "telemetria.db"))
+
+def test_lttb_keeps_endpoints_and_point_count():
+    """Testa que o LTTB devolve exatamente threshold índices crescentes com o primeiro e o último ponto"""
+    x = np.arange(10000, dtype=np.float64)
+    y = np.sin(x / 300.0)
+    index = lttb(x, y, 200)
+    assert len(index) == 200
+    assert index[0] == 0 and index[-1] == 9999
+    assert np.all(np.diff(index) > 0)
+    assert len(lttb(x[:50], y[:50], 200)) == 50
+
+def test_minmax_keeps_global_extremes():
+    """Testa que o minmax preserva o maior e o menor valor da série (picos isolados)"""
+    rng = np.random.default_rng(1)
+    y = rng.random(10000)
+    y[1234], y[8765] = 50.0, -50.0
+    index = minmax(np.arange(10000, dtype=np.float64), y, 100)
+    assert len(index) <= 100
+    assert 1234 in index and 8765 in index
+
+def test_raw_and_normalized_layouts_return_same_series(database):
+    """Testa que a leitura pelo layout original e pelo normalizado produz as mesmas séries"""
+    args = (database, [1, 2], "Uso do Motor", "Carga Alta", "2024-03-01", "2024-06-30T23:59:59", 300, "lttb")
+    raw = build_timeseries(*args)
+    migrate_to_normalized(database)
+    normalized = build_timeseries(*args)
+
+    assert raw["series"] == normalized["series"]
+    assert raw["unidade"] == normalized["unidade"] == "hr"
+    assert raw["points_in"] == normalized["points_in"] == 2 * 122 * 24
+    assert raw["points_out"] == 600
+    first = raw["series"][0]["t"][0]
+    assert first == int(datetime(2024, 3, 1, tzinfo=timezone.utc).timestamp())
+
+def test_date_only_end_includes_the_whole_day(database):
+    """Testa que um `end` sem horário (2024-01-31) inclui as medições do dia 31 até 23:00"""
+    date_only = build_timeseries(database, [1], "Uso do Motor", "Carga Alta", "2024-01-31", "2024-01-31", 500, "none")
+    explicit = build_timeseries(database, [1], "Uso do Motor", "Carga Alta", "2024-01-31", "2024-01-31T23:59:59", 500, "none")
+    assert date_only["points_in"] == explicit["points_in"] == 24
+    assert date_only["series"][0]["t"][-1] == int(datetime(2024, 1, 31, 23, tzinfo=timezone.utc).timestamp())
+
+    # Com horário, o fim é usado como informado
+    midnight = build_timeseries(database, [1], "Uso do Motor", "Carga Alta", "2024-01-31", "2024-01-31T00:00:00", 500, "none")
+    assert midnight["points_in"] == 1
+
+def test_year_of_data_renders_quickly(tmp_path):
+    """Testa que um ano de dados horários de vários chassis é reduzido em menos de 100 ms"""
+    path = _year_database(str(tmp_path / "ano.db"), chassis=(1, 2, 3))
+    migrate_to_normalized(path)
+    build_timeseries(path, [1, 2, 3], "Uso do Motor", "Carga Alta")
+    result = build_timeseries(path, [1, 2, 3], "Uso do Motor", "Carga Alta", points=500)
+    assert result["points_in"] == 3 * 366 * 24
+    assert result["points_out"] == 1500
+    assert result["elapsed_ms"] < 100
+
+def test_timeseries_endpoint(database, monkeypatch):
+    """Testa o endpoint /timeseries: formato colunar, chassi sem dados e erros de parâmetro"""
+    monkeypatch.setattr(service_pool_module.settings, "databases", {"frota": database})
+    client = TestClient(app)
+
+    response = client.get("/timeseries", params={
+        "database": "frota", "chassi": [1, 99], "categoria": "Uso do Motor", "serie": "Carga Alta",
+        "points": 100, "method": "minmax",
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert [s["chassi"] for s in data["series"]] == [1, 99]
+    assert len(data["series"][0]["t"]) == len(data["series"][0]["v"]) <= 100
+    assert data["series"][1] == {"chassi": 99, "t": [], "v": []}
+
+    params = {"database": "frota", "chassi": 1, "categoria": "Uso do Motor", "serie": "Carga Alta"}
+    assert client.get("/timeseries", params={**params, "method": "media"}).status_code == 400
+    assert client.get("/timeseries", params={**params, "start": "ontem"}).status_code == 400
+    assert client.get("/timeseries", params={**params, "database": "outro"}).status_code == 404
+
+if __name__ == "__main__":
+    pytest.main([__file__])
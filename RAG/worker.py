@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Worker standalone para os jobs assíncronos da API Visagio RAG
+
+Consome a mesma fila SQLite usada pela API (JOBS_DATABASE_PATH); vários
+processos podem ser executados em paralelo para drenar a fila.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Adicionar o diretório atual ao PYTHONPATH
+current_dir = Path(__file__).parent
+sys.path.insert(0, str(current_dir))
+
+def main():
+    """Função principal do worker"""
+    from config.settings import settings
+
+    parser = argparse.ArgumentParser(description="Worker dos jobs assíncronos da API Visagio RAG")
+    parser.add_argument("--workers", type=int, default=max(1, settings.job_workers), help="Número de threads de worker")
+    args = parser.parse_args()
+
+    from api.services.job_queue import get_job_queue, JobWorkerPool, run_query_job
+    from api.services.service_pool import service_pool
+    from api.services.hot_reload import HotReloader
+
+    print(f"🧵 Iniciando {args.workers} worker(s) de jobs")
+    print(f"📋 Fila: {settings.jobs_database_path}")
+    service_pool.default.start_warmup()
+    if settings.hot_reload_enabled:
+        HotReloader(service_pool, settings.hot_reload_poll_seconds).start()
+
+    JobWorkerPool(
+        get_job_queue(),
+        handler=run_query_job,
+        workers=args.workers,
+        poll_interval=settings.job_poll_interval_seconds
+    ).run_forever()
+
+if __name__ == "__main__":
+    main()